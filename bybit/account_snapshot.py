@@ -0,0 +1,304 @@
+"""
+Общий снимок позиций и открытых ордеров аккаунта
+
+Вместо того чтобы каждая стратегия спрашивала get_positions(symbol=...) и
+get_open_orders(symbol=...) для своего символа, один опросчик на аккаунт
+раз в interval секунд забирает все позиции и все открытые ордера USDT
+(settleCoin, постранично) и раскладывает их по символам. N стратегий - один
+комплект запросов за интервал вместо N.
+
+Снимок лежит в памяти процесса и, если есть Redis, в hash
+account_snapshot:{account} (поле на символ + _ts): опрашивает только
+процесс, держащий аренду, остальные читают Redis. Опрос идет, пока снимок
+кто-то читает.
+
+Снимку верят, только если он начат не раньше since (момента, с которого
+вызывающему нужны данные, например последнего перехода стратегии) и не
+старше max_age. Иначе чтение возвращает None, и вызывающий спрашивает
+биржу сам, как раньше.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pybit.unified_trading import HTTP
+
+from bybit.rate_limiter import rate_limited
+from config import ACCOUNT_SNAPSHOT_INTERVAL, API_KEY, API_SECRET, DEMO_API_KEY, DEMO_API_SECRET
+from database import redis_client
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+SNAPSHOT_KEY_PREFIX = "account_snapshot:"   # Hash снимка: account_snapshot:main, поле на символ + _ts
+TIMESTAMP_FIELD = "_ts"
+POSITIONS_PAGE = 200        # Максимальный limit get_positions
+ORDERS_PAGE = 50            # Максимальный limit get_open_orders
+MAX_PAGES = 20
+IDLE_AFTER = 60.0           # Снимок никто не читал - опрос приостанавливается (секунды)
+WAIT_STEP = 0.05            # Шаг ожидания свежего снимка (секунды)
+
+
+def snapshot_key(account: str) -> str:
+    return f"{SNAPSHOT_KEY_PREFIX}{account}"
+
+
+def _empty() -> Dict[str, List[Dict]]:
+    return {'positions': [], 'orders': []}
+
+
+class AccountSnapshot:
+    """Опросчик аккаунта и чтение снимка по символу"""
+
+    def __init__(self, session, account: str = "main", redis=None, interval: float = ACCOUNT_SNAPSHOT_INTERVAL,
+                 max_age: Optional[float] = None, settle_coin: str = "USDT"):
+        """
+        Args:
+            session: Сессия с интерфейсом pybit.HTTP (синхронная - опрос идет в своем потоке)
+            account: Имя аккаунта в ключах Redis
+            redis: Клиент Redis для общего снимка процессов; None - снимок только в памяти процесса
+            max_age: Снимок старше не используется (по умолчанию три интервала)
+        """
+        self.session = session
+        self.account = account
+        self.redis = redis
+        self.interval = interval
+        self.max_age = max_age if max_age is not None else 3 * interval
+        self.settle_coin = settle_coin
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._symbols: Dict[str, Dict[str, List[Dict]]] = {}
+        self._taken_at = 0.0       # Начало опроса последнего снимка процесса (time.time())
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._last_read = 0.0
+        self._demand_published = 0.0
+
+        # Статистика
+        self.polls = 0
+        self.requests = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0             # Снимок устарел - вызывающий спросил биржу сам
+
+    # ==================== ЧТЕНИЕ ====================
+
+    def positions(self, symbol: str, since: float = 0.0, wait: float = 0.0) -> Optional[List[Dict]]:
+        """
+        Позиции символа (пустой список - позиции нет); None - нет снимка новее since
+
+        wait - сколько ждать следующего опроса, если снимок старше since (только вне event loop).
+        """
+        item = self._read(symbol, since, wait)
+        return None if item is None else item['positions']
+
+    def open_orders(self, symbol: str, since: float = 0.0, wait: float = 0.0) -> Optional[List[Dict]]:
+        """Открытые ордера символа; None - нет снимка новее since"""
+        item = self._read(symbol, since, wait)
+        return None if item is None else item['orders']
+
+    def _read(self, symbol: str, since: float, wait: float) -> Optional[Dict[str, List[Dict]]]:
+        self._touch()
+        symbol = symbol.upper()
+        deadline = time.time() + wait
+        woken = False
+        while True:
+            taken_at, item = self._lookup(symbol, since)
+            if taken_at >= since and time.time() - taken_at <= self.max_age:
+                self.hits += 1
+                return item
+            if time.time() >= deadline:
+                self.misses += 1
+                return None
+            if not woken:
+                self._wake.set()    # Внеочередной опрос; ожидающие одновременно получат один общий
+                woken = True
+            time.sleep(WAIT_STEP)
+
+    def _lookup(self, symbol: str, since: float) -> Tuple[float, Dict[str, List[Dict]]]:
+        """Снимок процесса, а если он не подходит - общий снимок из Redis"""
+        with self._lock:
+            taken_at = self._taken_at
+            item = self._symbols.get(symbol)
+        if self.redis is None or (taken_at >= since and time.time() - taken_at <= self.interval * 1.5):
+            return taken_at, item or _empty()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hget(snapshot_key(self.account), TIMESTAMP_FIELD)
+            pipe.hget(snapshot_key(self.account), symbol)
+            raw_ts, raw_item = pipe.execute()
+        except Exception as e:
+            logger.warning(f"[AccountSnapshot] Ошибка чтения снимка из Redis: {e}")
+            return taken_at, item or _empty()
+        shared_at = float(raw_ts) if raw_ts else 0.0
+        if shared_at <= taken_at:
+            return taken_at, item or _empty()
+        return shared_at, json.loads(raw_item) if raw_item else _empty()
+
+    def _touch(self):
+        """Отмечает спрос на снимок (и в Redis - для опросчика другого процесса)"""
+        now = time.time()
+        self._last_read = now
+        self._ensure_started()
+        if self.redis is not None and now - self._demand_published >= self.interval:
+            self._demand_published = now
+            try:
+                self.redis.set(f"{snapshot_key(self.account)}:demand", str(now), px=int(IDLE_AFTER * 1000))
+            except Exception as e:
+                logger.warning(f"[AccountSnapshot] Ошибка Redis: {e}")
+
+    # ==================== ОПРОС ====================
+
+    def poll_once(self) -> bool:
+        """Забирает все позиции и открытые ордера аккаунта и публикует снимок"""
+        taken_at = time.time()
+        positions = self._fetch_all(self.session.get_positions, POSITIONS_PAGE)
+        orders = self._fetch_all(self.session.get_open_orders, ORDERS_PAGE) if positions is not None else None
+        if positions is None or orders is None:
+            self.errors += 1
+            return False
+
+        symbols: Dict[str, Dict[str, List[Dict]]] = {}
+        for position in positions:
+            symbols.setdefault(position.get('symbol'), _empty())['positions'].append(position)
+        for order in orders:
+            symbols.setdefault(order.get('symbol'), _empty())['orders'].append(order)
+        symbols.pop(None, None)
+        self._publish(taken_at, symbols)
+        return True
+
+    def _fetch_all(self, call, limit: int) -> Optional[List[Dict]]:
+        """Все страницы списка (nextPageCursor); None - ошибка запроса"""
+        items: List[Dict] = []
+        params = {'category': "linear", 'settleCoin': self.settle_coin, 'limit': limit}
+        for _ in range(MAX_PAGES):
+            self.requests += 1
+            try:
+                response = call(**params)
+            except Exception as e:
+                logger.warning(f"[AccountSnapshot] Ошибка запроса {getattr(call, '__name__', call)}: {e}")
+                return None
+            if response.get('retCode') != 0:
+                logger.warning(f"[AccountSnapshot] Ошибка API: {response.get('retMsg')}")
+                return None
+            result = response.get('result') or {}
+            items.extend(result.get('list') or [])
+            cursor = result.get('nextPageCursor')
+            if not cursor:
+                break
+            params['cursor'] = cursor
+        return items
+
+    def _publish(self, taken_at: float, symbols: Dict[str, Dict[str, List[Dict]]]):
+        with self._lock:
+            self._symbols = symbols
+            self._taken_at = taken_at
+            self.polls += 1
+        if self.redis is None:
+            return
+        key = snapshot_key(self.account)
+        mapping = {TIMESTAMP_FIELD: str(taken_at)}
+        mapping.update({symbol: json.dumps(item) for symbol, item in symbols.items()})
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, int(max(self.max_age * 2, 10)))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[AccountSnapshot] Ошибка записи снимка в Redis: {e}")
+
+    def _in_demand(self) -> bool:
+        if time.time() - self._last_read < IDLE_AFTER:
+            return True
+        if self.redis is None:
+            return False
+        try:
+            return bool(self.redis.get(f"{snapshot_key(self.account)}:demand"))
+        except Exception:
+            return False
+
+    def _hold_lease(self) -> bool:
+        """Опрашивает один процесс: аренда продлевается владельцем, после его смерти истекает"""
+        if self.redis is None:
+            return True
+        key = f"{snapshot_key(self.account)}:lease"
+        ttl_ms = int(self.max_age * 1000)
+        try:
+            if self.redis.set(key, self.owner, nx=True, px=ttl_ms):
+                return True
+            if self.redis.get(key) == self.owner:
+                self.redis.pexpire(key, ttl_ms)
+                return True
+            return False
+        except Exception as e:
+            # Без Redis каждый процесс опрашивает сам
+            logger.warning(f"[AccountSnapshot] Ошибка аренды в Redis: {e}")
+            return True
+
+    def _ensure_started(self):
+        if self._running:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"AccountSnapshot-{self.account}", daemon=True)
+        self._thread.start()
+        logger.info(f"[AccountSnapshot] Опрос аккаунта {self.account} каждые {self.interval} сек")
+
+    def _run(self):
+        last_poll = 0.0
+        while self._running:
+            try:
+                # Внеочередной опрос по запросу читателя - не чаще четверти интервала
+                if time.time() - last_poll >= self.interval / 4 and self._in_demand() and self._hold_lease():
+                    last_poll = time.time()
+                    self.poll_once()
+            except Exception as e:
+                logger.error(f"[AccountSnapshot] Ошибка опроса: {e}", exc_info=True)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def close(self):
+        self._running = False
+        self._wake.set()
+
+    def stats(self) -> Dict:
+        return {
+            'account': self.account,
+            'symbols': len(self._symbols),
+            'age_sec': time.time() - self._taken_at if self._taken_at else None,
+            'polls': self.polls,
+            'requests': self.requests,
+            'errors': self.errors,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Глобальные снимки (один опросчик на аккаунт в процессе)
+_snapshots: Dict[bool, AccountSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_account_snapshot(use_demo: bool) -> Optional[AccountSnapshot]:
+    """Снимок аккаунта (демо или реальный); None - выключен (ACCOUNT_SNAPSHOT_INTERVAL=0) или нет ключей"""
+    if ACCOUNT_SNAPSHOT_INTERVAL <= 0:
+        return None
+    api_key = DEMO_API_KEY if use_demo else API_KEY
+    api_secret = DEMO_API_SECRET if use_demo else API_SECRET
+    if not api_key or not api_secret:
+        return None
+    with _snapshots_lock:
+        snapshot = _snapshots.get(use_demo)
+        if snapshot is None:
+            session = rate_limited(HTTP(testnet=False, api_key=api_key, api_secret=api_secret, demo=use_demo),
+                                   use_demo)
+            snapshot = AccountSnapshot(session, "demo" if use_demo else "main", redis=redis_client)
+            _snapshots[use_demo] = snapshot
+        return snapshot
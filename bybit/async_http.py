@@ -0,0 +1,234 @@
+"""
+Асинхронный REST-клиент Bybit v5 (aiohttp)
+
+pybit.unified_trading.HTTP синхронный: вызов из async-функции останавливает
+event loop на весь HTTP round trip, и стратегии одного цикла ждут друг друга.
+AsyncHTTP повторяет интерфейс pybit для используемых эндпоинтов, но запросы
+идут через общий пул keep-alive соединений aiohttp (один на event loop):
+без нового TCP/TLS рукопожатия на каждый запрос и без блокировки цикла.
+
+Ответ возвращается как есть (dict с retCode/retMsg/result), retCode != 0 не
+превращается в исключение - вызывающий код проверяет retCode, как и раньше.
+Ошибки сети и таймауты поднимаются исключениями (asyncio.TimeoutError,
+aiohttp.ClientError, BybitHTTPError).
+
+Использование:
+    http = AsyncHTTP(api_key=API_KEY, api_secret=API_SECRET)
+    response = await http.get_positions(category="linear", symbol="BTCUSDT")
+    response = await http.place_order(category="linear", symbol="BTCUSDT", side="Sell",
+                                      orderType="Market", qty=0.01, timeout=3)
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import weakref
+from functools import partial
+from typing import Dict, Optional
+
+import aiohttp
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+MAINNET_URL = "https://api.bybit.com"
+TESTNET_URL = "https://api-testnet.bybit.com"
+DEMO_URL = "https://api-demo.bybit.com"
+DEMO_TESTNET_URL = "https://api-demo-testnet.bybit.com"
+
+DEFAULT_TIMEOUT = 10.0        # Таймаут запроса по умолчанию (секунды)
+DEFAULT_RECV_WINDOW = 5000    # Окно приема запроса биржей (мс)
+MAX_CONNECTIONS = 100         # Соединений в пуле на event loop
+KEEPALIVE_TIMEOUT = 30        # Сколько держать простаивающее соединение (секунды)
+
+# Поля, которые биржа ждет строками и целыми (как приводит pybit)
+STRING_PARAMS = ("qty", "price", "triggerPrice", "takeProfit", "stopLoss")
+INTEGER_PARAMS = ("positionIdx",)
+
+
+class BybitHTTPError(Exception):
+    """HTTP-ошибка без JSON-ответа биржи (403 при превышении лимитов IP, 5xx)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+def cast_values(params: Dict) -> Dict:
+    """Приводит числовые поля к типам, которые ждет биржа (qty, price - строкой, positionIdx - целым)"""
+    for key in STRING_PARAMS:
+        if key in params and not isinstance(params[key], str):
+            params[key] = str(params[key])
+    for key in INTEGER_PARAMS:
+        if key in params and not isinstance(params[key], int):
+            params[key] = int(params[key])
+    return params
+
+
+def _query_string(params: Dict) -> str:
+    """Строка запроса GET - ровно та, что подписывается"""
+    return "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+
+
+class AsyncHTTP:
+    """Подмножество pybit.HTTP на aiohttp с пулом соединений на каждый event loop"""
+
+    def __init__(self, testnet: bool = False, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 demo: bool = False, recv_window: int = DEFAULT_RECV_WINDOW, timeout: float = DEFAULT_TIMEOUT,
+                 max_connections: int = MAX_CONNECTIONS, endpoint: Optional[str] = None, limiter=None,
+                 coalescer=None):
+        if endpoint is None:
+            if demo:
+                endpoint = DEMO_TESTNET_URL if testnet else DEMO_URL
+            else:
+                endpoint = TESTNET_URL if testnet else MAINNET_URL
+        self.endpoint = endpoint.rstrip("/")
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.recv_window = recv_window
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.limiter = limiter    # RateLimiter аккаунта (bybit/rate_limiter.py); None - без ограничения
+        self.coalescer = coalescer    # RequestCoalescer (bybit/request_coalescer.py); None - без объединения
+        # Сессия aiohttp привязана к event loop: у каждого цикла свой пул соединений
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = \
+            weakref.WeakKeyDictionary()
+
+        # Статистика
+        self.requests = 0
+        self.errors = 0
+
+    def _session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = session
+        return session
+
+    def _sign(self, payload: str, timestamp: int) -> Dict[str, str]:
+        if not self.api_key or not self.api_secret:
+            raise PermissionError("Authenticated endpoints require keys.")
+        param_str = f"{timestamp}{self.api_key}{self.recv_window}{payload}"
+        signature = hmac.new(self.api_secret.encode("utf-8"), param_str.encode("utf-8"), hashlib.sha256).hexdigest()
+        return {
+            "X-BAPI-API-KEY": self.api_key,
+            "X-BAPI-SIGN": signature,
+            "X-BAPI-SIGN-TYPE": "2",
+            "X-BAPI-TIMESTAMP": str(timestamp),
+            "X-BAPI-RECV-WINDOW": str(self.recv_window),
+        }
+
+    async def request(self, method: str, path: str, params: Dict, auth: bool = True,
+                      timeout: Optional[float] = None) -> Dict:
+        """Подписанный (auth) запрос к /v5; timeout - на весь запрос, вместо таймаута клиента"""
+        params = {key: value for key, value in params.items() if value is not None}
+        if self.coalescer is None:
+            return await self._send(method, path, params, auth, timeout)
+        if method == "GET":
+            return await self.coalescer.call_async(path, params,
+                                                   partial(self._send, method, path, params, auth, timeout))
+        try:
+            return await self._send(method, path, params, auth, timeout)
+        finally:
+            self.coalescer.invalidate(params)
+
+    async def _send(self, method: str, path: str, params: Dict, auth: bool, timeout: Optional[float]) -> Dict:
+        # Токен берется до подписи: ожидание в лимитере не должно съедать recv_window метки времени
+        group = await self.limiter.acquire_path_async(path, params) if self.limiter is not None else None
+
+        headers = {"Content-Type": "application/json"}
+        url = self.endpoint + path
+        if method == "GET":
+            payload = _query_string(params)
+            if payload:
+                url = f"{url}?{payload}"
+            body = None
+        else:
+            payload = json.dumps(cast_values(params))
+            body = payload
+        if auth:
+            headers.update(self._sign(payload, int(time.time() * 1000)))
+
+        self.requests += 1
+        client_timeout = aiohttp.ClientTimeout(total=timeout if timeout is not None else self.timeout)
+        try:
+            async with self._session().request(method, url, data=body, headers=headers,
+                                               timeout=client_timeout) as response:
+                text = await response.text()
+                try:
+                    data = json.loads(text)
+                except ValueError:
+                    raise BybitHTTPError(response.status, text[:200])
+                if response.status >= 400 and 'retCode' not in data:
+                    raise BybitHTTPError(response.status, text[:200])
+                if group is not None:
+                    self.limiter.calibrate(group, response.headers)
+                return data
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def close(self):
+        """Закрывает пул соединений текущего event loop"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ==================== ОРДЕРА ====================
+
+    async def place_order(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("POST", "/v5/order/create", params, timeout=timeout)
+
+    async def place_batch_order(self, timeout: Optional[float] = None, **params) -> Dict:
+        """Несколько ордеров одним запросом: params = category + request (список ордеров)"""
+        return await self.request("POST", "/v5/order/create-batch", params, timeout=timeout)
+
+    async def cancel_order(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("POST", "/v5/order/cancel", params, timeout=timeout)
+
+    async def amend_order(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("POST", "/v5/order/amend", params, timeout=timeout)
+
+    async def set_trading_stop(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("POST", "/v5/position/trading-stop", params, timeout=timeout)
+
+    # ==================== ПОЗИЦИИ И ОРДЕРА ====================
+
+    async def get_positions(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("GET", "/v5/position/list", params, timeout=timeout)
+
+    async def get_open_orders(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("GET", "/v5/order/realtime", params, timeout=timeout)
+
+    async def get_order_history(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("GET", "/v5/order/history", params, timeout=timeout)
+
+    # ==================== РЫНОК (без подписи) ====================
+
+    async def get_tickers(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("GET", "/v5/market/tickers", params, auth=False, timeout=timeout)
+
+    async def get_instruments_info(self, timeout: Optional[float] = None, **params) -> Dict:
+        return await self.request("GET", "/v5/market/instruments-info", params, auth=False, timeout=timeout)
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'pools': len(self._sessions),
+        }
+
@@ -2,10 +2,15 @@
 Стратегия шорт-позиций с усреднением для работы через Celery
 Адаптированная версия для приема сигналов через вебхуки
 """
-from pybit.unified_trading import WebSocket, HTTP
+from pybit.unified_trading import HTTP
 import asyncio
-from typing import Optional
-from config import API_KEY, API_SECRET, DEMO_API_KEY, DEMO_API_SECRET, TELEGRAM_BOT_TOKEN
+import time
+from bisect import bisect_right
+from functools import partial
+from typing import Callable, Optional, Tuple
+from config import (
+    API_KEY, API_SECRET, DEMO_API_KEY, DEMO_API_SECRET, TELEGRAM_BOT_TOKEN, PROTECTION_MODE, USE_PRIVATE_STREAM
+)
 from database import get_all_subscribed_users, get_cached_subscribers
 from utils.send_tg_message import (
     notify_position_opened,
@@ -18,6 +23,22 @@ from utils.send_tg_message import (
     notify_strategy_error
 )
 from bybit.stop_all_orders import stop_trading_by_symbol
+from bybit.bar_builder import bar_aggregator
+from bybit.market_data_bus import get_ticker_feed
+from bybit.price_table import price_table
+from bybit.tick_mailbox import AsyncTickMailbox
+from bybit.order_executor import OrderExecutor
+from bybit.order_bundle import OrderBundle, place_bundle
+from bybit.order_gateway import get_order_gateway
+from bybit.account_snapshot import get_account_snapshot
+from bybit.rate_limiter import RateLimiter, rate_limited
+from bybit.request_coalescer import CoalescedSession, coalesced
+from bybit.private_stream import (
+    EVENT_EXECUTION, EVENT_ORDER, EVENT_POSITION, EVENT_RESYNC, get_private_stream,
+)
+from bybit.strategy_state import EXCHANGE_FIELDS, STATE_FIELDS, strategy_state_store
+from bybit.trigger_table import TriggerTable
+from bybit.orderbook import SIDE_BUY
 from logger_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -28,6 +49,19 @@ DEFAULT_AVERAGING_PERCENT = 10.0
 DEFAULT_INITIAL_TP_PERCENT = 3.0
 DEFAULT_BREAKEVEN_STEP = 2.0
 DEFAULT_STOP_LOSS_PERCENT = 15.0
+ORDERBOOK_DEPTH = 50  # Глубина стакана для триггеров и оценки проскальзывания
+BREAKEVEN_LEVELS = (5.0, 7.0, 9.0, 11.0, 13.0, 15.0, 17.0, 19.0, 21.0, 23.0, 25.0)  # Шаги безубытка (% прибыли)
+
+# Защита позиции: отдельные стоп-ордера или стоп-лосс самой позиции (set_trading_stop)
+PROTECTION_ORDERS = "orders"
+PROTECTION_TRADING_STOP = "trading_stop"
+PROTECTION_MODES = (PROTECTION_ORDERS, PROTECTION_TRADING_STOP)
+
+
+def next_breakeven_level(best_profit_percent: float) -> Optional[float]:
+    """Следующий шаг безубытка выше уже зафиксированной прибыли"""
+    index = bisect_right(BREAKEVEN_LEVELS, best_profit_percent)
+    return BREAKEVEN_LEVELS[index] if index < len(BREAKEVEN_LEVELS) else None
 
 
 class ShortAveragingStrategyCelery:
@@ -41,7 +75,18 @@ class ShortAveragingStrategyCelery:
         initial_tp_percent: float = DEFAULT_INITIAL_TP_PERCENT,
         breakeven_step: float = DEFAULT_BREAKEVEN_STEP,
         stop_loss_percent: float = DEFAULT_STOP_LOSS_PERCENT,
-        use_demo: bool = True
+        use_demo: bool = True,
+        use_orderbook: bool = False,
+        session=None,
+        clock: Optional[Callable[[], float]] = None,
+        notifications: bool = True,
+        ticker_feed=None,
+        position_book=None,
+        state_store=None,
+        protection_mode: str = PROTECTION_MODE,
+        private_stream=None,
+        order_gateway=None,
+        account_snapshot=None
     ):
         """
         Инициализация стратегии
@@ -54,6 +99,21 @@ class ShortAveragingStrategyCelery:
             breakeven_step: Шаг перемещения безубытка (по умолчанию 2%)
             stop_loss_percent: Стоп-лосс после усреднения (по умолчанию 15%)
             use_demo: Использовать демо-счет
+            use_orderbook: Триггеры по лучшему ask из стакана и оценка проскальзывания
+            session: Готовая сессия вместо pybit.HTTP (например, SimulatedSession при воспроизведении)
+            clock: Источник времени вместо time.time (часы воспроизведения)
+            notifications: Отправлять уведомления в Telegram
+            ticker_feed: Источник тиков вместо get_ticker_feed() (хост стратегий, стресс-тест)
+            position_book: Книга позиций хоста (PositionBook) для пакетной проверки порогов
+            state_store: Хранилище снимков состояния (по умолчанию Redis, только для живой сессии)
+            protection_mode: "orders" - стоп-лосс и безубыток отдельными Stop-ордерами,
+                "trading_stop" - стоп-лосс позиции на бирже, локальная проверка только страхует
+            private_stream: Приватный поток ордеров и позиции аккаунта вместо опроса REST
+                (по умолчанию общий PrivateStream процесса, только для живой сессии)
+            order_gateway: Шлюз ордеров для входа и аварийного закрытия (WebSocket Trade с запасным REST;
+                по умолчанию общий OrderGateway процесса, только для живой сессии)
+            account_snapshot: Общий снимок позиций и ордеров аккаунта вместо опроса по символу
+                (по умолчанию AccountSnapshot процесса, только для живой сессии)
         """
         self.symbol = symbol.upper()
         self.usdt_amount = usdt_amount
@@ -62,18 +122,73 @@ class ShortAveragingStrategyCelery:
         self.breakeven_step = breakeven_step
         self.stop_loss_percent = stop_loss_percent
         self.use_demo = use_demo
+        self.clock = clock or time.time
+        self.notifications = notifications
+        if protection_mode not in PROTECTION_MODES:
+            raise ValueError(f"Неизвестный режим защиты позиции: {protection_mode}")
+        self.protection_mode = protection_mode
         
         # Инициализация сессии
-        # Выбираем ключи в зависимости от режима
-        api_key = DEMO_API_KEY if use_demo else API_KEY
-        api_secret = DEMO_API_SECRET if use_demo else API_SECRET
-        
-        self.session = HTTP(
-            testnet=False,
-            api_key=api_key,
-            api_secret=api_secret,
-            demo=use_demo
-        )
+        # Подставленная сессия используется и для остановки торговли по символу
+        self.external_session = session
+        
+        # Снимок состояния в Redis для продолжения после перезапуска воркера;
+        # симулятор (подставленная сессия) не должен трогать снимки живой торговли
+        if state_store is None and session is None:
+            state_store = strategy_state_store
+        self.state_store = state_store
+        self.state_owner = state_store.new_owner() if state_store is not None else None
+        self.state_cleared = False
+        self.last_state = None      # Поля снимка на момент прошлого сохранения
+        self.state_saved = False
+        self.heartbeat_task = None
+        if session is not None:
+            self.session = session
+        else:
+            # Выбираем ключи в зависимости от режима
+            api_key = DEMO_API_KEY if use_demo else API_KEY
+            api_secret = DEMO_API_SECRET if use_demo else API_SECRET
+            
+            # Запросы всех стратегий аккаунта делят один бюджет лимитов биржи,
+            # одинаковые одновременные чтения процесса уходят одним запросом
+            self.session = coalesced(rate_limited(HTTP(
+                testnet=False,
+                api_key=api_key,
+                api_secret=api_secret,
+                demo=use_demo
+            ), use_demo), use_demo)
+        
+        # Запросы к бирже с обработчика тиков уходят через очередь исполнителя;
+        # симулятор (подставленная сессия) вызывается в том же потоке
+        self.orders = OrderExecutor(self.symbol, threaded=session is None)
+        
+        # Исполнение лимитки усреднения и avgPrice позиции приходят событиями приватного потока;
+        # пока поток не подключен (или после обрыва) - прежний опрос REST
+        if private_stream is None and session is None and USE_PRIVATE_STREAM:
+            private_stream = get_private_stream(use_demo)
+        self.private_stream = private_stream
+        self.private_subscribed = False
+        self.loop = None
+        self.stream_position = None       # (size, avgPrice) позиции из последнего события
+        self.stream_order_status = {}     # orderId -> статус из потока (событие может опередить ответ REST)
+        self.averaging_fill_pending = False
+        self.position_gone = False        # Поток сообщил нулевой размер позиции
+        self.stream_resync = False        # После переподключения потока - одна сверка через REST
+        self.close_exec_price = None      # Цена последнего исполнения на покупку (закрытие шорта)
+        self.private_events = 0
+        
+        # Вход и аварийное закрытие - по уже открытому соединению WebSocket Trade
+        if order_gateway is None and session is None:
+            order_gateway = get_order_gateway(use_demo)
+        self.order_gateway = order_gateway
+        self.signal_time = time.perf_counter()   # Стратегия создается по сигналу
+        
+        # Позиция и открытые ордера символа - из общего снимка аккаунта, а не своим запросом
+        if account_snapshot is None and session is None:
+            account_snapshot = get_account_snapshot(use_demo)
+        self.account_snapshot = account_snapshot
+        self.snapshot_since = 0.0   # Снимок старше последнего перехода не отражает его на бирже
+        self.entry_latency = None                # Сигнал -> подтверждение входа (секунды)
         
         # Получаем информацию о символе
         self.qty_precision = None
@@ -100,6 +215,9 @@ class ShortAveragingStrategyCelery:
         self.stop_loss_price = None
         self.stop_loss_order_id = None  # ID стоп-лосс ордера
         self.breakeven_order_id = None  # ID безубыток ордера
+        self.breakeven_amends = 0       # Переносов безубытка через amend_order
+        self.breakeven_replaces = 0     # Переносов через отмену и новый ордер (amend отклонен)
+        self.trading_stop_price = None  # Стоп-лосс позиции, принятый биржей (режим trading_stop)
         
         # Счетчик попыток открытия
         self.open_attempts = 0
@@ -107,19 +225,39 @@ class ShortAveragingStrategyCelery:
         self.failed_to_open = False
         self.last_error = None
         
-        # WebSocket для мониторинга цены
-        self.ws = None
+        # Подписка на общий источник тиков (хаб процесса или шина Redis)
+        self.ticker_feed = ticker_feed
+        self.ws_subscribed = False
+        
+        # Ящик с самым свежим тиком: поток источника не ждет REST-запросы стратегии,
+        # тики обрабатывает задача-потребитель в event loop стратегии
+        self.mailbox = AsyncTickMailbox()
+        self.tick_consumer = None
+        self._notification_tasks = set()
+        
+        # Стакан: шорт закрывается покупкой, поэтому триггеры смотрят на лучший ask
+        self.use_orderbook = use_orderbook
+        self.orderbook = None
+        self.orderbook_subscribed = False
+        
+        # Бары 1s/1m/5m из потока тиков (ATR и диапазон без REST kline)
+        self.bars = None
         self.should_stop = False
         
         # Счетчик для периодического вывода статуса
         self.message_counter = 0
         self.status_interval = 10
         
-        # ✨ НОВОЕ: Один event loop для всех операций
-        self.loop = None
-        
         # ✨ НОВОЕ: Отслеживание пиковой прибыли (важно!)
         self.peak_profit_percent = 0.0
+        self.peak_price = float('-inf')  # Цена, ниже которой прибыль превысит пик
+        
+        # Ценовые пороги состояния: тик без пересечения порогов не требует проверок
+        self.triggers = TriggerTable()
+        
+        # Книга позиций хоста: тики приходят только при пересечении порогов (пакетная проверка)
+        self.position_book = position_book
+        self.book_slot = None
         
         # ✨ НОВОЕ: Редкие проверки (ТОЛЬКО для некритичных операций)
         self.last_position_check = 0
@@ -134,20 +272,27 @@ class ShortAveragingStrategyCelery:
         # ✨ НОВОЕ: Счетчик обработанных тиков для статистики
         self.ticks_processed = 0
         self.start_time = None
+        self.last_price = None
         
         # ✨ НОВОЕ: Флаг для отслеживания фиктивного TP
         self.fake_tp_reached = False
         
         logger.info(f"[{self.symbol}] Стратегия инициализирована в БЫСТРОМ режиме")
 
-    def _ensure_event_loop(self):
-        """Создает event loop если его нет"""
-        if not self.loop:
-            self.loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.loop)
+    def notify(self, notification_func, *args, **kwargs):
+        """Отправляет уведомление фоновой задачей: обработка тиков и ордера его не ждут"""
+        if not self.notifications:
+            return
+        task = asyncio.get_running_loop().create_task(
+            self.safe_send_notification(notification_func, *args, **kwargs)
+        )
+        self._notification_tasks.add(task)
+        task.add_done_callback(self._notification_tasks.discard)
 
     async def safe_send_notification(self, notification_func, *args, **kwargs):
         """Безопасная отправка уведомления с использованием кэшированных подписчиков"""
+        if not self.notifications:
+            return
         try:
             # ✨ ИСПРАВЛЕНИЕ: Используем кэшированных подписчиков вместо асинхронной БД
             # Получаем подписчиков из кэша (синхронно, не зависит от event loop)
@@ -268,6 +413,37 @@ class ShortAveragingStrategyCelery:
             self.min_qty = 0.001
             self.max_qty = 1000000
 
+    def _on_orderbook(self, book):
+        """Callback стакана: хаб сам обновляет объект, сохраняем ссылку на него"""
+        self.orderbook = book
+
+    def get_close_trigger_price(self, current_price: float) -> float:
+        """Цена, по которой реально закроется шорт: лучший ask при свежем стакане"""
+        book = self.orderbook
+        if book is not None and book.is_fresh():
+            best_ask = book.best_ask()
+            if best_ask:
+                return best_ask[0]
+        return current_price
+
+    def log_close_slippage(self):
+        """Оценивает цену исполнения рыночного закрытия по стакану перед отправкой ордера"""
+        book = self.orderbook
+        if book is None or not book.is_fresh() or not self.position_qty:
+            return
+        fill_price = book.estimate_fill_price(SIDE_BUY, self.position_qty)
+        if fill_price is None:
+            logger.warning(
+                f"[{self.symbol}] ⚠️ Глубины стакана ({book.depth} уровней) не хватает "
+                f"для закрытия {self.position_qty}"
+            )
+            return
+        slippage = book.estimate_slippage_percent(SIDE_BUY, self.position_qty)
+        logger.info(
+            f"[{self.symbol}] 📖 Оценка закрытия по стакану: {fill_price:.8g} "
+            f"(проскальзывание {slippage:.3f}%)"
+        )
+
     def calculate_qty(self, price: float) -> float:
         """Рассчитывает количество актива для покупки на заданную сумму USDT"""
         qty = self.usdt_amount / price
@@ -291,20 +467,32 @@ class ShortAveragingStrategyCelery:
         
         return qty
 
+    def snapshot_positions(self, wait: float = 0.0) -> Optional[list]:
+        """Позиции символа из снимка аккаунта; None - снимка нет или он старше последнего перехода"""
+        if self.account_snapshot is None:
+            return None
+        return self.account_snapshot.positions(self.symbol, since=self.snapshot_since, wait=wait)
+
+    def fetch_positions(self, wait: float = 0.0) -> list:
+        """Позиции символа: из снимка аккаунта, если он свежий, иначе запросом get_positions"""
+        positions = self.snapshot_positions(wait)
+        if positions is not None:
+            return positions
+        response = self.session.get_positions(
+            category="linear",
+            symbol=self.symbol
+        )
+        if response.get('retCode') == 0:
+            return response.get('result', {}).get('list', [])
+        return []
+
     def check_position_exists(self) -> bool:
         """Проверяет существование открытой позиции на бирже"""
         try:
-            response = self.session.get_positions(
-                category="linear",
-                symbol=self.symbol
-            )
-            
-            if response.get('retCode') == 0:
-                positions = response.get('result', {}).get('list', [])
-                for pos in positions:
-                    size = float(pos.get('size', 0))
-                    if size > 0:
-                        return True
+            for pos in self.fetch_positions():
+                size = float(pos.get('size', 0))
+                if size > 0:
+                    return True
             return False
         except Exception as e:
             logger.error(f"[{self.symbol}] Ошибка проверки позиции: {e}")
@@ -313,16 +501,19 @@ class ShortAveragingStrategyCelery:
     def check_open_orders_exist(self) -> bool:
         """Проверяет существование открытых ордеров на бирже"""
         try:
-            response = self.session.get_open_orders(
-                category="linear",
-                symbol=self.symbol
-            )
+            orders = None
+            if self.account_snapshot is not None:
+                orders = self.account_snapshot.open_orders(self.symbol, since=self.snapshot_since)
+            if orders is None:
+                response = self.session.get_open_orders(
+                    category="linear",
+                    symbol=self.symbol
+                )
+                orders = response.get('result', {}).get('list', []) if response.get('retCode') == 0 else []
             
-            if response.get('retCode') == 0:
-                orders = response.get('result', {}).get('list', [])
-                if len(orders) > 0:
-                    logger.info(f"[{self.symbol}] Найдено {len(orders)} открытых ордеров")
-                    return True
+            if len(orders) > 0:
+                logger.info(f"[{self.symbol}] Найдено {len(orders)} открытых ордеров")
+                return True
             return False
         except Exception as e:
             logger.error(f"[{self.symbol}] Ошибка проверки ордеров: {e}")
@@ -343,23 +534,16 @@ class ShortAveragingStrategyCelery:
             
         return False
 
-    def get_position_avg_price(self) -> Optional[float]:
+    def get_position_avg_price(self, wait: float = 0.0) -> Optional[float]:
         """Получает среднюю цену входа позиции из API"""
         try:
-            response = self.session.get_positions(
-                category="linear",
-                symbol=self.symbol
-            )
-            
-            if response.get('retCode') == 0:
-                positions = response.get('result', {}).get('list', [])
-                for pos in positions:
-                    size = float(pos.get('size', 0))
-                    if size > 0:
-                        avg_price = float(pos.get('avgPrice', 0))
-                        if avg_price > 0:
-                            logger.info(f"[{self.symbol}] Средняя цена входа из API: {avg_price:.8g}")
-                            return avg_price
+            for pos in self.fetch_positions(wait):
+                size = float(pos.get('size', 0))
+                if size > 0:
+                    avg_price = float(pos.get('avgPrice', 0))
+                    if avg_price > 0:
+                        logger.info(f"[{self.symbol}] Средняя цена входа из API: {avg_price:.8g}")
+                        return avg_price
             return None
         except Exception as e:
             logger.error(f"[{self.symbol}] Ошибка получения средней цены: {e}")
@@ -377,7 +561,7 @@ class ShortAveragingStrategyCelery:
                 logger.error(f"[{self.symbol}] {error_msg}")
                 
                 # Уведомляем об ошибке
-                await self.safe_send_notification(
+                self.notify(
                     notify_strategy_error,
                     TELEGRAM_BOT_TOKEN, self.symbol, 
                     error_msg, "SHORT_AVERAGING"
@@ -393,14 +577,14 @@ class ShortAveragingStrategyCelery:
             logger.info(f"📊 Цена: {current_price:.8g}")
             logger.info(f"📈 Количество: {qty} (точность: {self.qty_precision} знаков)")
             
-            # Открываем шорт-позицию
-            order = self.session.place_order(
-                category="linear",
-                symbol=self.symbol,
-                side="Sell",
-                orderType="Market",
-                qty=qty,
-            )
+            # Вход и лимитка усреднения - одним пакетным запросом (через шлюз ордеров, если он есть):
+            # цена усреднения считается от цены сигнала, ответа на вход ждать не нужно
+            averaging_price, averaging_qty = self.averaging_order_params(current_price)
+            bundle = OrderBundle(self.symbol)
+            bundle.add('entry', side="Sell", orderType="Market", qty=qty)
+            bundle.add('averaging', side="Sell", orderType="Limit", qty=averaging_qty, price=averaging_price)
+            legs = await self.orders.run(partial(place_bundle, self.order_gateway or self.session, bundle))
+            order = legs['entry']
             
             if order.get('retCode') == 0:
                 self.entry_price = current_price
@@ -410,24 +594,40 @@ class ShortAveragingStrategyCelery:
                 
                 # Рассчитываем цену тейк-профита (для шорта это НИЖЕ)
                 self.tp_price = self.entry_price * (1 - self.initial_tp_percent / 100)
+                self._state_changed()
                 
+                self.entry_latency = time.perf_counter() - self.signal_time
                 logger.info("✅ ШОРТ позиция открыта!")
+                logger.info(
+                    f"⏱️ Сигнал -> вход: {self.entry_latency * 1000:.1f} мс "
+                    f"({order.get('via', 'rest').upper()})"
+                )
                 logger.info(f"💵 Цена входа: {self.entry_price:.8g}")
                 logger.info(f"🎯 Тейк-профит: {self.tp_price:.8g} (-{self.initial_tp_percent}%)")
                 
                 # Отправляем уведомление об открытии позиции
-                await self.safe_send_notification(
+                self.notify(
                     notify_position_opened,
                     TELEGRAM_BOT_TOKEN, self.symbol,
                     self.entry_price, self.position_qty, self.usdt_amount,
                     self.tp_price, self.initial_tp_percent, "SHORT"
                 )
                 
-                # Выставляем лимитный ордер на усреднение
-                await self.place_averaging_order()
+                # Лимитка усреднения ушла в том же пакете; если биржа ее отклонила - отдельным запросом
+                if legs['averaging'].get('retCode') == 0:
+                    self._on_averaging_order(averaging_price, averaging_qty, legs['averaging'])
+                else:
+                    self.place_averaging_order()
                 
                 return True
             else:
+                # Вход не прошел - лимитка усреднения без позиции не нужна
+                if legs['averaging'].get('retCode') == 0:
+                    self.orders.submit(
+                        'averaging_order',
+                        partial(self.session.cancel_order, category="linear", symbol=self.symbol,
+                                orderId=legs['averaging']['result'].get('orderId')),
+                    )
                 error_msg = order.get('retMsg', 'Неизвестная ошибка')
                 self.last_error = error_msg
                 logger.error(
@@ -444,63 +644,75 @@ class ShortAveragingStrategyCelery:
             )
             return False
 
-    async def place_averaging_order(self) -> bool:
-        """Выставляет лимитный ордер на усреднение +10% от цены входа"""
+    def place_averaging_order(self) -> bool:
+        """Ставит в очередь лимитный ордер на усреднение +10% от цены входа"""
         try:
-            # ✨ ИСПРАВЛЕНИЕ: Усреднение +10% от цены входа (для шорта это ВЫШЕ)
-            averaging_price = self.entry_price * (1 + self.averaging_percent / 100)
-            qty = self.calculate_qty(averaging_price)  # Сумма в USDT по новой цене
-            
-            logger.info("📝 Выставляем лимитный ордер на усреднение...")
-            logger.info(f"💰 Цена усреднения: {averaging_price:.8g} (+{self.averaging_percent}% от входа)")
-            logger.info(f"📈 Количество: {qty} (сумма: {self.usdt_amount} USDT)")
-            logger.info(f"📊 Округлено до {self.qty_precision} знаков")
+            averaging_price, qty = self.averaging_order_params(self.entry_price)
             
-            order = self.session.place_order(
-                category="linear",
-                symbol=self.symbol,
-                side="Sell",
-                orderType="Limit",
-                qty=qty,
-                price=averaging_price,
+            self.orders.submit(
+                'averaging_order',
+                partial(
+                    self.session.place_order,
+                    category="linear",
+                    symbol=self.symbol,
+                    side="Sell",
+                    orderType="Limit",
+                    qty=qty,
+                    price=averaging_price,
+                ),
+                partial(self._on_averaging_order, averaging_price, qty),
             )
-            
-            if order.get('retCode') == 0:
-                self.averaging_order_id = order.get('result', {}).get('orderId')
-                logger.info(f"✅ Лимитный ордер выставлен! ID: {self.averaging_order_id}")
-                
-                # Отправляем уведомление
-                await self.safe_send_notification(
-                    notify_averaging_order_placed,
-                    TELEGRAM_BOT_TOKEN, self.symbol,
-                    averaging_price, self.averaging_percent, qty
-                )
-                
-                return True
-            else:
-                logger.error(
-                    f"[{self.symbol}] Ошибка выставления ордера: "
-                    f"{order.get('retMsg', 'Неизвестная ошибка')}"
-                )
-                return False
+            return True
                 
         except Exception as e:
             logger.error(f"[{self.symbol}] Исключение при выставлении ордера: {e}")
             return False
 
+    def averaging_order_params(self, entry_price: float):
+        """Цена и количество лимитного ордера на усреднение для цены входа"""
+        # ✨ ИСПРАВЛЕНИЕ: Усреднение +10% от цены входа (для шорта это ВЫШЕ)
+        averaging_price = entry_price * (1 + self.averaging_percent / 100)
+        qty = self.calculate_qty(averaging_price)  # Сумма в USDT по новой цене
+        
+        logger.info("📝 Выставляем лимитный ордер на усреднение...")
+        logger.info(f"💰 Цена усреднения: {averaging_price:.8g} (+{self.averaging_percent}% от входа)")
+        logger.info(f"📈 Количество: {qty} (сумма: {self.usdt_amount} USDT)")
+        logger.info(f"📊 Округлено до {self.qty_precision} знаков")
+        return averaging_price, qty
+
+    def _on_averaging_order(self, averaging_price: float, qty: float, order: dict):
+        """Ответ биржи на лимитный ордер усреднения"""
+        if order.get('retCode') == 0:
+            self.averaging_order_id = order.get('result', {}).get('orderId')
+            self._save_state()
+            logger.info(f"✅ Лимитный ордер выставлен! ID: {self.averaging_order_id}")
+            
+            # Отправляем уведомление
+            self.notify(
+                notify_averaging_order_placed,
+                TELEGRAM_BOT_TOKEN, self.symbol,
+                averaging_price, self.averaging_percent, qty
+            )
+            
+            # Событие исполнения могло прийти из потока раньше ответа на place_order
+            if self.stream_order_status.get(self.averaging_order_id) == 'Filled':
+                self._on_averaging_filled()
+        else:
+            logger.error(
+                f"[{self.symbol}] Ошибка выставления ордера: "
+                f"{order.get('retMsg', 'Неизвестная ошибка')}"
+            )
+
     def check_averaging_by_position_size(self) -> bool:
         """Альтернативная проверка усреднения через изменение размера позиции"""
         try:
-            response = self.session.get_positions(category="linear", symbol=self.symbol)
-            if response.get('retCode') == 0:
-                positions = response.get('result', {}).get('list', [])
-                for pos in positions:
-                    size = float(pos.get('size', 0))
-                    if size > 0:
-                        # Если размер позиции увеличился, значит усреднение сработало
-                        if size > self.position_qty:
-                            logger.info(f"[{self.symbol}] ✅ Размер позиции увеличился: {self.position_qty} -> {size}")
-                            return True
+            for pos in self.fetch_positions():
+                size = float(pos.get('size', 0))
+                if size > 0:
+                    # Если размер позиции увеличился, значит усреднение сработало
+                    if size > self.position_qty:
+                        logger.info(f"[{self.symbol}] ✅ Размер позиции увеличился: {self.position_qty} -> {size}")
+                        return True
             return False
         except Exception as e:
             logger.error(f"[{self.symbol}] Ошибка проверки размера позиции: {e}")
@@ -569,83 +781,335 @@ class ShortAveragingStrategyCelery:
             logger.error(f"[{self.symbol}] Ошибка проверки ордера: {e}")
             return False
 
-    async def place_stop_loss_order(self) -> bool:
-        """Выставляет стоп-лосс ордер в Bybit"""
+    def _poll_averaging_fill(self, confirm_by_size: bool) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        """Запрос исполнителя: исполнена ли лимитка усреднения; если да - (avgPrice, size) позиции из API"""
+        filled = self.check_averaging_order_filled()
+        if not filled and confirm_by_size:
+            filled = self.check_averaging_by_position_size()
+        if not filled:
+            return None
+        # Исполнение уже на бирже: годится только снимок, начатый после проверки (ждем ближайший опрос)
+        if self.account_snapshot is not None:
+            self.snapshot_since = time.time()
+            wait = self.account_snapshot.interval * 2
+            return self.get_position_avg_price(wait), self.get_position_size(wait)
+        return self.get_position_avg_price(), self.get_position_size()
+
+    def request_averaging_check(self, confirm_by_size: bool = False):
+        """Ставит в очередь проверку исполнения лимитки усреднения (повторные проверки схлопываются)"""
+        self.orders.submit(
+            'averaging_check',
+            partial(self._poll_averaging_fill, confirm_by_size),
+            partial(self._on_averaging_check, confirm_by_size),
+        )
+
+    def _on_averaging_check(self, confirm_by_size: bool, fill: Optional[Tuple[Optional[float], Optional[float]]]):
+        if self.is_averaged or not self.position_opened:
+            return
+        if fill is None:
+            if confirm_by_size:
+                logger.warning(f"[{self.symbol}] Цена достигла уровня усреднения, но усреднение не подтверждено!")
+            return
+        logger.info(f"[{self.symbol}] ✅ Усреднение подтверждено!")
+        self.apply_averaging(*fill)
+
+    # ==================== ПРИВАТНЫЙ ПОТОК ====================
+
+    def subscribe_private_stream(self):
+        """Подписка на события ордеров и позиции символа (вызывается из event loop стратегии)"""
+        if self.private_stream is None or self.private_subscribed:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.private_stream.subscribe(self.symbol, self.handle_private_event)
+        self.private_subscribed = True
+
+    def stream_live(self) -> bool:
+        """Событиям приватного потока можно верить - опрос REST не нужен"""
+        return self.private_subscribed and not self.stream_resync and self.private_stream.is_connected()
+
+    def handle_private_event(self, kind: str, item: dict):
+        """Callback приватного потока (поток WebSocket): событие обрабатывается в event loop стратегии"""
+        if self.should_stop or self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._on_private_event, kind, item)
+        except RuntimeError:
+            pass  # Event loop стратегии уже закрыт
+
+    def _on_private_event(self, kind: str, item: dict):
+        if self.should_stop:
+            return
+        self.private_events += 1
+        if kind == EVENT_ORDER:
+            order_id = item.get('orderId')
+            self.stream_order_status[order_id] = item.get('orderStatus')
+            if order_id == self.averaging_order_id and item.get('orderStatus') == 'Filled':
+                self._on_averaging_filled()
+        elif kind == EVENT_EXECUTION:
+            if item.get('execType', 'Trade') != 'Trade':
+                return
+            if item.get('side') == 'Buy':
+                # Покупка закрывает шорт: фактическая цена закрытия (стоп на бирже или наш ордер)
+                self.close_exec_price = float(item.get('execPrice') or 0) or None
+            elif float(item.get('leavesQty') or 0) == 0:
+                order_id = item.get('orderId')
+                self.stream_order_status[order_id] = 'Filled'
+                if order_id == self.averaging_order_id:
+                    self._on_averaging_filled()
+        elif kind == EVENT_POSITION:
+            self._on_stream_position(item)
+        elif kind == EVENT_RESYNC:
+            # События за время обрыва потеряны: на ближайшем тике - одна сверка через REST
+            logger.warning(f"[{self.symbol}] Приватный поток переподключился, сверяем позицию через REST")
+            self.stream_resync = True
+            self.last_position_check = 0
+
+    def _on_stream_position(self, item: dict):
+        size = float(item.get('size') or 0)
+        avg_price = float(item.get('avgPrice') or 0)
+        self.stream_position = (size, avg_price)
+        if not self.position_opened:
+            return
+        # Нулевой размер обработает цикл тиков (ордера снимаются через очередь исполнителя)
+        self.position_gone = size == 0
+        if self.position_gone:
+            return
+        if self.averaging_fill_pending:
+            self._apply_stream_averaging()
+        elif self.is_averaged:
+            self._on_avg_price(avg_price)
+
+    def _on_averaging_filled(self):
+        """Лимитка усреднения исполнена: применяем, как только поток пришлет новый размер позиции"""
+        if self.is_averaged or not self.position_opened:
+            return
+        if not self.averaging_fill_pending:
+            logger.info(f"[{self.symbol}] ✅ Ордер на усреднение исполнен (приватный поток)")
+        self.averaging_fill_pending = True
+        self._apply_stream_averaging()
+
+    def _apply_stream_averaging(self):
+        position = self.stream_position
+        if position is None or position[0] <= self.position_qty:
+            return  # Событие позиции с новым размером еще не пришло
+        self.averaging_fill_pending = False
+        logger.info(f"[{self.symbol}] ✅ Усреднение подтверждено!")
+        self.apply_averaging(position[1], position[0])
+
+    def _finish_stream_resync(self):
+        """После переподключения потока: исполнение лимитки и avgPrice - одним запросом каждое"""
+        self.stream_resync = False
+        if not self.is_averaged:
+            self.request_averaging_check(confirm_by_size=True)
+        else:
+            self.orders.submit('avg_price', self.get_position_avg_price, self._on_avg_price)
+
+    async def _on_position_gone(self):
+        """Приватный поток сообщил нулевой размер позиции: снимаем оставшиеся ордера и останавливаемся"""
+        if self.protection_mode == PROTECTION_TRADING_STOP and self.trading_stop_price is not None:
+            logger.info(
+                f"[{self.symbol}] 🛡️ Позиция закрыта стоп-лоссом позиции на бирже "
+                f"({self.trading_stop_price:.6f})"
+            )
+            await self.close_position(closed_by_exchange=True)
+        else:
+            logger.warning(f"⚠️ [{self.symbol}] Позиция закрыта вручную!")
+            # Очищаем все ордера для этой монеты (стоп-ордера без позиции открыли бы новую)
+            await self.stop_trading_for_symbol()
+        self.should_stop = True
+        self.stop_websocket()
+
+    def get_position_size(self, wait: float = 0.0) -> Optional[float]:
+        """Получает размер позиции из API"""
+        try:
+            for pos in self.fetch_positions(wait):
+                size = float(pos.get('size', 0))
+                if size > 0:
+                    return size
+        except Exception as e:
+            logger.warning(f"[{self.symbol}] Не удалось получить обновленное количество: {e}")
+        return None
+
+    def place_stop_loss_order(self) -> bool:
+        """Ставит в очередь стоп-лосс ордер в Bybit"""
+        if self.protection_mode == PROTECTION_TRADING_STOP:
+            return self.set_trading_stop()
         try:
             logger.info(f"[{self.symbol}] 🛡️ Выставляем стоп-лосс ордер...")
             logger.info(f"[{self.symbol}] 💰 Цена стоп-лосса: {self.stop_loss_price:.6f} (+{self.stop_loss_percent}%)")
             logger.info(f"[{self.symbol}] 📈 Количество: {self.position_qty}")
             
             # Выставляем стоп-лосс ордер (для шорта это Buy Stop)
-            order = self.session.place_order(
-                category="linear",
-                symbol=self.symbol,
-                side="Buy",  # Для шорта стоп-лосс это Buy
-                orderType="Stop",  # ✨ ИСПРАВЛЕНИЕ: Stop вместо StopMarket
-                qty=self.position_qty,
-                stopPrice=self.stop_loss_price,
-                triggerBy="LastPrice"  # Срабатывает по последней цене
+            self.orders.submit(
+                'stop_loss',
+                partial(
+                    self.session.place_order,
+                    category="linear",
+                    symbol=self.symbol,
+                    side="Buy",  # Для шорта стоп-лосс это Buy
+                    orderType="Stop",  # ✨ ИСПРАВЛЕНИЕ: Stop вместо StopMarket
+                    qty=self.position_qty,
+                    stopPrice=self.stop_loss_price,
+                    triggerBy="LastPrice"  # Срабатывает по последней цене
+                ),
+                self._on_stop_loss_order,
             )
-            
-            if order.get('retCode') == 0:
-                self.stop_loss_order_id = order.get('result', {}).get('orderId')
-                logger.info(f"[{self.symbol}] ✅ Стоп-лосс ордер выставлен! ID: {self.stop_loss_order_id}")
-                return True
-            else:
-                error_msg = order.get('retMsg', 'Неизвестная ошибка')
-                logger.error(f"[{self.symbol}] ❌ Ошибка выставления стоп-лосса: {error_msg}")
-                return False
+            return True
                 
         except Exception as e:
             logger.error(f"[{self.symbol}] Исключение при выставлении стоп-лосса: {e}")
             return False
 
-    async def place_breakeven_order(self, current_price: float, profit_percent: float) -> bool:
-        """Выставляет безубыток ордер в Bybit"""
-        try:
+    def _on_stop_loss_order(self, order: dict):
+        if order.get('retCode') == 0:
+            self.stop_loss_order_id = order.get('result', {}).get('orderId')
+            self._save_state()
+            logger.info(f"[{self.symbol}] ✅ Стоп-лосс ордер выставлен! ID: {self.stop_loss_order_id}")
+        else:
+            error_msg = order.get('retMsg', 'Неизвестная ошибка')
+            logger.error(f"[{self.symbol}] ❌ Ошибка выставления стоп-лосса: {error_msg}")
+
+    def place_breakeven_order(self, current_price: float, profit_percent: float) -> bool:
+        """
+        Переносит безубыток: уровень стратегии меняется сразу, ордер выставляет исполнитель
+        
+        Перенос, еще не отправленный на биржу, заменяется более новым уровнем.
+        """
+        logger.info(f"[{self.symbol}] 🔒 Выставляем безубыток на {profit_percent:.1f}%...")
+        logger.info(f"[{self.symbol}] 💰 Цена безубытка: {current_price:.6f}")
+        logger.info(f"[{self.symbol}] 📈 Количество: {self.position_qty}")
+        
+        # ✨ НОВОЕ: Показываем статус множественных стоп-ордеров
+        if self.stop_loss_order_id:
+            logger.info(f"[{self.symbol}] 🛡️ Стоп-лосс активен: {self.stop_loss_price:.6f} (ID: {self.stop_loss_order_id})")
+        else:
+            logger.info(f"[{self.symbol}] ⚠️ Стоп-лосс не установлен")
+        
+        self.breakeven_price = current_price
+        self._state_changed()
+        if self.protection_mode == PROTECTION_TRADING_STOP:
+            return self.set_trading_stop()
+        self.orders.submit(
+            'breakeven',
+            partial(self._send_breakeven_order, current_price, self.position_qty),
+            self._on_breakeven_order,
+        )
+        return True
+
+    def protection_stop_price(self) -> Optional[float]:
+        """Ближайший к цене уровень закрытия шорта: безубыток или стоп-лосс после усреднения"""
+        levels = [self.breakeven_price]
+        if self.is_averaged:
+            levels.append(self.stop_loss_price)
+        levels = [level for level in levels if level]
+        return min(levels) if levels else None
+
+    def set_trading_stop(self) -> bool:
+        """
+        Ставит в очередь стоп-лосс позиции (режим trading_stop)
+        
+        Безубыток и стоп-лосс после усреднения - один уровень позиции на бирже:
+        ближайший к цене. Каждый перенос - один запрос без отмен и новых ордеров,
+        неотправленный уровень заменяется более новым.
+        """
+        self.orders.submit('trading_stop', self._send_trading_stop, self._on_trading_stop)
+        return True
+
+    def _send_trading_stop(self) -> Tuple[Optional[float], dict]:
+        """Запрос исполнителя: стоп-лосс всей позиции по текущему состоянию стратегии"""
+        price = self.protection_stop_price()
+        if price is None or price == self.trading_stop_price:
+            return price, {'retCode': 0}
+        logger.info(f"[{self.symbol}] 🛡️ Стоп-лосс позиции на бирже: {price:.6f}")
+        response = self.session.set_trading_stop(
+            category="linear",
+            symbol=self.symbol,
+            stopLoss=str(price),
+            slTriggerBy="LastPrice",
+            tpslMode="Full",
+            positionIdx=0,
+        )
+        return price, response
+
+    def _on_trading_stop(self, result: Tuple[Optional[float], dict]):
+        price, response = result
+        if response.get('retCode') == 0:
+            if price is not None and price != self.trading_stop_price:
+                self.trading_stop_price = price
+                self._save_state()
+                logger.info(f"[{self.symbol}] ✅ Стоп-лосс позиции установлен: {price:.6f}")
+        else:
+            # Уровень стратегии остается: закрытие подстрахует проверка на тиках
+            error_msg = response.get('retMsg', 'Неизвестная ошибка')
+            logger.error(f"[{self.symbol}] ❌ Ошибка установки стоп-лосса позиции: {error_msg}")
+
+    def _send_breakeven_order(self, price: float, qty: float) -> dict:
+        """
+        Запрос исполнителя: переносит безубыток ордер на новую цену
+        
+        Существующий стоп-ордер изменяется на месте (amend_order) - один запрос,
+        и позиция не остается без защиты между отменой и новым ордером.
+        Если биржа отклонила изменение, прежний ордер снимается и выставляется новый.
+        """
+        if self.breakeven_order_id:
+            response = self._amend_breakeven_order(price, qty)
+            if response is not None:
+                return response
             # Отменяем предыдущий безубыток ордер
-            if self.breakeven_order_id:
-                await self.cancel_breakeven_order()
-            
-            # ✨ ИСПРАВЛЕНИЕ: НЕ отменяем стоп-лосс - позволяем множественные стоп-ордера
-            # Стоп-лосс защищает от больших убытков, безубыток защищает прибыль
-            
-            logger.info(f"[{self.symbol}] 🔒 Выставляем безубыток на {profit_percent:.1f}%...")
-            logger.info(f"[{self.symbol}] 💰 Цена безубытка: {current_price:.6f}")
-            logger.info(f"[{self.symbol}] 📈 Количество: {self.position_qty}")
-            
-            # ✨ НОВОЕ: Показываем статус множественных стоп-ордеров
-            if self.stop_loss_order_id:
-                logger.info(f"[{self.symbol}] 🛡️ Стоп-лосс активен: {self.stop_loss_price:.6f} (ID: {self.stop_loss_order_id})")
-            else:
-                logger.info(f"[{self.symbol}] ⚠️ Стоп-лосс не установлен")
-            
-            # Выставляем Buy Stop ордер для закрытия шорта
-            order = self.session.place_order(
+            self._cancel_breakeven_order()
+        
+        # ✨ ИСПРАВЛЕНИЕ: НЕ отменяем стоп-лосс - позволяем множественные стоп-ордера
+        # Стоп-лосс защищает от больших убытков, безубыток защищает прибыль
+        
+        # Выставляем Buy Stop ордер для закрытия шорта
+        return self.session.place_order(
+            category="linear",
+            symbol=self.symbol,
+            side="Buy",  # Покупка для закрытия шорта
+            orderType="Stop",  # ✨ ИСПРАВЛЕНИЕ: Stop вместо StopMarket
+            qty=qty,
+            stopPrice=price,
+            triggerBy="LastPrice"
+        )
+
+    def _amend_breakeven_order(self, price: float, qty: float) -> Optional[dict]:
+        """Изменяет цену срабатывания и количество безубыток ордера; None - изменение отклонено"""
+        try:
+            response = self.session.amend_order(
                 category="linear",
                 symbol=self.symbol,
-                side="Buy",  # Покупка для закрытия шорта
-                orderType="Stop",  # ✨ ИСПРАВЛЕНИЕ: Stop вместо StopMarket
-                qty=self.position_qty,
-                stopPrice=current_price,
-                triggerBy="LastPrice"
+                orderId=self.breakeven_order_id,
+                triggerPrice=str(price),
+                qty=str(qty),
             )
-            
-            if order.get('retCode') == 0:
-                self.breakeven_order_id = order.get('result', {}).get('orderId')
-                self.breakeven_price = current_price
-                logger.info(f"[{self.symbol}] ✅ Безубыток ордер выставлен! ID: {self.breakeven_order_id}")
-                return True
-            else:
-                error_msg = order.get('retMsg', 'Неизвестная ошибка')
-                logger.error(f"[{self.symbol}] ❌ Ошибка выставления безубытка: {error_msg}")
-                return False
-                
         except Exception as e:
-            logger.error(f"[{self.symbol}] Исключение при выставлении безубытка: {e}")
-            return False
+            logger.warning(f"[{self.symbol}] Исключение при изменении безубытка: {e}, переставляем ордер")
+            self.breakeven_replaces += 1
+            return None
+        
+        if response.get('retCode') == 0:
+            self.breakeven_amends += 1
+            logger.info(f"[{self.symbol}] ✏️ Безубыток ордер {self.breakeven_order_id} перенесен на {price:.6f}")
+            return response
+        
+        self.breakeven_replaces += 1
+        logger.warning(
+            f"[{self.symbol}] Биржа отклонила изменение безубытка: "
+            f"{response.get('retMsg', 'Неизвестная ошибка')}, переставляем ордер"
+        )
+        return None
 
-    async def cancel_breakeven_order(self) -> bool:
+    def _on_breakeven_order(self, order: dict):
+        if order.get('retCode') == 0:
+            self.breakeven_order_id = order.get('result', {}).get('orderId')
+            self._save_state()
+            logger.info(f"[{self.symbol}] ✅ Безубыток ордер выставлен! ID: {self.breakeven_order_id}")
+        else:
+            # Уровень стратегии остается: закрытие по безубытку подстрахует проверка на тиках
+            error_msg = order.get('retMsg', 'Неизвестная ошибка')
+            logger.error(f"[{self.symbol}] ❌ Ошибка выставления безубытка: {error_msg}")
+
+    def _cancel_breakeven_order(self) -> bool:
         """Отменяет безубыток ордер"""
         try:
             if not self.breakeven_order_id:
@@ -676,13 +1140,16 @@ class ShortAveragingStrategyCelery:
             logger.error(f"[{self.symbol}] Исключение при отмене безубытка: {e}")
             return False
 
-    async def apply_averaging(self, current_price: float) -> bool:
-        """Применяет логику после усреднения"""
+    async def cancel_breakeven_order(self) -> bool:
+        """Отменяет безубыток ордер (после уже поставленных запросов)"""
+        return await self.orders.run(self._cancel_breakeven_order)
+
+    def apply_averaging(self, api_avg_price: Optional[float], api_size: Optional[float]) -> bool:
+        """Применяет логику после усреднения (средняя цена и размер - из ответа API, если есть)"""
         try:
             logger.info(f"[{self.symbol}] Усреднение сработало!")
             
-            # ✨ ИСПРАВЛЕНИЕ: Получаем среднюю цену входа из API
-            api_avg_price = self.get_position_avg_price()
+            # ✨ ИСПРАВЛЕНИЕ: Средняя цена входа из API
             if api_avg_price:
                 self.averaged_price = api_avg_price
                 logger.info(f"[{self.symbol}] Средняя цена входа из API: {self.averaged_price:.8g}")
@@ -696,18 +1163,9 @@ class ShortAveragingStrategyCelery:
                 ) / total_qty
                 logger.warning(f"[{self.symbol}] Используем расчетную среднюю цену: {self.averaged_price:.8g}")
             
-            # Получаем обновленное количество из API
-            try:
-                response = self.session.get_positions(category="linear", symbol=self.symbol)
-                if response.get('retCode') == 0:
-                    positions = response.get('result', {}).get('list', [])
-                    for pos in positions:
-                        size = float(pos.get('size', 0))
-                        if size > 0:
-                            self.position_qty = size
-                            break
-            except Exception as e:
-                logger.warning(f"[{self.symbol}] Не удалось получить обновленное количество: {e}")
+            # Обновленное количество из API
+            if api_size:
+                self.position_qty = api_size
             
             self.is_averaged = True
             
@@ -715,7 +1173,7 @@ class ShortAveragingStrategyCelery:
             self.stop_loss_price = self.averaged_price * (1 + self.stop_loss_percent / 100)
             
             # ✨ НОВОЕ: Выставляем стоп-лосс ордер в Bybit
-            await self.place_stop_loss_order()
+            self.place_stop_loss_order()
             
             # ✨ ИСПРАВЛЕНИЕ: Новый тейк-профит от усредненной цены
             self.tp_price = self.averaged_price * (1 - self.initial_tp_percent / 100)
@@ -724,6 +1182,7 @@ class ShortAveragingStrategyCelery:
             self.best_profit_percent = 0
             # ✨ ВАЖНО: Сбрасываем безубыток, чтобы он пересчитался от усредненной цены
             self.breakeven_price = None
+            self._state_changed()
             
             logger.info(
                 f"[{self.symbol}] Усредненная цена: {self.averaged_price:.6f}, "
@@ -732,7 +1191,7 @@ class ShortAveragingStrategyCelery:
             )
             
             # Отправляем уведомление
-            await self.safe_send_notification(
+            self.notify(
                 notify_averaging_executed,
                 TELEGRAM_BOT_TOKEN, self.symbol,
                 self.averaged_price, self.position_qty,
@@ -746,6 +1205,106 @@ class ShortAveragingStrategyCelery:
             logger.error(f"[{self.symbol}] Ошибка применения усреднения: {e}")
             return False
 
+    def _rebuild_triggers(self):
+        """Компилирует состояние в таблицу ценовых порогов (вызывается при каждом изменении состояния)"""
+        if not self.position_opened or not self.entry_price:
+            self.triggers.clear()
+            return
+        base_price = self.averaged_price if self.is_averaged else self.entry_price
+        above_last, above_close, below = [], [], []
+        
+        if self.is_averaged and self.stop_loss_price:
+            above_close.append((self.stop_loss_price, 'stop_loss'))
+        if not self.is_averaged:
+            above_last.append((self.entry_price * (1 + self.averaging_percent / 100), 'averaging'))
+        if self.is_averaged and self.fake_tp_price and not self.fake_tp_reached:
+            below.append((self.fake_tp_price, 'fake_tp'))
+        if not self.breakeven_price and not self.breakeven_order_id:
+            below.append((base_price * (1 - self.initial_tp_percent / 100), 'take_profit'))
+        elif self.breakeven_price:
+            level = next_breakeven_level(self.best_profit_percent)
+            if level is not None:
+                step_percent = max(level, self.initial_tp_percent)
+                below.append((base_price * (1 - step_percent / 100), 'breakeven_step'))
+        if self.breakeven_price:
+            above_close.append((self.breakeven_price, 'breakeven'))
+        
+        self.triggers.build(above_last, above_close, below)
+        # Новый пик прибыли - цена ниже этой
+        self.peak_price = base_price * (1 - self.peak_profit_percent / 100)
+
+    def _state_changed(self):
+        """Переход состояния: новые пороги и снимок в Redis"""
+        self._rebuild_triggers()
+        self._save_state()
+
+    def _save_state(self):
+        """Снимок в Redis, только если поля снимка изменились с прошлого вызова"""
+        state = {name: getattr(self, name) for name in STATE_FIELDS}
+        previous, self.last_state = self.last_state, state
+        if previous is None or any(state[name] != previous[name] for name in EXCHANGE_FIELDS):
+            # Позиция или ордера изменились: снимок аккаунта, снятый раньше, их не отражает
+            self.snapshot_since = time.time()
+        if state == previous and self.state_saved:
+            return
+        if self.state_store is not None and self.position_opened and not self.state_cleared:
+            self.state_saved = self.state_store.save(self.symbol, state, self.state_owner)
+
+    def _clear_state(self):
+        if self.state_store is not None:
+            self.state_store.delete(self.symbol)
+        self.state_cleared = True
+
+    async def resume_state(self) -> bool:
+        """Продолжает позицию по снимку из Redis (повторная доставка задачи после падения воркера)"""
+        if self.state_store is None:
+            return False
+        state = self.state_store.load(self.symbol)
+        if not state or not state['position_opened']:
+            return False
+        
+        # Свежий heartbeat - владелец снимка, возможно, еще жив: ждем, пока он устареет
+        deadline = time.time() + self.state_store.stale_after
+        while not self.state_store.is_stale(state):
+            if time.time() >= deadline:
+                logger.warning(f"[{self.symbol}] Снимок состояния обновляется другой стратегией ({state['owner']})")
+                return False
+            await asyncio.sleep(min(1.0, self.state_store.stale_after))
+            state = self.state_store.load(self.symbol)
+            if not state or not state['position_opened']:
+                return False
+        
+        # Снимок берем, только если с момента чтения его не подхватила другая задача
+        if not self.state_store.claim(self.symbol, state, self.state_owner):
+            logger.warning(f"[{self.symbol}] Снимок состояния уже подхвачен другой стратегией")
+            return False
+        
+        # Единственный REST-запрос: позиция из снимка еще существует
+        if not await self.orders.run(self.check_position_exists):
+            logger.info(f"[{self.symbol}] Позиции из снимка состояния уже нет, снимок удален")
+            self._clear_state()
+            return False
+        
+        for name in STATE_FIELDS:
+            setattr(self, name, state[name])
+        self.last_position_check = self.clock()
+        self._state_changed()
+        base_price = self.averaged_price if self.is_averaged else self.entry_price
+        logger.info(
+            f"[{self.symbol}] ♻️ Состояние восстановлено из снимка ({state['owner']}): "
+            f"вход {self.entry_price:.8g}, база {base_price:.8g}, qty {self.position_qty}, "
+            f"усреднение={'ДА' if self.is_averaged else 'НЕТ'}, безубыток {self.breakeven_price}"
+        )
+        return True
+
+    def profit_percent(self, current_price: float) -> float:
+        """Прибыль шорта в процентах от базовой цены (усредненной или цены входа)"""
+        if self.is_averaged and self.averaged_price:
+            base_price = self.averaged_price
+        else:
+            base_price = self.entry_price
+        return (base_price - current_price) / base_price * 100
+
     async def update(self, current_price: float, current_time: float) -> Optional[str]:
         """Обновляет состояние стратегии - ПРОВЕРЯЕТ КАЖДЫЙ ТИК"""
         
@@ -754,40 +1313,58 @@ class ShortAveragingStrategyCelery:
         
         # ✨ ПРИМЕЧАНИЕ: Проверка позиции теперь в handle_message для оптимизации
         
-        # ✨ ИСПРАВЛЕНИЕ: Определяем базовую цену для расчетов
-        # Если усреднение произошло, используем среднюю цену из API
-        if self.is_averaged:
-            # Периодически обновляем среднюю цену из API
+        # Если усреднение произошло, периодически обновляем среднюю цену из API
+        # (с приватным потоком avgPrice приходит событием позиции)
+        if self.is_averaged and not self.stream_live():
             if current_time - self.last_position_check > self.position_check_interval:
-                api_avg_price = self.get_position_avg_price()
-                if api_avg_price:
-                    self.averaged_price = api_avg_price
-            base_price = self.averaged_price
-        else:
-            base_price = self.entry_price
+                self.orders.submit('avg_price', self.get_position_avg_price, self._on_avg_price)
         
-        # ✨ НОВОЕ: Определяем цену для расчетов TP и БУ
-        # ДО усреднения: от начальной цены входа
-        # ПОСЛЕ усреднения: от усредненной цены
-        tp_breakeven_base_price = self.averaged_price if self.is_averaged else self.entry_price
+        # ✨ НОВОЕ: Отслеживаем пиковую прибыль (одно сравнение с ценой пика)
+        if current_price < self.peak_price:
+            base_price = self.averaged_price if self.is_averaged else self.entry_price
+            self.peak_profit_percent = (base_price - current_price) / base_price * 100
+            self.peak_price = current_price
         
-        # ✨ КРИТИЧНО: Рассчитываем прибыль на КАЖДОМ тике
-        profit_percent = (base_price - current_price) / base_price * 100
+        # ✨ ОПТИМИЗАЦИЯ: Проверяем исполнение лимитки усреднения по времени, а не на каждом тике
+        # (с приватным потоком исполнение приходит событием ордера)
+        if not self.is_averaged and not self.stream_live():
+            if current_time - self.last_averaging_check > self.averaging_check_interval:
+                self.request_averaging_check()
+                self.last_averaging_check = current_time
         
-        # ✨ НОВОЕ: Отслеживаем пиковую прибыль
-        if profit_percent > self.peak_profit_percent:
-            self.peak_profit_percent = profit_percent
+        # Цена фактического закрытия шорта (лучший ask) для стоп-лосса и безубытка
+        close_price = self.get_close_trigger_price(current_price)
         
-        # ✅ КРИТИЧНО: Проверяем стоп-лосс НА КАЖДОМ ТИКЕ (без кэширования!)
-        if self.is_averaged and self.stop_loss_price:
-            if current_price >= self.stop_loss_price:
+        # ✅ Цена между ближайшими порогами - ни одно условие не выполнено
+        fired = self.triggers.check(current_price, close_price)
+        if not fired:
+            return None
+        
+        try:
+            return await self._on_triggers(fired, current_price, close_price)
+        finally:
+            self._state_changed()
+
+    def _on_avg_price(self, api_avg_price: Optional[float]):
+        if api_avg_price and self.is_averaged and api_avg_price != self.averaged_price:
+            self.averaged_price = api_avg_price
+            self._state_changed()
+
+    async def _on_triggers(self, fired, current_price: float, close_price: float) -> Optional[str]:
+        """Полная проверка условий, когда цена пересекла хотя бы один порог"""
+        base_price = self.averaged_price if self.is_averaged else self.entry_price
+        profit_percent = (base_price - current_price) / base_price * 100
+        
+        # ✅ КРИТИЧНО: Стоп-лосс
+        if 'stop_loss' in fired and self.is_averaged and self.stop_loss_price:
+            if close_price >= self.stop_loss_price:
                 logger.warning(
                     f"[{self.symbol}] 🚨 Стоп-лосс сработал! "
-                    f"Цена: {current_price:.6f} >= {self.stop_loss_price:.6f}"
+                    f"Цена: {close_price:.6f} >= {self.stop_loss_price:.6f}"
                 )
                 
                 # Уведомление - НЕ блокируем, отправляем асинхронно
-                await self.safe_send_notification(
+                self.notify(
                     notify_stop_loss_triggered,
                     TELEGRAM_BOT_TOKEN, self.symbol,
                     current_price, self.stop_loss_price
@@ -795,33 +1372,20 @@ class ShortAveragingStrategyCelery:
                 
                 return "CLOSE"
         
-        # ✨ ОПТИМИЗАЦИЯ: Проверяем усреднение чаще, но не на каждом тике
-        if not self.is_averaged:
-            # Проверяем по времени
-            if current_time - self.last_averaging_check > self.averaging_check_interval:
-                if self.check_averaging_order_filled():
-                    await self.apply_averaging(current_price)
-                self.last_averaging_check = current_time
-            
-            # ✨ НОВОЕ: Дополнительная проверка по цене - если цена достигла уровня усреднения
+        # ✨ НОВОЕ: Дополнительная проверка по цене - если цена достигла уровня усреднения
+        if 'averaging' in fired and not self.is_averaged:
             averaging_price = self.entry_price * (1 + self.averaging_percent / 100)
             if current_price >= averaging_price:
                 logger.info(f"[{self.symbol}] 🎯 Цена достигла уровня усреднения! {current_price:.6f} >= {averaging_price:.6f}")
                 
-                # Проверяем двумя способами
-                order_filled = self.check_averaging_order_filled()
-                position_increased = self.check_averaging_by_position_size()
-                
-                if order_filled or position_increased:
-                    logger.info(f"[{self.symbol}] ✅ Усреднение подтверждено! Order: {order_filled}, Position: {position_increased}")
-                    await self.apply_averaging(current_price)
-                else:
-                    logger.warning(f"[{self.symbol}] Цена достигла уровня усреднения, но усреднение не подтверждено!")
+                # Проверяем двумя способами (ордер и размер позиции) - в очереди исполнителя;
+                # с приватным потоком исполнение подтвердит событие ордера
+                if not self.stream_live():
+                    self.request_averaging_check(confirm_by_size=True)
         
         # ✨ НОВОЕ: Проверяем 2% фиктивный TP после усреднения
-        if self.is_averaged and self.fake_tp_price and current_price <= self.fake_tp_price:
-            # Проверяем, что это первый раз когда достигаем фиктивный TP
-            if not hasattr(self, 'fake_tp_reached') or not self.fake_tp_reached:
+        if 'fake_tp' in fired and self.is_averaged and self.fake_tp_price and current_price <= self.fake_tp_price:
+            if not self.fake_tp_reached:
                 self.fake_tp_reached = True
                 logger.info(
                     f"[{self.symbol}] 🎯 Достигнут 2% фиктивный TP! "
@@ -830,14 +1394,8 @@ class ShortAveragingStrategyCelery:
                 # Фиктивный TP не закрывает позицию, только логируем
         
         # ✅ КРИТИЧНО: Логика тейк-профита с РЕАЛЬНЫМИ ОРДЕРАМИ
-        if profit_percent >= self.initial_tp_percent:
+        if ('take_profit' in fired or 'breakeven_step' in fired) and profit_percent >= self.initial_tp_percent:
             if not self.breakeven_price and not self.breakeven_order_id:
-                # ✨ ИСПРАВЛЕНИЕ: Рассчитываем правильную цену безубытка для первого TP
-                if self.is_averaged and self.averaged_price:
-                    base_price = self.averaged_price
-                else:
-                    base_price = self.entry_price
-                
                 # Цена безубытка = базовая цена * (1 - profit_percent / 100)
                 breakeven_price = base_price * (1 - profit_percent / 100)
                 
@@ -847,40 +1405,24 @@ class ShortAveragingStrategyCelery:
                 )
                 
                 # Выставляем реальный безубыток ордер
-                await self.place_breakeven_order(breakeven_price, profit_percent)
+                self.place_breakeven_order(breakeven_price, profit_percent)
                 self.best_profit_percent = profit_percent
                 
                 # Уведомление асинхронно
-                await self.safe_send_notification(
+                self.notify(
                     notify_take_profit_reached,
                     TELEGRAM_BOT_TOKEN, self.symbol,
-                    current_price, profit_percent, breakeven_price  # ✨ ИСПРАВЛЕНИЕ: используем правильную цену безубытка
+                    current_price, profit_percent, breakeven_price
                 )
             else:
-                # ✨ ИСПРАВЛЕНИЕ: Проверяем шаги безубытка - каждые 2% прибыли
-                # При 3% прибыли: БУ = 3% (уже выставлен выше)
-                # При 5% прибыли: БУ = 5% 
-                # При 7% прибыли: БУ = 7%
-                # При 9% прибыли: БУ = 9%
-                # И так далее...
-                breakeven_levels = [5.0, 7.0, 9.0, 11.0, 13.0, 15.0, 17.0, 19.0, 21.0, 23.0, 25.0]
-                target_breakeven_percent = None
-                
-                for level in breakeven_levels:
-                    if profit_percent >= level and self.best_profit_percent < level:
-                        target_breakeven_percent = level
-                        break
+                # Шаги безубытка каждые 2% прибыли: 5%, 7%, 9% ... 25%
+                target_breakeven_percent = next_breakeven_level(self.best_profit_percent)
+                if target_breakeven_percent is not None and profit_percent < target_breakeven_percent:
+                    target_breakeven_percent = None
                 
-                # Если прибыль достигла нового уровня (5%, 7%, 9%, 11%, 13%, 15%, 17%, 19%, 21%, 23%, 25%)
-                if target_breakeven_percent and self.breakeven_order_id:
+                if target_breakeven_percent and self.breakeven_price:
                     old_breakeven = self.breakeven_price
                     
-                    # ✨ ИСПРАВЛЕНИЕ: Рассчитываем правильную цену безубытка
-                    if self.is_averaged and self.averaged_price:
-                        base_price = self.averaged_price
-                    else:
-                        base_price = self.entry_price
-                    
                     # Цена безубытка = базовая цена * (1 - target_breakeven_percent / 100)
                     breakeven_price = base_price * (1 - target_breakeven_percent / 100)
                     
@@ -890,7 +1432,7 @@ class ShortAveragingStrategyCelery:
                     )
                     
                     # Выставляем новый безубыток ордер (старый отменится автоматически)
-                    await self.place_breakeven_order(breakeven_price, target_breakeven_percent)
+                    self.place_breakeven_order(breakeven_price, target_breakeven_percent)
                     self.best_profit_percent = target_breakeven_percent
                     
                     # ✨ НОВОЕ: Показываем статус множественных стоп-ордеров после перемещения
@@ -899,7 +1441,7 @@ class ShortAveragingStrategyCelery:
                     else:
                         logger.warning(f"[{self.symbol}] ⚠️ Стоп-лосс не установлен после перемещения безубытка")
                     
-                    await self.safe_send_notification(
+                    self.notify(
                         notify_breakeven_moved,
                         TELEGRAM_BOT_TOKEN, self.symbol,
                         self.breakeven_price, target_breakeven_percent, profit_percent
@@ -907,10 +1449,11 @@ class ShortAveragingStrategyCelery:
         
         # ✅ КРИТИЧНО: Проверяем безубыток - теперь это делается через реальные ордера
         # Но оставляем fallback проверку на случай, если ордер не сработал
-        if self.breakeven_price and current_price >= self.breakeven_price:
+        # (безубыток мог быть выставлен на этом же тике - проверяем по текущему состоянию)
+        if self.breakeven_price and close_price >= self.breakeven_price:
             logger.info(
                 f"[{self.symbol}] 🏁 Безубыток сработал! "
-                f"Цена: {current_price:.6f} >= {self.breakeven_price:.6f} "
+                f"Цена: {close_price:.6f} >= {self.breakeven_price:.6f} "
                 f"(Пик прибыли был: {self.peak_profit_percent:.2f}%)"
             )
             return "CLOSE"
@@ -928,11 +1471,12 @@ class ShortAveragingStrategyCelery:
                 logger.info(
                     f"[{self.symbol}] Попытка {attempt}/{max_attempts} отменить лимитный ордер"
                 )
-                response = self.session.cancel_order(
+                response = await self.orders.run(partial(
+                    self.session.cancel_order,
                     category="linear",
                     symbol=self.symbol,
                     orderId=self.averaging_order_id
-                )
+                ))
                 
                 if response.get('retCode') == 0:
                     logger.info(f"[{self.symbol}] Лимитный ордер успешно отменен")
@@ -961,14 +1505,20 @@ class ShortAveragingStrategyCelery:
         try:
             logger.info(f"[{self.symbol}] 🛑 Останавливаем торговлю для {self.symbol}...")
             
+            # Неотправленные переносы безубытка и проверки больше не нужны
+            self.orders.discard()
+            
             # ✨ ИСПРАВЛЕНИЕ: Используем функцию stop_trading_by_symbol 
             # которая отменяет ордера и закрывает позицию только для конкретной монеты
-            stop_trading_by_symbol(self.symbol)
+            await self.orders.run(partial(stop_trading_by_symbol, self.symbol, self.external_session, self.order_gateway))
             
             # Очищаем локальные переменные
             self.breakeven_order_id = None
             self.stop_loss_order_id = None
             self.averaging_order_id = None
+            self.trading_stop_price = None
+            self._rebuild_triggers()
+            self._clear_state()
             
             logger.info(f"[{self.symbol}] ✅ Торговля для {self.symbol} остановлена")
             return True
@@ -978,34 +1528,84 @@ class ShortAveragingStrategyCelery:
             return False
 
     def stop_websocket(self):
-        """Останавливает WebSocket соединение"""
+        """Отписывается от общего источника тиков"""
         try:
-            if self.ws:
-                logger.info(f"[{self.symbol}] Закрываем WebSocket соединение...")
-                self.ws.exit()
-                self.ws = None
-                logger.info(f"[{self.symbol}] WebSocket соединение закрыто")
+            if self.ws_subscribed:
+                logger.info(f"[{self.symbol}] Отписываемся от потока тикеров...")
+                if self.book_slot is not None:
+                    self.position_book.remove(self.symbol)
+                    self.book_slot = None
+                else:
+                    self.ticker_feed.unsubscribe(self.symbol, self.handle_message)
+                self.ws_subscribed = False
+                logger.info(f"[{self.symbol}] Подписка на тикеры снята")
+            if self.private_subscribed:
+                self.private_stream.unsubscribe(self.symbol, self.handle_private_event)
+                self.private_subscribed = False
+            if self.orderbook_subscribed:
+                self.ticker_feed.unsubscribe_orderbook(self.symbol, self._on_orderbook, ORDERBOOK_DEPTH)
+                self.orderbook_subscribed = False
+            if self.bars is not None:
+                bar_aggregator.detach(self.ticker_feed, self.symbol)
+                self.bars = None
         except Exception as e:
-            logger.warning(f"[{self.symbol}] Ошибка при закрытии WebSocket: {e}")
+            logger.warning(f"[{self.symbol}] Ошибка при отписке от тикеров: {e}")
     
-    async def close_position(self) -> bool:
-        """Закрывает позицию используя stop_trading_by_symbol"""
+    async def exit_position(self) -> bool:
+        """
+        Закрытие по условию стратегии
+        
+        В режиме trading_stop позицию закрывает стоп-лосс позиции на бирже, а проверка
+        на тиках - страховка: если позиции уже нет, остается снять лимитку усреднения.
+        """
+        if self.protection_mode == PROTECTION_TRADING_STOP and self.trading_stop_price is not None:
+            if not await self.orders.run(self.check_position_exists):
+                logger.info(
+                    f"[{self.symbol}] 🛡️ Позиция закрыта стоп-лоссом позиции на бирже "
+                    f"({self.trading_stop_price:.6f})"
+                )
+                return await self.close_position(closed_by_exchange=True)
+            logger.warning(f"[{self.symbol}] ⚠️ Стоп-лосс позиции на бирже не сработал, закрываем сами")
+        return await self.close_position()
+
+    async def finish_exchange_close(self):
+        """Позицию закрыла биржа: снимаем оставшиеся ордера стратегии без запросов по позиции"""
+        self.orders.discard()
+        if self.averaging_order_id and not self.is_averaged:
+            await self.cancel_averaging_order()
+        self.averaging_order_id = None
+        self.trading_stop_price = None
+        self._rebuild_triggers()
+        self._clear_state()
+
+    async def close_position(self, closed_by_exchange: bool = False) -> bool:
+        """Закрывает позицию используя stop_trading_by_symbol (или только убирает ордера после закрытия биржей)"""
         try:
             logger.info(f"[{self.symbol}] Закрываем позицию...")
+            self.log_close_slippage()
             
-            # ✨ ИСПРАВЛЕНИЕ: Используем функцию остановки торговли только для конкретной монеты
-            await self.stop_trading_for_symbol()
-            
-            # Получаем текущую цену для расчетов
-            response = self.session.get_tickers(
-                category="linear",
-                symbol=self.symbol
+            if closed_by_exchange:
+                await self.finish_exchange_close()
+            else:
+                # ✨ ИСПРАВЛЕНИЕ: Используем функцию остановки торговли только для конкретной монеты
+                await self.stop_trading_for_symbol()
+            
+            # Получаем текущую цену для расчетов: цена исполнения стопа на бирже (приватный поток),
+            # последний тик, разделяемая память, потом REST
+            current_price = (
+                (self.close_exec_price if closed_by_exchange else None)
+                or self.last_price or price_table.get_last_price(self.symbol)
             )
-            current_price = None
-            if response.get('retCode') == 0:
-                tickers = response.get('result', {}).get('list', [])
-                if len(tickers) > 0:
-                    current_price = float(tickers[0].get('lastPrice', 0))
+            if current_price is None:
+                response = await self.orders.run(partial(
+                    self.session.get_tickers,
+                    category="linear",
+                    symbol=self.symbol
+                ))
+                if response.get('retCode') == 0:
+                    tickers = response.get('result', {}).get('list', [])
+                    if len(tickers) > 0:
+                        current_price = float(tickers[0].get('lastPrice', 0))
             
             logger.info(f"[{self.symbol}] Позиция успешно закрыта!")
             
@@ -1029,7 +1629,7 @@ class ShortAveragingStrategyCelery:
                     close_reason = "STOP_LOSS"
             
             # Отправляем уведомление о закрытии
-            await self.safe_send_notification(
+            self.notify(
                 notify_position_closed,
                 TELEGRAM_BOT_TOKEN, self.symbol,
                 close_reason, base_price, current_price or 0,
@@ -1043,25 +1643,66 @@ class ShortAveragingStrategyCelery:
             logger.error(f"[{self.symbol}] Исключение при закрытии позиции: {e}")
             return False
 
-    def handle_message(self, message):
-        """Обработчик сообщений из WebSocket - МАКСИМАЛЬНО БЫСТРЫЙ"""
+    def handle_message(self, ticker):
+        """Обработчик тиков из источника - только кладет Ticker в ящик"""
+        if not self.should_stop:
+            self.mailbox.put(ticker)
+
+    async def _heartbeat(self):
+        """Heartbeat снимка по таймеру: стратегия на тихом символе без тиков не выглядит мертвой"""
+        while not self.should_stop:
+            await asyncio.sleep(self.state_store.stale_after / 3)
+            if not self.position_opened or self.state_cleared:
+                continue
+            if not self.state_store.touch(self.symbol, self.state_owner):
+                # Снимок подхватила другая задача - позицию ведет она, эта стратегия уходит без записи снимка
+                logger.warning(f"[{self.symbol}] Снимок состояния перехвачен другой стратегией, останавливаемся")
+                self.state_cleared = True
+                self.should_stop = True
+                self.stop_websocket()
+
+    async def _consume_ticks(self):
+        """Задача стратегии: всегда обрабатывает самый свежий тик из ящика"""
+        while not self.should_stop:
+            ticker = await self.mailbox.get(timeout=0.5)
+            if ticker is not None:
+                await self.process_message(ticker)
+                self._sync_book()
+            elif self.position_gone and self.position_opened:
+                # Тиков нет, а приватный поток сообщил о закрытии позиции
+                await self._on_position_gone()
+
+    def _sync_book(self):
+        """Публикует ближайшие пороги и время следующей проверки позиции в книгу хоста"""
+        if self.book_slot is None:
+            return
+        if not self.position_opened:
+            # Позиция еще не открыта - нужен каждый тик
+            self.position_book.sync(self.book_slot, float('-inf'), float('-inf'), float('inf'), float('-inf'))
+            return
+        self.position_book.sync(
+            self.book_slot,
+            self.triggers.upper_last,
+            self.triggers.upper_close,
+            # Тик ниже цены пика обновляет пиковую прибыль
+            max(self.triggers.lower, self.peak_price),
+            self.last_position_check + self.position_check_interval,
+        )
+
+    async def process_message(self, ticker):
+        """Обработка тика - МАКСИМАЛЬНО БЫСТРАЯ"""
         try:
             # Ранний выход при остановке
             if self.should_stop:
                 return
             
-            if 'data' not in message:
-                return
-            
-            data = message['data']
-            current_price = float(data.get('lastPrice', 0))
+            current_price = ticker.last_price
             
             if current_price <= 0:
                 return
             
-            # ✨ Импортируем time один раз в начале класса
-            import time
-            current_time = time.time()
+            self.last_price = current_price
+            current_time = self.clock()
             
             # Инициализация времени старта
             if self.start_time is None:
@@ -1071,8 +1712,7 @@ class ShortAveragingStrategyCelery:
             
             # Автоматическое открытие позиции
             if not self.position_opened and not self.failed_to_open:
-                self._ensure_event_loop()
-                success = self.loop.run_until_complete(self.open_short_position(current_price))
+                success = await self.open_short_position(current_price)
                 
                 if success:
                     logger.info("✅ ШОРТ позиция успешно открыта!")
@@ -1084,33 +1724,38 @@ class ShortAveragingStrategyCelery:
             
             # ✨ КРИТИЧНО: Проверяем, что позиция еще открыта
             if self.position_opened:
-                # Проверяем существование позиции периодически
+                # Приватный поток сообщил, что позиции больше нет
+                if self.position_gone:
+                    await self._on_position_gone()
+                    return
+                # Проверяем существование позиции периодически (с приватным потоком - без REST)
                 if current_time - self.last_position_check > self.position_check_interval:
-                    if not self.check_position_exists():
+                    if not self.stream_live() and not await self.orders.run(self.check_position_exists):
                         logger.warning(f"[{self.symbol}] 🚨 Позиция закрыта вручную или не существует!")
+                        self._clear_state()
                         self.should_stop = True
                         self.stop_websocket()
                         return
+                    if self.stream_resync:
+                        self._finish_stream_resync()
                     self.last_position_check = current_time
-                # ✨ ИСПРАВЛЕНИЕ: Используем правильную базовую цену
-                if self.is_averaged and self.averaged_price:
-                    base_price = self.averaged_price
-                else:
-                    base_price = self.entry_price
-                profit_percent = (base_price - current_price) / base_price * 100
-                
                 # ✨ КРИТИЧНО: Мгновенная проверка безубытка ПЕРЕД всем остальным!
-                if self.breakeven_price and current_price >= self.breakeven_price:
-                    logger.warning(f"🚨 МГНОВЕННОЕ срабатывание безубытка на {profit_percent:.2f}%!")
-                    self._ensure_event_loop()
-                    self.loop.run_until_complete(self.close_position())
+                if self.breakeven_price and self.get_close_trigger_price(current_price) >= self.breakeven_price:
+                    logger.warning(f"🚨 МГНОВЕННОЕ срабатывание безубытка на {self.profit_percent(current_price):.2f}%!")
+                    await self.exit_position()
                     self.should_stop = True
                     self.stop_websocket()
                     return
                 
-                # Логируем редко
+                # Логируем редко (PnL считаем только для логов)
                 self.log_counter += 1
-                if self.log_counter % self.log_interval == 0:
+                self.message_counter += 1
+                log_due = self.log_counter % self.log_interval == 0
+                status_due = self.message_counter % self.status_interval == 0
+                if log_due or status_due:
+                    profit_percent = self.profit_percent(current_price)
+                
+                if log_due:
                     pnl_emoji = "📈" if profit_percent >= 0 else "📉"
                     pnl_sign = "+" if profit_percent >= 0 else ""
                     
@@ -1124,30 +1769,30 @@ class ShortAveragingStrategyCelery:
                     )
                 
                 # Периодический статус
-                self.message_counter += 1
-                if self.message_counter % self.status_interval == 0:
+                if status_due:
                     averaged_status = "ДА" if self.is_averaged else "НЕТ"
+                    atr_percent = self.bars.atr_percent('1m') if self.bars else None
+                    atr_status = f"{atr_percent:.2f}%" if atr_percent is not None else "нет данных"
                     logger.info(
                         f"🔧 Позиция ОТКРЫТА | Усреднение={averaged_status} | "
-                        f"PnL={profit_percent:+.2f}% | Обработано {self.ticks_processed} тиков"
+                        f"PnL={profit_percent:+.2f}% | ATR(1m)={atr_status} | "
+                        f"Обработано {self.ticks_processed} тиков | "
+                        f"Пропущено устаревших: {self.mailbox.dropped}"
                     )
             
-            # Создаем loop если нужно
-            self._ensure_event_loop()
-            
             # ✅ Основная логика update - проверяет ВСЕ на каждом тике
-            action = self.loop.run_until_complete(self.update(current_price, current_time))
+            action = await self.update(current_price, current_time)
             
             if action == "CLOSE":
                 logger.info(f"[{self.symbol}] Условие закрытия! Макс прибыль: {self.peak_profit_percent:.2f}%")
-                self.loop.run_until_complete(self.close_position())
+                await self.exit_position()
                 self.should_stop = True
                 self.stop_websocket()
                 
             elif action == "STOP":
                 logger.warning(f"⚠️ [{self.symbol}] Позиция закрыта вручную!")
                 # Очищаем все ордера для этой монеты
-                self.loop.run_until_complete(self.stop_trading_for_symbol())
+                await self.stop_trading_for_symbol()
                 self.should_stop = True
                 self.stop_websocket()
                 
@@ -1170,40 +1815,107 @@ class ShortAveragingStrategyCelery:
             logger.info(f"⚡ Режим: ПРОВЕРКА КАЖДОГО ТИКА")
             logger.info("=" * 60)
             
-            # ✨ КРИТИЧНО: Проверяем активную торговлю перед запуском
-            logger.info(f"🔍 Проверяем активную торговлю для {self.symbol}...")
-            if self.check_active_trading():
-                logger.warning(f"🛑 Торговля для {self.symbol} уже активна! Игнорируем новый сигнал.")
+            # Соединение шлюза ордеров открывается, пока идут проверки перед входом
+            if self.order_gateway is not None:
+                self.order_gateway.connect()
+            
+            # Повторная доставка задачи после падения воркера: продолжаем позицию по снимку
+            if await self.resume_state():
+                logger.info(f"✅ Продолжаем вести позицию {self.symbol} после перезапуска")
+            else:
+                # ✨ КРИТИЧНО: Проверяем активную торговлю перед запуском
+                logger.info(f"🔍 Проверяем активную торговлю для {self.symbol}...")
+                if await self.orders.run(self.check_active_trading):
+                    logger.warning(f"🛑 Торговля для {self.symbol} уже активна! Игнорируем новый сигнал.")
                 
-                # Отправляем уведомление о том, что сигнал проигнорирован
-                await self.safe_send_notification(
-                    notify_strategy_error,
-                    TELEGRAM_BOT_TOKEN, self.symbol,
-                    f"Сигнал проигнорирован: торговля уже активна для {self.symbol}", 
-                    "DUPLICATE_PREVENTION"
-                )
+                    # Отправляем уведомление о том, что сигнал проигнорирован
+                    await self.safe_send_notification(
+                        notify_strategy_error,
+                        TELEGRAM_BOT_TOKEN, self.symbol,
+                        f"Сигнал проигнорирован: торговля уже активна для {self.symbol}", 
+                        "DUPLICATE_PREVENTION"
+                    )
                 
-                logger.info(f"✅ Сигнал для {self.symbol} успешно проигнорирован")
-                return  # Выходим из стратегии
+                    logger.info(f"✅ Сигнал для {self.symbol} успешно проигнорирован")
+                    return  # Выходим из стратегии
             
-            logger.info(f"✅ Торговля для {self.symbol} не активна, начинаем стратегию")
+                logger.info(f"✅ Торговля для {self.symbol} не активна, начинаем стратегию")
             
-            # ✨ Создаем ОДИН event loop для всей стратегии
-            self._ensure_event_loop()
+            # Тики из потока источника будят этот event loop
+            self.mailbox.bind(asyncio.get_running_loop())
             
-            # Инициализируем WebSocket
-            self.ws = WebSocket(testnet=False, channel_type="linear")
+            # Исполнения и позиция - событиями приватного потока аккаунта
+            self.subscribe_private_stream()
             
-            # Подписка на тикер
-            self.ws.ticker_stream(self.symbol, self.handle_message)
+            # Подписка на тикер через общий источник (без собственного соединения)
+            if self.ticker_feed is None:
+                self.ticker_feed = get_ticker_feed()
+            if self.position_book is not None:
+                # Тики сначала проходят пакетную проверку порогов в книге позиций хоста
+                self.book_slot = self.position_book.add(self.ticker_feed, self.symbol, self.handle_message)
+            else:
+                self.ticker_feed.subscribe(self.symbol, self.handle_message)
+            self.ws_subscribed = True
+            self.bars = bar_aggregator.attach(self.ticker_feed, self.symbol)
+            
+            if self.use_orderbook:
+                if hasattr(self.ticker_feed, 'subscribe_orderbook'):
+                    self.ticker_feed.subscribe_orderbook(self.symbol, self._on_orderbook, ORDERBOOK_DEPTH)
+                    self.orderbook_subscribed = True
+                else:
+                    logger.warning(f"[{self.symbol}] Источник тиков не поддерживает стакан, триггеры по lastPrice")
+            
+            if self.state_store is not None:
+                self.heartbeat_task = asyncio.create_task(self._heartbeat())
             
-            # Ждем остановки
-            while not self.should_stop:
-                await asyncio.sleep(0.1)  # Проверяем чаще для быстрой реакции
+            # Тики обрабатывает задача в этом же event loop; ждем ее завершения
+            self.tick_consumer = asyncio.create_task(self._consume_ticks())
+            await self.tick_consumer
             
             logger.info("\n" + "=" * 60)
             logger.info(f"🏁 СТРАТЕГИЯ ЗАВЕРШЕНА | Обработано {self.ticks_processed} тиков")
             logger.info(f"📊 Максимальная прибыль: {self.peak_profit_percent:.2f}%")
+            stats = self.mailbox.stats()
+            logger.info(
+                f"📬 Тиков получено: {stats['received']}, пропущено устаревших: {stats['dropped']}, "
+                f"макс. задержка: {stats['max_wait'] * 1000:.1f} мс"
+            )
+            orders = self.orders.stats()
+            logger.info(
+                f"📤 Запросов к бирже: {orders['sent']}, схлопнуто устаревших: {orders['collapsed']}, "
+                f"ошибок: {orders['failed']}, макс. ожидание в очереди: {orders['max_delay'] * 1000:.1f} мс"
+            )
+            if self.private_stream is not None:
+                logger.info(f"🔔 Событий приватного потока: {self.private_events}")
+            if self.order_gateway is not None:
+                gateway = self.order_gateway.stats()
+                logger.info(
+                    f"🚪 Шлюз ордеров: WebSocket {gateway['ws']['sent']}, REST {gateway['rest']['sent']}, "
+                    f"повторов через REST: {gateway['fallbacks']}"
+                )
+            if isinstance(self.session, CoalescedSession):
+                coalescing = self.session.coalescer.stats()
+                logger.info(
+                    f"🔗 Объединение запросов: из кэша {coalescing['hits']}, общих {coalescing['dedup']}, "
+                    f"отправлено {coalescing['misses']}"
+                )
+            if isinstance(getattr(self.session, 'limiter', None), RateLimiter):
+                limits = self.session.limiter.stats()
+                logger.info(
+                    f"🚦 Лимитер аккаунта {limits['account']}: ожидание ордеров {limits['order_wait_sec']:.2f} сек, "
+                    f"опроса {limits['read_wait_sec']:.2f} сек, без токена: {limits['overdrafts']}"
+                )
+            if self.account_snapshot is not None:
+                snapshot = self.account_snapshot.stats()
+                logger.info(
+                    f"📸 Снимок аккаунта {snapshot['account']}: из снимка {snapshot['hits']}, "
+                    f"запросом по символу {snapshot['misses']}, опросов {snapshot['polls']}"
+                )
+            if self.breakeven_amends or self.breakeven_replaces:
+                logger.info(
+                    f"✏️ Переносов безубытка: amend {self.breakeven_amends}, "
+                    f"отмена + новый ордер {self.breakeven_replaces}"
+                )
             logger.info("=" * 60)
             
         except Exception as e:
@@ -1218,19 +1930,27 @@ class ShortAveragingStrategyCelery:
             raise
         
         finally:
-            # Закрываем event loop
-            if self.loop and not self.loop.is_closed():
-                self.loop.close()
-                self.loop = None
-            
-            # Закрываем WebSocket
-            if self.ws:
-                try:
-                    self.ws.exit()
-                except Exception as e:
-                    logger.warning(f"Ошибка закрытия WS: {e}")
-                finally:
-                    self.ws = None
+            # Останавливаем обработку тиков
+            self.should_stop = True
+            self.mailbox.close()
+            if self.tick_consumer and not self.tick_consumer.done():
+                self.tick_consumer.cancel()
+            if self.heartbeat_task and not self.heartbeat_task.done():
+                self.heartbeat_task.cancel()
+            
+            # Снимаем подписку на тикеры
+            self.stop_websocket()
+            
+            # Даем уйти уже поставленным запросам к бирже
+            await self.orders.close()
+            
+            # Позиция осталась открытой (остановка воркера или хоста) - следующий запуск подхватит снимок сразу
+            if self.state_store is not None and self.position_opened and not self.state_cleared:
+                self.state_store.release(self.symbol, self.state_owner)
+            
+            # Даем отправиться уведомлениям о закрытии
+            if self._notification_tasks:
+                await asyncio.wait(self._notification_tasks, timeout=10)
 
 
 async def run_short_averaging_strategy(
@@ -1240,7 +1960,9 @@ async def run_short_averaging_strategy(
     initial_tp_percent: float = DEFAULT_INITIAL_TP_PERCENT,
     breakeven_step: float = DEFAULT_BREAKEVEN_STEP,
     stop_loss_percent: float = DEFAULT_STOP_LOSS_PERCENT,
-    use_demo: bool = True
+    use_demo: bool = True,
+    use_orderbook: bool = False,
+    protection_mode: str = PROTECTION_MODE
 ):
     """
     Запускает стратегию шорт с усреднением
@@ -1253,6 +1975,8 @@ async def run_short_averaging_strategy(
         breakeven_step: Шаг безубытка
         stop_loss_percent: Стоп-лосс
         use_demo: Использовать демо-счет
+        use_orderbook: Триггеры по лучшему ask из стакана
+        protection_mode: Защита позиции - "orders" или "trading_stop"
     """
     strategy = ShortAveragingStrategyCelery(
         symbol=symbol,
@@ -1261,7 +1985,9 @@ async def run_short_averaging_strategy(
         initial_tp_percent=initial_tp_percent,
         breakeven_step=breakeven_step,
         stop_loss_percent=stop_loss_percent,
-        use_demo=use_demo
+        use_demo=use_demo,
+        use_orderbook=use_orderbook,
+        protection_mode=protection_mode
     )
     
     await strategy.run()
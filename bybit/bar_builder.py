@@ -0,0 +1,216 @@
+"""
+Инкрементальное построение OHLCV-баров из живого потока тиков
+
+Для каждого символа строятся бары 1s / 1m / 5m в кольцевых буферах
+фиксированного размера (NumPy). Стратегии получают последние N баров,
+ATR и диапазон без REST-запросов kline.
+
+Объем: поток tickers не содержит объем сделок, поэтому объем бара -
+прирост volume24h между тиками (приближение скользящего 24ч окна).
+"""
+import threading
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from bybit.ws_decoder import Ticker
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+TIMEFRAMES = {'1s': 1, '1m': 60, '5m': 300}
+DEFAULT_CAPACITY = 500
+
+
+class BarSeries:
+    """Кольцевой буфер баров одного таймфрейма"""
+
+    def __init__(self, period: int, capacity: int = DEFAULT_CAPACITY):
+        self.period_ms = period * 1000
+        self.capacity = capacity
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.open = np.zeros(capacity, dtype=np.float64)
+        self.high = np.zeros(capacity, dtype=np.float64)
+        self.low = np.zeros(capacity, dtype=np.float64)
+        self.close = np.zeros(capacity, dtype=np.float64)
+        self.volume = np.zeros(capacity, dtype=np.float64)
+        # True range закрытых баров - для ATR без пересчета по всей истории
+        self.true_range = np.zeros(capacity, dtype=np.float64)
+        self.head = -1      # Индекс текущего (формирующегося) бара
+        self.count = 0      # Количество баров в буфере, включая текущий
+
+    def _open_bar(self, start: int, price: float):
+        self.head = (self.head + 1) % self.capacity
+        i = self.head
+        self.start[i] = start
+        self.open[i] = self.high[i] = self.low[i] = self.close[i] = price
+        self.volume[i] = 0.0
+        self.true_range[i] = 0.0
+        self.count = min(self.count + 1, self.capacity)
+
+    def _finalize(self, i: int, prev_close: float):
+        self.true_range[i] = max(self.high[i], prev_close) - min(self.low[i], prev_close)
+
+    def on_tick(self, ts_ms: int, price: float, volume: float = 0.0):
+        """Добавляет тик; при смене периода закрывает бар (пропуски заполняются плоскими барами)"""
+        start = ts_ms - ts_ms % self.period_ms
+        if self.count == 0:
+            self._open_bar(start, price)
+        else:
+            current_start = self.start[self.head]
+            if start < current_start:
+                return  # Опоздавший тик из уже закрытого периода
+            if start > current_start:
+                gap = (start - current_start) // self.period_ms
+                # Пропущенные периоды без тиков - плоские бары по последнему close
+                for k in range(1, min(gap, self.capacity)):
+                    prev_close = self.close[self.head]
+                    self._finalize(self.head, self._prev_close(self.head))
+                    self._open_bar(current_start + k * self.period_ms, prev_close)
+                self._finalize(self.head, self._prev_close(self.head))
+                self._open_bar(start, price)
+
+        i = self.head
+        if price > self.high[i]:
+            self.high[i] = price
+        if price < self.low[i]:
+            self.low[i] = price
+        self.close[i] = price
+        self.volume[i] += volume
+
+    def _prev_close(self, i: int) -> float:
+        if self.count < 2:
+            return self.open[i]
+        return self.close[(i - 1) % self.capacity]
+
+    def _indices(self, n: int, include_current: bool) -> np.ndarray:
+        available = self.count if include_current else self.count - 1
+        n = max(0, min(n, available))
+        last = self.head if include_current else self.head - 1
+        return np.arange(last - n + 1, last + 1) % self.capacity
+
+    def bar(self, offset: int = 0) -> Optional[Dict[str, float]]:
+        """Бар по смещению от текущего за O(1): 0 - текущий, 1 - последний закрытый"""
+        if offset >= self.count:
+            return None
+        i = (self.head - offset) % self.capacity
+        return {
+            'start': int(self.start[i]), 'open': float(self.open[i]), 'high': float(self.high[i]),
+            'low': float(self.low[i]), 'close': float(self.close[i]), 'volume': float(self.volume[i]),
+        }
+
+    def latest(self, n: int, include_current: bool = False) -> Dict[str, np.ndarray]:
+        """Последние n баров от старого к новому"""
+        idx = self._indices(n, include_current)
+        return {
+            'start': self.start[idx], 'open': self.open[idx], 'high': self.high[idx],
+            'low': self.low[idx], 'close': self.close[idx], 'volume': self.volume[idx],
+        }
+
+    def atr(self, n: int = 14) -> Optional[float]:
+        """Средний истинный диапазон по n закрытым барам"""
+        if self.count - 1 < n:
+            return None
+        return float(self.true_range[self._indices(n, include_current=False)].mean())
+
+    def price_range(self, n: int, include_current: bool = True) -> Optional[float]:
+        """Диапазон max(high) - min(low) за последние n баров"""
+        idx = self._indices(n, include_current)
+        if len(idx) == 0:
+            return None
+        return float(self.high[idx].max() - self.low[idx].min())
+
+
+class SymbolBars:
+    """Набор таймфреймов одного символа"""
+
+    def __init__(self, symbol: str, timeframes: Dict[str, int] = None, capacity: int = DEFAULT_CAPACITY):
+        self.symbol = symbol
+        self.series = {name: BarSeries(period, capacity) for name, period in (timeframes or TIMEFRAMES).items()}
+        self._lock = threading.Lock()
+        self._last_volume24h = None
+
+    def on_tick(self, ts_ms: int, price: float, volume24h: Optional[float] = None):
+        volume = 0.0
+        if volume24h is not None:
+            if self._last_volume24h is not None and volume24h > self._last_volume24h:
+                volume = volume24h - self._last_volume24h
+            self._last_volume24h = volume24h
+        with self._lock:
+            for series in self.series.values():
+                series.on_tick(ts_ms, price, volume)
+
+    def on_ticker(self, ticker: Ticker):
+        """Callback источника тиков"""
+        if ticker.last_price <= 0:
+            return
+        self.on_tick(ticker.ts, ticker.last_price, ticker.volume24h or None)
+
+    def atr(self, timeframe: str = '1m', n: int = 14) -> Optional[float]:
+        with self._lock:
+            return self.series[timeframe].atr(n)
+
+    def atr_percent(self, timeframe: str = '1m', n: int = 14) -> Optional[float]:
+        """ATR в процентах от последней цены"""
+        with self._lock:
+            series = self.series[timeframe]
+            atr = series.atr(n)
+            price = series.close[series.head] if series.count else 0
+        if atr is None or price <= 0:
+            return None
+        return atr / price * 100
+
+    def price_range(self, timeframe: str = '1m', n: int = 5) -> Optional[float]:
+        with self._lock:
+            return self.series[timeframe].price_range(n)
+
+    def latest(self, timeframe: str = '1m', n: int = 20, include_current: bool = False) -> Dict[str, np.ndarray]:
+        with self._lock:
+            # Копии, чтобы читатель не видел изменений из потока тиков
+            return {k: v.copy() for k, v in self.series[timeframe].latest(n, include_current).items()}
+
+
+class BarAggregator:
+    """Бары по всем символам процесса; подписывается на общий источник тиков"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bars: Dict[str, SymbolBars] = {}
+        self._refs: Dict[str, int] = {}
+        self._callbacks: Dict[str, Callable] = {}
+
+    def attach(self, feed, symbol: str) -> SymbolBars:
+        """Начинает строить бары символа (повторный вызов только увеличивает счетчик)"""
+        symbol = symbol.upper()
+        with self._lock:
+            self._refs[symbol] = self._refs.get(symbol, 0) + 1
+            bars = self._bars.get(symbol)
+            if bars is not None:
+                return bars
+            bars = SymbolBars(symbol)
+            self._bars[symbol] = bars
+            self._callbacks[symbol] = bars.on_ticker
+        feed.subscribe(symbol, bars.on_ticker)
+        logger.info(f"[BarAggregator] Построение баров {symbol}: {', '.join(TIMEFRAMES)}")
+        return bars
+
+    def detach(self, feed, symbol: str):
+        symbol = symbol.upper()
+        with self._lock:
+            if symbol not in self._refs:
+                return
+            self._refs[symbol] -= 1
+            if self._refs[symbol] > 0:
+                return
+            del self._refs[symbol]
+            self._bars.pop(symbol, None)
+            callback = self._callbacks.pop(symbol)
+        feed.unsubscribe(symbol, callback)
+
+    def get(self, symbol: str) -> Optional[SymbolBars]:
+        with self._lock:
+            return self._bars.get(symbol.upper())
+
+
+# Глобальный агрегатор баров (один на процесс)
+bar_aggregator = BarAggregator()
@@ -0,0 +1,172 @@
+"""
+Контроль свежести потока тиков
+
+Следит за возрастом последнего тика по каждому символу источника
+(TickerHub или шина Redis). Если молчат все символы - соединение
+считается мертвым и переоткрывается, если отдельные - по ним заново
+отправляется подписка. Единственный символ источника может просто редко
+торговаться: сначала переподписка, переподключение - только если и она не
+вернула тики, и не чаще одного раза, пока тики не пойдут снова. После
+переподключения текущие цены всех затронутых символов подтягиваются одним
+запросом get_tickers(category="linear"), чтобы стратегии продолжили
+проверки сразу, не дожидаясь первого тика.
+"""
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from bybit.ws_decoder import ticker_update_from_message
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+STALE_AFTER = 20            # Символ без тиков дольше - поток считается зависшим (секунды)
+CHECK_INTERVAL = 2          # Период проверки
+BACKOFF_BASE = 1.0          # Первая пауза переподключения
+BACKOFF_MAX = 60.0          # Максимальная пауза переподключения
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """Экспоненциальная пауза со случайным разбросом (половина фиксирована, половина - jitter)"""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class FeedWatchdog:
+    """
+    Сторож источника тиков
+
+    Источник должен предоставлять tick_ages(), reconnect(), resubscribe(symbols)
+    и apply_snapshot(update).
+    """
+
+    def __init__(self, feed, session=None, stale_after: float = STALE_AFTER,
+                 check_interval: float = CHECK_INTERVAL):
+        self.feed = feed
+        self.stale_after = stale_after
+        self.check_interval = check_interval
+        self._session = session
+        self._acted_at: Dict[str, float] = {}   # Когда по символу последний раз принимали меры
+        self._lone_attempts: Dict[str, int] = {}  # Единственный символ: меры подряд без тиков
+        self._pending_backfill: set = set()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # Статистика
+        self.reconnects_requested = 0
+        self.resubscribes = 0
+        self.backfills = 0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FeedWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.check_interval)
+            self._wakeup.clear()
+            if not self._running:
+                return
+            try:
+                self._flush_backfill()
+                self.check()
+            except Exception as e:
+                logger.error(f"[FeedWatchdog] Ошибка проверки потока: {e}", exc_info=True)
+
+    def check(self) -> List[str]:
+        """Один проход проверки; возвращает символы, по которым приняты меры"""
+        now = time.monotonic()
+        ages = self.feed.tick_ages()
+        stale = [
+            symbol for symbol, age in ages.items()
+            if age > self.stale_after and now - self._acted_at.get(symbol, 0) > self.stale_after
+        ]
+        # Снятые с подписки символы больше не отслеживаем
+        for symbol in list(self._acted_at):
+            if symbol not in ages:
+                del self._acted_at[symbol]
+        for symbol in list(self._lone_attempts):
+            if ages.get(symbol, 0) <= self.stale_after:
+                del self._lone_attempts[symbol]
+        if not stale:
+            return []
+
+        for symbol in stale:
+            self._acted_at[symbol] = now
+
+        escalate = len(stale) == len(ages)
+        if len(ages) == 1:
+            # Символ может просто редко торговаться: переподключение - только после неудачной переподписки
+            attempts = self._lone_attempts.get(stale[0], 0)
+            self._lone_attempts[stale[0]] = attempts + 1
+            escalate = attempts == 1
+        if escalate:
+            # Молчат все символы - проблема в соединении, цены подтянем после переподключения
+            logger.warning(f"[FeedWatchdog] Нет тиков ни по одному из {len(ages)} символов, переподключаемся")
+            self.reconnects_requested += 1
+            self.feed.reconnect()
+        else:
+            logger.warning(f"[FeedWatchdog] Нет тиков по {', '.join(stale)} - повторная подписка")
+            self.resubscribes += 1
+            self.feed.resubscribe(stale)
+            self.backfill(stale)
+        return stale
+
+    def request_backfill(self, symbols: Iterable[str]):
+        """Запрашивает подгрузку цен из потока сторожа (не блокирует поток WebSocket)"""
+        with self._lock:
+            self._pending_backfill.update(symbols)
+        self._wakeup.set()
+
+    def _flush_backfill(self):
+        with self._lock:
+            symbols = list(self._pending_backfill)
+            self._pending_backfill.clear()
+        if symbols:
+            self.backfill(symbols)
+
+    def _get_session(self):
+        if self._session is None:
+            from pybit.unified_trading import HTTP
+            self._session = HTTP(testnet=False)
+        return self._session
+
+    def backfill(self, symbols: Iterable[str]) -> int:
+        """Подтягивает текущие цены символов одним запросом get_tickers; возвращает число обновленных"""
+        wanted = {symbol.upper() for symbol in symbols}
+        if not wanted:
+            return 0
+        try:
+            response = self._get_session().get_tickers(category="linear")
+        except Exception as e:
+            logger.error(f"[FeedWatchdog] Ошибка get_tickers: {e}")
+            return 0
+        if response.get('retCode') != 0:
+            logger.error(f"[FeedWatchdog] get_tickers вернул ошибку: {response.get('retMsg')}")
+            return 0
+
+        ts = int(response.get('time') or time.time() * 1000)
+        applied = 0
+        for item in response.get('result', {}).get('list', []):
+            symbol = item.get('symbol')
+            if symbol not in wanted:
+                continue
+            update = ticker_update_from_message({
+                'topic': f"tickers.{symbol}", 'type': 'snapshot', 'ts': ts, 'data': item,
+            })
+            if update is not None and self.feed.apply_snapshot(update):
+                applied += 1
+
+        self.backfills += 1
+        logger.info(f"[FeedWatchdog] Цены подтянуты через REST: {applied}/{len(wanted)}")
+        return applied
@@ -0,0 +1,392 @@
+"""
+Межпроцессная шина рыночных данных через Redis pub/sub
+
+Celery работает в режиме prefork, и каждый дочерний процесс держал бы свое
+соединение с биржей. Вместо этого отдельный демон-публикатор подписывается
+на объединение активных символов (через TickerHub) и публикует компактные
+кадры тикеров в каналы Redis по символам, а последние цены - в таблицу
+в разделяемой памяти (bybit/price_table.py). Стратегии читают шину через
+MarketDataBusSubscriber - он повторяет интерфейс TickerHub.
+
+PubSub redis-py не потокобезопасен: им владеет только поток чтения шины.
+Подписки, отписки и переподключение из потоков стратегий ставятся в очередь
+и применяются этим потоком между чтениями.
+
+Запуск публикатора:
+    python -m bybit.market_data_bus
+"""
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import MARKET_DATA_SOURCE, TICK_RECORDER_DIR
+from database import redis_client
+from bybit.feed_watchdog import FeedWatchdog
+from bybit.ticker_hub import ticker_hub
+from bybit.price_table import PriceTableWriter, price_table
+from bybit.tick_recorder import TickRecorder
+from bybit.ws_decoder import Ticker, TickerUpdate, merge_ticker
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+CHANNEL_PREFIX = "md:ticker:"     # Канал кадров тикера: md:ticker:BTCUSDT
+LEASES_KEY = "md:leases"          # Hash "SYMBOL|consumer" -> срок действия подписки
+LEASE_TTL = 15                    # Подписка без продления считается мертвой (секунды)
+LEASE_REFRESH_INTERVAL = 5        # Как часто подписчик продлевает свои подписки
+SYNC_INTERVAL = 1.0               # Как часто публикатор сверяет набор символов
+LISTEN_TIMEOUT = 0.2              # Ожидание кадра: подписки из очереди применяются не позже (секунды)
+
+def ticker_channel(symbol: str) -> str:
+    return f"{CHANNEL_PREFIX}{symbol}"
+
+
+def encode_frame(ticker: Ticker) -> str:
+    """Кодирует тикер в строку ts|last|bid|ask|mark|volume"""
+    return (
+        f"{ticker.ts}|{ticker.last_price!r}|{ticker.bid_price!r}|{ticker.ask_price!r}|"
+        f"{ticker.mark_price!r}|{ticker.volume24h!r}"
+    )
+
+
+def decode_frame(symbol: str, frame: str) -> Ticker:
+    """Восстанавливает Ticker из компактного кадра"""
+    ts, last, bid, ask, mark, volume = frame.split("|")
+    return Ticker(symbol, int(ts), float(last), float(bid), float(ask), float(mark), float(volume))
+
+
+class MarketDataPublisher:
+    """Демон: держит подписки на объединение активных символов и публикует тики в Redis"""
+
+    def __init__(self, redis=None, hub=None, price_table_writer=None):
+        self.redis = redis or redis_client
+        self.hub = hub or ticker_hub
+        # Последние цены дублируются в разделяемую память для всех процессов хоста
+        self.price_table = price_table_writer or PriceTableWriter()
+        enable_tick_recording(self.hub)
+        self.symbols: Dict[str, Callable] = {}
+        self.frames_published = 0
+        self._running = False
+
+    def get_active_symbols(self) -> List[str]:
+        """Возвращает символы с живыми подписками и удаляет просроченные"""
+        now = time.time()
+        leases = self.redis.hgetall(LEASES_KEY) or {}
+        active = set()
+        expired = []
+        for field, expires_at in leases.items():
+            symbol = field.split("|", 1)[0]
+            if float(expires_at) < now:
+                expired.append(field)
+            else:
+                active.add(symbol)
+        if expired:
+            self.redis.hdel(LEASES_KEY, *expired)
+            logger.info(f"[MarketDataPublisher] Удалено просроченных подписок: {len(expired)}")
+        return sorted(active)
+
+    def sync_subscriptions(self):
+        """Приводит подписки хаба к объединению активных символов"""
+        active = set(self.get_active_symbols())
+        current = set(self.symbols)
+
+        for symbol in active - current:
+            callback = self._make_publisher(symbol)
+            self.symbols[symbol] = callback
+            self.hub.subscribe(symbol, callback)
+
+        for symbol in current - active:
+            self.hub.unsubscribe(symbol, self.symbols.pop(symbol))
+
+        if active != current:
+            logger.info(f"[MarketDataPublisher] Активных символов: {len(active)}")
+
+    def _make_publisher(self, symbol: str) -> Callable:
+        channel = ticker_channel(symbol)
+
+        def publish(ticker: Ticker):
+            try:
+                self.price_table.update_from_ticker(ticker)
+                self.redis.publish(channel, encode_frame(ticker))
+                self.frames_published += 1
+            except Exception as e:
+                logger.error(f"[MarketDataPublisher] Ошибка публикации {symbol}: {e}")
+
+        return publish
+
+    def run(self):
+        """Основной цикл демона"""
+        self._running = True
+        logger.info("[MarketDataPublisher] Публикатор рыночных данных запущен")
+        try:
+            while self._running:
+                try:
+                    self.sync_subscriptions()
+                except Exception as e:
+                    logger.error(f"[MarketDataPublisher] Ошибка синхронизации подписок: {e}")
+                time.sleep(SYNC_INTERVAL)
+        finally:
+            for symbol, callback in list(self.symbols.items()):
+                self.hub.unsubscribe(symbol, callback)
+            self.symbols.clear()
+            self.hub.close()
+            self.price_table.close()
+            logger.info(
+                f"[MarketDataPublisher] Остановлен, опубликовано кадров: {self.frames_published}"
+            )
+
+    def stop(self):
+        self._running = False
+
+
+class MarketDataBusSubscriber:
+    """Чтение тиков из шины Redis с тем же интерфейсом, что и TickerHub"""
+
+    def __init__(self, redis=None):
+        self.redis = redis or redis_client
+        self.consumer_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.RLock()
+        self._callbacks: Dict[str, List[Callable]] = {}
+        self._tickers: Dict[str, Ticker] = {}
+        self._last_tick: Dict[str, float] = {}
+        # Изменения подписок для потока чтения: ('subscribe' | 'unsubscribe', канал)
+        self._changes: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._reconnect_requested = threading.Event()
+        self._running = False
+        self.messages_received = 0
+        # Если публикатор или Redis замолчали - переподписка и цены из REST
+        self.watchdog = FeedWatchdog(self)
+
+    # ==================== ПОДПИСКИ ====================
+
+    def subscribe(self, symbol: str, callback: Callable):
+        symbol = symbol.upper()
+        with self._lock:
+            callbacks = self._callbacks.setdefault(symbol, [])
+            callbacks.append(callback)
+            is_first = len(callbacks) == 1
+            self._ensure_started()
+            if is_first:
+                self._last_tick[symbol] = time.monotonic()
+                self._changes.put(('subscribe', ticker_channel(symbol)))
+        if is_first:
+            self._refresh_lease(symbol)
+        logger.info(f"[MarketDataBus] Подписка на {symbol} (подписчиков: {self.subscriber_count(symbol)})")
+
+    def unsubscribe(self, symbol: str, callback: Callable):
+        symbol = symbol.upper()
+        with self._lock:
+            callbacks = self._callbacks.get(symbol)
+            if not callbacks or callback not in callbacks:
+                return
+            callbacks.remove(callback)
+            is_last = len(callbacks) == 0
+            if is_last:
+                del self._callbacks[symbol]
+                self._tickers.pop(symbol, None)
+                self._last_tick.pop(symbol, None)
+                self._changes.put(('unsubscribe', ticker_channel(symbol)))
+        if is_last:
+            try:
+                self.redis.hdel(LEASES_KEY, self._lease_field(symbol))
+            except Exception as e:
+                logger.warning(f"[MarketDataBus] Не удалось снять подписку {symbol}: {e}")
+            logger.info(f"[MarketDataBus] Отписка от {symbol}: подписчиков не осталось")
+
+    def subscriber_count(self, symbol: str) -> int:
+        with self._lock:
+            return len(self._callbacks.get(symbol.upper(), []))
+
+    def get_symbols(self) -> List[str]:
+        with self._lock:
+            return list(self._callbacks.keys())
+
+    def get_last_ticker(self, symbol: str) -> Optional[Ticker]:
+        with self._lock:
+            return self._tickers.get(symbol.upper())
+
+    def tick_ages(self) -> Dict[str, float]:
+        now = time.monotonic()
+        with self._lock:
+            return {symbol: now - at for symbol, at in self._last_tick.items()}
+
+    def reconnect(self):
+        """Пересоздает подключение pub/sub (в потоке чтения) и подтягивает цены через REST"""
+        with self._lock:
+            if not self._running:
+                return
+            self._reconnect_requested.set()
+            symbols = list(self._callbacks.keys())
+        for symbol in symbols:
+            self._refresh_lease(symbol)
+        self.watchdog.request_backfill(symbols)
+
+    def resubscribe(self, symbols: List[str]):
+        """Продлевает подписки символов (публикатор мог удалить их как просроченные)"""
+        for symbol in symbols:
+            self._refresh_lease(symbol.upper())
+
+    def apply_snapshot(self, update: TickerUpdate) -> bool:
+        """Раздает тикер из REST, если он не старее последнего кадра шины"""
+        with self._lock:
+            current = self._tickers.get(update.symbol)
+            if current is not None and current.ts > update.ts:
+                return False
+        self._dispatch(update.symbol, merge_ticker(None, update))
+        return True
+
+    # ==================== ПОТОКИ ====================
+
+    def _lease_field(self, symbol: str) -> str:
+        return f"{symbol}|{self.consumer_id}"
+
+    def _refresh_lease(self, symbol: str):
+        try:
+            self.redis.hset(LEASES_KEY, self._lease_field(symbol), time.time() + LEASE_TTL)
+        except Exception as e:
+            logger.warning(f"[MarketDataBus] Не удалось продлить подписку {symbol}: {e}")
+
+    def _ensure_started(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._listen, name="MarketDataBus", daemon=True).start()
+        threading.Thread(target=self._lease_loop, name="MarketDataBusLease", daemon=True).start()
+        self.watchdog.start()
+
+    def _open_pubsub(self, old):
+        """Новое подключение pub/sub на все текущие символы; очередь изменений им уже учтена"""
+        self._reconnect_requested.clear()
+        if old is not None:
+            try:
+                old.close()
+            except Exception as e:
+                logger.warning(f"[MarketDataBus] Ошибка при закрытии pub/sub: {e}")
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        with self._lock:
+            while True:
+                try:
+                    self._changes.get_nowait()
+                except queue.Empty:
+                    break
+            channels = [ticker_channel(symbol) for symbol in self._callbacks]
+        if channels:
+            pubsub.subscribe(*channels)
+        return pubsub
+
+    def _apply_changes(self, pubsub):
+        while True:
+            try:
+                action, channel = self._changes.get_nowait()
+            except queue.Empty:
+                return
+            if action == 'subscribe':
+                pubsub.subscribe(channel)
+            else:
+                pubsub.unsubscribe(channel)
+
+    def _listen(self):
+        """Поток чтения шины - единственный владелец PubSub"""
+        pubsub = None
+        try:
+            while self._running:
+                try:
+                    if pubsub is None or self._reconnect_requested.is_set():
+                        pubsub = self._open_pubsub(pubsub)
+                    self._apply_changes(pubsub)
+                    if not pubsub.subscribed:
+                        time.sleep(0.1)
+                        continue
+                    message = pubsub.get_message(timeout=LISTEN_TIMEOUT)
+                    if message and message.get('type') == 'message':
+                        self._on_frame(message['channel'], message['data'])
+                except Exception as e:
+                    # Подписка из очереди могла не дойти - новое подключение на полный набор символов
+                    logger.error(f"[MarketDataBus] Ошибка чтения шины: {e}")
+                    self._reconnect_requested.set()
+                    time.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+    def _lease_loop(self):
+        while self._running:
+            time.sleep(LEASE_REFRESH_INTERVAL)
+            for symbol in self.get_symbols():
+                self._refresh_lease(symbol)
+
+    def _on_frame(self, channel: str, frame: str):
+        symbol = channel[len(CHANNEL_PREFIX):]
+        ticker = decode_frame(symbol, frame)
+        self.messages_received += 1
+        with self._lock:
+            if symbol in self._last_tick:
+                self._last_tick[symbol] = time.monotonic()
+        self._dispatch(symbol, ticker)
+
+    def _dispatch(self, symbol: str, ticker: Ticker):
+        with self._lock:
+            callbacks = list(self._callbacks.get(symbol, []))
+            self._tickers[symbol] = ticker
+        for callback in callbacks:
+            try:
+                callback(ticker)
+            except Exception as e:
+                logger.error(f"[MarketDataBus] Ошибка в callback для {symbol}: {e}", exc_info=True)
+
+    def close(self):
+        self._running = False
+        self.watchdog.stop()
+        with self._lock:
+            symbols = list(self._callbacks.keys())
+            self._callbacks.clear()
+        for symbol in symbols:
+            try:
+                self.redis.hdel(LEASES_KEY, self._lease_field(symbol))
+            except Exception:
+                pass
+
+
+_bus_subscriber: Optional[MarketDataBusSubscriber] = None
+_bus_lock = threading.Lock()
+
+
+def enable_tick_recording(hub):
+    """Включает запись тиков хаба, если задан TICK_RECORDER_DIR"""
+    with _bus_lock:
+        if TICK_RECORDER_DIR and hub.recorder is None:
+            hub.recorder = TickRecorder(TICK_RECORDER_DIR)
+
+
+def get_ticker_feed():
+    """
+    Возвращает источник тиков для стратегий процесса
+
+    MARKET_DATA_SOURCE=redis - читаем шину Redis (нужен запущенный публикатор),
+    иначе - собственный хаб процесса с прямым соединением к бирже.
+    """
+    global _bus_subscriber
+    if MARKET_DATA_SOURCE != 'redis' or redis_client is None:
+        # С шиной Redis тики пишет публикатор, здесь - каждый процесс свои символы
+        enable_tick_recording(ticker_hub)
+        # Таблицу цен пишет только публикатор - цены своих символов читатель берет из хаба
+        price_table.attach_local_feed(ticker_hub)
+        return ticker_hub
+    with _bus_lock:
+        if _bus_subscriber is None:
+            _bus_subscriber = MarketDataBusSubscriber()
+        return _bus_subscriber
+
+
+if __name__ == "__main__":
+    publisher = MarketDataPublisher()
+    try:
+        publisher.run()
+    except KeyboardInterrupt:
+        publisher.stop()
@@ -1,6 +1,7 @@
 import asyncio
 import time
 from pybit.unified_trading import HTTP, WebSocket
+from bybit.market_data_bus import get_ticker_feed
 from utils.send_tg_message import send_message_to_telegram
 from logger_config import setup_logger
 from config import API_KEY, API_SECRET, TELEGRAM_BOT_TOKEN
@@ -179,20 +180,18 @@ async def short_strategy(symbol):
     await send_message_to_telegram(f"⏳ Ожидание усреднения: если цена вырастет до {averaging_price:.4f}", chat_ids, TELEGRAM_BOT_TOKEN)
 
     # 2. Мониторинг цены для усреднения с помощью Queue
+    # Зависший поток переподключает FeedWatchdog источника тиков, цены после обрыва подтягиваются через REST
     price_queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
 
-    def price_callback(msg):
-        for ticker in msg.get('data', []):
-            if ticker.get('symbol') == symbol:
-                last_price = float(ticker.get('lastPrice'))
-                try:
-                    price_queue.put_nowait(last_price)
-                except asyncio.QueueFull:
-                    pass
+    def price_callback(ticker):
+        # Вызывается из потока источника тиков
+        if ticker.last_price > 0:
+            loop.call_soon_threadsafe(price_queue.put_nowait, ticker.last_price)
 
-    ws_price = WebSocket(testnet=False, channel_type="linear")
-    ws_price.ticker_stream(callback=price_callback, symbol=symbol)
-    logger.info("✅ Запущен WebSocket для мониторинга цены усреднения.")
+    ticker_feed = get_ticker_feed()
+    ticker_feed.subscribe(symbol, price_callback)
+    logger.info("✅ Подписка на тикер для мониторинга цены усреднения.")
 
     last_logged_time = time.time()
     usrednenie_done = False
@@ -212,15 +211,10 @@ async def short_strategy(symbol):
                     usrednenie_done = True
                     break
             except asyncio.TimeoutError:
-                logger.warning("❗️ Нет данных от WebSocket в течение 20 секунд. Переподключаемся...")
-                ws_price.exit()
-                await asyncio.sleep(1)
-                ws_price = WebSocket(testnet=False, channel_type="linear")
-                ws_price.ticker_stream(callback=price_callback, symbol=symbol)
-                logger.info("🔄 WebSocket для мониторинга цены перезапущен.")
+                logger.warning("❗️ Нет данных по тикеру в течение 20 секунд, ожидаем восстановления потока...")
     finally:
-        logger.info("🛑 Остановка WebSocket для мониторинга цены.")
-        ws_price.exit()
+        logger.info("🛑 Отписка от тикера мониторинга цены.")
+        ticker_feed.unsubscribe(symbol, price_callback)
 
     if not usrednenie_done:
         return
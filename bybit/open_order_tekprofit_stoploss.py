@@ -1,12 +1,18 @@
-from pybit.unified_trading import HTTP, WebSocket
+from pybit.unified_trading import WebSocket
 from utils.send_tg_message import send_message_to_telegram
 from logger_config import setup_logger
 from config import API_KEY, API_SECRET, TELEGRAM_BOT_TOKEN
 from database import get_all_subscribed_users, save_completed_transaction
 from bybit.position_monitor import position_monitor
+from bybit.market_data_bus import get_ticker_feed
+from bybit.price_table import price_table
+from bybit.async_http import AsyncHTTP
+from bybit.rate_limiter import get_rate_limiter
+from bybit.request_coalescer import get_request_coalescer
+from bybit.account_snapshot import get_account_snapshot
+from bybit.order_bundle import OrderBundle, cancel_legs_async, place_bundle_async, retry_legs_async
 import asyncio
 import time
-import aiohttp
 
 # --- НАСТРОЙКИ ДЛЯ ТОРГОВЛИ STRONG SHORT ---
 TRADE_SYMBOL = "Clankerusdt".upper()  # ← тикер монеты (в верхнем регистре)
@@ -25,15 +31,21 @@ if not key or not secret:
     logger.error("API_KEY или API_SECRET не заданы. Проверьте файл .env.")
     exit(1)
 
-session = HTTP(api_key=key, api_secret=secret, testnet=False, recv_window=60000)
+# Асинхронный клиент: запросы стратегии не останавливают event loop воркера;
+# одинаковые одновременные чтения (правила символов, тикер) уходят одним запросом
+http = AsyncHTTP(api_key=key, api_secret=secret, testnet=False, recv_window=60000,
+                 limiter=get_rate_limiter(False), coalescer=get_request_coalescer(False))
+
+# Позиции всех символов аккаунта одним опросом на процесс (None - опрос по символу)
+account_snapshot = get_account_snapshot(False)
 
 # Глобальная переменная для хранения задачи мониторинга
 monitoring_task = None
 
 # Получение минимального значения qty и шага qty
-def get_qty_limits(symbol):
+async def get_qty_limits(symbol):
     try:
-        response = session.get_instruments_info(category="linear")
+        response = await http.get_instruments_info(category="linear")
         if response.get("retCode") == 0:
             instruments = response.get("result", {}).get("list", [])
             for instrument in instruments:
@@ -49,16 +61,17 @@ def get_qty_limits(symbol):
 def round_qty(qty, step_size):
     return round(qty - (qty % step_size), len(str(step_size).split('.')[1]))
 
-# Открытие рыночного шорт-ордера
-async def open_short(symbol, dollar_value, chat_ids):
-    # Получаем цену через REST (для открытия позиции)
-    response = session.get_tickers(category="linear", symbol=symbol)
-    entry_price = 0
-    if response.get("retCode") == 0:
-        result = response.get("result", {}).get("list", [])
-        for ticker in result:
-            if ticker.get("symbol") == symbol:
-                entry_price = float(ticker.get("lastPrice", 0))
+# Открытие рыночного шорт-ордера; тейк-профит и стоп-лосс (если заданы) уходят в том же пакетном запросе
+async def open_short(symbol, dollar_value, chat_ids, take_profit_percent=None, stop_price=None, held_qty=0):
+    # Берем цену из разделяемой памяти, если ее там нет или она устарела - через REST
+    entry_price = price_table.get_last_price(symbol) or 0
+    if entry_price <= 0:
+        response = await http.get_tickers(category="linear", symbol=symbol)
+        if response.get("retCode") == 0:
+            result = response.get("result", {}).get("list", [])
+            for ticker in result:
+                if ticker.get("symbol") == symbol:
+                    entry_price = float(ticker.get("lastPrice", 0))
     if entry_price <= 0:
         logger.error("Не удалось получить цену символа для открытия позиции.")
         await send_message_to_telegram(
@@ -67,7 +80,7 @@ async def open_short(symbol, dollar_value, chat_ids):
         )
         return None
     qty = dollar_value / entry_price * 10
-    min_qty, step_size = get_qty_limits(symbol)
+    min_qty, step_size = await get_qty_limits(symbol)
     if qty < min_qty:
         qty = min_qty
     qty = round_qty(qty, step_size)
@@ -99,30 +112,37 @@ async def open_short(symbol, dollar_value, chat_ids):
                 chat_ids, TELEGRAM_BOT_TOKEN
             )
 
-    response = session.place_order(
-        category="linear",
-        symbol=symbol,
-        side="Sell",
-        orderType="Market",
-        qty=str(qty),
-        timeInForce="IOC",
-        reduceOnly=False
-    )
+    # Защита рассчитана на всю позицию: уже открытую (held_qty) и этот вход
+    bundle = OrderBundle(symbol)
+    bundle.add("entry", side="Sell", orderType="Market", qty=str(qty), timeInForce="IOC", reduceOnly=False)
+    if stop_price is not None:
+        bundle.add("stop_loss", **stop_loss_order(held_qty + qty, stop_price))
+    if take_profit_percent is not None:
+        tp_price, tp_order = take_profit_order(held_qty + qty, entry_price, take_profit_percent)
+        bundle.add("take_profit", **tp_order)
+    legs = await place_bundle_async(http, bundle)
+    response = legs["entry"]
     if response.get("retCode") == 0:
         logger.info(f"Открыта шорт-позиция {symbol} qty={qty} по цене {entry_price}")
         await send_message_to_telegram(f"Открыта шорт-позиция {symbol} qty={qty} по цене {entry_price}", chat_ids, TELEGRAM_BOT_TOKEN)
+        # Reduce-only ногу биржа могла отклонить до исполнения входа - повторяем отдельно
+        legs = await retry_legs_async(http, bundle, legs)
+        if stop_price is not None:
+            await report_stop_loss(legs["stop_loss"], stop_price, chat_ids)
+        if take_profit_percent is not None:
+            await report_take_profit(legs["take_profit"], tp_price, chat_ids)
         return entry_price, qty
     else:
+        # Вход не прошел - защита, рассчитанная на новую позицию, не нужна
+        await cancel_legs_async(http, bundle, legs, ["stop_loss", "take_profit"])
         logger.error(f"Ошибка открытия позиции: {response.get('retMsg')}")
         await send_message_to_telegram(f"Ошибка открытия позиции: {response.get('retMsg')}", chat_ids, TELEGRAM_BOT_TOKEN)
         return None
 
-# Установка тейк-профита
-async def set_take_profit(symbol, qty, entry_price, percent, chat_ids):
+# Параметры ордера тейк-профита (для отдельного запроса и для пакета со входом)
+def take_profit_order(qty, entry_price, percent):
     tp_price = entry_price * (1 - percent / 100)
-    response = session.place_order(
-        category="linear",
-        symbol=symbol,
+    return tp_price, dict(
         side="Buy",
         orderType="Limit",
         qty=str(qty),
@@ -130,6 +150,14 @@ async def set_take_profit(symbol, qty, entry_price, percent, chat_ids):
         timeInForce="GTC",
         reduceOnly=True
     )
+
+# Установка тейк-профита
+async def set_take_profit(symbol, qty, entry_price, percent, chat_ids):
+    tp_price, tp_order = take_profit_order(qty, entry_price, percent)
+    response = await http.place_order(category="linear", symbol=symbol, **tp_order)
+    await report_take_profit(response, tp_price, chat_ids)
+
+async def report_take_profit(response, tp_price, chat_ids):
     if response.get("retCode") == 0:
         logger.info(f"Тейк-профит установлен на {tp_price}")
         await send_message_to_telegram(f"Тейк-профит установлен на {tp_price}", chat_ids, TELEGRAM_BOT_TOKEN)
@@ -137,11 +165,9 @@ async def set_take_profit(symbol, qty, entry_price, percent, chat_ids):
         logger.error(f"Ошибка установки тейк-профита: {response.get('retMsg')}")
         await send_message_to_telegram(f"Ошибка установки тейк-профита: {response.get('retMsg')}", chat_ids, TELEGRAM_BOT_TOKEN)
 
-# Установка стоп-лосса
-async def set_stop_loss(symbol, qty, stop_price, chat_ids):
-    response = session.place_order(
-        category="linear",
-        symbol=symbol,
+# Параметры ордера стоп-лосса (для отдельного запроса и для пакета со входом)
+def stop_loss_order(qty, stop_price):
+    return dict(
         side="Buy",
         orderType="Stop",
         qty=str(qty),
@@ -149,6 +175,13 @@ async def set_stop_loss(symbol, qty, stop_price, chat_ids):
         timeInForce="GTC",
         reduceOnly=True
     )
+
+# Установка стоп-лосса
+async def set_stop_loss(symbol, qty, stop_price, chat_ids):
+    response = await http.place_order(category="linear", symbol=symbol, **stop_loss_order(qty, stop_price))
+    await report_stop_loss(response, stop_price, chat_ids)
+
+async def report_stop_loss(response, stop_price, chat_ids):
     if response.get("retCode") == 0:
         logger.info(f"Стоп-лосс установлен на {stop_price}")
         await send_message_to_telegram(f"Стоп-лосс установлен на {stop_price}", chat_ids, TELEGRAM_BOT_TOKEN)
@@ -158,11 +191,20 @@ async def set_stop_loss(symbol, qty, stop_price, chat_ids):
 
 # Основная стратегия STRONG SHORT
 async def strong_short_strategy(symbol):
+    """STRONG SHORT стратегия по символу; пул соединений http закрывается вместе с задачей"""
+    try:
+        return await _run_strong_short_strategy(symbol)
+    finally:
+        # Сессия aiohttp привязана к event loop задачи - закрываем ее, пока цикл еще жив
+        await http.close()
+
+
+async def _run_strong_short_strategy(symbol):
     global monitoring_task
     
     chat_ids = await get_all_subscribed_users()
     logger.info(f"Открываем первую шорт-позицию на ${TRADE_AMOUNT} (STRONG SHORT)")
-    entry1 = await open_short(symbol, TRADE_AMOUNT, chat_ids)
+    entry1 = await open_short(symbol, TRADE_AMOUNT, chat_ids, take_profit_percent=TAKE_PROFIT_PERCENT)
     if not entry1:
         await send_message_to_telegram(
             f"❌ STRONG SHORT стратегия для {symbol} не запущена из-за ошибки открытия позиции.",
@@ -187,7 +229,6 @@ async def strong_short_strategy(symbol):
     loop = asyncio.get_event_loop()
     position_monitor.start_monitoring(symbol, loop)
     
-    await set_take_profit(symbol, qty1, entry_price_1, TAKE_PROFIT_PERCENT, chat_ids)
     await send_message_to_telegram(
         f"Ожидание усреднения: если цена вырастет на {AVERAGING_PERCENT}% до {entry_price_1 * (1 + AVERAGING_PERCENT / 100)}", 
         chat_ids, TELEGRAM_BOT_TOKEN
@@ -204,12 +245,18 @@ async def strong_short_strategy(symbol):
     # Функция для проверки состояния позиции
     async def check_position_and_exit():
         """Проверяет состояние позиции и завершает работу при закрытии"""
+        started = time.time()   # Снимок аккаунта, начатый раньше, мог не застать открытие позиции
         while True:
             try:
-                # Проверяем состояние позиции через API
-                response = session.get_positions(category="linear", symbol=symbol)
-                if response.get("retCode") == 0:
-                    positions = response.get("result", {}).get("list", [])
+                # Позиция из общего снимка аккаунта (в нем только открытые позиции), иначе запрос через API
+                positions = account_snapshot.positions(symbol, since=started) if account_snapshot else None
+                if positions == []:
+                    positions = [{"symbol": symbol, "size": "0"}]
+                if positions is None:
+                    response = await http.get_positions(category="linear", symbol=symbol)
+                    if response.get("retCode") == 0:
+                        positions = response.get("result", {}).get("list", [])
+                if positions:
                     for position in positions:
                         if position.get("symbol") == symbol:
                             qty = float(position.get("size", 0))
@@ -228,39 +275,39 @@ async def strong_short_strategy(symbol):
     # Запускаем проверку позиции в отдельной задаче
     position_check_task = asyncio.create_task(check_position_and_exit())
 
-    # --- Новый мониторинг цены через aiohttp WebSocket ---
+    # --- Мониторинг цены через общий источник тиков (хаб процесса или шина Redis) ---
     async def price_ws_monitor():
         nonlocal last_logged_time
-        WS_URL = "wss://stream.bybit.com/v5/public/linear"
-        async with aiohttp.ClientSession() as session:
-            async with session.ws_connect(WS_URL) as ws:
-                sub_msg = {
-                    "op": "subscribe",
-                    "args": [f"tickers.{symbol}"]
-                }
-                await ws.send_json(sub_msg)
-                logger.info(f"Подписка на {symbol} отправлена!")
-                async for msg in ws:
-                    # Проверяем, не нужно ли завершить работу
-                    if close_event.is_set():
-                        logger.info(f"[StrongStrategy] Получен сигнал завершения для {symbol}, останавливаем мониторинг цены")
-                        break
-                        
-                    if msg.type == aiohttp.WSMsgType.TEXT:
-                        data = msg.json()
-                        if 'data' in data and isinstance(data['data'], dict):
-                            last_price = float(data['data'].get('lastPrice', 0))
-                            if last_price > 0:
-                                current_price['value'] = last_price
-                                percent = ((last_price - entry_price_1) / entry_price_1) * 100
-                                now = time.time()
-                                if now - last_logged_time > log_interval:
-                                    logger.info(f"Мониторинг: цена входа={entry_price_1}, текущая цена={last_price}, изменение={percent:.2f}%")
-                                    last_logged_time = now
-                                # Усреднение при росте на AVERAGING_PERCENT%
-                                if not usrednenie_done and last_price >= entry_price_1 * (1 + AVERAGING_PERCENT / 100):
-                                    result_holder['trigger_price'] = last_price
-                                    loop.call_soon_threadsafe(ws_triggered.set)
+        price_queue = asyncio.Queue()
+
+        def on_ticker(ticker):
+            # Вызывается из потока источника тиков - передаем цену в event loop стратегии
+            if ticker.last_price > 0:
+                loop.call_soon_threadsafe(price_queue.put_nowait, ticker.last_price)
+
+        ticker_feed = get_ticker_feed()
+        ticker_feed.subscribe(symbol, on_ticker)
+        logger.info(f"Подписка на {symbol} отправлена!")
+        try:
+            while True:
+                last_price = await price_queue.get()
+                # Проверяем, не нужно ли завершить работу
+                if close_event.is_set():
+                    logger.info(f"[StrongStrategy] Получен сигнал завершения для {symbol}, останавливаем мониторинг цены")
+                    break
+
+                current_price['value'] = last_price
+                percent = ((last_price - entry_price_1) / entry_price_1) * 100
+                now = time.time()
+                if now - last_logged_time > log_interval:
+                    logger.info(f"Мониторинг: цена входа={entry_price_1}, текущая цена={last_price}, изменение={percent:.2f}%")
+                    last_logged_time = now
+                # Усреднение при росте на AVERAGING_PERCENT%
+                if not usrednenie_done and last_price >= entry_price_1 * (1 + AVERAGING_PERCENT / 100):
+                    result_holder['trigger_price'] = last_price
+                    ws_triggered.set()
+        finally:
+            ticker_feed.unsubscribe(symbol, on_ticker)
 
     price_ws_task = asyncio.create_task(price_ws_monitor())
 
@@ -300,8 +347,10 @@ async def strong_short_strategy(symbol):
         chat_ids, TELEGRAM_BOT_TOKEN
     )
 
-    # Усреднение
-    entry2 = await open_short(symbol, TRADE_AMOUNT, chat_ids)
+    # Усреднение: стоп-лосс (относительно цены входа первой позиции) и тейк-профит на весь объем - в пакете со входом
+    stop_loss_price = entry_price_1 * (1 + STOP_LOSS_PERCENT / 100)
+    entry2 = await open_short(symbol, TRADE_AMOUNT, chat_ids, take_profit_percent=TAKE_PROFIT_PERCENT,
+                              stop_price=stop_loss_price, held_qty=qty1)
     if not entry2:
         await send_message_to_telegram(
             f"❌ Ошибка усреднения для {symbol}: не удалось открыть вторую позицию. Стратегия остановлена.",
@@ -317,11 +366,6 @@ async def strong_short_strategy(symbol):
     
     # Обновляем информацию о позиции в мониторе
     position_monitor.add_position(symbol, entry_price_2, total_qty, "Sell")
-    
-    # Стоп-лосс относительно цены входа первой позиции
-    stop_loss_price = entry_price_1 * (1 + STOP_LOSS_PERCENT / 100)
-    await set_stop_loss(symbol, total_qty, stop_loss_price, chat_ids)
-    await set_take_profit(symbol, total_qty, entry_price_2, TAKE_PROFIT_PERCENT, chat_ids)
 
     # --- Приватный WebSocket для мониторинга исполнения ордеров ---
     private_ws = WebSocket(
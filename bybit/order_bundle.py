@@ -0,0 +1,170 @@
+"""
+Пакет ордеров шага стратегии: один запрос /v5/order/create-batch вместо цепочки place_order
+
+Вход и защитные ордера шага (лимитка усреднения, тейк-профит, стоп-лосс)
+собираются в OrderBundle и уходят одним пакетным запросом: между входом и
+выставлением защиты - один круг до биржи, а не по одному на каждый ордер.
+
+Каждая нога пакета получает имя и orderLinkId. Ответ биржи (два списка:
+result.list с ордерами и retExtInfo.list с кодом каждой ноги) разбирается
+в словарь имя -> ответ в формате place_order (retCode/retMsg/result), так
+что код стратегии обрабатывает ноги так же, как раньше отдельные ордера.
+
+Биржа принимает ноги независимо: отказ одной не отменяет остальные.
+Reduce-only ногу биржа может отклонить, если обработала ее раньше, чем
+исполнился вход того же пакета, - такие ноги повторяются отдельными
+запросами (retry_legs_async).
+"""
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+from bybit.async_http import cast_values
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+MAX_BATCH_SIZE = 20     # Лимит Bybit на один пакетный запрос категории linear
+
+
+def new_leg_link_id() -> str:
+    """Уникальный orderLinkId ноги (до 36 символов)"""
+    return f"bd-{uuid.uuid4().hex[:30]}"
+
+
+def _leg_response(code: int, message: str, item: Optional[Dict] = None, via: Optional[str] = None) -> Dict:
+    """Ответ одной ноги в формате place_order"""
+    item = item or {}
+    response = {
+        'retCode': code,
+        'retMsg': message,
+        'result': {'orderId': item.get('orderId', ''), 'orderLinkId': item.get('orderLinkId', '')}
+        if code == 0 else {},
+    }
+    if via is not None:
+        response['via'] = via
+    return response
+
+
+class OrderBundle:
+    """Именованные ноги одного шага стратегии для пакетного запроса"""
+
+    def __init__(self, symbol: str, category: str = "linear"):
+        self.symbol = symbol
+        self.category = category
+        self.legs: Dict[str, Dict] = {}    # имя -> параметры ордера (в порядке добавления)
+
+    def add(self, name: str, **params) -> 'OrderBundle':
+        """Добавляет ногу; symbol и orderLinkId подставляются, если не заданы"""
+        if name in self.legs:
+            raise ValueError(f"Нога {name} уже есть в пакете")
+        params = {key: value for key, value in params.items() if value is not None}
+        params.setdefault('symbol', self.symbol)
+        if not params.get('orderLinkId'):
+            params['orderLinkId'] = new_leg_link_id()
+        self.legs[name] = cast_values(params)
+        return self
+
+    def names(self) -> List[str]:
+        return list(self.legs)
+
+    def chunks(self) -> Iterator[List[str]]:
+        """Имена ног порциями не больше MAX_BATCH_SIZE"""
+        names = self.names()
+        for start in range(0, len(names), MAX_BATCH_SIZE):
+            yield names[start:start + MAX_BATCH_SIZE]
+
+    def batch_params(self, names: List[str]) -> Dict:
+        """Параметры place_batch_order для порции ног"""
+        return {'category': self.category, 'request': [dict(self.legs[name]) for name in names]}
+
+    def split(self, names: List[str], response: Dict) -> Dict[str, Dict]:
+        """Раскладывает ответ пакетного запроса по ногам"""
+        via = response.get('via')
+        if response.get('retCode') != 0:
+            # Отклонен весь запрос (подпись, лимит, формат) - ни одна нога не выставлена
+            message = response.get('retMsg', 'Неизвестная ошибка')
+            return {name: _leg_response(response.get('retCode'), message, via=via) for name in names}
+
+        items = (response.get('result') or {}).get('list') or []
+        codes = (response.get('retExtInfo') or {}).get('list') or []
+        by_link_id = {item.get('orderLinkId'): item for item in items if item.get('orderLinkId')}
+        legs = {}
+        for index, name in enumerate(names):
+            link_id = self.legs[name]['orderLinkId']
+            item = by_link_id.get(link_id) or (items[index] if index < len(items) else {})
+            ext = codes[index] if index < len(codes) else {}
+            code = ext.get('code', 0 if item.get('orderId') else -1)
+            message = ext.get('msg', 'OK' if code == 0 else 'Нет ответа по ноге')
+            legs[name] = _leg_response(code, message, item, via)
+        return legs
+
+    @staticmethod
+    def failed(legs: Dict[str, Dict]) -> List[str]:
+        return [name for name, response in legs.items() if response.get('retCode') != 0]
+
+    @staticmethod
+    def placed(legs: Dict[str, Dict]) -> List[str]:
+        return [name for name, response in legs.items() if response.get('retCode') == 0]
+
+
+def place_bundle(client, bundle: OrderBundle) -> Dict[str, Dict]:
+    """
+    Выставляет пакет через client (pybit.HTTP, OrderGateway, SimulatedSession)
+
+    Клиент без place_batch_order получает ноги по одной - в том же порядке.
+    """
+    place_batch = getattr(client, 'place_batch_order', None)
+    legs = {}
+    for names in bundle.chunks():
+        if place_batch is None:
+            for name in names:
+                legs[name] = client.place_order(category=bundle.category, **bundle.legs[name])
+            continue
+        legs.update(bundle.split(names, place_batch(**bundle.batch_params(names))))
+    _log_failed(bundle, legs)
+    return legs
+
+
+async def place_bundle_async(client, bundle: OrderBundle) -> Dict[str, Dict]:
+    """То же для асинхронного клиента (AsyncHTTP)"""
+    place_batch = getattr(client, 'place_batch_order', None)
+    legs = {}
+    for names in bundle.chunks():
+        if place_batch is None:
+            for name in names:
+                legs[name] = await client.place_order(category=bundle.category, **bundle.legs[name])
+            continue
+        legs.update(bundle.split(names, await place_batch(**bundle.batch_params(names))))
+    _log_failed(bundle, legs)
+    return legs
+
+
+async def retry_legs_async(client, bundle: OrderBundle, legs: Dict[str, Dict],
+                           names: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Повторяет отклоненные ноги (или только names из них) отдельными place_order с новым orderLinkId"""
+    retry = [name for name in OrderBundle.failed(legs) if names is None or name in names]
+    for name in retry:
+        params = dict(bundle.legs[name], orderLinkId=new_leg_link_id())
+        legs[name] = await client.place_order(category=bundle.category, **params)
+        logger.info(
+            f"[OrderBundle] {bundle.symbol}: повтор ноги {name} отдельным запросом - "
+            f"{legs[name].get('retMsg', '')} ({legs[name].get('retCode')})"
+        )
+    return legs
+
+
+async def cancel_legs_async(client, bundle: OrderBundle, legs: Dict[str, Dict], names: List[str]):
+    """Отменяет выставленные ноги из names (например, защиту, если не прошел вход)"""
+    for name in names:
+        response = legs.get(name, {})
+        if response.get('retCode') != 0:
+            continue
+        cancel = await client.cancel_order(category=bundle.category, symbol=bundle.legs[name]['symbol'],
+                                           orderId=response['result'].get('orderId'))
+        if cancel.get('retCode') != 0:
+            logger.warning(f"[OrderBundle] {bundle.symbol}: не удалось отменить ногу {name}: {cancel.get('retMsg')}")
+
+
+def _log_failed(bundle: OrderBundle, legs: Dict[str, Dict]):
+    for name in OrderBundle.failed(legs):
+        logger.warning(f"[OrderBundle] {bundle.symbol}: нога {name} отклонена - {legs[name].get('retMsg')}")
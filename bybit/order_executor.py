@@ -0,0 +1,215 @@
+"""
+Исполнитель торговых запросов стратегии
+
+Запросы к REST API Bybit синхронные (pybit), и вызов из обработчика тиков
+останавливает event loop на весь HTTP round trip - вместе со всеми
+стратегиями хоста. Стратегия вместо этого ставит намерение ("перенести
+безубыток на X") в очередь своего исполнителя и продолжает проверять цены.
+
+Исполнитель - задача asyncio с упорядоченной очередью: запросы символа
+уходят строго по одному и в порядке постановки, сам HTTP-вызов выполняется
+в пуле потоков. Намерение с ключом заменяет еще не отправленное намерение
+с тем же ключом (старый уровень безубытка не отправляется вовсе). Результат
+обрабатывает callback в event loop до отправки следующего запроса.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class OrderIntent:
+    __slots__ = ('key', 'call', 'on_done', 'future', 'submitted')
+
+    def __init__(self, key: Optional[str], call: Callable[[], Any], on_done: Optional[Callable[[Any], None]],
+                 future: Optional[asyncio.Future]):
+        self.key = key
+        self.call = call
+        self.on_done = on_done
+        self.future = future
+        self.submitted = time.monotonic()
+
+
+class OrderExecutor:
+    """
+    Очередь запросов одной стратегии
+
+    submit(key, call, on_done) - намерение без ожидания (ключ схлопывает повторы)
+    run(call)                  - запрос, результат которого нужен сразу (в порядке очереди)
+
+    threaded=False - для симулятора биржи, который не рассчитан на вызовы из других
+    потоков: при пустой очереди запрос выполняется сразу, без переключения задач.
+    """
+
+    def __init__(self, symbol: str, threaded: bool = True):
+        self.symbol = symbol
+        self.threaded = threaded
+        self._queue: Deque[OrderIntent] = deque()
+        self._pending: Dict[str, OrderIntent] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._busy = False
+
+        # Статистика
+        self.sent = 0
+        self.collapsed = 0
+        self.discarded = 0
+        self.failed = 0
+        self.max_delay = 0.0   # Максимальное ожидание намерения в очереди (секунды)
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._worker(), name=f"Orders-{self.symbol}")
+
+    def submit(self, key: Optional[str], call: Callable[[], Any],
+               on_done: Optional[Callable[[Any], None]] = None):
+        """Ставит намерение в очередь; неотправленное намерение с тем же ключом заменяется"""
+        if self._can_call_now():
+            self._execute(OrderIntent(key, call, on_done, None))
+            return
+        self._ensure_task()
+        pending = self._pending.get(key) if key is not None else None
+        if pending is not None:
+            # Место в очереди сохраняется, отправится только последняя версия
+            pending.call = call
+            pending.on_done = on_done
+            self.collapsed += 1
+            return
+        self._enqueue(OrderIntent(key, call, on_done, None))
+
+    async def run(self, call: Callable[[], Any]) -> Any:
+        """Выполняет запрос после уже поставленных и возвращает его результат"""
+        if self._can_call_now():
+            self._busy = True
+            try:
+                result = call()
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self._busy = False
+            self.sent += 1
+            return result
+        self._ensure_task()
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(OrderIntent(None, call, None, future))
+        return await future
+
+    def _can_call_now(self) -> bool:
+        return not self.threaded and not self._busy and not self._queue
+
+    def _enqueue(self, intent: OrderIntent):
+        self._queue.append(intent)
+        if intent.key is not None:
+            self._pending[intent.key] = intent
+        self._idle.clear()
+        self._wakeup.set()
+
+    def discard(self, *keys: str) -> int:
+        """Снимает неотправленные намерения (все или с указанными ключами); запросы run() остаются"""
+        kept = deque()
+        dropped = 0
+        for intent in self._queue:
+            if intent.future is None and (not keys or intent.key in keys):
+                self._pending.pop(intent.key, None)
+                dropped += 1
+            else:
+                kept.append(intent)
+        self._queue = kept
+        self.discarded += dropped
+        return dropped
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    async def join(self):
+        """Ждет, пока очередь опустеет и последний запрос будет обработан"""
+        if self._task is not None and not self._task.done():
+            await self._idle.wait()
+
+    async def close(self, timeout: float = 10):
+        """Дает отправиться поставленным намерениям и останавливает задачу исполнителя"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[{self.symbol}] Не отправлено намерений: {len(self._queue)}")
+        self._task.cancel()
+        for intent in self._queue:
+            if intent.future is not None and not intent.future.done():
+                intent.future.cancel()
+        self._queue.clear()
+        self._pending.clear()
+
+    async def _worker(self):
+        while True:
+            if not self._queue:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            intent = self._queue.popleft()
+            if intent.key is not None and self._pending.get(intent.key) is intent:
+                del self._pending[intent.key]
+            self.max_delay = max(self.max_delay, time.monotonic() - intent.submitted)
+            self._busy = True
+            try:
+                if self.threaded:
+                    result = await asyncio.to_thread(intent.call)
+                else:
+                    result = intent.call()
+            except Exception as e:
+                self._busy = False
+                self._failed(intent, e)
+                continue
+            self._busy = False
+            self._done(intent, result)
+
+    def _execute(self, intent: OrderIntent):
+        """Выполнение на месте (симулятор, очередь пуста)"""
+        self._busy = True
+        try:
+            result = intent.call()
+        except Exception as e:
+            self._failed(intent, e)
+            return
+        finally:
+            self._busy = False
+        self._done(intent, result)
+
+    def _failed(self, intent: OrderIntent, error: Exception):
+        self.failed += 1
+        if intent.future is not None:
+            if not intent.future.done():
+                intent.future.set_exception(error)
+        else:
+            logger.error(f"[{self.symbol}] Ошибка запроса {intent.key}: {error}")
+
+    def _done(self, intent: OrderIntent, result: Any):
+        self.sent += 1
+        if intent.future is not None:
+            if not intent.future.done():
+                intent.future.set_result(result)
+        elif intent.on_done is not None:
+            try:
+                intent.on_done(result)
+            except Exception as e:
+                logger.error(f"[{self.symbol}] Ошибка обработки ответа {intent.key}: {e}", exc_info=True)
+
+    def stats(self) -> Dict:
+        return {
+            'sent': self.sent,
+            'collapsed': self.collapsed,
+            'discarded': self.discarded,
+            'failed': self.failed,
+            'pending': len(self._queue),
+            'max_delay': self.max_delay,
+        }
@@ -0,0 +1,422 @@
+"""
+Шлюз ордеров: WebSocket Trade API Bybit с запасным путем через REST
+
+Вход в позицию (вместе с защитными ордерами шага) и аварийное закрытие
+отправляются по уже открытому авторизованному соединению
+wss://stream.bybit.com/v5/trade (op order.create, order.create-batch,
+order.amend, order.cancel): без HTTP-запроса, TLS-рукопожатия и подписи
+каждого вызова. Одно соединение на аккаунт в процессе, ответы сопоставляются
+с запросами по reqId.
+
+Интерфейс повторяет pybit.HTTP (place_order/place_batch_order/amend_order/
+cancel_order с теми же параметрами и ответом retCode/retMsg/result), вызовы
+синхронные - их делает поток исполнителя ордеров стратегии. Если соединение
+не готово, не удалось отправить кадр или ответ не пришел за timeout, запрос
+уходит через REST. Новый ордер всегда получает orderLinkId: повтор через REST
+после таймаута не создаст второй ордер (биржа отклонит дубль, и шлюз вернет
+уже созданный).
+
+В ответ добавляется поле via ('ws' или 'rest'), задержки по каждому пути
+копятся в stats() для сравнения WebSocket и REST.
+"""
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import websocket
+from pybit.exceptions import InvalidRequestError
+from pybit.unified_trading import HTTP
+
+from bybit.async_http import cast_values
+from bybit.feed_watchdog import backoff_delay
+from bybit.private_stream import auth_args
+from bybit.rate_limiter import endpoint_group, get_rate_limiter, rate_limited, request_cost
+from bybit.request_coalescer import get_request_coalescer
+from config import API_KEY, API_SECRET, DEMO_API_KEY, DEMO_API_SECRET, ORDER_GATEWAY_WS
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+TRADE_WS_URL = "wss://stream.bybit.com/v5/trade"
+TESTNET_TRADE_WS_URL = "wss://stream-testnet.bybit.com/v5/trade"
+PING_INTERVAL = 20          # Bybit закрывает соединение без пинга ~30 секунд
+ORDER_TIMEOUT = 2.0         # Ожидание ответа по WebSocket до перехода на REST (секунды)
+RECV_WINDOW = 8000          # Окно приема запроса биржей (мс)
+LATENCY_SAMPLES = 1000      # Последних замеров задержки на путь
+
+OP_CREATE = "order.create"
+OP_CREATE_BATCH = "order.create-batch"
+OP_AMEND = "order.amend"
+OP_CANCEL = "order.cancel"
+
+# WebSocket Trade делит лимиты аккаунта с REST: операция -> путь REST для лимитера
+OP_PATHS = {
+    OP_CREATE: "/v5/order/create",
+    OP_CREATE_BATCH: "/v5/order/create-batch",
+    OP_AMEND: "/v5/order/amend",
+    OP_CANCEL: "/v5/order/cancel",
+}
+
+DUPLICATE_ORDER_LINK_ID = 110072   # Код Bybit "OrderLinkedID is duplicate"
+
+PATH_WS = "ws"
+PATH_REST = "rest"
+
+
+def new_order_link_id() -> str:
+    """Уникальный orderLinkId (до 36 символов) для защиты от повторного создания ордера"""
+    return f"gw-{uuid.uuid4().hex[:30]}"
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class _Pending:
+    """Запрос, ожидающий ответа по WebSocket"""
+
+    __slots__ = ('event', 'response')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response: Optional[Dict] = None
+
+
+class OrderGateway:
+    """Одно соединение WebSocket Trade на аккаунт; REST - запасной путь"""
+
+    def __init__(self, rest, api_key: str, api_secret: str, url: Optional[str] = TRADE_WS_URL,
+                 timeout: float = ORDER_TIMEOUT, limiter=None, coalescer=None):
+        """
+        Args:
+            rest: Сессия с интерфейсом pybit.HTTP для запасного пути
+            url: Адрес WebSocket Trade; None - только REST (аккаунт без WebSocket Trade)
+            timeout: Сколько ждать ответа по WebSocket до повтора через REST
+            limiter: RateLimiter аккаунта для запросов по WebSocket (REST-сессию оборачивают отдельно)
+            coalescer: RequestCoalescer аккаунта - после ордера чтения символа идут заново
+        """
+        self.rest = rest
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.url = url
+        self.timeout = timeout
+        self.limiter = limiter
+        self.coalescer = coalescer
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Pending] = {}
+        self._ids = itertools.count(1)
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ping_thread: Optional[threading.Thread] = None
+        self._connected = threading.Event()
+        self._ready = threading.Event()    # Соединение авторизовано
+        self._running = False
+        self._reconnect_attempt = 0
+
+        # Статистика
+        self.sent = {PATH_WS: 0, PATH_REST: 0}
+        self.fallbacks = 0      # Запросы, ушедшие в REST из-за сбоя WebSocket
+        self.timeouts = 0
+        self.duplicates = 0     # Ордер создан по WebSocket, хотя ответ не дошел
+        self._latency = {PATH_WS: deque(maxlen=LATENCY_SAMPLES), PATH_REST: deque(maxlen=LATENCY_SAMPLES)}
+
+    # ==================== API pybit.HTTP ====================
+
+    def place_order(self, **params) -> Dict:
+        params = {key: value for key, value in params.items() if value is not None}
+        if not params.get('orderLinkId'):
+            params['orderLinkId'] = new_order_link_id()
+        return self._request(OP_CREATE, params, self.rest.place_order)
+
+    def place_batch_order(self, **params) -> Dict:
+        """Пакет ордеров (category + request): каждая нога получает orderLinkId"""
+        request = []
+        for leg in params.get('request') or []:
+            leg = cast_values({key: value for key, value in leg.items() if value is not None})
+            if not leg.get('orderLinkId'):
+                leg['orderLinkId'] = new_order_link_id()
+            request.append(leg)
+        params['request'] = request
+        return self._request(OP_CREATE_BATCH, params, self.rest.place_batch_order)
+
+    def amend_order(self, **params) -> Dict:
+        return self._request(OP_AMEND, params, self.rest.amend_order)
+
+    def cancel_order(self, **params) -> Dict:
+        return self._request(OP_CANCEL, params, self.rest.cancel_order)
+
+    def is_connected(self) -> bool:
+        return self._ready.is_set()
+
+    def _request(self, op: str, params: Dict, rest_call: Callable) -> Dict:
+        params = cast_values({key: value for key, value in params.items() if value is not None})
+        try:
+            return self._route(op, params, rest_call)
+        finally:
+            # Позиция и ордера символа изменились: начатые раньше чтения не переиспользуются
+            if self.coalescer is not None:
+                self.coalescer.invalidate(params)
+
+    def _route(self, op: str, params: Dict, rest_call: Callable) -> Dict:
+        started = time.perf_counter()
+        if self.url is not None and self._ready.is_set():
+            if self.limiter is not None:
+                group, priority = endpoint_group(OP_PATHS[op])
+                self.limiter.acquire(group, request_cost(params), priority)
+            response = self._send_request(op, params)
+            if response is not None:
+                return self._done(PATH_WS, started, response)
+            self.fallbacks += 1
+            logger.warning(f"[OrderGateway] {op} {params.get('symbol')}: нет ответа по WebSocket, повтор через REST")
+            if op == OP_CREATE:
+                return self._done(PATH_REST, started, self._create_after_ws_failure(params))
+            if op == OP_CREATE_BATCH:
+                return self._done(PATH_REST, started, self._create_batch_after_ws_failure(params))
+        return self._done(PATH_REST, started, rest_call(**params))
+
+    def _done(self, path: str, started: float, response: Dict) -> Dict:
+        self.sent[path] += 1
+        self._latency[path].append(time.perf_counter() - started)
+        response['via'] = path
+        return response
+
+    def _create_after_ws_failure(self, params: Dict) -> Dict:
+        """REST с тем же orderLinkId: если ордер уже создан по WebSocket, возвращаем его"""
+        try:
+            return self.rest.place_order(**params)
+        except InvalidRequestError as e:
+            # pybit выбрасывает исключение на любой retCode != 0, в том числе на дубль orderLinkId
+            if e.status_code != DUPLICATE_ORDER_LINK_ID:
+                raise
+            order_id = self._find_created(params.get('category', 'linear'), params.get('symbol'),
+                                          params['orderLinkId'])
+            if order_id is None:
+                raise
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {
+            'orderId': order_id, 'orderLinkId': params['orderLinkId'],
+        }, 'retExtInfo': {}, 'time': int(time.time() * 1000)}
+
+    def _create_batch_after_ws_failure(self, params: Dict) -> Dict:
+        """Пакет через REST с теми же orderLinkId: ноги, уже созданные по WebSocket, подменяются найденными"""
+        response = self.rest.place_batch_order(**params)
+        if response.get('retCode') != 0:
+            return response
+        items = response.get('result', {}).get('list') or []
+        codes = response.get('retExtInfo', {}).get('list') or []
+        for leg, item, ext in zip(params['request'], items, codes):
+            if ext.get('code') != DUPLICATE_ORDER_LINK_ID:
+                continue
+            order_id = self._find_created(params.get('category', 'linear'), leg.get('symbol'), leg['orderLinkId'])
+            if order_id is not None:
+                item.update(orderId=order_id, orderLinkId=leg['orderLinkId'])
+                ext.update(code=0, msg='OK')
+        return response
+
+    def _find_created(self, category: str, symbol: str, order_link_id: str) -> Optional[str]:
+        """orderId ордера, созданного по WebSocket, хотя ответ не дошел; None - не найден"""
+        self.duplicates += 1
+        query = {'category': category, 'symbol': symbol, 'orderLinkId': order_link_id}
+        for lookup in (self.rest.get_open_orders, self.rest.get_order_history):
+            try:
+                orders = lookup(**query).get('result', {}).get('list', [])
+            except Exception as e:
+                logger.warning(f"[OrderGateway] Ошибка поиска ордера {order_link_id}: {e}")
+                continue
+            if orders:
+                logger.info(f"[OrderGateway] Ордер {order_link_id} уже создан по WebSocket")
+                return orders[0].get('orderId')
+        return None
+
+    def _send_request(self, op: str, params: Dict) -> Optional[Dict]:
+        """Отправляет запрос и ждет ответ с тем же reqId; None - сбой (отправка, обрыв, таймаут)"""
+        req_id = f"{next(self._ids)}-{int(time.time() * 1000)}"
+        pending = _Pending()
+        with self._lock:
+            self._pending[req_id] = pending
+        frame = {
+            "reqId": req_id,
+            "header": {"X-BAPI-TIMESTAMP": str(int(time.time() * 1000)), "X-BAPI-RECV-WINDOW": str(RECV_WINDOW)},
+            "op": op,
+            "args": [params],
+        }
+        try:
+            if not self._send(frame):
+                return None
+            if not pending.event.wait(self.timeout):
+                self.timeouts += 1
+                return None
+            return pending.response
+        finally:
+            with self._lock:
+                self._pending.pop(req_id, None)
+
+    # ==================== СОЕДИНЕНИЕ ====================
+
+    def connect(self):
+        """Открывает соединение заранее, чтобы первый ордер не ждал рукопожатия"""
+        if self.url is None:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run_forever, name="OrderGateway", daemon=True)
+        self._thread.start()
+        self._ping_thread = threading.Thread(target=self._ping_loop, name="OrderGatewayPing", daemon=True)
+        self._ping_thread.start()
+
+    def _run_forever(self):
+        """Держит соединение открытым и переподключается при обрыве"""
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            try:
+                self._ws.run_forever()
+            except Exception as e:
+                logger.error(f"[OrderGateway] Ошибка соединения: {e}")
+            self._disconnected()
+
+            if self._running:
+                delay = backoff_delay(self._reconnect_attempt)
+                self._reconnect_attempt += 1
+                logger.warning(f"[OrderGateway] Соединение потеряно, переподключение через {delay:.1f} сек")
+                time.sleep(delay)
+
+    def _ping_loop(self):
+        """Отправляет ping, чтобы Bybit не закрыл соединение"""
+        while self._running:
+            time.sleep(PING_INTERVAL)
+            if self._connected.is_set():
+                self._send({"op": "ping"})
+
+    def close(self):
+        """Закрывает соединение и останавливает потоки"""
+        self._running = False
+        if self._ws:
+            try:
+                self._ws.close()
+            except Exception as e:
+                logger.warning(f"[OrderGateway] Ошибка при закрытии WebSocket: {e}")
+        self._disconnected()
+        logger.info("[OrderGateway] Соединение закрыто")
+
+    def _disconnected(self):
+        """Обрыв: ожидающие запросы сразу уходят в REST, не дожидаясь таймаута"""
+        self._connected.clear()
+        self._ready.clear()
+        with self._lock:
+            pending = list(self._pending.values())
+        for item in pending:
+            item.event.set()
+
+    def _send(self, payload: Dict) -> bool:
+        ws = self._ws
+        if not ws or not self._connected.is_set():
+            return False
+        try:
+            ws.send(json.dumps(payload))
+            return True
+        except Exception as e:
+            logger.warning(f"[OrderGateway] Не удалось отправить {payload.get('op')}: {e}")
+            return False
+
+    # ==================== CALLBACK'И WEBSOCKET ====================
+
+    def _on_open(self, ws):
+        self._connected.set()
+        logger.info("[OrderGateway] Соединение открыто, авторизация...")
+        self._send({"op": "auth", "args": auth_args(self.api_key, self.api_secret)})
+
+    def _on_error(self, ws, error):
+        logger.error(f"[OrderGateway] Ошибка WebSocket: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        self._disconnected()
+        logger.info(f"[OrderGateway] Соединение закрыто: {status_code} {message}")
+
+    def _on_message(self, ws, raw: str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"[OrderGateway] Некорректное сообщение: {raw[:200]}")
+            return
+
+        op = message.get('op')
+        if op == 'auth':
+            if message.get('retCode') == 0 or message.get('success'):
+                self._reconnect_attempt = 0
+                self._ready.set()
+                logger.info("[OrderGateway] Авторизация пройдена, ордера идут по WebSocket")
+            else:
+                # Неверные ключи - переподключение не поможет, ордера идут через REST
+                logger.error(f"[OrderGateway] Ошибка авторизации: {message.get('retMsg') or message.get('ret_msg')}")
+            return
+
+        req_id = message.get('reqId')
+        if req_id is None:
+            return
+        with self._lock:
+            pending = self._pending.get(req_id)
+        if pending is None:
+            return  # Ответ пришел после таймаута - запрос уже повторен через REST
+        pending.response = {
+            'retCode': message.get('retCode'),
+            'retMsg': message.get('retMsg', ''),
+            'result': message.get('data') or {},
+            'retExtInfo': message.get('retExtInfo') or {},
+            'time': int(message.get('header', {}).get('Timenow') or time.time() * 1000),
+        }
+        pending.event.set()
+
+    def stats(self) -> Dict:
+        """Количество запросов и задержки (мс) по каждому пути"""
+        result = {
+            'connected': self.is_connected(),
+            'fallbacks': self.fallbacks,
+            'timeouts': self.timeouts,
+            'duplicates': self.duplicates,
+        }
+        for path, samples in self._latency.items():
+            result[path] = {'sent': self.sent[path]}
+            if samples:
+                result[path].update({
+                    'p50_ms': _percentile(samples, 0.5) * 1000,
+                    'p99_ms': _percentile(samples, 0.99) * 1000,
+                })
+        return result
+
+
+# Глобальные шлюзы ордеров (один на аккаунт в процессе)
+_gateways: Dict[bool, OrderGateway] = {}
+_gateways_lock = threading.Lock()
+
+
+def get_order_gateway(use_demo: bool) -> Optional[OrderGateway]:
+    """
+    Возвращает шлюз ордеров аккаунта; None - выключен (ORDER_GATEWAY_WS=false)
+
+    Демо-счет не поддерживает WebSocket Trade: его шлюз отправляет все через REST
+    и только замеряет задержки.
+    """
+    if not ORDER_GATEWAY_WS:
+        return None
+    with _gateways_lock:
+        gateway = _gateways.get(use_demo)
+        if gateway is None:
+            api_key = DEMO_API_KEY if use_demo else API_KEY
+            api_secret = DEMO_API_SECRET if use_demo else API_SECRET
+            rest = rate_limited(HTTP(testnet=False, api_key=api_key, api_secret=api_secret, demo=use_demo), use_demo)
+            gateway = OrderGateway(rest, api_key, api_secret, url=None if use_demo else TRADE_WS_URL,
+                                   limiter=get_rate_limiter(use_demo), coalescer=get_request_coalescer(use_demo))
+            _gateways[use_demo] = gateway
+        return gateway
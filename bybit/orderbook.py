@@ -0,0 +1,196 @@
+"""
+Стакан Bybit (orderbook.1 / orderbook.50 / ...) в предвыделенных массивах NumPy
+
+Snapshot и delta применяются к отсортированным массивам цен и объемов
+без словарей: поиск уровня - searchsorted, вставка и удаление - сдвиг
+хвоста массива. Для расчетов доступны лучший уровень, глубина до заданного
+объема в USDT и оценка средней цены исполнения рыночного ордера.
+"""
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SIDE_BUY = "Buy"     # Покупка исполняется по ask
+SIDE_SELL = "Sell"   # Продажа исполняется по bid
+
+
+def orderbook_topic(symbol: str, depth: int) -> str:
+    return f"orderbook.{depth}.{symbol}"
+
+
+class BookSide:
+    """
+    Одна сторона стакана
+
+    Уровни хранятся по возрастанию ключа: для ask ключ = цена, для bid ключ = -цена,
+    поэтому лучший уровень всегда под индексом 0.
+    """
+
+    def __init__(self, capacity: int, is_bid: bool):
+        self.capacity = capacity
+        self.is_bid = is_bid
+        self.keys = np.zeros(capacity, dtype=np.float64)
+        self.sizes = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+    def _key(self, price: float) -> float:
+        return -price if self.is_bid else price
+
+    def prices(self) -> np.ndarray:
+        keys = self.keys[:self.count]
+        return -keys if self.is_bid else keys
+
+    def clear(self):
+        self.count = 0
+
+    def load(self, levels: List[List[str]]):
+        """Загружает snapshot"""
+        n = min(len(levels), self.capacity)
+        if n == 0:
+            self.count = 0
+            return
+        data = np.array(levels[:n], dtype=np.float64)
+        keys = -data[:, 0] if self.is_bid else data[:, 0]
+        order = np.argsort(keys, kind='stable')
+        self.keys[:n] = keys[order]
+        self.sizes[:n] = data[order, 1]
+        self.count = n
+
+    def update(self, price: float, size: float):
+        """Применяет одно изменение уровня из delta (size == 0 - удаление)"""
+        key = self._key(price)
+        n = self.count
+        i = int(np.searchsorted(self.keys[:n], key))
+        found = i < n and self.keys[i] == key
+
+        if size == 0:
+            if found:
+                self.keys[i:n - 1] = self.keys[i + 1:n]
+                self.sizes[i:n - 1] = self.sizes[i + 1:n]
+                self.count = n - 1
+            return
+
+        if found:
+            self.sizes[i] = size
+            return
+
+        if n == self.capacity:
+            if i >= n:
+                return  # Уровень хуже самого глубокого - за пределами нашей глубины
+            n -= 1      # Вытесняем самый дальний уровень
+        self.keys[i + 1:n + 1] = self.keys[i:n]
+        self.sizes[i + 1:n + 1] = self.sizes[i:n]
+        self.keys[i] = key
+        self.sizes[i] = size
+        self.count = n + 1
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        if self.count == 0:
+            return None
+        price = -self.keys[0] if self.is_bid else self.keys[0]
+        return float(price), float(self.sizes[0])
+
+    def fill(self, qty: float) -> Optional[Tuple[float, float]]:
+        """Средняя цена и худшая цена исполнения qty; None - не хватает глубины"""
+        if qty <= 0 or self.count == 0:
+            return None
+        sizes = self.sizes[:self.count]
+        cumulative = np.cumsum(sizes)
+        last = int(np.searchsorted(cumulative, qty))
+        if last >= self.count:
+            return None
+        prices = self.prices()
+        taken = sizes[:last + 1].copy()
+        taken[last] -= cumulative[last] - qty
+        avg_price = float(np.dot(prices[:last + 1], taken) / qty)
+        return avg_price, float(prices[last])
+
+    def depth_to_notional(self, notional: float) -> Optional[Tuple[float, float]]:
+        """Объем и худшая цена, которые нужно пройти, чтобы набрать notional в USDT"""
+        if notional <= 0 or self.count == 0:
+            return None
+        prices = self.prices()
+        sizes = self.sizes[:self.count]
+        cumulative = np.cumsum(prices * sizes)
+        last = int(np.searchsorted(cumulative, notional))
+        if last >= self.count:
+            return None
+        remaining = notional - (cumulative[last - 1] if last > 0 else 0.0)
+        qty = float(sizes[:last].sum() + remaining / prices[last])
+        return qty, float(prices[last])
+
+
+class OrderBook:
+    """Локальная копия стакана одного символа"""
+
+    def __init__(self, symbol: str, depth: int = 50):
+        self.symbol = symbol
+        self.depth = depth
+        self.bids = BookSide(depth, is_bid=True)
+        self.asks = BookSide(depth, is_bid=False)
+        self.update_id = 0
+        self.ts = 0                 # Время биржи (мс)
+        self.received_at = 0.0      # Локальное время последнего обновления (monotonic)
+        self._lock = threading.Lock()
+
+    def apply_message(self, message: dict):
+        """Применяет сообщение orderbook.{depth}.{symbol} из WebSocket"""
+        data = message.get('data') or {}
+        update_id = int(data.get('u', 0))
+        with self._lock:
+            # Bybit: snapshot или u == 1 (перезапуск сервиса) - полная замена стакана
+            if message.get('type') == 'snapshot' or update_id == 1:
+                self.bids.load(data.get('b', []))
+                self.asks.load(data.get('a', []))
+            else:
+                for price, size in data.get('b', []):
+                    self.bids.update(float(price), float(size))
+                for price, size in data.get('a', []):
+                    self.asks.update(float(price), float(size))
+            self.update_id = update_id
+            self.ts = int(message.get('ts') or 0)
+            self.received_at = time.monotonic()
+
+    def is_fresh(self, max_age: float = 5.0) -> bool:
+        return self.received_at > 0 and time.monotonic() - self.received_at <= max_age
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            return self.asks.best()
+
+    def mid_price(self) -> Optional[float]:
+        with self._lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        if not bid or not ask:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def _side_for(self, side: str) -> BookSide:
+        return self.asks if side == SIDE_BUY else self.bids
+
+    def depth_to_notional(self, side: str, notional: float) -> Optional[Tuple[float, float]]:
+        """(qty, худшая цена) для рыночного ордера side на сумму notional USDT"""
+        with self._lock:
+            return self._side_for(side).depth_to_notional(notional)
+
+    def estimate_fill_price(self, side: str, qty: float) -> Optional[float]:
+        """Оценка средней цены исполнения рыночного ордера side на qty"""
+        with self._lock:
+            result = self._side_for(side).fill(qty)
+        return result[0] if result else None
+
+    def estimate_slippage_percent(self, side: str, qty: float) -> Optional[float]:
+        """Проскальзывание относительно лучшей цены стороны исполнения (в процентах)"""
+        with self._lock:
+            book_side = self._side_for(side)
+            best = book_side.best()
+            result = book_side.fill(qty)
+        if not best or not result:
+            return None
+        return abs(result[0] - best[0]) / best[0] * 100
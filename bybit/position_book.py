@@ -0,0 +1,185 @@
+"""
+Книга позиций хоста стратегий в параллельных массивах NumPy
+
+Каждая стратегия хоста занимает слот книги и после любого изменения
+состояния публикует в него свои ближайшие пороги (таблица порогов
+bybit/trigger_table.py: уровень усреднения, стоп-лосс, безубыток, TP,
+шаг безубытка, фиктивный TP, пик прибыли) и время следующей плановой
+проверки позиции. Тики всех символов копятся в пачку, и раз в interval
+одна векторная проверка находит символы, у которых пересечен порог или
+подошла проверка по времени. Только эти тики попадают в ящик стратегии
+и проходят полный Python-путь; остальные стоят одно сравнение в массиве.
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+BATCH_INTERVAL = 0.01   # Как часто проверяется накопленная пачка тиков (секунды)
+INITIAL_CAPACITY = 256  # Начальное число слотов; при нехватке массивы удваиваются
+
+
+class PositionBook:
+    """
+    Слоты символов с порогами:
+      upper_last  - срабатывает при last >= порога
+      upper_close - при цене закрытия шорта (max(last, ask)) >= порога
+      lower       - при last <= порога
+      due_at      - при времени >= due_at (плановая проверка позиции)
+    Новый слот срабатывает на любом тике, пока стратегия не опубликует пороги.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        self._symbols: List[Optional[str]] = []
+        self._deliver: List[Optional[Callable]] = []
+        self._feeds: Dict[str, object] = {}
+        self._free: List[int] = []
+        self._pending: Dict[int, object] = {}
+        self._allocate(capacity)
+
+        # Статистика
+        self.batches = 0
+        self.ticks = 0
+        self.fired = 0
+
+    def _allocate(self, capacity: int):
+        size = len(self._symbols)
+        self.upper_last = self._grow(getattr(self, 'upper_last', None), capacity, float('-inf'))
+        self.upper_close = self._grow(getattr(self, 'upper_close', None), capacity, float('-inf'))
+        self.lower = self._grow(getattr(self, 'lower', None), capacity, float('inf'))
+        self.due_at = self._grow(getattr(self, 'due_at', None), capacity, float('-inf'))
+        self.last_price = self._grow(getattr(self, 'last_price', None), capacity, float('nan'))
+        self._symbols.extend([None] * (capacity - size))
+        self._deliver.extend([None] * (capacity - size))
+        self._free.extend(range(capacity - 1, size - 1, -1))
+
+    @staticmethod
+    def _grow(array: Optional[np.ndarray], capacity: int, fill: float) -> np.ndarray:
+        grown = np.full(capacity, fill, dtype=np.float64)
+        if array is not None:
+            grown[:len(array)] = array
+        return grown
+
+    # ==================== СЛОТЫ ====================
+
+    def add(self, feed, symbol: str, deliver: Callable) -> int:
+        """Занимает слот символа и подписывает книгу на его тики; deliver(ticker) получает сработавшие тики"""
+        symbol = symbol.upper()
+        with self._lock:
+            if symbol in self._slots:
+                raise ValueError(f"{symbol} уже есть в книге позиций")
+            if not self._free:
+                self._allocate(len(self._symbols) * 2)
+            slot = self._free.pop()
+            self._slots[symbol] = slot
+            self._symbols[slot] = symbol
+            self._deliver[slot] = deliver
+            self._feeds[symbol] = feed
+            self._reset(slot)
+        feed.subscribe(symbol, self.on_ticker)
+        return slot
+
+    def remove(self, symbol: str):
+        """Освобождает слот и отписывает книгу от тиков символа"""
+        symbol = symbol.upper()
+        with self._lock:
+            slot = self._slots.pop(symbol, None)
+            if slot is None:
+                return
+            feed = self._feeds.pop(symbol)
+            self._symbols[slot] = None
+            self._deliver[slot] = None
+            self._pending.pop(slot, None)
+            self._reset(slot)
+            self._free.append(slot)
+        feed.unsubscribe(symbol, self.on_ticker)
+
+    def _reset(self, slot: int):
+        self.upper_last[slot] = float('-inf')
+        self.upper_close[slot] = float('-inf')
+        self.lower[slot] = float('inf')
+        self.due_at[slot] = float('-inf')
+        self.last_price[slot] = float('nan')
+
+    def sync(self, slot: int, upper_last: float, upper_close: float, lower: float, due_at: float):
+        """Публикует ближайшие пороги стратегии (после каждого изменения ее состояния)"""
+        self.upper_last[slot] = upper_last
+        self.upper_close[slot] = upper_close
+        self.lower[slot] = lower
+        self.due_at[slot] = due_at
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    # ==================== ТИКИ ====================
+
+    def on_ticker(self, ticker):
+        """Callback источника тиков (любой поток): в пачке остается самый свежий тик символа"""
+        slot = self._slots.get(ticker.symbol)
+        if slot is not None:
+            with self._lock:
+                self._pending[slot] = ticker
+
+    def evaluate(self, slots: np.ndarray, last: np.ndarray, close: np.ndarray, now: float) -> np.ndarray:
+        """Слоты пачки, у которых пересечен хотя бы один порог или подошла проверка по времени"""
+        self.last_price[slots] = last
+        fired = (
+            (last >= self.upper_last[slots])
+            | (close >= self.upper_close[slots])
+            | (last <= self.lower[slots])
+            | (self.due_at[slots] <= now)
+        )
+        return slots[fired]
+
+    def flush(self) -> int:
+        """Проверяет накопленную пачку и передает сработавшие тики стратегиям; возвращает их число"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            deliver = self._deliver
+        count = len(pending)
+        slots = np.fromiter(pending.keys(), dtype=np.intp, count=count)
+        tickers = list(pending.values())
+        last = np.fromiter((t.last_price for t in tickers), dtype=np.float64, count=count)
+        ask = np.fromiter((t.ask_price for t in tickers), dtype=np.float64, count=count)
+        # Шорт закрывается по ask; без ask (0) - по last. Больший из двух срабатывает не позже точной проверки
+        close = np.maximum(last, ask)
+
+        fired = self.evaluate(slots, last, close, self.clock())
+        self.batches += 1
+        self.ticks += count
+        self.fired += len(fired)
+        for slot in fired.tolist():
+            callback = deliver[slot]
+            if callback is not None:
+                callback(pending[slot])
+        return len(fired)
+
+    async def run(self, interval: float = BATCH_INTERVAL):
+        """Задача хоста: проверка пачки раз в interval"""
+        logger.info(f"[PositionBook] Пакетная проверка тиков раз в {interval * 1000:.0f} мс")
+        while True:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[PositionBook] Ошибка проверки пачки тиков: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict:
+        return {
+            'symbols': len(self._slots),
+            'batches': self.batches,
+            'ticks': self.ticks,
+            'fired': self.fired,
+            'fired_share': self.fired / self.ticks if self.ticks else 0.0,
+        }
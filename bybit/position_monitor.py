@@ -1,6 +1,9 @@
 from pybit.unified_trading import HTTP
 from logger_config import setup_logger
 from config import API_KEY, API_SECRET
+from bybit.account_snapshot import get_account_snapshot
+from bybit.rate_limiter import rate_limited
+from bybit.request_coalescer import coalesced
 import asyncio
 import time
 from typing import Dict, Optional, Callable
@@ -12,7 +15,10 @@ class PositionMonitor:
     """Класс для мониторинга позиций и управления состоянием сделок"""
     
     def __init__(self):
-        self.session = HTTP(api_key=API_KEY, api_secret=API_SECRET, testnet=False)
+        self.session = coalesced(rate_limited(HTTP(api_key=API_KEY, api_secret=API_SECRET, testnet=False), False),
+                                 False)
+        # Позиции всех символов одним опросом аккаунта вместо запроса на каждый символ
+        self.account_snapshot = get_account_snapshot(False)
         self.active_positions: Dict[str, Dict] = {}
         self.monitoring_tasks: Dict[str, asyncio.Task] = {}
         self.stop_callbacks: Dict[str, Callable] = {}
@@ -26,7 +32,8 @@ class PositionMonitor:
                 'qty': qty,
                 'side': side,
                 'status': 'open',
-                'last_check': time.time()
+                'last_check': time.time(),
+                'changed_at': time.time()   # Снимок аккаунта старше не знает о новом размере позиции
             }
             logger.info(f"[PositionMonitor] Добавлена позиция для мониторинга: {symbol}")
     
@@ -44,13 +51,21 @@ class PositionMonitor:
     async def check_position_status(self, symbol: str) -> bool:
         """Проверяет статус позиции через API Bybit"""
         try:
-            response = self.session.get_positions(
-                category="linear",
-                symbol=symbol
-            )
+            positions = None
+            if self.account_snapshot is not None:
+                with self._lock:
+                    since = self.active_positions.get(symbol, {}).get('changed_at', 0.0)
+                positions = self.account_snapshot.positions(symbol, since=since)
+            if positions is None:
+                response = self.session.get_positions(
+                    category="linear",
+                    symbol=symbol
+                )
+                if response.get("retCode") == 0:
+                    positions = response.get("result", {}).get("list", [])
             
-            if response.get("retCode") == 0:
-                positions = response.get("result", {}).get("list", [])
+            # В снимке аккаунта закрытой позиции нет совсем - как и раньше, это "закрыта"
+            if positions is not None:
                 for position in positions:
                     if position.get("symbol") == symbol:
                         qty = float(position.get("size", 0))
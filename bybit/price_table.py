@@ -0,0 +1,272 @@
+"""
+Таблица последних цен в разделяемой памяти (mmap) для всех процессов воркеров
+
+Публикатор рыночных данных - единственный писатель, все дочерние процессы
+Celery читают таблицу без блокировок. Каждая строка защищена seqlock'ом:
+писатель делает счетчик нечетным, пишет значения и делает его четным,
+читатель повторяет чтение, если счетчик нечетный или изменился.
+
+Без публикатора (MARKET_DATA_SOURCE=hub, по умолчанию) таблицу никто не пишет:
+у каждого процесса свой TickerHub, а общий файл допускает одного писателя.
+Тогда читатель отдает цены из хаба своего процесса (attach_local_feed) -
+по символам, на которые процесс подписан.
+
+Формат файла:
+    заголовок: magic (8 байт) | generation | capacity | count  (int64)
+    имена:     capacity * 32 байта (ASCII, дополнены нулями)
+    строки:    capacity * [seq, ts, last, bid, ask, mark] (int64/float64)
+"""
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Dict, NamedTuple, Optional
+
+from bybit.ws_decoder import Ticker
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+MAGIC = b"BBPRICE1"
+HEADER_FORMAT = "<8sqqq"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+NAME_SIZE = 32
+ROW_WORDS = 6             # seq, ts, last, bid, ask, mark
+ROW_SIZE = ROW_WORDS * 8
+DEFAULT_CAPACITY = 4096
+MAX_READ_RETRIES = 100
+
+# Позиции полей заголовка в int64-представлении (после magic)
+_GENERATION_WORD = 1
+_CAPACITY_WORD = 2
+_COUNT_WORD = 3
+
+
+def default_table_path() -> str:
+    """Путь к файлу таблицы: /dev/shm (память), иначе временный каталог"""
+    path = os.getenv('PRICE_TABLE_PATH')
+    if path:
+        return path
+    shm_dir = "/dev/shm"
+    base_dir = shm_dir if os.path.isdir(shm_dir) else tempfile.gettempdir()
+    return os.path.join(base_dir, "bybit_price_table")
+
+
+def _table_size(capacity: int) -> int:
+    return HEADER_SIZE + capacity * NAME_SIZE + capacity * ROW_SIZE
+
+
+class PriceRow(NamedTuple):
+    symbol: str
+    ts: int          # Время биржи (мс)
+    last: float
+    bid: float
+    ask: float
+    mark: float
+
+
+class _TableView:
+    """Общая разметка файла для писателя и читателя"""
+
+    def _map(self, mm: mmap.mmap, capacity: int):
+        self._mm = mm
+        self.capacity = capacity
+        self._header = memoryview(mm)[:HEADER_SIZE].cast('q')
+        names_end = HEADER_SIZE + capacity * NAME_SIZE
+        self._names = memoryview(mm)[HEADER_SIZE:names_end]
+        rows = memoryview(mm)[names_end:names_end + capacity * ROW_SIZE]
+        self._ints = rows.cast('q')
+        self._floats = rows.cast('d')
+
+    def _read_name(self, index: int) -> str:
+        raw = bytes(self._names[index * NAME_SIZE:(index + 1) * NAME_SIZE])
+        return raw.rstrip(b"\x00").decode('ascii')
+
+    def close(self):
+        self._header.release()
+        self._names.release()
+        self._ints.release()
+        self._floats.release()
+        self._mm.close()
+        self._mm = None
+
+
+class PriceTableWriter(_TableView):
+    """Писатель таблицы (единственный - публикатор рыночных данных)"""
+
+    def __init__(self, path: Optional[str] = None, capacity: int = DEFAULT_CAPACITY):
+        self.path = path or default_table_path()
+        self._index: Dict[str, int] = {}
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = _table_size(capacity)
+            generation = 0
+            if os.fstat(fd).st_size >= HEADER_SIZE:
+                magic, generation, _, _ = struct.unpack(
+                    HEADER_FORMAT, os.pread(fd, HEADER_SIZE, 0)
+                )
+                # Поколение растет и при смене емкости - иначе читатель не заметит новую разметку
+                if magic != MAGIC:
+                    generation = 0
+            # Файл только растет: читатели со старой разметкой не выйдут за его конец (SIGBUS)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            mm = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+
+        self._map(mm, capacity)
+        # Новое поколение: читатели сбросят закэшированные индексы символов
+        mm[:HEADER_SIZE] = struct.pack(HEADER_FORMAT, MAGIC, generation + 1, capacity, 0)
+        # Имена и строки с нуля: при смене емкости на их месте лежит старая разметка
+        mm[HEADER_SIZE:] = bytes(len(mm) - HEADER_SIZE)
+        logger.info(f"[PriceTable] Таблица цен создана: {self.path} (емкость {capacity})")
+
+    def _symbol_index(self, symbol: str) -> Optional[int]:
+        index = self._index.get(symbol)
+        if index is not None:
+            return index
+
+        index = len(self._index)
+        if index >= self.capacity:
+            logger.error(f"[PriceTable] Таблица заполнена, {symbol} не добавлен")
+            return None
+        name = symbol.encode('ascii')[:NAME_SIZE]
+        self._names[index * NAME_SIZE:index * NAME_SIZE + len(name)] = name
+        self._index[symbol] = index
+        # Счетчик увеличиваем после записи имени - читатель не увидит пустую строку
+        self._header[_COUNT_WORD] = index + 1
+        return index
+
+    def update(self, symbol: str, last: float, bid: float = 0.0, ask: float = 0.0,
+               mark: float = 0.0, ts: Optional[int] = None):
+        """Записывает цены символа"""
+        index = self._symbol_index(symbol)
+        if index is None:
+            return
+        base = index * ROW_WORDS
+        seq = self._ints[base]
+        self._ints[base] = seq + 1          # нечетный - запись идет
+        self._ints[base + 1] = int(ts if ts else time.time() * 1000)
+        self._floats[base + 2] = last
+        self._floats[base + 3] = bid
+        self._floats[base + 4] = ask
+        self._floats[base + 5] = mark
+        self._ints[base] = seq + 2          # четный - запись завершена
+
+    def update_from_ticker(self, ticker: Ticker):
+        """Записывает цены из склеенного тикера (bybit/ws_decoder.py)"""
+        if ticker.last_price <= 0:
+            return
+        self.update(
+            ticker.symbol,
+            ticker.last_price,
+            ticker.bid_price,
+            ticker.ask_price,
+            ticker.mark_price,
+            ticker.ts,
+        )
+
+
+class PriceTable(_TableView):
+    """Читатель таблицы: чтение из памяти без блокировок и без REST"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_table_path()
+        self._mm = None
+        self._index: Dict[str, int] = {}
+        self._generation = None
+        self._known = 0
+        self.local_feed = None      # Источник тиков процесса, если таблицу никто не пишет
+
+    def attach_local_feed(self, feed):
+        """Цены символов, которых нет в таблице, берутся из последних тикеров feed (TickerHub)"""
+        self.local_feed = feed
+
+    def _open(self) -> bool:
+        if self._mm is not None:
+            return True
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(HEADER_SIZE)
+                if len(header) < HEADER_SIZE:
+                    return False
+                magic, _, capacity, _ = struct.unpack(HEADER_FORMAT, header)
+                if magic != MAGIC:
+                    return False
+                mm = mmap.mmap(f.fileno(), _table_size(capacity), access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        self._map(mm, capacity)
+        return True
+
+    def _lookup(self, symbol: str) -> Optional[int]:
+        generation = self._header[_GENERATION_WORD]
+        if generation != self._generation:
+            if self._header[_CAPACITY_WORD] != self.capacity:
+                # Писатель перезапущен с другой емкостью - разметка файла сменилась
+                self.close()
+                if not self._open():
+                    return None
+                generation = self._header[_GENERATION_WORD]
+            self._generation = generation
+            self._index.clear()
+            self._known = 0
+
+        index = self._index.get(symbol)
+        if index is not None:
+            return index
+
+        # Дочитываем имена, добавленные писателем после прошлого поиска
+        count = min(self._header[_COUNT_WORD], self.capacity)
+        for i in range(self._known, count):
+            self._index[self._read_name(i)] = i
+        self._known = count
+        return self._index.get(symbol)
+
+    def get(self, symbol: str) -> Optional[PriceRow]:
+        """Возвращает строку цен символа или None, если символа нет ни в таблице, ни в хабе процесса"""
+        symbol = symbol.upper()
+        row = self._get_shared(symbol)
+        if self.local_feed is not None:
+            # Файл мог остаться от прежнего запуска публикатора - берем более свежую строку
+            ticker = self.local_feed.get_last_ticker(symbol)
+            if ticker is not None and (row is None or ticker.ts > row.ts):
+                row = PriceRow(symbol, ticker.ts, ticker.last_price, ticker.bid_price, ticker.ask_price,
+                               ticker.mark_price)
+        return row
+
+    def _get_shared(self, symbol: str) -> Optional[PriceRow]:
+        if not self._open():
+            return None
+        index = self._lookup(symbol)
+        if index is None:
+            return None
+
+        base = index * ROW_WORDS
+        ints = self._ints
+        floats = self._floats
+        for _ in range(MAX_READ_RETRIES):
+            seq = ints[base]
+            if seq & 1:
+                continue
+            row = PriceRow(symbol, ints[base + 1], floats[base + 2], floats[base + 3],
+                           floats[base + 4], floats[base + 5])
+            if ints[base] == seq:
+                return row if seq else None
+        return None
+
+    def get_last_price(self, symbol: str, max_age: float = 5.0) -> Optional[float]:
+        """Возвращает последнюю цену, если она не старше max_age секунд"""
+        row = self.get(symbol)
+        if row is None or row.last <= 0:
+            return None
+        if time.time() - row.ts / 1000 > max_age:
+            return None
+        return row.last
+
+
+# Глобальный читатель таблицы цен (один на процесс)
+price_table = PriceTable()
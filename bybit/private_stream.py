@@ -0,0 +1,280 @@
+"""
+Приватный WebSocket Bybit: ордера, исполнения и позиции аккаунта
+
+Вместо опроса REST (get_open_orders + get_order_history каждые 0.1 сек,
+get_positions каждые 5 секунд на каждый символ) держим ОДНО авторизованное
+соединение на аккаунт с топиками order, execution и position категории
+linear. Биржа сама присылает смену статуса ордера, исполнения и новый
+размер/avgPrice позиции, а события раздаются подписчикам по символу.
+
+Callback подписчика получает (kind, item): kind - 'order', 'execution',
+'position' или 'resync'. 'resync' приходит после переподключения: события
+за время обрыва потеряны, и подписчик один раз сверяется с биржей через REST.
+"""
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import websocket
+
+from bybit.feed_watchdog import backoff_delay
+from config import API_KEY, API_SECRET, DEMO_API_KEY, DEMO_API_SECRET
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+PRIVATE_WS_URL = "wss://stream.bybit.com/v5/private"
+DEMO_PRIVATE_WS_URL = "wss://stream-demo.bybit.com/v5/private"
+PRIVATE_TOPICS = ("order.linear", "execution.linear", "position.linear")
+PING_INTERVAL = 20          # Bybit закрывает соединение без пинга ~30 секунд
+AUTH_EXPIRES = 10           # Срок действия подписи авторизации (секунды)
+
+EVENT_ORDER = "order"
+EVENT_EXECUTION = "execution"
+EVENT_POSITION = "position"
+EVENT_RESYNC = "resync"
+
+
+def auth_args(api_key: str, api_secret: str, expires: Optional[int] = None) -> List:
+    """Аргументы op=auth: подпись HMAC-SHA256 строки "GET/realtime{expires}" (expires - мс)"""
+    if expires is None:
+        expires = int((time.time() + AUTH_EXPIRES) * 1000)
+    signature = hmac.new(
+        api_secret.encode("utf-8"), f"GET/realtime{expires}".encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    return [api_key, expires, signature]
+
+
+class PrivateStream:
+    """Одно авторизованное соединение на аккаунт, события раздаются подписчикам по символу"""
+
+    def __init__(self, api_key: str, api_secret: str, url: str = PRIVATE_WS_URL):
+        self.url = url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._lock = threading.RLock()
+        self._callbacks: Dict[str, List[Callable]] = {}   # символ -> callback'и
+        self._positions: Dict[str, Dict] = {}             # символ -> последнее состояние позиции
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ping_thread: Optional[threading.Thread] = None
+        self._connected = threading.Event()
+        self._ready = threading.Event()    # Авторизованы и подписаны на топики
+        self._running = False
+        self._reconnect_attempt = 0
+        self._was_ready = False
+
+        # Статистика
+        self.messages_received = 0
+        self.events_dispatched = 0
+        self.reconnects = 0
+
+    # ==================== ПОДПИСКИ ====================
+
+    def subscribe(self, symbol: str, callback: Callable):
+        """Добавляет callback событий символа; соединение открывается только один раз"""
+        symbol = symbol.upper()
+        with self._lock:
+            callbacks = self._callbacks.setdefault(symbol, [])
+            callbacks.append(callback)
+            self._ensure_started()
+        logger.info(f"[PrivateStream] Подписка на события {symbol} (подписчиков: {len(callbacks)})")
+
+    def unsubscribe(self, symbol: str, callback: Callable):
+        """Удаляет callback; топики аккаунта общие, соединение остается открытым"""
+        symbol = symbol.upper()
+        with self._lock:
+            callbacks = self._callbacks.get(symbol)
+            if not callbacks or callback not in callbacks:
+                return
+            callbacks.remove(callback)
+            if not callbacks:
+                del self._callbacks[symbol]
+                self._positions.pop(symbol, None)
+        logger.info(f"[PrivateStream] Отписка от событий {symbol}")
+
+    def get_position(self, symbol: str) -> Optional[Dict]:
+        """Последнее состояние позиции символа из потока (если было событие)"""
+        with self._lock:
+            return self._positions.get(symbol.upper())
+
+    def get_symbols(self) -> List[str]:
+        with self._lock:
+            return list(self._callbacks)
+
+    def is_connected(self) -> bool:
+        """Соединение авторизовано и подписано: событиям можно верить вместо опроса REST"""
+        return self._ready.is_set()
+
+    # ==================== СОЕДИНЕНИЕ ====================
+
+    def _ensure_started(self):
+        """Запускает поток соединения при первой подписке"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run_forever, name="PrivateStream", daemon=True)
+        self._thread.start()
+        self._ping_thread = threading.Thread(target=self._ping_loop, name="PrivateStreamPing", daemon=True)
+        self._ping_thread.start()
+
+    def _run_forever(self):
+        """Держит соединение открытым и переподключается при обрыве"""
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            try:
+                self._ws.run_forever()
+            except Exception as e:
+                logger.error(f"[PrivateStream] Ошибка соединения: {e}")
+            self._connected.clear()
+            self._ready.clear()
+
+            if self._running:
+                self.reconnects += 1
+                delay = backoff_delay(self._reconnect_attempt)
+                self._reconnect_attempt += 1
+                logger.warning(f"[PrivateStream] Соединение потеряно, переподключение через {delay:.1f} сек")
+                time.sleep(delay)
+
+    def _ping_loop(self):
+        """Отправляет ping, чтобы Bybit не закрыл соединение"""
+        while self._running:
+            time.sleep(PING_INTERVAL)
+            if self._connected.is_set():
+                self._send({"op": "ping"})
+
+    def close(self):
+        """Закрывает соединение и останавливает потоки"""
+        self._running = False
+        self._connected.clear()
+        self._ready.clear()
+        if self._ws:
+            try:
+                self._ws.close()
+            except Exception as e:
+                logger.warning(f"[PrivateStream] Ошибка при закрытии WebSocket: {e}")
+        logger.info("[PrivateStream] Соединение закрыто")
+
+    def _send(self, payload: Dict) -> bool:
+        ws = self._ws
+        if not ws or not self._connected.is_set():
+            return False
+        try:
+            ws.send(json.dumps(payload))
+            return True
+        except Exception as e:
+            logger.warning(f"[PrivateStream] Не удалось отправить {payload.get('op')}: {e}")
+            return False
+
+    # ==================== CALLBACK'И WEBSOCKET ====================
+
+    def _on_open(self, ws):
+        self._connected.set()
+        logger.info("[PrivateStream] Соединение открыто, авторизация...")
+        self._send({"op": "auth", "args": auth_args(self.api_key, self.api_secret)})
+
+    def _on_error(self, ws, error):
+        logger.error(f"[PrivateStream] Ошибка WebSocket: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        self._connected.clear()
+        self._ready.clear()
+        logger.info(f"[PrivateStream] Соединение закрыто: {status_code} {message}")
+
+    def _on_message(self, ws, raw: str):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"[PrivateStream] Некорректное сообщение: {raw[:200]}")
+            return
+
+        op = message.get('op')
+        if op is not None:
+            self._on_op(op, message)
+            return
+
+        topic = message.get('topic', '')
+        kind = topic.split('.', 1)[0]
+        if kind not in (EVENT_ORDER, EVENT_EXECUTION, EVENT_POSITION):
+            return
+        self.messages_received += 1
+        for item in message.get('data') or []:
+            symbol = item.get('symbol')
+            if not symbol:
+                continue
+            with self._lock:
+                callbacks = self._callbacks.get(symbol)
+                if not callbacks:
+                    continue
+                callbacks = list(callbacks)
+                if kind == EVENT_POSITION:
+                    self._positions[symbol] = item
+            self._dispatch(symbol, callbacks, kind, item)
+
+    def _on_op(self, op: str, message: Dict):
+        if op == 'auth':
+            if not message.get('success'):
+                # Неверные ключи - переподключение не поможет, остаемся на опросе REST
+                logger.error(f"[PrivateStream] Ошибка авторизации: {message.get('ret_msg')}")
+                return
+            self._send({"op": "subscribe", "args": list(PRIVATE_TOPICS)})
+        elif op == 'subscribe':
+            if not message.get('success'):
+                logger.error(f"[PrivateStream] Ошибка подписки: {message.get('ret_msg')}")
+                return
+            self._reconnect_attempt = 0
+            self._ready.set()
+            logger.info(f"[PrivateStream] Подписка на {', '.join(PRIVATE_TOPICS)} активна")
+            if self._was_ready:
+                # События за время обрыва потеряны - подписчики сверятся с биржей через REST
+                with self._lock:
+                    subscribers = [(symbol, list(callbacks)) for symbol, callbacks in self._callbacks.items()]
+                for symbol, callbacks in subscribers:
+                    self._dispatch(symbol, callbacks, EVENT_RESYNC, {'symbol': symbol})
+            self._was_ready = True
+
+    def _dispatch(self, symbol: str, callbacks: List[Callable], kind: str, item: Dict):
+        """Раздает событие всем подписчикам символа; ошибка одного не мешает остальным"""
+        self.events_dispatched += 1
+        for callback in callbacks:
+            try:
+                callback(kind, item)
+            except Exception as e:
+                logger.error(f"[PrivateStream] Ошибка в callback для {symbol} ({kind}): {e}", exc_info=True)
+
+    def stats(self) -> Dict:
+        return {
+            'connected': self.is_connected(),
+            'symbols': len(self._callbacks),
+            'messages': self.messages_received,
+            'events': self.events_dispatched,
+            'reconnects': self.reconnects,
+        }
+
+
+# Глобальные экземпляры приватного потока (один на аккаунт в процессе)
+_streams: Dict[bool, PrivateStream] = {}
+_streams_lock = threading.Lock()
+
+
+def get_private_stream(use_demo: bool) -> Optional[PrivateStream]:
+    """Возвращает приватный поток аккаунта (демо или реальный); без ключей - None"""
+    api_key = DEMO_API_KEY if use_demo else API_KEY
+    api_secret = DEMO_API_SECRET if use_demo else API_SECRET
+    if not api_key or not api_secret:
+        return None
+    with _streams_lock:
+        stream = _streams.get(use_demo)
+        if stream is None:
+            stream = PrivateStream(api_key, api_secret, DEMO_PRIVATE_WS_URL if use_demo else PRIVATE_WS_URL)
+            _streams[use_demo] = stream
+        return stream
@@ -0,0 +1,403 @@
+"""
+Лимитер запросов к Bybit, общий для всех воркеров и процессов аккаунта
+
+Bybit ограничивает частоту запросов по каждому эндпоинту на аккаунт (UID)
+и общее число запросов с одного IP. Опрос ордеров и позиций десятков
+стратегий легко выбирает этот бюджет, и тогда отказ (10006 / HTTP 403)
+получает уже ордер на вход или отмена.
+
+Перед запросом берется токен из двух корзин (token bucket): корзины группы
+эндпоинтов аккаунта и общей корзины IP. Состояние корзин лежит в Redis и
+меняется атомарно Lua-скриптом, поэтому все процессы делят один бюджет;
+без Redis корзины живут в памяти процесса.
+
+Приоритет: ордера и отмены (PRIORITY_ORDER) берут токены до нуля, а опрос
+(PRIORITY_READ) - только пока в корзине остается резерв (доля емкости).
+Лимиты группы калибруются по заголовкам ответа X-Bapi-Limit (лимит в
+секунду), X-Bapi-Limit-Status (остаток) и X-Bapi-Limit-Reset-Timestamp.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import RATE_LIMIT_ENABLED, RATE_LIMIT_READ_RESERVE
+from database import redis_client
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+KEY_PREFIX = "rate_limit:"      # Hash корзины: rate_limit:{account}:{group}
+IP_GROUP = "ip"                 # Общая корзина всех запросов с IP (без аккаунта в ключе)
+BUCKET_TTL_MS = 60_000          # Корзина без запросов минуту - снова полная
+MAX_READ_WAIT = 5.0             # Опрос ждет токен не дольше (секунды), потом идет без него
+
+PRIORITY_ORDER = 0
+PRIORITY_READ = 1
+
+# Лимиты по умолчанию: группа -> (запросов в секунду, емкость корзины)
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    'order_create': (10, 10),
+    'order_amend': (10, 10),
+    'order_cancel': (10, 10),
+    'trading_stop': (10, 10),
+    'order_read': (50, 50),
+    'position_read': (50, 50),
+    'market': (120, 600),
+    IP_GROUP: (120, 600),        # 600 запросов за 5 секунд с IP
+}
+
+# Путь REST -> (группа, приоритет)
+ENDPOINT_GROUPS: Dict[str, Tuple[str, int]] = {
+    "/v5/order/create": ('order_create', PRIORITY_ORDER),
+    "/v5/order/create-batch": ('order_create', PRIORITY_ORDER),
+    "/v5/order/amend": ('order_amend', PRIORITY_ORDER),
+    "/v5/order/cancel": ('order_cancel', PRIORITY_ORDER),
+    "/v5/order/cancel-all": ('order_cancel', PRIORITY_ORDER),
+    "/v5/position/trading-stop": ('trading_stop', PRIORITY_ORDER),
+    "/v5/order/realtime": ('order_read', PRIORITY_READ),
+    "/v5/order/history": ('order_read', PRIORITY_READ),
+    "/v5/position/list": ('position_read', PRIORITY_READ),
+    "/v5/market/tickers": ('market', PRIORITY_READ),
+    "/v5/market/instruments-info": ('market', PRIORITY_READ),
+}
+
+# Метод pybit.HTTP -> путь REST
+METHOD_PATHS: Dict[str, str] = {
+    'place_order': "/v5/order/create",
+    'place_batch_order': "/v5/order/create-batch",
+    'amend_order': "/v5/order/amend",
+    'cancel_order': "/v5/order/cancel",
+    'cancel_all_orders': "/v5/order/cancel-all",
+    'set_trading_stop': "/v5/position/trading-stop",
+    'get_open_orders': "/v5/order/realtime",
+    'get_order_history': "/v5/order/history",
+    'get_positions': "/v5/position/list",
+    'get_tickers': "/v5/market/tickers",
+    'get_instruments_info': "/v5/market/instruments-info",
+}
+
+# Взять cost токенов из обеих корзин или ни из одной.
+# KEYS: корзина группы, корзина IP. ARGV: now_ms, cost, reserve, ttl_ms, rate1, cap1, rate2, cap2.
+# Ответ: 0 - токены взяты, иначе сколько мс ждать.
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local wait = 0
+local tokens = {}
+for i = 1, 2 do
+    local rate = tonumber(ARGV[3 + i * 2])
+    local cap = tonumber(ARGV[4 + i * 2])
+    local b = redis.call('HMGET', KEYS[i], 'tokens', 'ts', 'rate', 'cap')
+    if b[3] then rate = tonumber(b[3]) end
+    if b[4] then cap = tonumber(b[4]) end
+    local level = tonumber(b[1]) or cap
+    local ts = tonumber(b[2]) or now
+    level = math.min(cap, level + math.max(0, now - ts) * rate / 1000)
+    local need = cost + reserve * cap
+    if level < need then
+        wait = math.max(wait, math.ceil((need - level) * 1000 / rate))
+    end
+    tokens[i] = level
+end
+if wait > 0 then
+    return wait
+end
+for i = 1, 2 do
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i] - cost), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], tonumber(ARGV[4]))
+end
+return 0
+"""
+
+# Калибровка по заголовкам ответа.
+# KEYS: корзина группы. ARGV: now_ms, limit, remaining, reset_ms, ttl_ms.
+CALIBRATE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local remaining = tonumber(ARGV[3])
+local reset = tonumber(ARGV[4])
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate', 'cap')
+local rate = tonumber(b[3]) or limit
+local level = tonumber(b[1]) or limit
+local ts = tonumber(b[2]) or now
+level = math.min(limit, level + math.max(0, now - ts) * rate / 1000)
+if remaining < level then
+    level = remaining
+    if remaining <= 0 and reset > now then
+        now = reset
+    end
+end
+redis.call('HSET', KEYS[1], 'rate', tostring(limit), 'cap', tostring(limit),
+           'tokens', tostring(level), 'ts', tostring(math.max(now, ts)))
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[5]))
+return 0
+"""
+
+
+def bucket_key(account: str, group: str) -> str:
+    if group == IP_GROUP:
+        return f"{KEY_PREFIX}{IP_GROUP}"
+    return f"{KEY_PREFIX}{account}:{group}"
+
+
+def _header(headers, name: str) -> Optional[str]:
+    """Заголовок без учета регистра (requests, aiohttp и обычный dict)"""
+    if not headers:
+        return None
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, item in headers.items():
+            if key.lower() == lowered:
+                return item
+    return value
+
+
+class _LocalBuckets:
+    """Те же корзины в памяти процесса (без Redis) - логика скриптов ACQUIRE/CALIBRATE"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+
+    def _level(self, key: str, now: float, rate: float, cap: float) -> Tuple[Dict[str, float], float, float]:
+        bucket = self._buckets.get(key)
+        if bucket is None or now - bucket['ts'] > BUCKET_TTL_MS:
+            bucket = {'tokens': cap, 'ts': now}
+        rate = bucket.get('rate', rate)
+        cap = bucket.get('cap', cap)
+        level = min(cap, bucket['tokens'] + max(0.0, now - bucket['ts']) * rate / 1000)
+        return bucket, level, rate
+
+    def acquire(self, keys, now: float, cost: float, reserve: float, limits) -> int:
+        with self._lock:
+            wait = 0
+            levels = []
+            for key, (rate, cap) in zip(keys, limits):
+                bucket, level, rate = self._level(key, now, rate, cap)
+                need = cost + reserve * bucket.get('cap', cap)
+                if level < need:
+                    wait = max(wait, int(-(-(need - level) * 1000 // rate)))
+                levels.append((key, bucket, level))
+            if wait > 0:
+                return wait
+            for key, bucket, level in levels:
+                bucket.update(tokens=level - cost, ts=now)
+                self._buckets[key] = bucket
+            return 0
+
+    def calibrate(self, key: str, now: float, limit: float, remaining: float, reset: float):
+        with self._lock:
+            bucket, level, _ = self._level(key, now, limit, limit)
+            level = min(limit, level)
+            ts = now
+            if remaining < level:
+                level = remaining
+                if remaining <= 0 and reset > now:
+                    ts = reset
+            bucket.update(rate=limit, cap=limit, tokens=level, ts=max(ts, bucket['ts']))
+            self._buckets[key] = bucket
+
+
+class RateLimiter:
+    """Корзины токенов аккаунта: общие через Redis или в памяти процесса"""
+
+    def __init__(self, account: str = "main", redis=None, read_reserve: float = RATE_LIMIT_READ_RESERVE,
+                 limits: Optional[Dict[str, Tuple[float, float]]] = None, max_read_wait: float = MAX_READ_WAIT):
+        """
+        Args:
+            account: Имя аккаунта в ключах корзин (у демо-счета свой бюджет)
+            redis: Клиент Redis; None - корзины в памяти процесса
+            read_reserve: Доля емкости корзины, которую опрос оставляет ордерам
+        """
+        self.account = account
+        self.redis = redis
+        self.read_reserve = read_reserve
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.max_read_wait = max_read_wait
+        self._local = _LocalBuckets()
+        self._acquire_script = redis.register_script(ACQUIRE_SCRIPT) if redis is not None else None
+        self._calibrate_script = redis.register_script(CALIBRATE_SCRIPT) if redis is not None else None
+
+        # Статистика
+        self.granted = {PRIORITY_ORDER: 0, PRIORITY_READ: 0}
+        self.waited = {PRIORITY_ORDER: 0.0, PRIORITY_READ: 0.0}   # Суммарное ожидание (секунды)
+        self.overdrafts = 0       # Опрос, ушедший без токена после MAX_READ_WAIT
+        self.calibrations = 0
+        self.redis_errors = 0
+
+    # ==================== ТОКЕНЫ ====================
+
+    def try_acquire(self, group: str, cost: float = 1, priority: int = PRIORITY_READ) -> int:
+        """Берет cost токенов группы и IP; 0 - взяты, иначе через сколько мс повторить"""
+        keys = (bucket_key(self.account, group), bucket_key(self.account, IP_GROUP))
+        limits = (self.limits.get(group, self.limits[IP_GROUP]), self.limits[IP_GROUP])
+        reserve = self.read_reserve if priority == PRIORITY_READ else 0.0
+        now = int(time.time() * 1000)
+        if self._acquire_script is not None:
+            try:
+                return int(self._acquire_script(
+                    keys=list(keys),
+                    args=[now, cost, reserve, BUCKET_TTL_MS, *limits[0], *limits[1]],
+                ))
+            except Exception as e:
+                # Redis недоступен - бюджет считаем в памяти процесса, запросы не останавливаем
+                self.redis_errors += 1
+                logger.warning(f"[RateLimiter] Ошибка Redis, корзины в памяти процесса: {e}")
+        return self._local.acquire(keys, now, cost, reserve, limits)
+
+    def acquire(self, group: str, cost: float = 1, priority: int = PRIORITY_READ) -> float:
+        """Ждет токены (блокирует поток); возвращает время ожидания в секундах"""
+        started = time.monotonic()
+        while True:
+            wait_ms = self.try_acquire(group, cost, priority)
+            waited = time.monotonic() - started
+            if wait_ms == 0 or self._give_up(priority, waited):
+                return self._granted(priority, waited)
+            time.sleep(self._pause(wait_ms, priority))
+
+    async def acquire_async(self, group: str, cost: float = 1, priority: int = PRIORITY_READ) -> float:
+        """То же без блокировки event loop"""
+        started = time.monotonic()
+        while True:
+            wait_ms = self.try_acquire(group, cost, priority)
+            waited = time.monotonic() - started
+            if wait_ms == 0 or self._give_up(priority, waited):
+                return self._granted(priority, waited)
+            await asyncio.sleep(self._pause(wait_ms, priority))
+
+    async def acquire_path_async(self, path: str, params: Dict) -> str:
+        """Токены для запроса REST по пути; возвращает группу для calibrate"""
+        group, priority = endpoint_group(path)
+        await self.acquire_async(group, request_cost(params), priority)
+        return group
+
+    def _give_up(self, priority: int, waited: float) -> bool:
+        if priority == PRIORITY_READ and waited >= self.max_read_wait:
+            self.overdrafts += 1
+            return True
+        return False
+
+    @staticmethod
+    def _pause(wait_ms: int, priority: int) -> float:
+        # Ордер проверяет корзину чаще: токен, освободившийся раньше расчета, достанется ему
+        pause = wait_ms / 1000
+        return min(pause, 0.01) if priority == PRIORITY_ORDER else pause
+
+    def _granted(self, priority: int, waited: float) -> float:
+        self.granted[priority] += 1
+        self.waited[priority] += waited
+        if waited > 1:
+            logger.warning(f"[RateLimiter] {self.account}: запрос ждал лимит {waited:.1f} сек")
+        return waited
+
+    # ==================== КАЛИБРОВКА ====================
+
+    def calibrate(self, group: str, headers) -> bool:
+        """Подстраивает корзину группы под X-Bapi-Limit* ответа биржи"""
+        if group == IP_GROUP:
+            return False    # Заголовки описывают лимит эндпоинта, а не IP
+        limit = _header(headers, 'X-Bapi-Limit')
+        remaining = _header(headers, 'X-Bapi-Limit-Status')
+        if limit is None or remaining is None:
+            return False
+        try:
+            limit = float(limit)
+            remaining = float(remaining)
+            reset = float(_header(headers, 'X-Bapi-Limit-Reset-Timestamp') or 0)
+        except (TypeError, ValueError):
+            return False
+        if limit <= 0:
+            return False
+        self.calibrations += 1
+        key = bucket_key(self.account, group)
+        now = int(time.time() * 1000)
+        if self._calibrate_script is not None:
+            try:
+                self._calibrate_script(keys=[key], args=[now, limit, remaining, reset, BUCKET_TTL_MS])
+                return True
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"[RateLimiter] Ошибка Redis при калибровке: {e}")
+        self._local.calibrate(key, now, limit, remaining, reset)
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            'account': self.account,
+            'shared': self.redis is not None,
+            'orders': self.granted[PRIORITY_ORDER],
+            'reads': self.granted[PRIORITY_READ],
+            'order_wait_sec': self.waited[PRIORITY_ORDER],
+            'read_wait_sec': self.waited[PRIORITY_READ],
+            'overdrafts': self.overdrafts,
+            'calibrations': self.calibrations,
+        }
+
+
+def endpoint_group(path: str) -> Tuple[str, int]:
+    """Группа и приоритет пути REST; незнакомый путь - только общая корзина IP"""
+    return ENDPOINT_GROUPS.get(path, (IP_GROUP, PRIORITY_READ))
+
+
+def request_cost(params: Dict) -> int:
+    """Пакетный запрос расходует токен на каждый ордер"""
+    request = params.get('request')
+    return max(1, len(request)) if isinstance(request, list) else 1
+
+
+class RateLimitedSession:
+    """
+    Обертка сессии с интерфейсом pybit.HTTP: токен перед каждым запросом
+
+    Сессия принадлежит обертке: у pybit.HTTP включается return_response_headers,
+    чтобы калибровать лимиты по заголовкам, а ответ возвращается как обычно.
+    """
+
+    def __init__(self, session, limiter: RateLimiter):
+        self.session = session
+        self.limiter = limiter
+        self._headers = hasattr(session, 'return_response_headers')
+        if self._headers:
+            session.return_response_headers = True
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.session, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        group, priority = endpoint_group(METHOD_PATHS.get(name, ""))
+
+        def call(*args, **kwargs):
+            self.limiter.acquire(group, request_cost(kwargs), priority)
+            response = attr(*args, **kwargs)
+            if self._headers and isinstance(response, tuple):
+                response, _, headers = response
+                self.limiter.calibrate(group, headers)
+            return response
+
+        return call
+
+
+# Глобальные лимитеры (один на аккаунт в процессе, состояние общее через Redis)
+_limiters: Dict[bool, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(use_demo: bool) -> Optional[RateLimiter]:
+    """Лимитер аккаунта (демо или реальный); None - выключен (RATE_LIMIT_ENABLED=false)"""
+    if not RATE_LIMIT_ENABLED:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(use_demo)
+        if limiter is None:
+            limiter = RateLimiter("demo" if use_demo else "main", redis=redis_client)
+            _limiters[use_demo] = limiter
+        return limiter
+
+
+def rate_limited(session, use_demo: bool):
+    """Сессия с лимитером аккаунта или как есть, если лимитер выключен"""
+    limiter = get_rate_limiter(use_demo)
+    return RateLimitedSession(session, limiter) if limiter is not None else session
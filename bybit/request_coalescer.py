@@ -0,0 +1,272 @@
+"""
+Объединение одинаковых одновременных запросов чтения к Bybit (singleflight)
+
+Стратегии и монитор позиций одного процесса часто спрашивают одно и то же в
+один момент: get_instruments_info для get_qty_limits, get_tickers и
+get_positions по одному символу. Одинаковый запрос (путь + параметры), пока
+первый еще в полете, не отправляется повторно: ожидающие получают ответ
+первого. Успешные ответы части эндпоинтов живут короткое время в кэше
+(instruments-info - минуты, tickers - секунду).
+
+Чтения состояния (позиции, ордера) не кэшируются, а присоединиться к ним можно,
+только если запрос начат после завершения последней записи по символу
+(ордер, отмена, стоп через эту же сессию, AsyncHTTP или шлюз ордеров) -
+иначе ответ мог не отразить запись, и уходит новый запрос.
+
+Ответ общий для всех ожидающих - вызывающий код его не изменяет.
+
+Работает и для синхронной сессии pybit (потоки), и для AsyncHTTP (event loop):
+ожидание идет через concurrent.futures.Future, общий для потоков и циклов.
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
+
+from bybit.rate_limiter import METHOD_PATHS
+from config import REQUEST_CACHE_TTL, REQUEST_COALESCING_ENABLED
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+INSTRUMENTS_CACHE_TTL = 300.0    # Правила торговли символа меняются редко (секунды)
+
+# Путь чтения -> время жизни ответа в кэше (0 - только объединение запросов в полете)
+DEFAULT_TTLS: Dict[str, float] = {
+    "/v5/market/instruments-info": INSTRUMENTS_CACHE_TTL,
+    "/v5/market/tickers": REQUEST_CACHE_TTL,
+    "/v5/position/list": 0.0,
+    "/v5/order/realtime": 0.0,
+    "/v5/order/history": 0.0,
+}
+
+# Чтения состояния аккаунта: запись по символу делает начатые раньше чтения непригодными
+STATE_PATHS = ("/v5/position/list", "/v5/order/realtime", "/v5/order/history")
+
+# Методы записи pybit.HTTP
+WRITE_METHODS = ('place_order', 'place_batch_order', 'amend_order', 'cancel_order', 'cancel_all_orders',
+                 'set_trading_stop')
+
+MAX_CACHE_ENTRIES = 1024
+
+
+class _LeaderGone(Exception):
+    """Первый запрос прерван (отмена задачи) - ожидающие отправляют свой"""
+
+
+class _Flight:
+    """Запрос в полете: момент начала (time.monotonic()) и общий результат"""
+
+    __slots__ = ('started', 'future')
+
+    def __init__(self, started: float):
+        self.started = started
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+
+
+def request_key(path: str, params: Dict) -> Tuple:
+    return path, tuple(sorted((key, str(value)) for key, value in params.items() if value is not None))
+
+
+class RequestCoalescer:
+    """Запросы в полете и кэш ответов процесса; статистика по путям"""
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            ttls: Путь -> время жизни ответа в кэше; путь не из таблицы идет в обход
+        """
+        self.ttls = dict(DEFAULT_TTLS) if ttls is None else dict(ttls)
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple, _Flight] = {}
+        self._cache: Dict[Tuple, Tuple[float, Dict]] = {}    # Ключ -> (начало запроса, ответ)
+        self._writes: Dict[str, float] = {}                  # Символ -> конец последней записи
+        self._unscoped_write = 0.0                           # Запись без символа (cancel_all по settleCoin)
+        self._last_write = 0.0
+
+        # Статистика по путям: hits - из кэша, dedup - ответ чужого запроса, misses - свой запрос
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    # ==================== ЧТЕНИЕ ====================
+
+    def call(self, path: str, params: Dict, fetch: Callable[[], Dict]) -> Dict:
+        """Синхронное чтение: ответ из кэша, чужого запроса в полете или fetch()"""
+        if path not in self.ttls:
+            return fetch()
+        key = request_key(path, params)
+        while True:
+            cached, flight, leader = self._enter(path, key, params)
+            if cached is not None:
+                return cached
+            if leader:
+                break
+            try:
+                return flight.future.result()
+            except _LeaderGone:
+                continue
+        try:
+            response = fetch()
+        except Exception as e:
+            self._finish(path, key, flight, error=e)
+            raise
+        except BaseException:
+            self._finish(path, key, flight, error=_LeaderGone())
+            raise
+        self._finish(path, key, flight, response)
+        return response
+
+    async def call_async(self, path: str, params: Dict, fetch: Callable) -> Dict:
+        """То же для корутины fetch(); ожидание чужого запроса не блокирует event loop"""
+        if path not in self.ttls:
+            return await fetch()
+        key = request_key(path, params)
+        while True:
+            cached, flight, leader = self._enter(path, key, params)
+            if cached is not None:
+                return cached
+            if leader:
+                break
+            try:
+                # shield: отмена ожидающего не отменяет общий результат для остальных
+                return await asyncio.shield(asyncio.wrap_future(flight.future))
+            except _LeaderGone:
+                continue
+        try:
+            response = await fetch()
+        except Exception as e:
+            self._finish(path, key, flight, error=e)
+            raise
+        except BaseException:
+            self._finish(path, key, flight, error=_LeaderGone())
+            raise
+        self._finish(path, key, flight, response)
+        return response
+
+    def _not_before(self, path: str, params: Dict) -> float:
+        """Ответы чтений состояния, начатых до последней записи по символу, не годятся"""
+        if path not in STATE_PATHS:
+            return 0.0
+        symbol = params.get('symbol')
+        if not symbol:
+            return self._last_write
+        return max(self._writes.get(symbol, 0.0), self._unscoped_write)
+
+    def _enter(self, path: str, key: Tuple, params: Dict) -> Tuple[Optional[Dict], Optional[_Flight], bool]:
+        """(ответ из кэша, None, False), (None, чужой запрос, False) или (None, свой запрос, True)"""
+        now = time.monotonic()
+        with self._lock:
+            not_before = self._not_before(path, params)
+            counters = self.counters.setdefault(path, {'hits': 0, 'dedup': 0, 'misses': 0})
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > not_before and now - cached[0] <= self.ttls[path]:
+                counters['hits'] += 1
+                return cached[1], None, False
+            flight = self._inflight.get(key)
+            if flight is not None and flight.started > not_before:
+                counters['dedup'] += 1
+                return None, flight, False
+            # Запроса нет или он начат до записи - свой запрос (старый завершится сам)
+            flight = _Flight(now)
+            self._inflight[key] = flight
+            counters['misses'] += 1
+            return None, flight, True
+
+    def _finish(self, path: str, key: Tuple, flight: _Flight, response: Optional[Dict] = None,
+                error: Optional[BaseException] = None):
+        with self._lock:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+            if error is None and self.ttls[path] > 0 and isinstance(response, dict) and response.get('retCode') == 0:
+                cached = self._cache.get(key)
+                if cached is None or cached[0] < flight.started:
+                    if len(self._cache) >= MAX_CACHE_ENTRIES:
+                        self._evict_expired(flight.started)
+                    self._cache[key] = (flight.started, response)
+        if error is None:
+            flight.future.set_result(response)
+        else:
+            flight.future.set_exception(error)
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, (started, _) in self._cache.items() if now - started > self.ttls[key[0]]]
+        for key in expired:
+            del self._cache[key]
+        if len(self._cache) >= MAX_CACHE_ENTRIES:
+            self._cache.clear()
+
+    # ==================== ЗАПИСЬ ====================
+
+    def invalidate(self, params: Dict):
+        """Запись завершена: чтения состояния символа, начатые раньше, больше не отдаются"""
+        symbols = {leg.get('symbol') for leg in params.get('request') or [] if isinstance(leg, dict)}
+        symbols.add(params.get('symbol'))
+        symbols.discard(None)
+        now = time.monotonic()
+        with self._lock:
+            self._last_write = now
+            if not symbols:
+                self._unscoped_write = now
+            for symbol in symbols:
+                self._writes[symbol] = now
+
+    def stats(self) -> Dict:
+        with self._lock:
+            paths = {path: dict(counters) for path, counters in self.counters.items()}
+        totals = {name: sum(counters[name] for counters in paths.values()) for name in ('hits', 'dedup', 'misses')}
+        return dict(totals, paths=paths, cached=len(self._cache))
+
+
+class CoalescedSession:
+    """
+    Обертка сессии с интерфейсом pybit.HTTP: чтения через RequestCoalescer
+
+    Оборачивает сессию с лимитером (rate_limited), чтобы объединенные запросы не
+    брали токены. Методы записи проходят как есть и отмечают запись по символу.
+    """
+
+    def __init__(self, session, coalescer: RequestCoalescer):
+        self.session = session
+        self.coalescer = coalescer
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.session, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        path = METHOD_PATHS.get(name)
+        if path in self.coalescer.ttls:
+            def read(**kwargs):
+                return self.coalescer.call(path, kwargs, partial(attr, **kwargs))
+            return read
+        if name in WRITE_METHODS:
+            def write(*args, **kwargs):
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    self.coalescer.invalidate(kwargs)
+            return write
+        return attr
+
+
+# Глобальные объединители (один на аккаунт в процессе)
+_coalescers: Dict[bool, RequestCoalescer] = {}
+_coalescers_lock = threading.Lock()
+
+
+def get_request_coalescer(use_demo: bool) -> Optional[RequestCoalescer]:
+    """Объединитель запросов аккаунта (демо или реальный); None - выключен (REQUEST_COALESCING_ENABLED=false)"""
+    if not REQUEST_COALESCING_ENABLED:
+        return None
+    with _coalescers_lock:
+        coalescer = _coalescers.get(use_demo)
+        if coalescer is None:
+            coalescer = RequestCoalescer()
+            _coalescers[use_demo] = coalescer
+        return coalescer
+
+
+def coalesced(session, use_demo: bool):
+    """Сессия с объединением запросов аккаунта или как есть, если оно выключено"""
+    coalescer = get_request_coalescer(use_demo)
+    return CoalescedSession(session, coalescer) if coalescer is not None else session
@@ -1,14 +1,15 @@
 from pybit.unified_trading import HTTP
 from config import DEMO_API_KEY, DEMO_API_SECRET
+from bybit.rate_limiter import rate_limited
 import time
 
-session = HTTP(
+session = rate_limited(HTTP(
     api_key=DEMO_API_KEY,
     api_secret=DEMO_API_SECRET,
     testnet=False,
     recv_window=60000,
     demo=True,
-)
+), True)
 
 def get_all_orders():
     """Получить все открытые ордера"""
@@ -124,10 +125,10 @@ def close_all_positions():
         # Небольшая задержка между запросами
         time.sleep(0.1)
 
-def get_orders_by_symbol(symbol):
-    """Получить все открытые ордера для определенной монеты"""
+def get_orders_by_symbol(symbol, client=None):
+    """Получить все открытые ордера для определенной монеты (client - другая сессия вместо демо)"""
     try:
-        response = session.get_open_orders(
+        response = (client or session).get_open_orders(
             category="linear",
             symbol=symbol,
             settleCoin="USDT",
@@ -138,10 +139,10 @@ def get_orders_by_symbol(symbol):
         print(f"Ошибка при получении ордеров для {symbol}: {e}")
         return []
 
-def get_position_by_symbol(symbol):
+def get_position_by_symbol(symbol, client=None):
     """Получить позицию для определенной монеты"""
     try:
-        response = session.get_positions(
+        response = (client or session).get_positions(
             category="linear",
             symbol=symbol,
             settleCoin="USDT"
@@ -156,9 +157,9 @@ def get_position_by_symbol(symbol):
         print(f"Ошибка при получении позиции для {symbol}: {e}")
         return None
 
-def cancel_orders_by_symbol(symbol):
+def cancel_orders_by_symbol(symbol, client=None):
     """Отменить все ордера для определенной монеты"""
-    orders = get_orders_by_symbol(symbol)
+    orders = get_orders_by_symbol(symbol, client)
     
     if not orders:
         print(f"Нет открытых ордеров для {symbol}")
@@ -174,7 +175,7 @@ def cancel_orders_by_symbol(symbol):
             qty = order.get('qty', 'Unknown')
             price = order.get('price', 'Market')
             
-            response = session.cancel_order(
+            response = (client or session).cancel_order(
                 category="linear",
                 symbol=symbol,
                 orderId=order_id
@@ -188,11 +189,13 @@ def cancel_orders_by_symbol(symbol):
         except Exception as e:
             print(f"❌ Ошибка при отмене ордера {order.get('orderId', 'unknown')}: {e}")
         
-        time.sleep(0.1)
+        # Пауза нужна только реальной бирже (симулятору при воспроизведении - нет)
+        if client is None:
+            time.sleep(0.1)
 
-def close_position_by_symbol(symbol):
-    """Закрыть позицию для определенной монеты"""
-    position = get_position_by_symbol(symbol)
+def close_position_by_symbol(symbol, client=None, gateway=None):
+    """Закрыть позицию для определенной монеты (gateway - шлюз ордеров: закрытие по WebSocket Trade)"""
+    position = get_position_by_symbol(symbol, client)
     
     if not position:
         print(f"Нет открытой позиции для {symbol}")
@@ -205,7 +208,7 @@ def close_position_by_symbol(symbol):
         # Определяем противоположную сторону для закрытия
         close_side = "Sell" if side == "Buy" else "Buy"
         
-        response = session.place_order(
+        response = (gateway or client or session).place_order(
             category="linear",
             symbol=symbol,
             side=close_side,
@@ -222,20 +225,20 @@ def close_position_by_symbol(symbol):
     except Exception as e:
         print(f"❌ Ошибка при закрытии позиции {symbol}: {e}")
 
-def stop_trading_by_symbol(symbol):
+def stop_trading_by_symbol(symbol, client=None, gateway=None):
     """Остановить торговлю для определенной монеты"""
     print(f"🛑 Начинаем остановку торговли для {symbol}...")
     print("=" * 50)
     
     # Сначала отменяем все ордера для этой монеты
     print(f"1. Отменяем все открытые ордера для {symbol}...")
-    cancel_orders_by_symbol(symbol)
+    cancel_orders_by_symbol(symbol, client)
     
     print("\n" + "=" * 50)
     
     # Затем закрываем позицию для этой монеты
     print(f"2. Закрываем позицию для {symbol}...")
-    close_position_by_symbol(symbol)
+    close_position_by_symbol(symbol, client, gateway)
     
     print("\n" + "=" * 50)
     print(f"✅ Остановка торговли для {symbol} завершена!")
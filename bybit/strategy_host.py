@@ -0,0 +1,328 @@
+"""
+Хост стратегий: сотни стратегий усреднения в одном процессе
+
+Вместо отдельной задачи Celery (и слота prefork на 12 часов) на каждый
+символ стратегии ShortAveragingStrategyCelery запускаются задачами asyncio
+в одном event loop. Все они читают один общий источник тиков процесса.
+Команды start/stop приходят через список Redis шарда; символ закрепляется
+за шардом по crc32(symbol) % STRATEGY_HOST_SHARDS, поэтому хостов можно
+запустить несколько.
+
+С batch_interval > 0 тики проходят пакетную проверку в книге позиций
+(bybit/position_book.py): стратегия получает только тики, пересекшие ее пороги.
+
+Запуск шарда:
+    python -m bybit.strategy_host --shard 0 --shards 4
+
+Команда (JSON в список strategy_host:commands:{shard}):
+    {"action": "start", "symbol": "BTCUSDT", "params": {"usdt_amount": 100}}
+    {"action": "stop", "symbol": "BTCUSDT", "close": true}
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+import zlib
+from typing import Callable, Dict, Optional, Set
+
+from config import STRATEGY_HOST_BATCH_INTERVAL, STRATEGY_HOST_SHARDS
+from database import redis_client
+from logger_config import setup_logger
+from bybit.position_book import PositionBook
+
+logger = setup_logger(__name__)
+
+COMMANDS_KEY_PREFIX = "strategy_host:commands:"   # Список команд шарда: strategy_host:commands:0
+STATUS_KEY = "strategy_host:status"               # Hash шард -> JSON состояния хоста
+STATUS_INTERVAL = 5                               # Как часто хост публикует состояние (секунды)
+POLL_TIMEOUT = 1                                  # Таймаут BLPOP - как быстро хост замечает остановку
+MAX_STRATEGIES = 1000                             # Защита от неограниченного роста на одном хосте
+
+
+def shard_for_symbol(symbol: str, shards: int) -> int:
+    """Номер шарда символа (стабилен между процессами, в отличие от hash())"""
+    return zlib.crc32(symbol.upper().encode()) % max(shards, 1)
+
+
+def commands_key(shard: int) -> str:
+    return f"{COMMANDS_KEY_PREFIX}{shard}"
+
+
+def submit_command(action: str, symbol: str, params: Optional[Dict] = None, close: bool = False,
+                   shards: int = STRATEGY_HOST_SHARDS, redis=None) -> int:
+    """Ставит команду в очередь шарда символа; возвращает номер шарда"""
+    redis = redis or redis_client
+    if redis is None:
+        raise RuntimeError("Redis недоступен - команды хосту стратегий не отправить")
+    symbol = symbol.upper()
+    shard = shard_for_symbol(symbol, shards)
+    command = {'action': action, 'symbol': symbol, 'params': params or {}, 'close': close, 'ts': time.time()}
+    redis.rpush(commands_key(shard), json.dumps(command))
+    return shard
+
+
+def default_strategy_factory(symbol: str, **params):
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+    return ShortAveragingStrategyCelery(symbol=symbol, **params)
+
+
+class StrategyHost:
+    """Запускает и останавливает стратегии своего шарда по командам из Redis"""
+
+    def __init__(self, shard: int = 0, shards: int = 1, redis=None,
+                 strategy_factory: Callable = default_strategy_factory,
+                 max_strategies: int = MAX_STRATEGIES,
+                 batch_interval: float = STRATEGY_HOST_BATCH_INTERVAL):
+        self.shard = shard
+        self.shards = max(shards, 1)
+        self.redis = redis or redis_client
+        self.strategy_factory = strategy_factory
+        self.max_strategies = max_strategies
+        self.strategies: Dict[str, object] = {}     # None - стратегия еще создается
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._pending_stops: Dict[str, bool] = {}   # Stop во время создания: символ -> close
+        self._commands: Set[asyncio.Task] = set()   # Выполняющиеся команды start/stop
+        self._running = False
+
+        # Пакетная проверка тиков всех стратегий хоста (0 - выключена)
+        self.batch_interval = batch_interval
+        self.position_book = PositionBook() if batch_interval > 0 else None
+        self._book_task: Optional[asyncio.Task] = None
+
+        # Статистика
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    # ==================== КОМАНДЫ ====================
+
+    async def handle_command(self, command: Dict):
+        action = command.get('action')
+        symbol = (command.get('symbol') or '').upper()
+        if not symbol:
+            logger.warning(f"[StrategyHost] Команда без символа: {command}")
+            return
+        if action == 'start':
+            # Создание стратегии (REST-запрос) не задерживает остальные команды шарда
+            self._spawn(self.start_strategy(symbol, command.get('params') or {}), f"Start-{symbol}")
+        elif action == 'stop':
+            await self.stop_strategy(symbol, close=bool(command.get('close')))
+        else:
+            logger.warning(f"[StrategyHost] Неизвестная команда: {command}")
+
+    def _spawn(self, coro, name: str):
+        task = asyncio.create_task(coro, name=name)
+        self._commands.add(task)
+        task.add_done_callback(self._commands.discard)
+
+    async def join_commands(self):
+        """Ждет завершения выполняющихся команд start/stop"""
+        while self._commands:
+            await asyncio.wait(list(self._commands))
+
+    async def start_strategy(self, symbol: str, params: Dict) -> bool:
+        """Создает стратегию и запускает ее задачей; дубликаты и чужие символы игнорируются"""
+        if shard_for_symbol(symbol, self.shards) != self.shard:
+            logger.warning(f"[StrategyHost] {symbol} относится к другому шарду, команда пропущена")
+            self.rejected += 1
+            return False
+        if symbol in self.strategies:
+            logger.warning(f"[StrategyHost] Стратегия {symbol} уже запущена, дублирующий сигнал проигнорирован")
+            self.rejected += 1
+            return False
+        if len(self.strategies) >= self.max_strategies:
+            logger.error(f"[StrategyHost] Достигнут лимит {self.max_strategies} стратегий, {symbol} не запущен")
+            self.rejected += 1
+            return False
+
+        if self.position_book is not None:
+            params = dict(params, position_book=self.position_book)
+            if self._book_task is None:
+                self._book_task = asyncio.create_task(self.position_book.run(self.batch_interval), name="PositionBook")
+
+        # Конструктор делает REST-запрос (информация о символе) - не блокируем loop
+        self.strategies[symbol] = None
+        try:
+            strategy = await asyncio.to_thread(self.strategy_factory, symbol, **params)
+        except Exception as e:
+            self.strategies.pop(symbol, None)
+            self._pending_stops.pop(symbol, None)
+            self.failed += 1
+            logger.error(f"[StrategyHost] Не удалось создать стратегию {symbol}: {e}")
+            return False
+
+        if symbol in self._pending_stops:
+            # Stop пришел, пока стратегия создавалась - не запускаем ее
+            close = self._pending_stops.pop(symbol)
+            self.strategies.pop(symbol, None)
+            logger.info(f"[StrategyHost] Стратегия {symbol} остановлена до запуска")
+            if close:
+                await self._stop(symbol, strategy, close)
+            return False
+
+        self.strategies[symbol] = strategy
+        self.tasks[symbol] = asyncio.create_task(self._run_strategy(symbol, strategy), name=f"Strategy-{symbol}")
+        self.started += 1
+        logger.info(f"[StrategyHost] Запущена стратегия {symbol}, всего: {len(self.strategies)}")
+        return True
+
+    async def stop_strategy(self, symbol: str, close: bool = False) -> bool:
+        """
+        Останавливает стратегию; close=True - еще и отменяет ордера и закрывает позицию
+
+        Остановка идет отдельной задачей и не задерживает остальные команды шарда.
+        Стратегия, которая еще создается, будет остановлена сразу после создания.
+        """
+        if symbol not in self.strategies:
+            logger.info(f"[StrategyHost] Стратегия {symbol} не запущена")
+            return False
+        strategy = self.strategies[symbol]
+        if strategy is None:
+            self._pending_stops[symbol] = self._pending_stops.get(symbol, False) or close
+            logger.info(f"[StrategyHost] Стратегия {symbol} еще создается, остановим после создания")
+            return True
+        self._spawn(self._stop(symbol, strategy, close), f"Stop-{symbol}")
+        return True
+
+    async def _stop(self, symbol: str, strategy, close: bool):
+        try:
+            if close:
+                await strategy.stop_trading_for_symbol()
+        except Exception as e:
+            logger.error(f"[StrategyHost] Ошибка закрытия торговли {symbol}: {e}")
+        finally:
+            strategy.should_stop = True
+            strategy.mailbox.close()
+        task = self.tasks.get(symbol)
+        if task is not None:
+            await asyncio.wait([task], timeout=30)
+
+    async def _run_strategy(self, symbol: str, strategy):
+        try:
+            await strategy.run()
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"[StrategyHost] Стратегия {symbol} завершилась с ошибкой: {e}")
+        finally:
+            if self.strategies.get(symbol) is strategy:
+                del self.strategies[symbol]
+            self.tasks.pop(symbol, None)
+            logger.info(f"[StrategyHost] Стратегия {symbol} завершена, осталось: {len(self.strategies)}")
+
+    # ==================== ЦИКЛ ХОСТА ====================
+
+    async def _next_command(self) -> Optional[Dict]:
+        try:
+            item = await asyncio.to_thread(self.redis.blpop, commands_key(self.shard), POLL_TIMEOUT)
+        except Exception as e:
+            logger.error(f"[StrategyHost] Ошибка чтения команд: {e}")
+            await asyncio.sleep(POLL_TIMEOUT)
+            return None
+        if not item:
+            return None
+        try:
+            return json.loads(item[1])
+        except ValueError:
+            logger.error(f"[StrategyHost] Некорректная команда: {item[1]!r}")
+            return None
+
+    def status(self) -> Dict:
+        return {
+            'pid': os.getpid(),
+            'host': socket.gethostname(),
+            'shard': self.shard,
+            'shards': self.shards,
+            'strategies': len(self.strategies),
+            'symbols': sorted(self.strategies),
+            'started': self.started,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'batch': self.position_book.stats() if self.position_book is not None else None,
+            'updated': time.time(),
+        }
+
+    async def _publish_status(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.redis.hset, STATUS_KEY, str(self.shard), json.dumps(self.status()))
+            except Exception as e:
+                logger.warning(f"[StrategyHost] Не удалось опубликовать состояние: {e}")
+            await asyncio.sleep(STATUS_INTERVAL)
+
+    async def run(self):
+        """Основной цикл: читает команды шарда до stop()"""
+        if self.redis is None:
+            raise RuntimeError("Redis недоступен - хосту стратегий неоткуда брать команды")
+        self._running = True
+        logger.info(f"[StrategyHost] Шард {self.shard}/{self.shards} запущен, очередь {commands_key(self.shard)}")
+        status_task = asyncio.create_task(self._publish_status())
+        try:
+            while self._running:
+                command = await self._next_command()
+                if command:
+                    await self.handle_command(command)
+        finally:
+            status_task.cancel()
+            await self.shutdown()
+
+    def stop(self):
+        self._running = False
+
+    async def shutdown(self):
+        """Останавливает все стратегии без закрытия позиций (на бирже остаются их SL-ордера)"""
+        for symbol, strategy in self.strategies.items():
+            if strategy is None:
+                self._pending_stops.setdefault(symbol, False)
+        await self.join_commands()
+        for strategy in list(self.strategies.values()):
+            if strategy is not None:
+                strategy.should_stop = True
+                strategy.mailbox.close()
+        tasks = list(self.tasks.values())
+        if tasks:
+            await asyncio.wait(tasks, timeout=30)
+        if self._book_task is not None:
+            self._book_task.cancel()
+            self._book_task = None
+        if self.redis is not None:
+            try:
+                self.redis.hdel(STATUS_KEY, str(self.shard))
+            except Exception:
+                pass
+        logger.info(
+            f"[StrategyHost] Шард {self.shard} остановлен: запущено {self.started}, "
+            f"завершено {self.completed}, ошибок {self.failed}"
+        )
+
+
+async def _main(shard: int, shards: int, batch_interval: float):
+    host = StrategyHost(shard, shards, batch_interval=batch_interval)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, host.stop)
+        except NotImplementedError:
+            pass  # Windows
+    await host.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хост стратегий усреднения")
+    parser.add_argument("--shard", type=int, default=0, help="Номер шарда этого процесса")
+    parser.add_argument("--shards", type=int, default=max(STRATEGY_HOST_SHARDS, 1), help="Всего шардов")
+    parser.add_argument("--batch-interval", type=float, default=STRATEGY_HOST_BATCH_INTERVAL,
+                        help="Интервал пакетной проверки тиков в секундах (0 - выключена)")
+    args = parser.parse_args()
+    asyncio.run(_main(args.shard, args.shards, args.batch_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Снимок состояния стратегии усреднения в Redis
+
+При каждом переходе (открытие, усреднение, стоп-лосс, безубыток, шаг безубытка)
+стратегия пишет компактный hash strategy_state:{SYMBOL}: цены, количество,
+ID ордеров, лучшую прибыль и параметры. Задача, повторно доставленная Celery
+после падения или перезапуска воркера (task_acks_late), восстанавливает
+стратегию из снимка, а не отказывается от "уже активной" позиции.
+
+Пока стратегия жива, она обновляет heartbeat снимка по своему таймеру
+(каждые STALE_AFTER / 3 секунд, независимо от тиков). Снимок со свежим
+heartbeat принадлежит работающей стратегии - его нельзя подхватывать, пока
+heartbeat не устареет. Поэтому после падения воркера продолжение позиции
+ждет до STALE_AFTER секунд; после штатной остановки (release) - сразу.
+
+Снимок подхватывается сравнением с записью (claim): владелец и heartbeat не
+должны измениться с момента чтения, иначе его уже взяла другая стратегия.
+Heartbeat стратегии, чей снимок перехвачен, не пишется - она узнает о
+перехвате и останавливается.
+"""
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Optional
+
+from redis.exceptions import WatchError
+
+from database import redis_client
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+STATE_KEY_PREFIX = "strategy_state:"   # Hash состояния: strategy_state:BTCUSDT
+STATE_TTL = 3 * 24 * 3600              # Снимок брошенной стратегии живет 3 дня
+STALE_AFTER = 15.0                     # Heartbeat старше - стратегия-владелец мертва (секунды)
+
+# Поля снимка и их типы (атрибуты ShortAveragingStrategyCelery)
+STATE_FIELDS = {
+    # Параметры, с которыми позиция была открыта
+    'usdt_amount': float,
+    'averaging_percent': float,
+    'initial_tp_percent': float,
+    'breakeven_step': float,
+    'stop_loss_percent': float,
+    # Позиция
+    'position_opened': bool,
+    'position_qty': float,
+    'entry_price': float,
+    'initial_entry_price': float,
+    'averaged_price': float,
+    'is_averaged': bool,
+    # Ордера на бирже
+    'averaging_order_id': str,
+    'stop_loss_order_id': str,
+    'breakeven_order_id': str,
+    'trading_stop_price': float,   # Стоп-лосс позиции (режим trading_stop)
+    # Уровни
+    'tp_price': float,
+    'fake_tp_price': float,
+    'fake_tp_reached': bool,
+    'breakeven_price': float,
+    'stop_loss_price': float,
+    'best_profit_percent': float,
+    'peak_profit_percent': float,
+}
+
+# Поля позиции и ордеров на бирже: их изменение делает старый снимок аккаунта непригодным
+EXCHANGE_FIELDS = ('position_opened', 'position_qty', 'entry_price', 'averaged_price', 'is_averaged',
+                   'averaging_order_id', 'stop_loss_order_id', 'breakeven_order_id', 'trading_stop_price')
+
+
+def state_key(symbol: str) -> str:
+    return f"{STATE_KEY_PREFIX}{symbol.upper()}"
+
+
+def _encode(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+def _decode(kind, raw: Optional[str]):
+    if raw is None or raw == "":
+        return False if kind is bool else None
+    if kind is bool:
+        return raw == "1"
+    return kind(raw)
+
+
+class StrategyStateStore:
+    """Чтение и запись снимков; без Redis все операции ничего не делают"""
+
+    def __init__(self, redis=None, ttl: int = STATE_TTL, stale_after: float = STALE_AFTER):
+        self.redis = redis or redis_client
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def new_owner(self) -> str:
+        """Владелец снимка для одной стратегии: процесс + экземпляр (в процессе их может быть много)"""
+        return f"{self.owner}:{uuid.uuid4().hex[:8]}"
+
+    def save(self, symbol: str, state: Dict, owner: Optional[str] = None) -> bool:
+        """Пишет снимок целиком одним запросом (HSET + EXPIRE в pipeline)"""
+        if self.redis is None:
+            return False
+        mapping = {name: _encode(state.get(name)) for name in STATE_FIELDS}
+        mapping['heartbeat'] = str(time.time())
+        mapping['owner'] = owner or self.owner
+        key = state_key(symbol)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"[StrategyState] Не удалось сохранить состояние {symbol}: {e}")
+            return False
+
+    def load(self, symbol: str) -> Optional[Dict]:
+        """Снимок с типизированными полями, heartbeat и owner; None - снимка нет"""
+        if self.redis is None:
+            return None
+        try:
+            raw = self.redis.hgetall(state_key(symbol))
+        except Exception as e:
+            logger.warning(f"[StrategyState] Не удалось прочитать состояние {symbol}: {e}")
+            return None
+        if not raw:
+            return None
+        state = {name: _decode(kind, raw.get(name)) for name, kind in STATE_FIELDS.items()}
+        state['heartbeat'] = float(raw.get('heartbeat') or 0)
+        state['owner'] = raw.get('owner')
+        return state
+
+    def is_stale(self, state: Dict) -> bool:
+        """Владелец снимка перестал обновлять heartbeat (упал или отпустил снимок)"""
+        return time.time() - state.get('heartbeat', 0) >= self.stale_after
+
+    def _compare_and_set(self, symbol: str, check, mapping: Dict) -> Optional[bool]:
+        """
+        Пишет поля, только если текущий снимок проходит check (WATCH/MULTI)
+
+        Returns:
+            True - записано, False - снимок изменился или не прошел проверку, None - ошибка Redis
+        """
+        key = state_key(symbol)
+        pipe = self.redis.pipeline()
+        try:
+            pipe.watch(key)
+            if not check(pipe.hgetall(key)):
+                return False
+            pipe.multi()
+            pipe.hset(key, mapping=mapping)
+            pipe.execute()
+            return True
+        except WatchError:
+            return False
+        except Exception as e:
+            logger.warning(f"[StrategyState] Ошибка Redis при обновлении снимка {symbol}: {e}")
+            return None
+        finally:
+            pipe.reset()
+
+    def claim(self, symbol: str, state: Dict, owner: str) -> bool:
+        """Подхватывает устаревший снимок, если с момента чтения его никто не взял и не обновил"""
+        if self.redis is None:
+            return False
+        return bool(self._compare_and_set(
+            symbol,
+            lambda current: (current.get('owner') == state['owner']
+                             and float(current.get('heartbeat') or 0) == state['heartbeat']),
+            {'heartbeat': str(time.time()), 'owner': owner},
+        ))
+
+    def touch(self, symbol: str, owner: Optional[str] = None) -> bool:
+        """Стратегия жива; False - снимок перехвачен другой стратегией (ошибка Redis - не перехват)"""
+        if self.redis is None:
+            return True
+        owner = owner or self.owner
+        try:
+            current_owner = self.redis.hget(state_key(symbol), 'owner')
+        except Exception as e:
+            logger.warning(f"[StrategyState] Не удалось обновить heartbeat {symbol}: {e}")
+            return True
+        if current_owner is None:
+            return True     # Снимка нет (еще не сохранен или удален) - обновлять нечего
+        if current_owner != owner:
+            return False
+        return self._compare_and_set(
+            symbol, lambda current: current.get('owner') == owner, {'heartbeat': str(time.time())},
+        ) is not False
+
+    def release(self, symbol: str, owner: Optional[str] = None):
+        """Штатная остановка с открытой позицией: следующий запуск подхватит снимок сразу"""
+        if self.redis is None:
+            return
+        owner = owner or self.owner
+        self._compare_and_set(symbol, lambda current: current.get('owner') == owner, {'heartbeat': "0"})
+
+    def delete(self, symbol: str):
+        """Позиция закрыта - снимок больше не нужен"""
+        if self.redis is None:
+            return
+        try:
+            self.redis.delete(state_key(symbol))
+        except Exception as e:
+            logger.warning(f"[StrategyState] Не удалось удалить состояние {symbol}: {e}")
+
+
+# Глобальное хранилище снимков процесса
+strategy_state_store = StrategyStateStore()
@@ -0,0 +1,104 @@
+"""
+Почтовый ящик тиков с вытеснением (conflation)
+
+Поток источника тиков только кладет тик в ящик и никогда не ждет стратегию.
+В ящике хранится ровно один - самый свежий - тик: если стратегия занята
+REST-запросом, промежуточные тики заменяются новыми и учитываются
+в счетчике dropped. Отставание стратегии от рынка ограничено одним тиком.
+
+Стратегия работает в event loop: поток источника будит loop через
+call_soon_threadsafe, тик забирает задача-потребитель.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class AsyncTickMailbox:
+    """Ящик на один слот для event loop: put() из любого потока, await get() в loop"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tick: Optional[Any] = None
+        self._put_time = 0.0
+        self._closed = False
+
+        # Статистика
+        self.received = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.max_wait = 0.0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Привязывает ящик к event loop потребителя"""
+        self._loop = loop
+
+    def put(self, tick: Any):
+        """Кладет тик; loop будится только когда ящик был пуст"""
+        with self._lock:
+            if self._closed:
+                return
+            self.received += 1
+            if self._tick is not None:
+                self.dropped += 1
+                self._tick = tick
+                return
+            self._tick = tick
+            self._put_time = time.monotonic()
+        self._wakeup()
+
+    def _wakeup(self):
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # Loop уже закрыт
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Ждет и забирает самый свежий тик; None - по таймауту или после close()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                # Сигнал мог остаться от тика, который уже забрали - сбрасываем до проверки слота
+                self._ready.clear()
+                tick = self._tick
+                if tick is not None:
+                    self._tick = None
+                    self.delivered += 1
+                    wait = time.monotonic() - self._put_time
+                    if wait > self.max_wait:
+                        self.max_wait = wait
+                    return tick
+                if self._closed:
+                    return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    def close(self):
+        """Закрывает ящик и будит ожидающую задачу"""
+        with self._lock:
+            self._closed = True
+            self._tick = None
+        self._wakeup()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'received': self.received,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'max_wait': self.max_wait,
+            }
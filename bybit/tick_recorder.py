@@ -0,0 +1,321 @@
+"""
+Запись тиков в сжатые колоночные файлы (по символу и дню)
+
+Файл {root}/{SYMBOL}/{YYYY-MM-DD}.ticks:
+
+    заголовок   <8s32s>   магия BBTICK01, символ
+    блок        <4sIIqq>  магия BLK1, строк, байт сжатых данных, первый ts, последний ts
+                zlib(ts-дельты int64 | last | bid | ask | volume float64) - колонки подряд
+    ...
+    индекс      <qqqI>    смещение блока, первый ts, последний ts, строк - на каждый блок
+    трейлер     <qI4s>    смещение индекса, количество блоков, магия BIDX
+
+Новый блок пишется поверх старого индекса, после него - обновленный индекс.
+Если процесс упал между ними, читатель восстанавливает индекс проходом по блокам.
+
+Запись идет из фонового потока через ограниченную очередь: при переполнении
+тик отбрасывается (счетчик dropped), поток тиков никогда не ждет диск.
+"""
+import atexit
+import fcntl
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from bybit.ws_decoder import Ticker
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+FILE_MAGIC = b"BBTICK01"
+BLOCK_MAGIC = b"BLK1"
+INDEX_MAGIC = b"BIDX"
+_HEADER = struct.Struct("<8s32s")
+_BLOCK = struct.Struct("<4sIIqq")
+_INDEX_ENTRY = struct.Struct("<qqqI")
+_TRAILER = struct.Struct("<qI4s")
+
+COLUMNS = ('ts', 'last', 'bid', 'ask', 'volume')
+BLOCK_ROWS = 4096           # Строк в блоке до принудительного сброса
+FLUSH_INTERVAL = 5.0        # Неполный блок сбрасывается не реже (секунды)
+QUEUE_SIZE = 100_000        # Ограничение буфера между потоком тиков и писателем
+COMPRESS_LEVEL = 6
+
+
+class BlockInfo(NamedTuple):
+    offset: int
+    first_ts: int
+    last_ts: int
+    rows: int
+
+
+def tick_file_path(root: str, symbol: str, ts_ms: int) -> str:
+    day = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+    return os.path.join(root, symbol, f"{day}.ticks")
+
+
+def encode_block(rows: List[Tuple[int, float, float, float, float]]) -> bytes:
+    """Упаковывает строки в блок: заголовок + сжатые колонки"""
+    data = np.array(rows, dtype=np.float64)
+    ts = np.array([row[0] for row in rows], dtype=np.int64)
+    # Дельты времени - маленькие числа, сжимаются намного лучше абсолютных ts
+    ts_delta = np.diff(ts, prepend=ts[0])
+    payload = ts_delta.tobytes() + data[:, 1:].T.copy().tobytes()
+    compressed = zlib.compress(payload, COMPRESS_LEVEL)
+    return _BLOCK.pack(BLOCK_MAGIC, len(rows), len(compressed), int(ts[0]), int(ts[-1])) + compressed
+
+
+def decode_block(header: bytes, compressed: bytes) -> Dict[str, np.ndarray]:
+    _, rows, _, first_ts, _ = _BLOCK.unpack(header)
+    payload = zlib.decompress(compressed)
+    ts = first_ts + np.cumsum(np.frombuffer(payload[:rows * 8], dtype=np.int64))
+    values = np.frombuffer(payload[rows * 8:], dtype=np.float64).reshape(4, rows)
+    return {'ts': ts, 'last': values[0], 'bid': values[1], 'ask': values[2], 'volume': values[3]}
+
+
+class TickFileWriter:
+    """Дописывает блоки в один файл и поддерживает индекс в конце"""
+
+    def __init__(self, path: str, symbol: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = self._open_locked(path)
+        self.blocks: List[BlockInfo] = []
+        self._data_end = _HEADER.size
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            self._file.write(_HEADER.pack(FILE_MAGIC, symbol.encode()[:32]))
+        else:
+            # Продолжаем существующий файл (например, после перезапуска в тот же день)
+            reader = TickFileReader(self.path)
+            self.blocks = reader.blocks()
+            self._data_end = reader.data_end
+            reader.close()
+
+    def _open_locked(self, path: str):
+        """Один писатель на файл: если файл занят другим процессом - пишем в файл с pid"""
+        handle = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except OSError:
+            handle.close()
+            base, ext = os.path.splitext(path)
+            self.path = f"{base}.{os.getpid()}{ext}"
+            handle = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+
+    def write_block(self, rows: List[Tuple[int, float, float, float, float]]):
+        block = encode_block(rows)
+        offset = self._data_end
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self._file.write(block)
+        self._data_end = offset + len(block)
+        self.blocks.append(BlockInfo(offset, rows[0][0], rows[-1][0], len(rows)))
+
+        index = b"".join(_INDEX_ENTRY.pack(*info) for info in self.blocks)
+        self._file.write(index + _TRAILER.pack(self._data_end, len(self.blocks), INDEX_MAGIC))
+        self._file.flush()
+
+    def close(self):
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+
+
+class TickFileReader:
+    """Чтение файла тиков: индекс из трейлера или восстановление проходом по блокам"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        header = self._file.read(_HEADER.size)
+        magic, symbol = _HEADER.unpack(header)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path}: не файл тиков")
+        self.symbol = symbol.rstrip(b"\0").decode()
+        self._blocks: Optional[List[BlockInfo]] = None
+        self.data_end = _HEADER.size
+
+    def blocks(self) -> List[BlockInfo]:
+        if self._blocks is None:
+            self._blocks = self._read_index() or self._scan_blocks()
+        return self._blocks
+
+    def _read_index(self) -> Optional[List[BlockInfo]]:
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _HEADER.size + _TRAILER.size:
+            return None
+        self._file.seek(size - _TRAILER.size)
+        index_offset, count, magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+        if magic != INDEX_MAGIC or index_offset + count * _INDEX_ENTRY.size + _TRAILER.size != size:
+            return None
+        self._file.seek(index_offset)
+        raw = self._file.read(count * _INDEX_ENTRY.size)
+        self.data_end = index_offset
+        return [BlockInfo(*entry) for entry in _INDEX_ENTRY.iter_unpack(raw)]
+
+    def _scan_blocks(self) -> List[BlockInfo]:
+        blocks = []
+        offset = _HEADER.size
+        while True:
+            self._file.seek(offset)
+            header = self._file.read(_BLOCK.size)
+            if len(header) < _BLOCK.size:
+                break
+            magic, rows, length, first_ts, last_ts = _BLOCK.unpack(header)
+            if magic != BLOCK_MAGIC or len(self._file.read(length)) < length:
+                break
+            blocks.append(BlockInfo(offset, first_ts, last_ts, rows))
+            offset += _BLOCK.size + length
+        self.data_end = offset
+        if blocks:
+            logger.warning(f"[TickRecorder] {self.path}: индекс поврежден, восстановлено блоков: {len(blocks)}")
+        return blocks
+
+    def read_block(self, info: BlockInfo) -> Dict[str, np.ndarray]:
+        self._file.seek(info.offset)
+        header = self._file.read(_BLOCK.size)
+        length = _BLOCK.unpack(header)[2]
+        return decode_block(header, self._file.read(length))
+
+    def iter_blocks(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """Блоки, пересекающиеся с интервалом [start_ts, end_ts] (по индексу, без распаковки лишних)"""
+        for info in self.blocks():
+            if start_ts is not None and info.last_ts < start_ts:
+                continue
+            if end_ts is not None and info.first_ts > end_ts:
+                continue
+            yield self.read_block(info)
+
+    def read(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Все тики интервала одним набором колонок"""
+        parts = list(self.iter_blocks(start_ts, end_ts))
+        if not parts:
+            return {name: np.empty(0, dtype=np.int64 if name == 'ts' else np.float64) for name in COLUMNS}
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+        mask = np.ones(len(columns['ts']), dtype=bool)
+        if start_ts is not None:
+            mask &= columns['ts'] >= start_ts
+        if end_ts is not None:
+            mask &= columns['ts'] <= end_ts
+        return {name: values[mask] for name, values in columns.items()}
+
+    def close(self):
+        self._file.close()
+
+
+class TickRecorder:
+    """Фоновая запись тиков всех символов источника"""
+
+    def __init__(self, root: str, block_rows: int = BLOCK_ROWS, flush_interval: float = FLUSH_INTERVAL,
+                 queue_size: int = QUEUE_SIZE):
+        self.root = root
+        self.block_rows = block_rows
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._buffers: Dict[str, List[Tuple]] = {}
+        self._writers: Dict[str, TickFileWriter] = {}
+        self._last_flush = time.monotonic()
+        self._running = True
+
+        # Статистика
+        self.recorded = 0
+        self.dropped = 0
+        self.blocks_written = 0
+
+        self._thread = threading.Thread(target=self._run, name="TickRecorder", daemon=True)
+        self._thread.start()
+        # Дочерние процессы Celery перезапускаются - не теряем неполные блоки при выходе
+        atexit.register(self.close)
+        logger.info(f"[TickRecorder] Запись тиков в {root}")
+
+    def record(self, ticker: Ticker):
+        """Вызывается из потока тиков: только кладет строку в очередь"""
+        try:
+            self._queue.put_nowait((ticker.symbol, ticker.ts, ticker.last_price, ticker.bid_price,
+                                    ticker.ask_price, ticker.volume24h))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while self._running or not self._queue.empty():
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                item = None
+            try:
+                if item is not None:
+                    self._append(item)
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self.flush()
+            except Exception as e:
+                logger.error(f"[TickRecorder] Ошибка записи: {e}", exc_info=True)
+        self.flush()
+
+    def _append(self, item: Tuple):
+        symbol, ts = item[0], item[1]
+        path = tick_file_path(self.root, symbol, ts)
+        if path not in self._buffers:
+            # Новый день - дописываем и закрываем файлы прошлых дней этого символа
+            for old_path in [p for p in self._buffers if os.path.dirname(p) == os.path.dirname(path)]:
+                self._flush_path(old_path)
+                self._close_path(old_path)
+            self._buffers[path] = []
+        buffer = self._buffers[path]
+        buffer.append(item[1:])
+        self.recorded += 1
+        if len(buffer) >= self.block_rows:
+            self._flush_path(path)
+
+    def _flush_path(self, path: str):
+        rows = self._buffers.get(path)
+        if not rows:
+            return
+        writer = self._writers.get(path)
+        if writer is None:
+            writer = TickFileWriter(path, os.path.basename(os.path.dirname(path)))
+            self._writers[path] = writer
+        writer.write_block(rows)
+        self._buffers[path] = []
+        self.blocks_written += 1
+
+    def _close_path(self, path: str):
+        self._buffers.pop(path, None)
+        writer = self._writers.pop(path, None)
+        if writer is not None:
+            writer.close()
+
+    def flush(self):
+        for path in list(self._buffers):
+            self._flush_path(path)
+        self._last_flush = time.monotonic()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'blocks_written': self.blocks_written,
+            'queued': self._queue.qsize(),
+        }
+
+    def close(self):
+        """Дописывает очередь и неполные блоки, закрывает файлы"""
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join(timeout=10)
+        for path in list(self._writers):
+            self._close_path(path)
+        logger.info(f"[TickRecorder] Остановлен: {self.stats()}")
@@ -0,0 +1,508 @@
+"""
+Ускоренное воспроизведение записанных тиков для ShortAveragingStrategyCelery
+
+Тики из файлов TickRecorder подаются в стратегию с любой скоростью
+(вплоть до "как можно быстрее"). Ордера уходят не в pybit.HTTP, а в
+SimulatedSession - симулятор биржи, который исполняет рыночные, лимитные
+и стоп-ордера по воспроизводимым ценам. Время стратегии задает ReplayClock.
+События ордеров, исполнений и позиции симулятор отдает SimulatedPrivateStream
+(вместо приватного WebSocket аккаунта).
+
+Запуск:
+    python -m bybit.tick_replay --root /path/to/ticks --symbol BTCUSDT --day 2025-01-15
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from bybit.tick_recorder import TickFileReader
+from bybit.ws_decoder import Ticker
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+ORDER_NOT_EXISTS = 110001   # Код Bybit "order not exists or too late to cancel"
+
+
+class ReplayClock:
+    """Часы стратегии: время последнего воспроизведенного тика (секунды)"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def set_ms(self, ts_ms: int):
+        self.now = ts_ms / 1000
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _ok(result: Optional[Dict] = None) -> Dict:
+    return {'retCode': 0, 'retMsg': 'OK', 'result': result if result is not None else {}, 'time': 0}
+
+
+def _error(code: int, message: str) -> Dict:
+    return {'retCode': code, 'retMsg': message, 'result': {}, 'time': 0}
+
+
+class SimulatedSession:
+    """
+    Симулятор биржи с интерфейсом pybit.HTTP (подмножество, которое использует стратегия)
+
+    Позиция одна на символ (one-way mode). Рыночные ордера исполняются по
+    последней цене, лимитные - по своей цене при ее достижении, стоп-ордера
+    (stopPrice/triggerPrice) и TP/SL позиции (set_trading_stop) - по цене
+    тика, на котором сработали.
+    """
+
+    def __init__(self, qty_step: float = 0.001, min_qty: float = 0.001, max_qty: float = 1_000_000,
+                 fee_rate: float = 0.00055):
+        self.qty_step = qty_step
+        self.min_qty = min_qty
+        self.max_qty = max_qty
+        self.fee_rate = fee_rate
+        self.prices: Dict[str, float] = {}
+        self.ts = 0
+        self.positions: Dict[str, Dict[str, float]] = {}   # символ -> {'qty': со знаком, 'avg': цена}
+        self.orders: Dict[str, Dict] = {}                  # Активные ордера
+        self.trading_stops: Dict[str, Dict[str, float]] = {}   # символ -> {'stopLoss': цена, 'takeProfit': цена}
+        self.history: Dict[str, Dict] = {}                 # Исполненные и отмененные
+        self.fills: List[Dict] = []
+        self.realized_pnl = 0.0
+        self.fees = 0.0
+        self._ids = itertools.count(1)
+        self.listeners: List[Callable[[str, Dict], None]] = []   # События приватного потока (kind, item)
+
+    # ==================== ДВИЖЕНИЕ ЦЕНЫ ====================
+
+    def on_price(self, symbol: str, price: float, ts: int = 0):
+        """Новая цена символа: проверяет срабатывание ордеров"""
+        self.prices[symbol] = price
+        self.ts = ts
+        for order in [o for o in self.orders.values() if o['symbol'] == symbol]:
+            if order['orderId'] not in self.orders:
+                continue  # Отменен reduce-only после закрытия позиции
+            fill_price = self._trigger_price(order, price)
+            if fill_price is not None:
+                self._fill(order, fill_price)
+        self._check_trading_stop(symbol, price)
+
+    def _check_trading_stop(self, symbol: str, price: float):
+        """TP/SL позиции: закрывает всю позицию рыночным ордером по цене тика"""
+        stops = self.trading_stops.get(symbol)
+        position = self.positions.get(symbol)
+        if not stops or not position or position['qty'] == 0:
+            return
+        short = position['qty'] < 0
+        stop_loss = stops.get('stopLoss')
+        take_profit = stops.get('takeProfit')
+        if stop_loss and (price >= stop_loss if short else price <= stop_loss):
+            kind = 'StopLoss'
+        elif take_profit and (price <= take_profit if short else price >= take_profit):
+            kind = 'TakeProfit'
+        else:
+            return
+        order_id = f"sim-{next(self._ids)}"
+        order = {
+            'orderId': order_id,
+            'orderLinkId': '',
+            'symbol': symbol,
+            'side': 'Buy' if short else 'Sell',
+            'orderType': 'Market',
+            'stopOrderType': kind,
+            'qty': str(abs(position['qty'])),
+            'price': '0',
+            'triggerPrice': str(stop_loss if kind == 'StopLoss' else take_profit),
+            'reduceOnly': True,
+            'closeOnTrigger': True,
+            'orderStatus': 'Triggered',
+            'createdTime': str(self.ts),
+        }
+        self.orders[order_id] = order
+        self._fill(order, price)
+
+    def _trigger_price(self, order: Dict, price: float) -> Optional[float]:
+        if order['orderType'] == 'Limit':
+            limit = float(order['price'])
+            if order['side'] == 'Sell' and price >= limit:
+                return limit
+            if order['side'] == 'Buy' and price <= limit:
+                return limit
+            return None
+        trigger = float(order['triggerPrice'])
+        direction = order.get('triggerDirection')
+        if direction is None:
+            # Без направления: стоп на покупку срабатывает на росте, на продажу - на падении
+            direction = 1 if order['side'] == 'Buy' else 2
+        if (direction == 1 and price >= trigger) or (direction == 2 and price <= trigger):
+            return price
+        return None
+
+    # ==================== ИСПОЛНЕНИЕ ====================
+
+    def _fill(self, order: Dict, price: float):
+        symbol = order['symbol']
+        position = self.positions.setdefault(symbol, {'qty': 0.0, 'avg': 0.0})
+        qty = float(order['qty'])
+        signed = qty if order['side'] == 'Buy' else -qty
+
+        if order.get('reduceOnly') or order.get('closeOnTrigger'):
+            # Reduce-only не может увеличить или перевернуть позицию
+            if position['qty'] == 0 or (position['qty'] > 0) == (signed > 0):
+                self._finish(order, 'Cancelled')
+                return
+            signed = max(-abs(position['qty']), min(abs(position['qty']), signed))
+
+        current = position['qty']
+        if current == 0 or (current > 0) == (signed > 0):
+            total = current + signed
+            position['avg'] = (position['avg'] * abs(current) + price * abs(signed)) / abs(total)
+            position['qty'] = total
+        else:
+            closed = min(abs(current), abs(signed))
+            direction = 1 if current > 0 else -1
+            self.realized_pnl += (price - position['avg']) * closed * direction
+            remainder = current + signed
+            if abs(remainder) < 1e-12:
+                position['qty'], position['avg'] = 0.0, 0.0
+            elif (remainder > 0) == (current > 0):
+                position['qty'] = remainder
+            else:
+                position['qty'], position['avg'] = remainder, price
+
+        fee = abs(signed) * price * self.fee_rate
+        self.fees += fee
+        order['avgPrice'] = str(price)
+        order['cumExecQty'] = str(abs(signed))
+        self._emit('execution', {
+            'symbol': symbol, 'orderId': order['orderId'], 'side': order['side'], 'execType': 'Trade',
+            'execPrice': str(price), 'execQty': str(abs(signed)), 'leavesQty': '0', 'execFee': str(fee),
+        })
+        self._finish(order, 'Filled')
+        self.fills.append({
+            'ts': self.ts, 'symbol': symbol, 'side': order['side'], 'orderType': order['orderType'],
+            'qty': abs(signed), 'price': price, 'fee': fee, 'orderId': order['orderId'],
+        })
+
+        if position['qty'] == 0:
+            # Позиция закрыта - биржа снимает TP/SL позиции и reduce-only ордера символа
+            self.trading_stops.pop(symbol, None)
+            for other in [o for o in self.orders.values() if o['symbol'] == symbol]:
+                if other.get('reduceOnly') or other.get('closeOnTrigger'):
+                    self._finish(other, 'Deactivated')
+        self._emit('position', self._position_item(symbol))
+
+    def _finish(self, order: Dict, status: str):
+        order['orderStatus'] = status
+        order['updatedTime'] = str(self.ts)
+        self.orders.pop(order['orderId'], None)
+        self.history[order['orderId']] = order
+        self._emit('order', dict(order))
+
+    def _emit(self, kind: str, item: Dict):
+        for listener in self.listeners:
+            listener(kind, item)
+
+    def _position_item(self, symbol: str) -> Dict:
+        position = self.positions[symbol]
+        qty = position['qty']
+        return {
+            'symbol': symbol,
+            'side': 'Buy' if qty > 0 else ('Sell' if qty < 0 else ''),
+            'size': str(abs(qty)),
+            'avgPrice': str(position['avg']),
+            'positionIdx': 0,
+            'stopLoss': str(self.trading_stops.get(symbol, {}).get('stopLoss') or ''),
+            'takeProfit': str(self.trading_stops.get(symbol, {}).get('takeProfit') or ''),
+        }
+
+    # ==================== API pybit.HTTP ====================
+
+    def get_instruments_info(self, category: str = "linear", symbol: str = None, **kwargs) -> Dict:
+        return _ok({'category': category, 'list': [{
+            'symbol': symbol,
+            'lotSizeFilter': {
+                'qtyStep': str(self.qty_step), 'minOrderQty': str(self.min_qty), 'maxOrderQty': str(self.max_qty),
+            },
+        }]})
+
+    def get_tickers(self, category: str = "linear", symbol: str = None, **kwargs) -> Dict:
+        symbols = [symbol] if symbol else list(self.prices)
+        return _ok({'category': category, 'list': [
+            {'symbol': s, 'lastPrice': str(self.prices[s])} for s in symbols if s in self.prices
+        ]})
+
+    def get_positions(self, category: str = "linear", symbol: str = None, **kwargs) -> Dict:
+        result = [self._position_item(s) for s in self.positions if not symbol or s == symbol]
+        return _ok({'category': category, 'list': result})
+
+    def get_open_orders(self, category: str = "linear", symbol: str = None, orderId: str = None, **kwargs) -> Dict:
+        orders = [
+            dict(o) for o in self.orders.values()
+            if (not symbol or o['symbol'] == symbol) and (not orderId or o['orderId'] == orderId)
+        ]
+        return _ok({'category': category, 'list': orders})
+
+    def get_order_history(self, category: str = "linear", symbol: str = None, orderId: str = None, **kwargs) -> Dict:
+        orders = [
+            dict(o) for o in list(self.history.values())[::-1]
+            if (not symbol or o['symbol'] == symbol) and (not orderId or o['orderId'] == orderId)
+        ]
+        return _ok({'category': category, 'list': orders})
+
+    def place_order(self, category: str = "linear", symbol: str = None, side: str = None,
+                    orderType: str = "Market", qty=None, price=None, **kwargs) -> Dict:
+        if symbol not in self.prices:
+            return _error(10001, f"Нет цены для {symbol}")
+        if not qty or float(qty) <= 0:
+            return _error(10001, "Qty invalid")
+
+        order_id = f"sim-{next(self._ids)}"
+        trigger = kwargs.get('triggerPrice', kwargs.get('stopPrice'))
+        order = {
+            'orderId': order_id,
+            'orderLinkId': kwargs.get('orderLinkId', ''),
+            'symbol': symbol,
+            'side': side,
+            'orderType': orderType,
+            'qty': str(qty),
+            'price': str(price) if price is not None else '0',
+            'triggerPrice': str(trigger) if trigger is not None else '',
+            'reduceOnly': bool(kwargs.get('reduceOnly', False)),
+            'closeOnTrigger': bool(kwargs.get('closeOnTrigger', False)),
+            'orderStatus': 'Untriggered' if trigger is not None else 'New',
+            'createdTime': str(self.ts),
+        }
+        if kwargs.get('triggerDirection') is not None:
+            order['triggerDirection'] = int(kwargs['triggerDirection'])
+
+        self.orders[order_id] = order
+        last = self.prices[symbol]
+        if trigger is None and orderType == 'Market':
+            self._fill(order, last)
+        else:
+            # Лимит или стоп, который уже "в деньгах", исполняется сразу
+            fill_price = self._trigger_price(order, last)
+            if fill_price is not None:
+                self._fill(order, fill_price)
+        return _ok({'orderId': order_id, 'orderLinkId': order['orderLinkId']})
+
+    def place_batch_order(self, category: str = "linear", request: List[Dict] = None, **kwargs) -> Dict:
+        """Пакет ордеров: ноги выставляются по порядку, ответ - два списка, как у /v5/order/create-batch"""
+        items, codes = [], []
+        for leg in request or []:
+            response = self.place_order(category=category, **leg)
+            result = response['result']
+            items.append({'category': category, 'symbol': leg.get('symbol'),
+                          'orderId': result.get('orderId', ''),
+                          'orderLinkId': result.get('orderLinkId', leg.get('orderLinkId', ''))})
+            codes.append({'code': response['retCode'], 'msg': response['retMsg']})
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'list': items}, 'retExtInfo': {'list': codes}, 'time': 0}
+
+    def amend_order(self, category: str = "linear", symbol: str = None, orderId: str = None, **kwargs) -> Dict:
+        order = self.orders.get(orderId)
+        if order is None:
+            return _error(ORDER_NOT_EXISTS, "order not exists or too late to amend")
+        if kwargs.get('qty') is not None:
+            order['qty'] = str(kwargs['qty'])
+        if kwargs.get('price') is not None:
+            order['price'] = str(kwargs['price'])
+        if kwargs.get('triggerPrice') is not None:
+            order['triggerPrice'] = str(kwargs['triggerPrice'])
+        fill_price = self._trigger_price(order, self.prices[order['symbol']])
+        if fill_price is not None:
+            self._fill(order, fill_price)
+        return _ok({'orderId': orderId, 'orderLinkId': order['orderLinkId']})
+
+    def set_trading_stop(self, category: str = "linear", symbol: str = None, stopLoss=None,
+                         takeProfit=None, **kwargs) -> Dict:
+        """TP/SL всей позиции (tpslMode=Full); "0" снимает уровень"""
+        position = self.positions.get(symbol)
+        if not position or position['qty'] == 0:
+            return _error(10001, "can not set tp/sl/ts for zero position")
+        short = position['qty'] < 0
+        last = self.prices[symbol]
+        levels = {}
+        for name, value, above in (('stopLoss', stopLoss, short), ('takeProfit', takeProfit, not short)):
+            if value is None:
+                continue
+            level = float(value)
+            if level and (level <= last if above else level >= last):
+                side = 'Sell' if short else 'Buy'
+                relation = 'greater' if above else 'less'
+                return _error(10001, f"{name}:{level} set for {side} position should {relation} base_price:{last}")
+            levels[name] = level or None
+        self.trading_stops.setdefault(symbol, {}).update(levels)
+        self._emit('position', self._position_item(symbol))
+        return _ok({})
+
+    def cancel_order(self, category: str = "linear", symbol: str = None, orderId: str = None, **kwargs) -> Dict:
+        order = self.orders.get(orderId)
+        if order is None:
+            return _error(ORDER_NOT_EXISTS, "order not exists or too late to cancel")
+        self._finish(order, 'Cancelled')
+        return _ok({'orderId': orderId, 'orderLinkId': order['orderLinkId']})
+
+    def summary(self) -> Dict:
+        return {
+            'fills': len(self.fills),
+            'realized_pnl': self.realized_pnl,
+            'fees': self.fees,
+            'net_pnl': self.realized_pnl - self.fees,
+            'open_orders': len(self.orders),
+            'positions': {s: p['qty'] for s, p in self.positions.items() if p['qty']},
+        }
+
+
+class SimulatedPrivateStream:
+    """Приватный поток (интерфейс PrivateStream) на событиях SimulatedSession"""
+
+    def __init__(self, session: SimulatedSession):
+        self._callbacks: Dict[str, List[Callable]] = {}
+        self.connected = True
+        self.events = 0
+        session.listeners.append(self._on_event)
+
+    def subscribe(self, symbol: str, callback: Callable):
+        self._callbacks.setdefault(symbol.upper(), []).append(callback)
+
+    def unsubscribe(self, symbol: str, callback: Callable):
+        callbacks = self._callbacks.get(symbol.upper(), [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def reconnect(self):
+        """Имитация переподключения: подписчики получают 'resync'"""
+        self.connected = True
+        for symbol, callbacks in self._callbacks.items():
+            for callback in list(callbacks):
+                callback('resync', {'symbol': symbol})
+
+    def _on_event(self, kind: str, item: Dict):
+        if not self.connected:
+            return  # Обрыв: события теряются, как на бирже
+        self.events += 1
+        for callback in list(self._callbacks.get(item['symbol'], [])):
+            callback(kind, item)
+
+
+def load_ticks(root: str, symbol: str, days: Iterable[str]) -> Iterator[Ticker]:
+    """Тики символа из файлов TickRecorder за указанные дни (YYYY-MM-DD) по порядку"""
+    symbol = symbol.upper()
+    for day in days:
+        directory = os.path.join(root, symbol)
+        # Основной файл дня и файлы с pid (если писали несколько процессов)
+        names = sorted(n for n in os.listdir(directory) if n.startswith(day) and n.endswith(".ticks"))
+        for name in names:
+            reader = TickFileReader(os.path.join(directory, name))
+            try:
+                for block in reader.iter_blocks():
+                    for ts, last, bid, ask, volume in zip(
+                        block['ts'].tolist(), block['last'].tolist(), block['bid'].tolist(),
+                        block['ask'].tolist(), block['volume'].tolist(),
+                    ):
+                        yield Ticker(symbol, ts, last, bid, ask, 0.0, volume)
+            finally:
+                reader.close()
+
+
+class TickReplay:
+    """
+    Подает тики в стратегию по одному в event loop: сначала биржа исполняет ордера по цене тика,
+    затем стратегия обрабатывает тот же тик, и ее запросы к бирже отправляются до следующего тика
+
+    speed: None - как можно быстрее, 1.0 - реальное время, 60.0 - минута за секунду.
+    """
+
+    def __init__(self, strategy, session: SimulatedSession, clock: ReplayClock, speed: Optional[float] = None):
+        self.strategy = strategy
+        self.session = session
+        self.clock = clock
+        self.speed = speed
+        self.ticks = 0
+
+    async def run(self, ticks: Iterable[Ticker]) -> Dict:
+        started = time.perf_counter()
+        if getattr(self.strategy, 'private_stream', None) is not None:
+            self.strategy.subscribe_private_stream()
+        first_ts = None
+        for ticker in ticks:
+            if self.speed and first_ts is not None:
+                # Выдерживаем масштабированное время между тиками
+                target = started + (ticker.ts - first_ts) / 1000 / self.speed
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if first_ts is None:
+                first_ts = ticker.ts
+
+            self.clock.set_ms(ticker.ts)
+            self.session.on_price(ticker.symbol, ticker.last_price, ticker.ts)
+            if self.session.listeners:
+                # События приватного потока от исполнений на этом тике - до обработки тика
+                await asyncio.sleep(0)
+            await self.strategy.process_message(ticker)
+            orders = getattr(self.strategy, 'orders', None)
+            if orders is not None:
+                await orders.join()
+            self.ticks += 1
+            if self.strategy.should_stop:
+                break
+
+        elapsed = time.perf_counter() - started
+        result = self.session.summary()
+        result.update({
+            'ticks': self.ticks,
+            'elapsed': elapsed,
+            'ticks_per_sec': self.ticks / elapsed if elapsed > 0 else 0.0,
+            'stopped': bool(self.strategy.should_stop),
+        })
+        return result
+
+
+def replay_strategy(ticks: Iterable[Ticker], symbol: str, speed: Optional[float] = None,
+                    session: Optional[SimulatedSession] = None, private_stream: bool = False,
+                    **strategy_kwargs) -> Dict:
+    """Создает стратегию на симуляторе и прогоняет через нее тики (private_stream - события вместо опроса)"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+
+    session = session or SimulatedSession()
+    clock = ReplayClock()
+    strategy = ShortAveragingStrategyCelery(
+        symbol=symbol, session=session, clock=clock, notifications=False,
+        private_stream=SimulatedPrivateStream(session) if private_stream else None, **strategy_kwargs
+    )
+    return asyncio.run(TickReplay(strategy, session, clock, speed).run(ticks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных тиков через стратегию")
+    parser.add_argument("--root", required=True, help="Каталог TickRecorder (TICK_RECORDER_DIR)")
+    parser.add_argument("--symbol", required=True)
+    parser.add_argument("--day", action="append", required=True, help="День YYYY-MM-DD (можно несколько)")
+    parser.add_argument("--speed", type=float, default=None, help="Множитель скорости (по умолчанию - максимум)")
+    parser.add_argument("--usdt", type=float, default=100, help="Сумма позиции в USDT")
+    parser.add_argument("--protection", choices=("orders", "trading_stop"), default="orders",
+                        help="Защита позиции: Stop-ордера или стоп-лосс позиции (set_trading_stop)")
+    parser.add_argument("--private-stream", action="store_true",
+                        help="Исполнения и позиция событиями приватного потока вместо опроса REST")
+    args = parser.parse_args()
+
+    result = replay_strategy(
+        load_ticks(args.root, args.symbol, args.day), args.symbol, args.speed, usdt_amount=args.usdt,
+        protection_mode=args.protection, private_stream=args.private_stream
+    )
+    logger.info(f"[TickReplay] {args.symbol} {', '.join(args.day)}: {result}")
+    print(f"Тиков: {result['ticks']} за {result['elapsed']:.2f} сек ({result['ticks_per_sec']:,.0f} тиков/сек)")
+    print(f"Сделок: {result['fills']}, PnL: {result['realized_pnl']:.4f} USDT, "
+          f"комиссии: {result['fees']:.4f}, итог: {result['net_pnl']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
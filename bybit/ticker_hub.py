@@ -0,0 +1,342 @@
+"""
+Общий мультиплексированный WebSocket тикеров Bybit для всех стратегий процесса
+
+Вместо отдельного соединения на каждую стратегию держим ОДНО соединение
+с публичным потоком linear, подписки считаются по ссылкам (ref-count)
+на каждый топик, а тики раздаются зарегистрированным callback'ам.
+Помимо тикеров поддерживаются стаканы orderbook.{depth}.{symbol}.
+Кадры тикеров декодируются быстрым путем bybit/ws_decoder.py в Ticker.
+Свежесть потока контролирует FeedWatchdog (bybit/feed_watchdog.py).
+"""
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import websocket
+
+from bybit.feed_watchdog import FeedWatchdog, backoff_delay
+from bybit.orderbook import OrderBook, orderbook_topic
+from bybit.ws_decoder import (
+    Ticker, TickerUpdate, decode_ticker, is_ticker_frame, loads, merge_ticker, ticker_update_from_message,
+)
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+PUBLIC_LINEAR_WS_URL = "wss://stream.bybit.com/v5/public/linear"
+PING_INTERVAL = 20          # Bybit закрывает соединение без пинга ~30 секунд
+MAX_ARGS_PER_REQUEST = 10   # Лимит топиков в одном сообщении subscribe
+
+
+def ticker_topic(symbol: str) -> str:
+    """Возвращает имя топика тикера для символа"""
+    return f"tickers.{symbol}"
+
+
+class TickerHub:
+    """Один WebSocket на процесс с подсчетом подписок по топикам"""
+
+    def __init__(self, url: str = PUBLIC_LINEAR_WS_URL):
+        self.url = url
+        self._lock = threading.RLock()
+        self._callbacks: Dict[str, List[Callable]] = {}   # топик -> callback'и
+        # Bybit присылает snapshot, затем delta только с измененными полями -
+        # храним склеенное состояние тикера, чтобы callback всегда видел lastPrice
+        self._tickers: Dict[str, Ticker] = {}
+        self._books: Dict[str, OrderBook] = {}
+        self._last_tick: Dict[str, float] = {}           # символ -> monotonic последнего тика
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ping_thread: Optional[threading.Thread] = None
+        self._connected = threading.Event()
+        self._running = False
+        self._reconnect_attempt = 0
+        self._was_connected = False
+        self.watchdog = FeedWatchdog(self)
+        self.recorder = None    # TickRecorder: запись живых тиков на диск (опционально)
+
+        # Статистика
+        self.messages_received = 0
+        self.reconnects = 0
+
+    # ==================== ПОДПИСКИ ====================
+
+    def _add_callback(self, topic: str, callback: Callable):
+        with self._lock:
+            callbacks = self._callbacks.setdefault(topic, [])
+            callbacks.append(callback)
+            self._ensure_started()
+            if len(callbacks) == 1:
+                # Под блокировкой: параллельная отписка не отправит unsubscribe после этого subscribe
+                self._send_op("subscribe", [topic])
+        logger.info(f"[TickerHub] Подписка на {topic} (подписчиков: {len(callbacks)})")
+
+    def _remove_callback(self, topic: str, callback: Callable) -> bool:
+        """Удаляет callback; возвращает True, если это был последний подписчик топика"""
+        with self._lock:
+            callbacks = self._callbacks.get(topic)
+            if not callbacks or callback not in callbacks:
+                return False
+            callbacks.remove(callback)
+            if callbacks:
+                return False
+            del self._callbacks[topic]
+            self._send_op("unsubscribe", [topic])
+        logger.info(f"[TickerHub] Отписка от {topic}: подписчиков не осталось")
+        return True
+
+    def subscribe(self, symbol: str, callback: Callable):
+        """Добавляет callback тикера (получает Ticker); соединение открывается только один раз"""
+        symbol = symbol.upper()
+        with self._lock:
+            # Возраст тика считаем от момента подписки, пока не пришел первый тик
+            self._last_tick.setdefault(symbol, time.monotonic())
+            self._add_callback(ticker_topic(symbol), callback)
+
+    def unsubscribe(self, symbol: str, callback: Callable):
+        """Удаляет callback тикера; при последнем подписчике отписывается от топика"""
+        symbol = symbol.upper()
+        with self._lock:
+            if self._remove_callback(ticker_topic(symbol), callback):
+                self._tickers.pop(symbol, None)
+                self._last_tick.pop(symbol, None)
+
+    def subscribe_orderbook(self, symbol: str, callback: Callable, depth: int = 50):
+        """Подписка на стакан: callback получает объект OrderBook после каждого обновления"""
+        topic = orderbook_topic(symbol.upper(), depth)
+        with self._lock:
+            if topic not in self._books:
+                self._books[topic] = OrderBook(symbol.upper(), depth)
+            self._add_callback(topic, callback)
+
+    def unsubscribe_orderbook(self, symbol: str, callback: Callable, depth: int = 50):
+        topic = orderbook_topic(symbol.upper(), depth)
+        with self._lock:
+            if self._remove_callback(topic, callback):
+                self._books.pop(topic, None)
+
+    def get_orderbook(self, symbol: str, depth: int = 50) -> Optional[OrderBook]:
+        """Возвращает локальный стакан символа (если на него есть подписка)"""
+        with self._lock:
+            return self._books.get(orderbook_topic(symbol.upper(), depth))
+
+    def subscriber_count(self, symbol: str) -> int:
+        """Возвращает количество подписчиков тикера символа"""
+        with self._lock:
+            return len(self._callbacks.get(ticker_topic(symbol.upper()), []))
+
+    def get_symbols(self) -> List[str]:
+        """Возвращает список символов с активными подписками на тикер"""
+        with self._lock:
+            return [topic[len('tickers.'):] for topic in self._callbacks if topic.startswith('tickers.')]
+
+    def get_last_ticker(self, symbol: str) -> Optional[Ticker]:
+        """Возвращает последнее известное состояние тикера"""
+        with self._lock:
+            return self._tickers.get(symbol.upper())
+
+    def is_connected(self) -> bool:
+        return self._connected.is_set()
+
+    def tick_ages(self) -> Dict[str, float]:
+        """Секунды с последнего тика по каждому символу с подпиской на тикер"""
+        now = time.monotonic()
+        with self._lock:
+            return {symbol: now - at for symbol, at in self._last_tick.items()}
+
+    def tick_age(self, symbol: str) -> Optional[float]:
+        with self._lock:
+            at = self._last_tick.get(symbol.upper())
+        return time.monotonic() - at if at is not None else None
+
+    def reconnect(self):
+        """Принудительно закрывает соединение - поток переподключится сам"""
+        ws = self._ws
+        if ws:
+            try:
+                ws.close()
+            except Exception as e:
+                logger.warning(f"[TickerHub] Ошибка при закрытии WebSocket: {e}")
+
+    def resubscribe(self, symbols: List[str]):
+        """Повторная подписка на тикеры символов (биржа пришлет свежий snapshot)"""
+        topics = [ticker_topic(symbol.upper()) for symbol in symbols]
+        self._send_op("unsubscribe", topics)
+        self._send_op("subscribe", topics)
+
+    def apply_snapshot(self, update: TickerUpdate) -> bool:
+        """Применяет тикер из REST, если он не старее уже полученного из потока"""
+        with self._lock:
+            current = self._tickers.get(update.symbol)
+            if current is not None and current.ts > update.ts:
+                return False
+        self._on_ticker(update, live=False)
+        return True
+
+    # ==================== СОЕДИНЕНИЕ ====================
+
+    def _ensure_started(self):
+        """Запускает поток соединения при первой подписке"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run_forever, name="TickerHub", daemon=True)
+        self._thread.start()
+        self._ping_thread = threading.Thread(target=self._ping_loop, name="TickerHubPing", daemon=True)
+        self._ping_thread.start()
+        self.watchdog.start()
+
+    def _run_forever(self):
+        """Держит соединение открытым и переподключается при обрыве"""
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            try:
+                self._ws.run_forever()
+            except Exception as e:
+                logger.error(f"[TickerHub] Ошибка соединения: {e}")
+            self._connected.clear()
+
+            if self._running:
+                self.reconnects += 1
+                delay = backoff_delay(self._reconnect_attempt)
+                self._reconnect_attempt += 1
+                logger.warning(f"[TickerHub] Соединение потеряно, переподключение через {delay:.1f} сек")
+                time.sleep(delay)
+
+    def _ping_loop(self):
+        """Отправляет ping, чтобы Bybit не закрыл соединение"""
+        while self._running:
+            time.sleep(PING_INTERVAL)
+            if self._connected.is_set():
+                self._send({"op": "ping"})
+
+    def close(self):
+        """Закрывает соединение и останавливает потоки"""
+        self._running = False
+        self._connected.clear()
+        self.watchdog.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self._ws:
+            try:
+                self._ws.close()
+            except Exception as e:
+                logger.warning(f"[TickerHub] Ошибка при закрытии WebSocket: {e}")
+        logger.info("[TickerHub] Соединение закрыто")
+
+    def _send(self, payload: Dict) -> bool:
+        ws = self._ws
+        if not ws or not self._connected.is_set():
+            return False
+        try:
+            ws.send(json.dumps(payload))
+            return True
+        except Exception as e:
+            logger.warning(f"[TickerHub] Не удалось отправить {payload.get('op')}: {e}")
+            return False
+
+    def _send_op(self, op: str, topics: List[str]):
+        """Отправляет subscribe/unsubscribe пачками по MAX_ARGS_PER_REQUEST (под self._lock)"""
+        # Если соединение еще не открыто - подписка уйдет из _on_open
+        for i in range(0, len(topics), MAX_ARGS_PER_REQUEST):
+            self._send({"op": op, "args": topics[i:i + MAX_ARGS_PER_REQUEST]})
+
+    # ==================== CALLBACK'И WEBSOCKET ====================
+
+    def _on_open(self, ws):
+        self._connected.set()
+        self._reconnect_attempt = 0
+        with self._lock:
+            topics = list(self._callbacks.keys())
+            logger.info(f"[TickerHub] Соединение открыто, подписываемся на {len(topics)} топиков")
+            self._send_op("subscribe", topics)
+        if self._was_connected:
+            # Тики за время обрыва потеряны - текущие цены подтянет сторож одним REST-запросом
+            self.watchdog.request_backfill(self.get_symbols())
+        self._was_connected = True
+
+    def _on_error(self, ws, error):
+        logger.error(f"[TickerHub] Ошибка WebSocket: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        self._connected.clear()
+        logger.info(f"[TickerHub] Соединение закрыто: {status_code} {message}")
+
+    def _on_message(self, ws, raw: str):
+        # Быстрый путь: тикеры декодируются сразу в типизированную структуру
+        if is_ticker_frame(raw):
+            try:
+                update = decode_ticker(raw)
+            except ValueError:
+                update = None
+            if update is not None:
+                self.messages_received += 1
+                self._on_ticker(update)
+                return
+
+        try:
+            message = loads(raw)
+        except ValueError:
+            logger.warning(f"[TickerHub] Некорректное сообщение: {raw[:200]}")
+            return
+
+        if 'op' in message:
+            if message.get('op') == 'subscribe' and not message.get('success', True):
+                logger.error(f"[TickerHub] Ошибка подписки: {message.get('ret_msg')}")
+            return
+
+        topic = message.get('topic', '')
+        self.messages_received += 1
+        if topic.startswith('orderbook.'):
+            self._on_orderbook(topic, message)
+        elif topic.startswith('tickers.'):
+            # Кадр в нестандартной записи, не прошедший быстрый путь
+            update = ticker_update_from_message(message)
+            if update is not None:
+                self._on_ticker(update)
+
+    def _on_ticker(self, update: TickerUpdate, live: bool = True):
+        topic = ticker_topic(update.symbol)
+        with self._lock:
+            if live and update.symbol in self._last_tick:
+                self._last_tick[update.symbol] = time.monotonic()
+            callbacks = self._callbacks.get(topic)
+            if not callbacks:
+                return
+            callbacks = list(callbacks)
+            ticker = merge_ticker(self._tickers.get(update.symbol), update)
+            self._tickers[update.symbol] = ticker
+
+        if live and self.recorder is not None:
+            self.recorder.record(ticker)
+
+        self._dispatch(topic, callbacks, ticker)
+
+    def _on_orderbook(self, topic: str, message: Dict):
+        with self._lock:
+            callbacks = self._callbacks.get(topic)
+            book = self._books.get(topic)
+            if not callbacks or book is None:
+                return
+            callbacks = list(callbacks)
+        book.apply_message(message)
+        self._dispatch(topic, callbacks, book)
+
+    def _dispatch(self, topic: str, callbacks: List[Callable], payload):
+        """Раздает обновление всем подписчикам; ошибка одного не мешает остальным"""
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"[TickerHub] Ошибка в callback для {topic}: {e}", exc_info=True)
+
+
+# Глобальный экземпляр хаба тикеров (один на процесс)
+ticker_hub = TickerHub()
@@ -0,0 +1,77 @@
+"""
+Таблица ценовых порогов стратегии
+
+Состояние стратегии (вход, усреднение, стоп-лосс, безубыток, фиктивный TP)
+при каждом изменении компилируется в отсортированные массивы абсолютных цен.
+На тике достаточно сравнить цену с ближайшим верхним и нижним порогом:
+если ни один не пересечен - делать нечего. Только при пересечении bisect
+находит сработавшие пороги, и стратегия выполняет полную проверку.
+"""
+from bisect import bisect_left, bisect_right
+from typing import FrozenSet, Iterable, List, Tuple
+
+# Запас на погрешность float: порог срабатывает чуть раньше, точную проверку делает стратегия
+EPSILON = 1e-9
+
+Threshold = Tuple[float, str]   # (цена, вид порога)
+
+
+def _sorted(thresholds: Iterable[Threshold]) -> Tuple[List[float], List[str]]:
+    ordered = sorted(thresholds)
+    return [price for price, _ in ordered], [kind for _, kind in ordered]
+
+
+class TriggerTable:
+    """
+    Пороги трех видов:
+      above_last  - срабатывают при last >= цены (уровень усреднения)
+      above_close - при цене закрытия шорта >= цены (стоп-лосс, безубыток)
+      below       - при last <= цены (тейк-профит, шаги безубытка, фиктивный TP)
+    """
+
+    def __init__(self):
+        self.builds = 0
+        self.clear()
+
+    def clear(self):
+        self._above_last: List[float] = []
+        self._above_last_kinds: List[str] = []
+        self._above_close: List[float] = []
+        self._above_close_kinds: List[str] = []
+        self._below: List[float] = []
+        self._below_kinds: List[str] = []
+        self.upper_last = float('inf')
+        self.upper_close = float('inf')
+        self.lower = float('-inf')
+
+    def build(self, above_last: Iterable[Threshold] = (), above_close: Iterable[Threshold] = (),
+              below: Iterable[Threshold] = ()):
+        """Перестраивает таблицу; вызывается только при изменении состояния стратегии"""
+        self._above_last, self._above_last_kinds = _sorted(
+            (price * (1 - EPSILON), kind) for price, kind in above_last
+        )
+        self._above_close, self._above_close_kinds = _sorted(
+            (price * (1 - EPSILON), kind) for price, kind in above_close
+        )
+        self._below, self._below_kinds = _sorted((price * (1 + EPSILON), kind) for price, kind in below)
+        self.upper_last = self._above_last[0] if self._above_last else float('inf')
+        self.upper_close = self._above_close[0] if self._above_close else float('inf')
+        self.lower = self._below[-1] if self._below else float('-inf')
+        self.builds += 1
+
+    def check(self, last: float, close: float) -> FrozenSet[str]:
+        """Виды сработавших порогов; пустое множество - цена между ближайшими порогами"""
+        if last < self.upper_last and close < self.upper_close and last > self.lower:
+            return frozenset()
+        kinds = self._above_last_kinds[:bisect_right(self._above_last, last)]
+        kinds += self._above_close_kinds[:bisect_right(self._above_close, close)]
+        kinds += self._below_kinds[bisect_left(self._below, last):]
+        return frozenset(kinds)
+
+    def thresholds(self) -> List[Threshold]:
+        """Все пороги по возрастанию цены (для логов)"""
+        return sorted(
+            list(zip(self._above_last, self._above_last_kinds))
+            + list(zip(self._above_close, self._above_close_kinds))
+            + list(zip(self._below, self._below_kinds))
+        )
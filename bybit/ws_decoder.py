@@ -0,0 +1,152 @@
+"""
+Быстрое декодирование кадров WebSocket Bybit в типизированные тикеры
+
+Кадр tickers.{symbol} разбирается только по нужным стратегиям полям
+(lastPrice, bid1Price, ask1Price, markPrice, volume24h) - сразу во float,
+без обхода вложенных словарей в каждом callback'е. Используется самый
+быстрый доступный декодер: msgspec (схема), orjson, стандартный json.
+"""
+import json
+from typing import NamedTuple, Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TICKER_TOPIC_MARK = '"topic":"tickers.'
+
+
+class Ticker(NamedTuple):
+    """Склеенное состояние тикера символа"""
+    symbol: str
+    ts: int                 # Время биржи (мс)
+    last_price: float
+    bid_price: float
+    ask_price: float
+    mark_price: float
+    volume24h: float
+
+
+class TickerUpdate(NamedTuple):
+    """Одно сообщение тикера: None - поле не пришло в delta"""
+    symbol: str
+    is_snapshot: bool
+    ts: int
+    last_price: Optional[float]
+    bid_price: Optional[float]
+    ask_price: Optional[float]
+    mark_price: Optional[float]
+    volume24h: Optional[float]
+
+
+if orjson is not None:
+    loads = orjson.loads
+    BACKEND = "orjson"
+else:
+    loads = json.loads
+    BACKEND = "json"
+
+
+def _to_float(value) -> Optional[float]:
+    # None - поле не пришло, пустая строка - биржа не знает значения
+    return float(value) if value else None
+
+
+def ticker_update_from_message(message: dict) -> Optional[TickerUpdate]:
+    """TickerUpdate из уже разобранного сообщения tickers.*"""
+    topic = message.get('topic', '')
+    data = message.get('data')
+    if not topic.startswith('tickers.') or not isinstance(data, dict):
+        return None
+    return TickerUpdate(
+        topic[len('tickers.'):],
+        message.get('type') == 'snapshot',
+        int(message.get('ts') or 0),
+        _to_float(data.get('lastPrice')),
+        _to_float(data.get('bid1Price')),
+        _to_float(data.get('ask1Price')),
+        _to_float(data.get('markPrice')),
+        _to_float(data.get('volume24h')),
+    )
+
+
+def _decode_ticker_dict(raw: Union[str, bytes]) -> Optional[TickerUpdate]:
+    return ticker_update_from_message(loads(raw))
+
+
+if msgspec is not None:
+    class _TickerData(msgspec.Struct):
+        lastPrice: Optional[float] = None
+        bid1Price: Optional[float] = None
+        ask1Price: Optional[float] = None
+        markPrice: Optional[float] = None
+        volume24h: Optional[float] = None
+
+    class _TickerFrame(msgspec.Struct):
+        topic: str = ''
+        type: str = ''
+        ts: int = 0
+        data: Optional[_TickerData] = None
+
+    # strict=False: Bybit присылает числа строками, msgspec приводит их к float сам
+    _frame_decoder = msgspec.json.Decoder(_TickerFrame, strict=False)
+    BACKEND = "msgspec"
+
+    def decode_ticker(raw: Union[str, bytes]) -> Optional[TickerUpdate]:
+        """Декодирует кадр tickers.*; None - это не тикер"""
+        try:
+            frame = _frame_decoder.decode(raw)
+        except msgspec.ValidationError:
+            # Нестандартное значение поля (например, пустая строка) - общий путь
+            return _decode_ticker_dict(raw)
+        data = frame.data
+        if not frame.topic.startswith('tickers.') or data is None:
+            return None
+        return TickerUpdate(
+            frame.topic[len('tickers.'):],
+            frame.type == 'snapshot',
+            frame.ts,
+            data.lastPrice,
+            data.bid1Price,
+            data.ask1Price,
+            data.markPrice,
+            data.volume24h,
+        )
+else:
+    decode_ticker = _decode_ticker_dict
+
+
+def is_ticker_frame(raw: Union[str, bytes]) -> bool:
+    """Быстрая проверка без разбора JSON: кадр относится к топику tickers.*"""
+    if isinstance(raw, bytes):
+        return TICKER_TOPIC_MARK.encode() in raw
+    return TICKER_TOPIC_MARK in raw
+
+
+def merge_ticker(previous: Optional[Ticker], update: TickerUpdate) -> Ticker:
+    """Применяет snapshot/delta к предыдущему состоянию тикера"""
+    if previous is None or update.is_snapshot:
+        return Ticker(
+            update.symbol,
+            update.ts,
+            update.last_price or 0.0,
+            update.bid_price or 0.0,
+            update.ask_price or 0.0,
+            update.mark_price or 0.0,
+            update.volume24h or 0.0,
+        )
+    return Ticker(
+        update.symbol,
+        update.ts or previous.ts,
+        previous.last_price if update.last_price is None else update.last_price,
+        previous.bid_price if update.bid_price is None else update.bid_price,
+        previous.ask_price if update.ask_price is None else update.ask_price,
+        previous.mark_price if update.mark_price is None else update.mark_price,
+        previous.volume24h if update.volume24h is None else update.volume24h,
+    )
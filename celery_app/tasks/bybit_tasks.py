@@ -8,7 +8,8 @@ from bybit.averaging_strategy_celery import run_short_averaging_strategy
 from utils.signal_parser import process_signal
 from utils.send_tg_message import send_message_to_telegram
 from database import get_all_subscribed_users
-from config import TELEGRAM_BOT_TOKEN
+from config import TELEGRAM_BOT_TOKEN, STRATEGY_HOST_SHARDS
+from bybit.strategy_host import submit_command
 from logger_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -220,6 +221,24 @@ def run_short_averaging_strategy_task(
         f"TP={initial_tp_percent}%, BE Step={breakeven_step}%, SL={stop_loss_percent}%"
     )
     
+    # С хостами стратегий задача только передает команду и сразу освобождает слот
+    if STRATEGY_HOST_SHARDS > 0:
+        params = {
+            'usdt_amount': usdt_amount,
+            'averaging_percent': averaging_percent,
+            'initial_tp_percent': initial_tp_percent,
+            'breakeven_step': breakeven_step,
+            'stop_loss_percent': stop_loss_percent,
+            'use_demo': use_demo,
+        }
+        try:
+            shard = submit_command('start', clean_symbol, params)
+            logger.info(f"[Bybit] Стратегия {clean_symbol} передана хосту стратегий, шард {shard}")
+            return {'status': 'queued', 'symbol': clean_symbol, 'shard': shard}
+        except Exception as e:
+            logger.error(f"[Bybit] Не удалось передать {clean_symbol} хосту стратегий: {e}")
+            return {'status': 'error', 'symbol': clean_symbol, 'error': str(e)}
+    
     # ✨ КРИТИЧНО: Проверяем активные задачи для этого символа
     try:
         from celery_app import celery_app
@@ -10,4 +10,49 @@ NGROK_TOKEN=os.getenv('NGROK_TOKEN')
 
 # Demo account credentials (for testing)
 DEMO_API_KEY=os.getenv('DEMO_API_KEY', API_KEY)  # Fallback to real API key if not set
-DEMO_API_SECRET=os.getenv('DEMO_API_SECRET', API_SECRET)  # Fallback to real API secret if not set
\ No newline at end of file
+DEMO_API_SECRET=os.getenv('DEMO_API_SECRET', API_SECRET)  # Fallback to real API secret if not set
+
+# Источник рыночных данных для стратегий: 'hub' - свое соединение в процессе,
+# 'redis' - общая шина Redis (python -m bybit.market_data_bus)
+MARKET_DATA_SOURCE=os.getenv('MARKET_DATA_SOURCE', 'hub')
+
+# Каталог для записи всех тиков (bybit/tick_recorder.py); пусто - запись выключена
+TICK_RECORDER_DIR=os.getenv('TICK_RECORDER_DIR', '')
+
+# Количество процессов-хостов стратегий (python -m bybit.strategy_host --shard N);
+# 0 - стратегии усреднения запускаются отдельными задачами Celery
+STRATEGY_HOST_SHARDS=int(os.getenv('STRATEGY_HOST_SHARDS', '0'))
+
+# Интервал пакетной проверки тиков хостом стратегий в секундах (bybit/position_book.py);
+# 0 - каждая стратегия проверяет каждый свой тик сама
+STRATEGY_HOST_BATCH_INTERVAL=float(os.getenv('STRATEGY_HOST_BATCH_INTERVAL', '0'))
+
+# Защита позиции стратегией усреднения: 'orders' - стоп-лосс и безубыток отдельными
+# Stop-ордерами, 'trading_stop' - стоп-лосс самой позиции (set_trading_stop)
+PROTECTION_MODE=os.getenv('PROTECTION_MODE', 'orders')
+
+# Приватный WebSocket аккаунта (bybit/private_stream.py): исполнение ордеров и позиция
+# стратегии усреднения приходят событиями; 'false' - прежний опрос REST
+USE_PRIVATE_STREAM=os.getenv('USE_PRIVATE_STREAM', 'true').lower() == 'true'
+
+# Вход в позицию и аварийное закрытие через WebSocket Trade API (bybit/order_gateway.py),
+# при сбое - REST; 'false' - все ордера через REST, как раньше
+ORDER_GATEWAY_WS=os.getenv('ORDER_GATEWAY_WS', 'true').lower() == 'true'
+
+# Общий для всех процессов лимитер запросов к бирже (bybit/rate_limiter.py, состояние в Redis);
+# 'false' - запросы без ограничения, как раньше
+RATE_LIMIT_ENABLED=os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+
+# Доля емкости корзин, которую опрос (чтение) оставляет ордерам и отменам
+RATE_LIMIT_READ_RESERVE=float(os.getenv('RATE_LIMIT_READ_RESERVE', '0.2'))
+
+# Общий снимок позиций и открытых ордеров аккаунта (bybit/account_snapshot.py): интервал опроса
+# в секундах; 0 - каждая стратегия опрашивает свой символ сама, как раньше
+ACCOUNT_SNAPSHOT_INTERVAL=float(os.getenv('ACCOUNT_SNAPSHOT_INTERVAL', '2'))
+
+# Объединение одинаковых одновременных запросов чтения в процессе (bybit/request_coalescer.py);
+# 'false' - каждый вызов идет на биржу, как раньше
+REQUEST_COALESCING_ENABLED=os.getenv('REQUEST_COALESCING_ENABLED', 'true').lower() == 'true'
+
+# Сколько секунд ответ get_tickers отдается из кэша процесса (0 - только объединение запросов)
+REQUEST_CACHE_TTL=float(os.getenv('REQUEST_CACHE_TTL', '1'))
@@ -13,7 +13,8 @@ from utils.send_tg_message import send_message_to_telegram
 from utils.signal_parser import process_signal, clean_symbol
 from database import get_all_subscribed_users
 from bybit.stop_all_orders import stop_all_trading, stop_trading_by_symbol
-from config import TELEGRAM_BOT_TOKEN, NGROK_TOKEN
+from config import TELEGRAM_BOT_TOKEN, NGROK_TOKEN, STRATEGY_HOST_SHARDS
+from bybit.strategy_host import submit_command
 import asyncio
 import re
 from logger_config import setup_logger
@@ -412,6 +413,13 @@ async def stop_trading_by_symbol_endpoint(request: Request):
         # Выполняем остановку торговли для символа
         stop_trading_by_symbol(cleaned_symbol)
         
+        # Стратегия в хосте стратегий останавливается командой, не дожидаясь проверки позиции
+        if STRATEGY_HOST_SHARDS > 0:
+            try:
+                submit_command('stop', cleaned_symbol)
+            except Exception as e:
+                logger.error(f"[STOP_TRADING_BY_SYMBOL] Не удалось остановить стратегию в хосте: {e}")
+        
         # Отправляем уведомление в Telegram
         try:
             users = await get_all_subscribed_users()
@@ -1,15 +1,25 @@
 from pybit.unified_trading import WebSocket
 from time import sleep, time
 import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.bar_builder import SymbolBars
 
 
 class PaperTrailingStop:
-    def __init__(self, symbol, position_size, activation_percent=1.0, trail_percent=0.5):
+    def __init__(self, symbol, position_size, activation_percent=1.0, trail_percent=0.5,
+                 bars=None, atr_multiplier=None):
         self.symbol = symbol
         self.position_size = position_size  # + для лонга, - для шорта
         self.activation_percent = activation_percent
         self.trail_percent = trail_percent
 
+        # Бары из потока тиков: при atr_multiplier трейлинг не уже atr_multiplier * ATR(1m)
+        self.bars = bars
+        self.atr_multiplier = atr_multiplier
+
         # Трейдинг переменные
         self.entry_price = None
         self.best_price = None
@@ -22,6 +32,14 @@ class PaperTrailingStop:
         self.close_time = None
         self.total_profit = 0
 
+    def current_trail_percent(self):
+        if self.bars is None or not self.atr_multiplier:
+            return self.trail_percent
+        atr_percent = self.bars.atr_percent('1m')
+        if atr_percent is None:
+            return self.trail_percent
+        return max(self.trail_percent, atr_percent * self.atr_multiplier)
+
     def update(self, current_price):
         if self.is_position_closed:
             return "ALREADY_CLOSED"
@@ -42,6 +60,8 @@ class PaperTrailingStop:
             current_profit_percent = (self.entry_price - current_price) / self.entry_price * 100
             current_profit_usd = (self.entry_price - current_price) * abs(self.position_size)
 
+        trail_percent = self.current_trail_percent()
+
         # Логика для LONG позиции
         if self.position_size > 0:
             if current_price > self.best_price:
@@ -51,14 +71,14 @@ class PaperTrailingStop:
             # Активация трейлинг-стопа
             if not self.is_active and current_profit_percent >= self.activation_percent:
                 self.is_active = True
-                self.stop_price = self.best_price * (1 - self.trail_percent / 100)
+                self.stop_price = self.best_price * (1 - trail_percent / 100)
                 print(f"🚀 Трейлинг-стоп АКТИВИРОВАН!")
                 print(f"   Прибыль: {current_profit_percent:.2f}% ({current_profit_usd:.2f}$)")
                 print(f"   Стоп-цена: {self.stop_price:.2f}")
 
             # Обновление стопа
             if self.is_active:
-                new_stop = self.best_price * (1 - self.trail_percent / 100)
+                new_stop = self.best_price * (1 - trail_percent / 100)
                 if new_stop > self.stop_price:
                     self.stop_price = new_stop
                     print(f"🔼 Стоп перемещен: {self.stop_price:.2f}")
@@ -83,13 +103,13 @@ class PaperTrailingStop:
 
             if not self.is_active and current_profit_percent >= self.activation_percent:
                 self.is_active = True
-                self.stop_price = self.best_price * (1 + self.trail_percent / 100)
+                self.stop_price = self.best_price * (1 + trail_percent / 100)
                 print(f"🚀 Трейлинг-стоп АКТИВИРОВАН!")
                 print(f"   Прибыль: {current_profit_percent:.2f}% ({current_profit_usd:.2f}$)")
                 print(f"   Стоп-цена: {self.stop_price:.2f}")
 
             if self.is_active:
-                new_stop = self.best_price * (1 + self.trail_percent / 100)
+                new_stop = self.best_price * (1 + trail_percent / 100)
                 if new_stop < self.stop_price:
                     self.stop_price = new_stop
                     print(f"🔽 Стоп перемещен: {self.stop_price:.2f}")
@@ -115,12 +135,17 @@ class PaperTrailingStop:
         return "UPDATED"
 
 
+# Бары строятся из того же потока тикеров, без REST kline
+bars = SymbolBars("BTCUSDT")
+
 # Создаем виртуальный трейлинг-стоп
 trailing_stop = PaperTrailingStop(
     symbol="BTCUSDT",
     position_size=0.001,  # Лонг 0.001 BTC
     activation_percent=1.0,  # Активация при +1%
-    trail_percent=0.5  # Следование на 0.5%
+    trail_percent=0.5,  # Следование на 0.5%
+    bars=bars,
+    atr_multiplier=2.0  # Но не уже 2 x ATR(1m)
 )
 
 
@@ -138,6 +163,8 @@ def handle_message(message):
             if last_price == 0:
                 return
 
+            bars.on_tick(int(message.get('ts', 0)), last_price)
+
             # Обновляем трейлинг-стоп
             result = trailing_stop.update(last_price)
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк переноса безубытка (мс на перенос)
+
+Сравнивает перенос стоп-ордера безубытка через amend_order (один запрос)
+с прежней отменой и выставлением нового ордера (два последовательных
+запроса), а также запасной путь, когда биржа отклонила изменение.
+Симулятор биржи отвечает с заданной задержкой сети; замеряется время
+от постановки переноса до ответа биржи и время, когда у позиции не было
+стоп-ордера безубытка.
+
+Использование:
+    python scripts/bench_breakeven.py --moves 50 --rtt-ms 25
+"""
+
+import argparse
+import asyncio
+import io
+import contextlib
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.tick_replay import ReplayClock, SimulatedSession
+from bybit.ws_decoder import Ticker
+
+
+class LatencySession(SimulatedSession):
+    """Симулятор с задержкой ответа на запросы ордеров; считает время без стоп-ордера"""
+
+    def __init__(self, rtt: float, allow_amend: bool = True):
+        super().__init__()
+        self.rtt = rtt
+        self.allow_amend = allow_amend
+        self.requests = 0
+        self.unprotected = 0.0
+        self._unprotected_since = None
+
+    def place_order(self, *args, **kwargs):
+        time.sleep(self.rtt)
+        self.requests += 1
+        response = super().place_order(*args, **kwargs)
+        if kwargs.get('orderType') == 'Stop' and self._unprotected_since is not None:
+            self.unprotected += time.perf_counter() - self._unprotected_since
+            self._unprotected_since = None
+        return response
+
+    def amend_order(self, *args, **kwargs):
+        time.sleep(self.rtt)
+        self.requests += 1
+        if not self.allow_amend:
+            return {'retCode': 10001, 'retMsg': 'amend disabled', 'result': {}}
+        return super().amend_order(*args, **kwargs)
+
+    def cancel_order(self, *args, **kwargs):
+        time.sleep(self.rtt)
+        self.requests += 1
+        response = super().cancel_order(*args, **kwargs)
+        if response.get('retCode') == 0:
+            self._unprotected_since = time.perf_counter()
+        return response
+
+
+async def move_cost(moves: int, rtt: float, mode: str):
+    """Среднее время переноса (с), запросов на перенос и время без защиты на перенос (с)"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+
+    session = LatencySession(rtt, allow_amend=mode != 'fallback')
+    session.on_price("BTCUSDT", 100.0)
+    clock = ReplayClock(1.0)
+    strategy = ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=clock, notifications=False,
+                                            state_store=None)
+    if mode == 'replace':
+        # Прежнее поведение: без попытки amend_order
+        strategy._amend_breakeven_order = lambda price, qty: None
+    with contextlib.redirect_stdout(io.StringIO()):
+        await strategy.process_message(Ticker("BTCUSDT", 1000, 100.0, 100.0, 100.0, 100.0, 0.0))
+        await strategy.orders.join()
+        # Цена ушла далеко вниз: безубыток ставится выше нее и не срабатывает
+        session.on_price("BTCUSDT", 50.0)
+        strategy.place_breakeven_order(97.0, 3.0)
+        await strategy.orders.join()
+
+        session.requests = 0
+        total = 0.0
+        for i in range(moves):
+            price = 96.0 - i * 0.5
+            started = time.perf_counter()
+            strategy.place_breakeven_order(price, 4.0 + i * 0.5)
+            await strategy.orders.join()
+            total += time.perf_counter() - started
+    assert strategy.breakeven_order_id in session.orders
+    return total / moves, session.requests / moves, session.unprotected / moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос безубытка: amend_order против отмены и нового ордера")
+    parser.add_argument("--moves", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=25.0, help="Задержка ответа биржи на запрос (мс)")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    rtt = args.rtt_ms / 1000
+    print(f"Переносов: {args.moves}, задержка биржи {args.rtt_ms:.0f} мс на запрос")
+    for mode, title in (('replace', 'отмена + новый ордер'), ('amend', 'amend_order'),
+                        ('fallback', 'amend отклонен')):
+        elapsed, requests, unprotected = asyncio.run(move_cost(args.moves, rtt, mode))
+        print(f"  {title:<22}{elapsed * 1000:7.1f} мс/перенос, запросов {requests:.0f}, "
+              f"без защиты {unprotected * 1000:5.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
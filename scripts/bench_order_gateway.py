@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки ордеров: WebSocket Trade (bybit/order_gateway.py) против REST
+
+Выставляет лимитный PostOnly-ордер на покупку вдвое ниже рынка (не исполнится)
+и сразу отменяет его - попеременно через OrderGateway по WebSocket и через
+pybit.HTTP. Замеряется время от отправки до подтверждения биржи для
+order.create и order.cancel.
+
+Нужны ключи реального счета (API_KEY/API_SECRET) или --testnet с ключами
+тестовой сети: демо-счет WebSocket Trade не поддерживает.
+
+Использование:
+    python scripts/bench_order_gateway.py --symbol BTCUSDT --count 20
+"""
+
+import argparse
+import logging
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pybit.unified_trading import HTTP
+
+from bybit.order_gateway import TESTNET_TRADE_WS_URL, TRADE_WS_URL, OrderGateway
+from config import API_KEY, API_SECRET
+
+
+def probe_order(client, symbol: str, price: str, qty: str):
+    """Время create и cancel (с) одного ордера через client"""
+    started = time.perf_counter()
+    response = client.place_order(category="linear", symbol=symbol, side="Buy", orderType="Limit",
+                                  qty=qty, price=price, timeInForce="PostOnly")
+    created = time.perf_counter()
+    if response.get('retCode') != 0:
+        raise RuntimeError(f"place_order: {response.get('retMsg')}")
+    response = client.cancel_order(category="linear", symbol=symbol, orderId=response['result']['orderId'])
+    cancelled = time.perf_counter()
+    if response.get('retCode') != 0:
+        raise RuntimeError(f"cancel_order: {response.get('retMsg')}")
+    return created - started, cancelled - created
+
+
+def order_params(rest, symbol: str, usdt: float):
+    """Цена вдвое ниже рынка по шагу цены и количество на сумму usdt по шагу лота"""
+    info = rest.get_instruments_info(category="linear", symbol=symbol)['result']['list'][0]
+    tick = float(info['priceFilter']['tickSize'])
+    step = float(info['lotSizeFilter']['qtyStep'])
+    last = float(rest.get_tickers(category="linear", symbol=symbol)['result']['list'][0]['lastPrice'])
+    price = math.floor(last / 2 / tick) * tick
+    qty = max(float(info['lotSizeFilter']['minOrderQty']), math.ceil(usdt / price / step) * step)
+    price_decimals = max(0, -int(math.floor(math.log10(tick))))
+    qty_decimals = max(0, -int(math.floor(math.log10(step))))
+    return f"{price:.{price_decimals}f}", f"{qty:.{qty_decimals}f}"
+
+
+def report(title: str, samples):
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"  {title:<18}p50 {statistics.median(samples) * 1000:6.1f} мс, p99 {p99 * 1000:6.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка ордеров: WebSocket Trade против REST")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--count", type=int, default=20, help="Ордеров на каждый путь")
+    parser.add_argument("--usdt", type=float, default=10.0, help="Сумма ордера в USDT")
+    parser.add_argument("--testnet", action="store_true")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rest = HTTP(testnet=args.testnet, api_key=API_KEY, api_secret=API_SECRET)
+    gateway = OrderGateway(rest, API_KEY, API_SECRET, url=TESTNET_TRADE_WS_URL if args.testnet else TRADE_WS_URL)
+    gateway.connect()
+    deadline = time.time() + 10
+    while not gateway.is_connected():
+        if time.time() > deadline:
+            print("❌ WebSocket Trade не подключился (ключи, сеть или демо-счет)")
+            return
+        time.sleep(0.05)
+
+    price, qty = order_params(rest, args.symbol, args.usdt)
+    samples = {('ws', 'create'): [], ('ws', 'cancel'): [], ('rest', 'create'): [], ('rest', 'cancel'): []}
+    try:
+        for _ in range(args.count):
+            # Пути чередуются, чтобы оба видели одинаковую нагрузку биржи и сети
+            for path, client in (('ws', gateway), ('rest', rest)):
+                create, cancel = probe_order(client, args.symbol, price, qty)
+                samples[(path, 'create')].append(create)
+                samples[(path, 'cancel')].append(cancel)
+    finally:
+        gateway.close()
+
+    print(f"{args.symbol}: {args.count} ордеров на путь, Buy Limit {qty} @ {price} (PostOnly)")
+    for (path, op), values in samples.items():
+        report(f"{path.upper()} {op}", values)
+    stats = gateway.stats()
+    print(f"  повторов через REST: {stats['fallbacks']}, таймаутов: {stats['timeouts']}")
+
+
+if __name__ == "__main__":
+    main()
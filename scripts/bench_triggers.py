@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк стоимости тика стратегии усреднения (нс на тик)
+
+Сравнивает прежнюю проверку условий на каждом тике (пересчет прибыли,
+уровня усреднения и обход списка шагов безубытка) с таблицей порогов
+bybit/trigger_table.py и замеряет полный ShortAveragingStrategyCelery.update()
+на симуляторе биржи. Цена ходит в коридоре, где ни одно условие не выполняется -
+это подавляющее большинство тиков.
+
+Использование:
+    python scripts/bench_triggers.py --ticks 200000
+"""
+
+import argparse
+import asyncio
+import io
+import contextlib
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.tick_replay import ReplayClock, SimulatedSession
+from bybit.trigger_table import TriggerTable
+from bybit.ws_decoder import Ticker
+
+LEVELS = [5.0, 7.0, 9.0, 11.0, 13.0, 15.0, 17.0, 19.0, 21.0, 23.0, 25.0]
+
+
+class State:
+    """Состояние шорта после первого TP: безубыток выставлен, ждем следующий шаг"""
+    entry_price = 100.0
+    averaged_price = None
+    is_averaged = False
+    averaging_percent = 10.0
+    initial_tp_percent = 3.0
+    stop_loss_price = None
+    fake_tp_price = None
+    fake_tp_reached = False
+    breakeven_price = 97.0
+    breakeven_order_id = "be"
+    best_profit_percent = 3.0
+    peak_profit_percent = 4.9
+
+
+def legacy_tick(state, current_price):
+    """Прежняя проверка условий на каждом тике (без побочных эффектов)"""
+    base_price = state.averaged_price if state.is_averaged else state.entry_price
+    profit_percent = (base_price - current_price) / base_price * 100
+    close_price = current_price
+    if profit_percent > state.peak_profit_percent:
+        state.peak_profit_percent = profit_percent
+    if state.is_averaged and state.stop_loss_price and close_price >= state.stop_loss_price:
+        return "CLOSE"
+    if not state.is_averaged:
+        averaging_price = state.entry_price * (1 + state.averaging_percent / 100)
+        if current_price >= averaging_price:
+            return "AVERAGING"
+    if state.is_averaged and state.fake_tp_price and current_price <= state.fake_tp_price:
+        if not state.fake_tp_reached:
+            return "FAKE_TP"
+    if profit_percent >= state.initial_tp_percent:
+        if not state.breakeven_price and not state.breakeven_order_id:
+            return "TP"
+        target = None
+        for level in LEVELS:
+            if profit_percent >= level and state.best_profit_percent < level:
+                target = level
+                break
+        if target and state.breakeven_order_id:
+            return "STEP"
+    if state.breakeven_price and close_price >= state.breakeven_price:
+        return "CLOSE"
+    return None
+
+
+def table_tick(table, peak, current_price):
+    if current_price < peak[0]:
+        peak[0] = current_price
+    return table.check(current_price, current_price)
+
+
+def measure(func, prices, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for price in prices:
+            func(price)
+        best = min(best, time.perf_counter() - started)
+    return best / len(prices) * 1e9
+
+
+async def strategy_update_cost(prices, repeat):
+    """Полный update() только что открытой стратегии: цена между TP (97) и усреднением (110)"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+
+    session = SimulatedSession()
+    session.on_price("BTCUSDT", 100.0)
+    clock = ReplayClock(1.0)
+    strategy = ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=clock, notifications=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        await strategy.process_message(Ticker("BTCUSDT", 1000, 100.0, 100.0, 100.0, 100.0, 0.0))
+        await strategy.orders.join()
+    strategy.last_averaging_check = float('inf')   # Исключаем REST-проверку лимитки по времени
+    update = strategy.update
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for price in prices:
+            await update(price, 1.0)
+        best = min(best, time.perf_counter() - started)
+    return best / len(prices) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость тика: прежние проверки против таблицы порогов")
+    parser.add_argument("--ticks", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-strategy", action="store_true", help="Не замерять полный update() стратегии")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    rng = random.Random(7)
+    # Коридор 95.2..96.9: ниже безубытка (97), выше следующего шага (95) и пика прибыли
+    prices = [rng.uniform(95.2, 96.9) for _ in range(args.ticks)]
+
+    state = State()
+    table = TriggerTable()
+    table.build(
+        above_last=[(110.0, 'averaging')],
+        above_close=[(state.breakeven_price, 'breakeven')],
+        below=[(100.0 * (1 - 5.0 / 100), 'breakeven_step')],
+    )
+    peak = [100.0 * (1 - state.peak_profit_percent / 100)]
+    assert not any(table_tick(table, peak, p) for p in prices[:1000])
+
+    legacy = measure(lambda p: legacy_tick(state, p), prices, args.repeat)
+    fast = measure(lambda p: table_tick(table, peak, p), prices, args.repeat)
+    print(f"Тиков: {args.ticks}, цена в коридоре без срабатываний")
+    print(f"  прежние проверки        {legacy:8.0f} нс/тик")
+    print(f"  таблица порогов         {fast:8.0f} нс/тик  x{legacy / fast:.1f}")
+    if not args.no_strategy:
+        full = asyncio.run(strategy_update_cost([rng.uniform(97.5, 109.0) for _ in range(50_000)], args.repeat))
+        print(f"  update() стратегии      {full:8.0f} нс/тик (с таблицей порогов)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк декодирования кадров тикеров WebSocket (кадров в секунду)
+
+Сравнивает старый путь (json.loads + обход словаря + float() в callback'е
+и склейка delta в словаре) с быстрым путем bybit/ws_decoder.py на корпусе
+записанных кадров.
+
+Использование:
+    # Записать корпус с биржи (по одному сырому кадру на строку)
+    python scripts/bench_ws_decode.py --record frames.jsonl --seconds 60 BTCUSDT ETHUSDT
+
+    # Прогнать бенчмарк на корпусе (без --corpus - синтетический корпус)
+    python scripts/bench_ws_decode.py --corpus frames.jsonl
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit import ws_decoder
+from bybit.ticker_hub import PUBLIC_LINEAR_WS_URL
+
+
+def record_corpus(path, symbols, seconds):
+    """Записывает сырые кадры tickers.* в файл"""
+    import websocket
+
+    ws = websocket.create_connection(PUBLIC_LINEAR_WS_URL, timeout=5)
+    ws.send(json.dumps({"op": "subscribe", "args": [f"tickers.{s.upper()}" for s in symbols]}))
+    count = 0
+    deadline = time.time() + seconds
+    with open(path, "w") as f:
+        while time.time() < deadline:
+            try:
+                raw = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            if ws_decoder.is_ticker_frame(raw):
+                f.write(raw.strip() + "\n")
+                count += 1
+    ws.close()
+    print(f"Записано кадров: {count} -> {path}")
+
+
+def synthetic_corpus(n=50_000, symbols=20):
+    """Корпус, похожий на реальный поток: snapshot, затем delta с частью полей"""
+    rng = random.Random(42)
+    frames = []
+    prices = {f"SYM{i}USDT": rng.uniform(0.01, 70000) for i in range(symbols)}
+    for symbol, price in prices.items():
+        frames.append(json.dumps({
+            "topic": f"tickers.{symbol}", "type": "snapshot", "cs": 1, "ts": 1,
+            "data": {
+                "symbol": symbol, "tickDirection": "PlusTick", "price24hPcnt": "0.012",
+                "lastPrice": f"{price:.4f}", "prevPrice24h": f"{price:.4f}",
+                "highPrice24h": f"{price * 1.05:.4f}", "lowPrice24h": f"{price * 0.95:.4f}",
+                "prevPrice1h": f"{price:.4f}", "markPrice": f"{price:.4f}", "indexPrice": f"{price:.4f}",
+                "openInterest": "1000", "openInterestValue": "100000", "turnover24h": "123456789",
+                "volume24h": "98765.4", "nextFundingTime": "1700000000000", "fundingRate": "0.0001",
+                "bid1Price": f"{price:.4f}", "bid1Size": "1.5", "ask1Price": f"{price:.4f}", "ask1Size": "2.5",
+            },
+        }, separators=(',', ':')))
+    names = list(prices)
+    for i in range(n - len(frames)):
+        symbol = rng.choice(names)
+        price = prices[symbol] * (1 + rng.uniform(-0.001, 0.001))
+        prices[symbol] = price
+        data = {"symbol": symbol, "bid1Price": f"{price:.4f}", "bid1Size": "1.1",
+                "ask1Price": f"{price * 1.0001:.4f}", "ask1Size": "0.9"}
+        if rng.random() < 0.4:
+            data.update({"lastPrice": f"{price:.4f}", "tickDirection": "MinusTick",
+                         "volume24h": "98800.1", "turnover24h": "123500000"})
+        frames.append(json.dumps({
+            "topic": f"tickers.{symbol}", "type": "delta", "cs": i, "ts": 2 + i, "data": data,
+        }, separators=(',', ':')))
+    return frames
+
+
+def baseline(frames):
+    """Старый путь: полный разбор, склейка словарей, float() в callback'е"""
+    state = {}
+    for raw in frames:
+        message = json.loads(raw)
+        data = message.get('data') or {}
+        symbol = message['topic'][len('tickers.'):]
+        if message.get('type') == 'snapshot' or symbol not in state:
+            state[symbol] = dict(data)
+        else:
+            state[symbol].update(data)
+        merged = {'topic': message['topic'], 'ts': message.get('ts'), 'data': dict(state[symbol])}
+        float(merged['data'].get('lastPrice', 0))
+
+
+def make_fast_path(decode):
+    def fast_path(frames):
+        state = {}
+        for raw in frames:
+            update = decode(raw)
+            ticker = ws_decoder.merge_ticker(state.get(update.symbol), update)
+            state[update.symbol] = ticker
+            ticker.last_price
+    return fast_path
+
+
+def measure(func, frames, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(frames)
+        best = min(best, time.perf_counter() - start)
+    return len(frames) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк декодирования кадров тикеров")
+    parser.add_argument("symbols", nargs="*", default=["BTCUSDT", "ETHUSDT", "SOLUSDT"])
+    parser.add_argument("--corpus", help="Файл с кадрами (по одному на строку)")
+    parser.add_argument("--record", help="Записать корпус в файл и выйти")
+    parser.add_argument("--seconds", type=int, default=60, help="Длительность записи")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество прогонов (берется лучший)")
+    args = parser.parse_args()
+
+    if args.record:
+        record_corpus(args.record, args.symbols, args.seconds)
+        return
+
+    if args.corpus:
+        with open(args.corpus) as f:
+            frames = [line.strip() for line in f if line.strip()]
+        source = args.corpus
+    else:
+        frames = synthetic_corpus()
+        source = "синтетический"
+
+    print(f"Корпус: {source}, кадров: {len(frames)}, декодер: {ws_decoder.BACKEND}")
+    variants = [("json + dict (было)", baseline)]
+    variants.append(("json -> Ticker", make_fast_path(
+        lambda raw: ws_decoder.ticker_update_from_message(json.loads(raw)))))
+    if ws_decoder.orjson is not None:
+        variants.append(("orjson -> Ticker", make_fast_path(
+            lambda raw: ws_decoder.ticker_update_from_message(ws_decoder.orjson.loads(raw)))))
+    if ws_decoder.msgspec is not None:
+        variants.append(("msgspec -> Ticker", make_fast_path(ws_decoder.decode_ticker)))
+
+    base = None
+    for name, func in variants:
+        rate = measure(func, frames, args.repeat)
+        base = base or rate
+        print(f"  {name:<22} {rate:>12,.0f} кадров/сек  x{rate / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Стресс-тест хоста стратегий: сотни стратегий усреднения в одном event loop
+
+Стратегии запускаются через StrategyHost.handle_command (как из очереди Redis),
+ордера уходят в SimulatedSession (по одной на символ), тики генерирует
+синтетический источник с интерфейсом TickerHub. Сеть и биржа не нужны.
+
+Использование:
+    python scripts/stress_strategy_host.py --symbols 500 --rate 5 --seconds 60
+    python scripts/stress_strategy_host.py --symbols 500 --rate 5 --batch-interval 0.01
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.strategy_host import StrategyHost
+from bybit.tick_replay import SimulatedSession
+from bybit.ws_decoder import Ticker
+
+
+class SyntheticFeed:
+    """Источник тиков со случайным блужданием цены (интерфейс subscribe/unsubscribe как у TickerHub)"""
+
+    def __init__(self, sessions, volatility):
+        self.sessions = sessions
+        self.volatility = volatility
+        self.callbacks = {}
+        self.prices = {}
+        self.ticks_sent = 0
+        self.rng = random.Random(42)
+
+    def subscribe(self, symbol, callback):
+        self.callbacks.setdefault(symbol, []).append(callback)
+
+    def unsubscribe(self, symbol, callback):
+        callbacks = self.callbacks.get(symbol, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def tick(self, symbol):
+        price = self.prices[symbol] * (1 + self.rng.gauss(0, self.volatility))
+        self.prices[symbol] = price
+        ticker = Ticker(symbol, int(time.time() * 1000), price, price, price, price, 0.0)
+        # Биржа исполняет ордера раньше, чем стратегия увидит тик
+        self.sessions[symbol].on_price(symbol, price, ticker.ts)
+        for callback in list(self.callbacks.get(symbol, ())):
+            callback(ticker)
+        self.ticks_sent += 1
+
+    async def run(self, symbols, rate):
+        interval = 1.0 / rate
+        while True:
+            started = time.perf_counter()
+            for symbol in symbols:
+                self.tick(symbol)
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def measure_loop_lag(samples, period=0.05):
+    """Задержка пробуждения задачи сверх запрошенной - насколько loop занят"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(period)
+        samples.append(time.perf_counter() - started - period)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def stress(args):
+    symbols = [f"SYM{i:04d}USDT" for i in range(args.symbols)]
+    sessions = {symbol: SimulatedSession() for symbol in symbols}
+    feed = SyntheticFeed(sessions, args.volatility)
+    for symbol in symbols:
+        feed.prices[symbol] = random.uniform(0.1, 1000)
+        sessions[symbol].on_price(symbol, feed.prices[symbol])
+
+    def factory(symbol, **params):
+        from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+        return ShortAveragingStrategyCelery(
+            symbol, session=sessions[symbol], notifications=False, ticker_feed=feed, **params
+        )
+
+    host = StrategyHost(shard=0, shards=1, strategy_factory=factory, max_strategies=args.symbols,
+                        batch_interval=args.batch_interval)
+    lag = []
+    lag_task = asyncio.create_task(measure_loop_lag(lag))
+
+    started = time.perf_counter()
+    for symbol in symbols:
+        await host.handle_command({'action': 'start', 'symbol': symbol, 'params': {'usdt_amount': 100}})
+    await host.join_commands()
+    print(f"Запущено стратегий: {len(host.strategies)} за {time.perf_counter() - started:.1f} сек")
+
+    lag.clear()
+    cpu_started = time.process_time()
+    feed_task = asyncio.create_task(feed.run(symbols, args.rate))
+    await asyncio.sleep(args.seconds)
+    feed_task.cancel()
+    cpu = time.process_time() - cpu_started
+
+    strategies = [s for s in host.strategies.values() if s is not None]
+    processed = sum(s.ticks_processed for s in strategies)
+    dropped = sum(s.mailbox.dropped for s in strategies)
+    max_wait = max((s.mailbox.max_wait for s in strategies), default=0.0)
+    alive = len(strategies)
+    finished = host.completed
+    batch = host.position_book.stats() if host.position_book is not None else None
+
+    await host.shutdown()
+    lag_task.cancel()
+
+    print(f"Активных стратегий в конце: {alive} из {args.symbols}, завершились сами: {finished}")
+    print(f"Тиков отправлено: {feed.ticks_sent} ({feed.ticks_sent / args.seconds:,.0f}/сек), "
+          f"обработано активными: {processed}, вытеснено: {dropped}")
+    if batch:
+        print(f"Пакетная проверка: {batch['batches']} пачек, до стратегий дошло "
+              f"{batch['fired']} из {batch['ticks']} тиков ({batch['fired_share'] * 100:.1f}%)")
+    print(f"Задержка loop: p50 {percentile(lag, 0.5) * 1000:.1f} мс, p99 {percentile(lag, 0.99) * 1000:.1f} мс, "
+          f"макс {max(lag, default=0) * 1000:.1f} мс; макс. ожидание тика в ящике {max_wait * 1000:.1f} мс")
+    print(f"CPU: {cpu / args.seconds * 100:.0f}% одного ядра, "
+          f"пиковая память: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стресс-тест хоста стратегий")
+    parser.add_argument("--symbols", type=int, default=500, help="Количество стратегий")
+    parser.add_argument("--rate", type=float, default=5, help="Тиков в секунду на символ")
+    parser.add_argument("--seconds", type=float, default=30, help="Длительность прогона")
+    parser.add_argument("--volatility", type=float, default=0.0005, help="Шаг случайного блуждания цены")
+    parser.add_argument("--batch-interval", type=float, default=0.0,
+                        help="Пакетная проверка тиков книгой позиций раз в N секунд (0 - выключена)")
+    parser.add_argument("--verbose", action="store_true", help="Не приглушать логи стратегий")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        for name in ("bybit.averaging_strategy_celery", "bybit.strategy_host", "bybit.bar_builder",
+                     "bybit.position_book"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+    asyncio.run(stress(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки общего снимка позиций и открытых ордеров аккаунта
+"""
+
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.account_snapshot import AccountSnapshot, snapshot_key
+from bybit.tick_replay import ReplayClock, SimulatedSession
+from bybit.ws_decoder import Ticker
+
+
+class AccountSession:
+    """pybit-подобная сессия: позиции и ордера аккаунта постранично"""
+
+    def __init__(self, positions, orders, page=2):
+        self.positions = positions
+        self.orders = orders
+        self.page = page
+        self.calls = []
+
+    def _pages(self, items, params):
+        start = int(params.get('cursor') or 0)
+        end = start + self.page
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {
+            'list': items[start:end], 'nextPageCursor': str(end) if end < len(items) else "",
+        }}
+
+    def get_positions(self, **params):
+        self.calls.append(('positions', params))
+        return self._pages(self.positions, params)
+
+    def get_open_orders(self, **params):
+        self.calls.append(('orders', params))
+        return self._pages(self.orders, params)
+
+
+class FakeRedis:
+    """Минимальный Redis в памяти: строки и hash, pipeline выполняется сразу"""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def pexpire(self, key, ttl_ms):
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def hset(self, key, mapping=None):
+        self.data.setdefault(key, {}).update(mapping or {})
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def expire(self, key, seconds):
+        return True
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.results.append(getattr(self.redis, name)(*args, **kwargs))
+        return call
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+POSITIONS = [
+    {'symbol': "BTCUSDT", 'size': "0.01", 'avgPrice': "100"},
+    {'symbol': "ETHUSDT", 'size': "1", 'avgPrice': "10"},
+    {'symbol': "XRPUSDT", 'size': "50", 'avgPrice': "0.5"},
+]
+ORDERS = [
+    {'symbol': "BTCUSDT", 'orderId': "o1"},
+    {'symbol': "BTCUSDT", 'orderId': "o2"},
+    {'symbol': "SOLUSDT", 'orderId': "o3"},
+]
+
+
+def test_poll_groups_pages_by_symbol():
+    """Один опрос забирает все страницы и раскладывает позиции и ордера по символам"""
+    session = AccountSession(POSITIONS, ORDERS)
+    snapshot = AccountSnapshot(session, "test", interval=1.0)
+    snapshot._running = True        # Без фонового потока опроса
+    assert snapshot.poll_once()
+
+    assert [kind for kind, _ in session.calls] == ['positions', 'positions', 'orders', 'orders']
+    assert session.calls[0][1]['settleCoin'] == "USDT" and session.calls[1][1]['cursor'] == "2"
+    assert snapshot.positions("BTCUSDT")[0]['avgPrice'] == "100"
+    assert [o['orderId'] for o in snapshot.open_orders("btcusdt")] == ["o1", "o2"]
+    assert snapshot.positions("SOLUSDT") == [] and len(snapshot.open_orders("SOLUSDT")) == 1
+    assert snapshot.positions("DOGEUSDT") == [] and snapshot.open_orders("DOGEUSDT") == []
+    assert snapshot.stats()['symbols'] == 4 and snapshot.stats()['requests'] == 4
+
+    # Ошибка API - снимок не обновляется
+    session.get_open_orders = lambda **params: {'retCode': 10002, 'retMsg': 'timeout'}
+    assert not snapshot.poll_once() and snapshot.errors == 1 and snapshot.polls == 1
+
+
+def test_stale_snapshot_returns_none():
+    """Снимок старше since или max_age не используется - вызывающий спрашивает биржу сам"""
+    snapshot = AccountSnapshot(AccountSession(POSITIONS, ORDERS), "test", interval=0.1)
+    snapshot._running = True
+    snapshot.poll_once()
+    assert snapshot.positions("BTCUSDT", since=time.time() - 1) is not None
+    assert snapshot.positions("BTCUSDT", since=time.time() + 1) is None
+    time.sleep(0.35)
+    assert snapshot.positions("BTCUSDT") is None
+    assert snapshot.hits == 1 and snapshot.misses == 2
+
+
+def test_shared_snapshot_through_redis():
+    """Опрашивает держатель аренды, другой процесс читает его снимок из Redis без запросов"""
+    redis = FakeRedis()
+    poller = AccountSnapshot(AccountSession(POSITIONS, ORDERS), "test", redis=redis, interval=1.0)
+    reader_session = AccountSession(POSITIONS, ORDERS)
+    reader = AccountSnapshot(reader_session, "test", redis=redis, interval=1.0)
+    reader.owner = "other:1"
+    for snapshot in (poller, reader):
+        snapshot._running = True
+
+    assert poller._hold_lease() and not reader._hold_lease()
+    poller.poll_once()
+    assert float(redis.data[snapshot_key("test")]['_ts']) == poller._taken_at
+    assert reader.positions("ETHUSDT")[0]['size'] == "1"
+    assert reader.open_orders("ETHUSDT") == [] and reader_session.calls == []
+    assert redis.get(f"{snapshot_key('test')}:demand")
+
+
+def test_strategy_falls_back_to_rest():
+    """Стратегия берет позицию из свежего снимка, а после своего перехода - запросом по символу"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+    session = SimulatedSession(fee_rate=0.0)
+    calls = []
+    get_positions = session.get_positions
+
+    def counting_get_positions(**params):
+        calls.append(params)
+        return get_positions(**params)
+    session.get_positions = counting_get_positions
+
+    snapshot = AccountSnapshot(AccountSession(POSITIONS, ORDERS), "test", interval=1.0)
+    snapshot._running = True
+    snapshot.poll_once()
+    strategy = ShortAveragingStrategyCelery("BTCUSDT", session=session, account_snapshot=snapshot,
+                                            notifications=False)
+    assert strategy.check_position_exists() and strategy.get_position_avg_price() == 100.0
+    assert calls == []
+
+    strategy.snapshot_since = time.time() + 1
+    assert not strategy.check_position_exists()
+    assert calls and calls[0]['symbol'] == "BTCUSDT"
+
+
+def test_snapshot_since_moves_only_on_exchange_transitions():
+    """Порог без перехода на бирже не делает снимок устаревшим; новый ордер - делает"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+
+    async def scenario():
+        session = SimulatedSession(fee_rate=0.0)
+        strategy = ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=ReplayClock(1.0),
+                                                notifications=False)
+        session.on_price("BTCUSDT", 100.0)
+        await strategy.process_message(Ticker("BTCUSDT", 0, 100.0, 100.0, 100.0, 100.0, 0.0))
+        await strategy.orders.join()
+        since = strategy.snapshot_since
+        assert since > 0 and strategy.averaging_order_id
+
+        # Цена выше уровня усреднения без исполнения: порог срабатывает, позиция и ордера те же
+        for ts in range(1, 21):
+            await strategy.process_message(Ticker("BTCUSDT", ts, 111.0, 111.0, 111.0, 111.0, 0.0))
+        await strategy.orders.join()
+        assert strategy.snapshot_since == since
+
+        strategy.stop_loss_order_id = "sl-1"
+        strategy._save_state()
+        assert strategy.snapshot_since > since
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_poll_groups_pages_by_symbol()
+    test_stale_snapshot_returns_none()
+    test_shared_snapshot_through_redis()
+    test_strategy_falls_back_to_rest()
+    test_snapshot_since_moves_only_on_exchange_transitions()
+    print("✅ Все тесты снимка аккаунта пройдены")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки асинхронного REST-клиента Bybit (локальный сервер aiohttp)
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from bybit.async_http import AsyncHTTP, BybitHTTPError
+
+
+class FakeBybit:
+    """Локальный /v5: проверяет подпись и запоминает запросы и соединения"""
+
+    def __init__(self, secret, delay=0.0):
+        self.secret = secret
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+
+    async def handle(self, request):
+        body = await request.text()
+        payload = request.query_string if request.method == "GET" else body
+        self.requests.append((request.method, request.path, payload, dict(request.headers)))
+        self.connections.add(request.transport.get_extra_info('peername'))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if request.path == "/v5/boom":
+            return web.Response(status=502, text="Bad Gateway")
+        if "X-BAPI-SIGN" in request.headers:
+            param_str = (request.headers["X-BAPI-TIMESTAMP"] + request.headers["X-BAPI-API-KEY"]
+                         + request.headers["X-BAPI-RECV-WINDOW"] + payload)
+            expected = hmac.new(self.secret.encode(), param_str.encode(), hashlib.sha256).hexdigest()
+            if request.headers["X-BAPI-SIGN"] != expected:
+                return web.json_response({'retCode': 10004, 'retMsg': 'error sign!', 'result': {}})
+        return web.json_response({'retCode': 0, 'retMsg': 'OK', 'result': {'path': request.path}})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+
+def test_signed_requests_and_pooling():
+    """Подпись v5 для GET и POST, приведение типов тела, одно keep-alive соединение на серию запросов"""
+    async def scenario():
+        server = FakeBybit("secret")
+        http = AsyncHTTP(api_key="key", api_secret="secret", endpoint=await server.start())
+
+        response = await http.get_positions(category="linear", symbol="BTCUSDT", cursor=None)
+        assert response['retCode'] == 0 and response['result']['path'] == "/v5/position/list"
+        method, path, payload, headers = server.requests[-1]
+        assert payload == "category=linear&symbol=BTCUSDT"
+        assert headers["X-BAPI-SIGN-TYPE"] == "2" and abs(int(headers["X-BAPI-TIMESTAMP"]) - time.time() * 1000) < 5000
+
+        response = await http.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market",
+                                          qty=0.5, positionIdx=0.0, reduceOnly=False)
+        assert response['retCode'] == 0
+        body = json.loads(server.requests[-1][2])
+        assert body['qty'] == "0.5" and body['positionIdx'] == 0 and body['reduceOnly'] is False
+
+        # Публичные эндпоинты идут без подписи
+        await http.get_tickers(category="linear", symbol="BTCUSDT")
+        assert "X-BAPI-SIGN" not in server.requests[-1][3]
+
+        # Чужой секрет - биржа отвечает retCode, исключения нет
+        wrong = AsyncHTTP(api_key="key", api_secret="wrong", endpoint=http.endpoint)
+        assert (await wrong.cancel_order(category="linear", symbol="BTCUSDT", orderId="1"))['retCode'] == 10004
+        await wrong.close()
+
+        for _ in range(5):
+            await http.get_open_orders(category="linear", symbol="BTCUSDT")
+        assert len(server.connections) == 2   # Клиент с чужим секретом - свой пул
+        await http.close()
+        await server.runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_timeouts_and_concurrency():
+    """Таймаут на вызов, HTTP-ошибка без JSON; параллельные запросы не ждут друг друга"""
+    async def scenario():
+        server = FakeBybit("secret", delay=0.2)
+        http = AsyncHTTP(api_key="key", api_secret="secret", endpoint=await server.start())
+
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            http.get_positions(category="linear", symbol=f"S{i}USDT") for i in range(10)
+        ])
+        assert all(r['retCode'] == 0 for r in responses)
+        assert time.perf_counter() - started < 1.0   # Последовательно было бы 2 секунды
+
+        try:
+            await http.amend_order(category="linear", symbol="BTCUSDT", orderId="1", timeout=0.05)
+            assert False, "ожидался таймаут"
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await http.request("GET", "/v5/boom", {})
+            assert False, "ожидалась HTTP-ошибка"
+        except BybitHTTPError as e:
+            assert e.status == 502
+        assert http.stats()['errors'] == 2
+        await http.close()
+        await server.runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_signed_requests_and_pooling()
+    test_timeouts_and_concurrency()
+    print("✅ Все тесты асинхронного REST-клиента пройдены")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки построения OHLCV-баров из тиков
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.bar_builder import BarSeries, SymbolBars
+from bybit.ws_decoder import Ticker
+
+
+def test_ohlc_and_rollover():
+    """Тики одного периода собираются в бар, новый период закрывает предыдущий"""
+    series = BarSeries(period=60, capacity=10)
+    for ts, price in ((0, 100.0), (10_000, 105.0), (20_000, 95.0), (59_999, 101.0), (60_000, 102.0)):
+        series.on_tick(ts, price, volume=1.0)
+
+    closed = series.bar(1)
+    assert closed == {'start': 0, 'open': 100.0, 'high': 105.0, 'low': 95.0, 'close': 101.0, 'volume': 4.0}
+    assert series.bar(0)['start'] == 60_000
+    assert series.bar(0)['close'] == 102.0
+
+
+def test_gap_filled_with_flat_bars():
+    """Периоды без тиков заполняются плоскими барами по последнему close"""
+    series = BarSeries(period=1, capacity=10)
+    series.on_tick(0, 100.0)
+    series.on_tick(3_000, 103.0)
+
+    bars = series.latest(3)
+    assert list(bars['start']) == [0, 1_000, 2_000]
+    assert list(bars['close']) == [100.0, 100.0, 100.0]
+    assert series.bar(0)['open'] == 103.0
+
+
+def test_ring_buffer_wraps_and_atr():
+    """Буфер перезаписывает старые бары; ATR и диапазон считаются по последним барам"""
+    series = BarSeries(period=1, capacity=5)
+    for i in range(20):
+        series.on_tick(i * 1_000, 100.0 + i)
+        series.on_tick(i * 1_000 + 500, 100.0 + i + 2)
+
+    assert series.count == 5
+    assert list(series.latest(3)['start']) == [16_000, 17_000, 18_000]
+    # Каждый бар: open = low = 100 + i, close = high = 102 + i, prev_close внутри -> true range 2
+    assert series.atr(3) == 2.0
+    assert series.atr(10) is None
+    assert series.price_range(2) == (119.0 + 2) - 118.0
+
+
+def test_symbol_bars_from_ticker_messages():
+    """Сообщения тикера попадают во все таймфреймы, объем - прирост volume24h"""
+    bars = SymbolBars("BTCUSDT")
+    bars.on_ticker(Ticker("BTCUSDT", 1_000, 100.0, 0.0, 0.0, 0.0, 10.0))
+    bars.on_ticker(Ticker("BTCUSDT", 1_500, 101.0, 0.0, 0.0, 0.0, 12.5))
+    bars.on_ticker(Ticker("BTCUSDT", 1_700, 0.0, 0.0, 0.0, 0.0, 0.0))  # Тикер без цены пропускается
+
+    for series in bars.series.values():
+        assert series.bar(0)['close'] == 101.0
+        assert series.bar(0)['volume'] == 2.5
+    assert bars.latest('1s', 5, include_current=True)['close'].tolist() == [101.0]
+
+
+if __name__ == "__main__":
+    test_ohlc_and_rollover()
+    test_gap_filled_with_flat_bars()
+    test_ring_buffer_wraps_and_atr()
+    test_symbol_bars_from_ticker_messages()
+    print("✅ Все тесты построения баров пройдены")
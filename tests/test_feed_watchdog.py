@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки сторожа свежести потока тиков
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.feed_watchdog import FeedWatchdog, backoff_delay
+
+
+class FakeFeed:
+    def __init__(self, ages):
+        self.ages = ages
+        self.reconnected = 0
+        self.resubscribed = []
+        self.snapshots = []
+
+    def tick_ages(self):
+        return dict(self.ages)
+
+    def reconnect(self):
+        self.reconnected += 1
+
+    def resubscribe(self, symbols):
+        self.resubscribed.extend(symbols)
+
+    def apply_snapshot(self, update):
+        self.snapshots.append(update)
+        return True
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = 0
+
+    def get_tickers(self, category):
+        self.calls += 1
+        return {
+            'retCode': 0, 'time': 1700000000000,
+            'result': {'list': [
+                {'symbol': 'BTCUSDT', 'lastPrice': '65000', 'bid1Price': '64999', 'ask1Price': '65001',
+                 'markPrice': '65000.5', 'volume24h': '100'},
+                {'symbol': 'ETHUSDT', 'lastPrice': '3000', 'bid1Price': '2999', 'ask1Price': '3001',
+                 'markPrice': '3000', 'volume24h': '50'},
+                {'symbol': 'XRPUSDT', 'lastPrice': '0.5'},
+            ]},
+        }
+
+
+def test_backoff_grows_with_jitter():
+    """Пауза растет экспоненциально, разброс в пределах [delay/2, delay], потолок соблюдается"""
+    for attempt, full in ((0, 1.0), (3, 8.0), (10, 60.0)):
+        for _ in range(50):
+            delay = backoff_delay(attempt)
+            assert full / 2 <= delay <= full
+
+
+def test_all_symbols_silent_reconnects():
+    """Молчат все символы - переподключение, повторно не дергаем до истечения stale_after"""
+    feed = FakeFeed({'BTCUSDT': 30.0, 'ETHUSDT': 25.0})
+    watchdog = FeedWatchdog(feed, session=FakeSession(), stale_after=20)
+    assert sorted(watchdog.check()) == ['BTCUSDT', 'ETHUSDT']
+    assert feed.reconnected == 1
+    assert feed.resubscribed == []
+
+    assert watchdog.check() == []
+    assert feed.reconnected == 1
+
+
+def test_partial_stall_resubscribes_and_backfills():
+    """Молчит один символ - переподписка и одна пачка цен из REST только по нему"""
+    feed = FakeFeed({'BTCUSDT': 45.0, 'ETHUSDT': 0.5})
+    session = FakeSession()
+    watchdog = FeedWatchdog(feed, session=session, stale_after=20)
+    assert watchdog.check() == ['BTCUSDT']
+    assert feed.reconnected == 0
+    assert feed.resubscribed == ['BTCUSDT']
+    assert session.calls == 1
+    assert len(feed.snapshots) == 1
+    update = feed.snapshots[0]
+    assert update.symbol == 'BTCUSDT' and update.is_snapshot
+    assert update.last_price == 65000.0 and update.ask_price == 65001.0
+    assert update.ts == 1700000000000
+
+
+def test_single_quiet_symbol_resubscribes_first():
+    """Единственный молчащий символ: переподписка, затем одно переподключение, дальше только переподписка"""
+    feed = FakeFeed({'XRPUSDT': 25.0})
+    session = FakeSession()
+    watchdog = FeedWatchdog(feed, session=session, stale_after=20)
+    assert watchdog.check() == ['XRPUSDT']
+    assert feed.reconnected == 0 and feed.resubscribed == ['XRPUSDT'] and session.calls == 1
+
+    for expected_reconnects in (1, 1, 1):
+        watchdog._acted_at['XRPUSDT'] -= 21     # Прошло stale_after, тиков так и нет
+        assert watchdog.check() == ['XRPUSDT']
+        assert feed.reconnected == expected_reconnects
+    assert feed.resubscribed == ['XRPUSDT'] * 3
+
+    # Тики пошли - следующая тишина снова начинается с переподписки
+    feed.ages['XRPUSDT'] = 1.0
+    assert watchdog.check() == []
+    feed.ages['XRPUSDT'] = 25.0
+    watchdog._acted_at['XRPUSDT'] -= 21
+    watchdog.check()
+    assert feed.reconnected == 1 and len(feed.resubscribed) == 4
+
+
+def test_backfill_batches_symbols():
+    """Несколько символов подтягиваются одним запросом get_tickers"""
+    feed = FakeFeed({})
+    session = FakeSession()
+    watchdog = FeedWatchdog(feed, session=session)
+    watchdog.request_backfill(['btcusdt'])
+    watchdog.request_backfill(['ETHUSDT'])
+    watchdog._flush_backfill()
+    assert session.calls == 1
+    assert sorted(u.symbol for u in feed.snapshots) == ['BTCUSDT', 'ETHUSDT']
+
+
+if __name__ == "__main__":
+    test_backoff_grows_with_jitter()
+    test_all_symbols_silent_reconnects()
+    test_partial_stall_resubscribes_and_backfills()
+    test_single_quiet_symbol_resubscribes_first()
+    test_backfill_batches_symbols()
+    print("✅ Все тесты сторожа потока пройдены")
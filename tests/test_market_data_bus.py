@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки шины рыночных данных через Redis (кадры, подписки, раздача тиков)
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.market_data_bus import (
+    LEASE_TTL, LEASES_KEY, MarketDataBusSubscriber, MarketDataPublisher, decode_frame, encode_frame,
+    ticker_channel,
+)
+from bybit.ws_decoder import Ticker
+
+
+class FakePubSub:
+    """PubSub в памяти; запоминает потоки, из которых его вызывали"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = set()
+        self.messages = queue.Queue()
+        self.threads = set()
+        self.closed = False
+
+    @property
+    def subscribed(self):
+        return bool(self.channels)
+
+    def subscribe(self, *channels):
+        self.threads.add(threading.get_ident())
+        self.channels.update(channels)
+
+    def unsubscribe(self, *channels):
+        self.threads.add(threading.get_ident())
+        self.channels.difference_update(channels)
+
+    def get_message(self, timeout=0.0):
+        self.threads.add(threading.get_ident())
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.threads.add(threading.get_ident())
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.pubsubs = []
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    def publish(self, channel, data):
+        receivers = 0
+        for pubsub in self.pubsubs:
+            if channel in pubsub.channels and not pubsub.closed:
+                pubsub.messages.put({'type': 'message', 'channel': channel, 'data': data})
+                receivers += 1
+        return receivers
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub(self)
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+
+class FakeHub:
+    def __init__(self):
+        self.recorder = None
+        self.callbacks = {}
+
+    def subscribe(self, symbol, callback):
+        self.callbacks[symbol] = callback
+
+    def unsubscribe(self, symbol, callback):
+        assert self.callbacks.pop(symbol) is callback
+
+
+class FakePriceTable:
+    def __init__(self):
+        self.tickers = []
+
+    def update_from_ticker(self, ticker):
+        self.tickers.append(ticker)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_frame_roundtrip():
+    """Кадр восстанавливает тикер без потери точности цен"""
+    ticker = Ticker("BTCUSDT", 1700000000123, 65000.1, 64999.95, 65000.15, 65000.123456789, 1234.5)
+    frame = encode_frame(ticker)
+    assert frame.count("|") == 5
+    assert decode_frame("BTCUSDT", frame) == ticker
+
+    small = Ticker("PEPEUSDT", 1, 1.234e-05, 1.2e-05, 1.25e-05, 0.0, 0.0)
+    assert decode_frame("PEPEUSDT", encode_frame(small)) == small
+
+
+def test_publisher_leases_and_sync():
+    """Публикатор подписывается на символы с живыми подписками и снимает просроченные"""
+    redis = FakeRedis()
+    hub = FakeHub()
+    prices = FakePriceTable()
+    publisher = MarketDataPublisher(redis=redis, hub=hub, price_table_writer=prices)
+
+    now = time.time()
+    redis.hset(LEASES_KEY, "BTCUSDT|a:1", now + LEASE_TTL)
+    redis.hset(LEASES_KEY, "BTCUSDT|b:2", now + LEASE_TTL)
+    redis.hset(LEASES_KEY, "ETHUSDT|a:1", now - 1)           # Просрочена
+    assert publisher.get_active_symbols() == ["BTCUSDT"]
+    assert "ETHUSDT|a:1" not in redis.hashes[LEASES_KEY]
+
+    publisher.sync_subscriptions()
+    assert set(hub.callbacks) == {"BTCUSDT"}
+    reader = redis.pubsub()
+    reader.subscribe(ticker_channel("BTCUSDT"))
+    ticker = Ticker("BTCUSDT", 1, 100.0, 99.9, 100.1, 100.0, 5.0)
+    hub.callbacks["BTCUSDT"](ticker)
+    assert decode_frame("BTCUSDT", reader.get_message()['data']) == ticker
+    assert prices.tickers == [ticker] and publisher.frames_published == 1
+
+    redis.hset(LEASES_KEY, "ETHUSDT|a:1", now + LEASE_TTL)
+    redis.hdel(LEASES_KEY, "BTCUSDT|a:1", "BTCUSDT|b:2")
+    publisher.sync_subscriptions()
+    assert set(hub.callbacks) == {"ETHUSDT"} and set(publisher.symbols) == {"ETHUSDT"}
+
+
+def test_subscriber_fanout_and_single_pubsub_thread():
+    """Кадр раздается всем подписчикам символа; PubSub трогает только поток чтения"""
+    redis = FakeRedis()
+    bus = MarketDataBusSubscriber(redis=redis)
+    first, second, other = [], [], []
+    try:
+        bus.subscribe("btcusdt", first.append)
+        bus.subscribe("BTCUSDT", second.append)
+        bus.subscribe("ETHUSDT", other.append)
+        assert bus.subscriber_count("BTCUSDT") == 2
+        leases = redis.hashes[LEASES_KEY]
+        assert set(leases) == {f"BTCUSDT|{bus.consumer_id}", f"ETHUSDT|{bus.consumer_id}"}
+
+        assert wait_for(lambda: redis.pubsubs and redis.pubsubs[0].channels == {
+            ticker_channel("BTCUSDT"), ticker_channel("ETHUSDT")})
+        ticker = Ticker("BTCUSDT", 5, 101.0, 100.9, 101.1, 101.0, 1.0)
+        redis.publish(ticker_channel("BTCUSDT"), encode_frame(ticker))
+        assert wait_for(lambda: first and second)
+        assert first == [ticker] and second == [ticker] and other == []
+        assert bus.get_last_ticker("BTCUSDT") == ticker
+
+        # Последний подписчик ушел - канал и подписка в Redis сняты
+        bus.unsubscribe("ETHUSDT", other.append)
+        assert f"ETHUSDT|{bus.consumer_id}" not in redis.hashes[LEASES_KEY]
+        assert wait_for(lambda: redis.pubsubs[0].channels == {ticker_channel("BTCUSDT")})
+
+        # Переподключение: новое соединение на все символы, старое закрыто
+        bus.reconnect()
+        assert wait_for(lambda: len(redis.pubsubs) == 2 and redis.pubsubs[0].closed)
+        assert wait_for(lambda: redis.pubsubs[1].channels == {ticker_channel("BTCUSDT")})
+        redis.publish(ticker_channel("BTCUSDT"), encode_frame(ticker._replace(ts=6)))
+        assert wait_for(lambda: len(first) == 2)
+    finally:
+        bus.close()
+
+    assert wait_for(lambda: redis.pubsubs[1].closed)
+    threads = set().union(*(pubsub.threads for pubsub in redis.pubsubs))
+    assert len(threads) == 1 and threading.get_ident() not in threads
+
+
+if __name__ == "__main__":
+    test_frame_roundtrip()
+    test_publisher_leases_and_sync()
+    test_subscriber_fanout_and_single_pubsub_thread()
+    print("✅ Все тесты шины рыночных данных пройдены")
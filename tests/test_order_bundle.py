@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки пакета ордеров (вход и защита одним запросом)
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.order_bundle import (
+    MAX_BATCH_SIZE, OrderBundle, cancel_legs_async, place_bundle, place_bundle_async, retry_legs_async,
+)
+from bybit.order_gateway import OrderGateway
+from bybit.tick_replay import ReplayClock, SimulatedSession, TickReplay
+from bybit.ws_decoder import Ticker
+
+REDUCE_ONLY_REJECTED = 110017
+
+
+class BatchClient:
+    """pybit-подобный клиент: пакетный запрос, ноги reduce-only в пакете отклоняются (вход еще не исполнен)"""
+
+    def __init__(self, reject_reduce_only=False, fail_entry=False):
+        self.reject_reduce_only = reject_reduce_only
+        self.fail_entry = fail_entry
+        self.batches = []
+        self.orders = []
+        self.cancelled = []
+
+    def _code(self, leg):
+        if self.fail_entry and not leg.get('reduceOnly'):
+            return 110007, "ab not enough for new order"
+        if self.reject_reduce_only and leg.get('reduceOnly'):
+            return REDUCE_ONLY_REJECTED, "current position is zero, cannot fix reduce-only order qty"
+        return 0, "OK"
+
+    def place_batch_order(self, category=None, request=None):
+        self.batches.append(request)
+        items, codes = [], []
+        for i, leg in enumerate(request):
+            code, message = self._code(leg)
+            items.append({'orderId': f"b{len(self.batches)}-{i}" if code == 0 else "",
+                          'orderLinkId': leg['orderLinkId']})
+            codes.append({'code': code, 'msg': message})
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'list': items}, 'retExtInfo': {'list': codes}}
+
+    def place_order(self, **params):
+        self.orders.append(params)
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'orderId': f"o{len(self.orders)}",
+                                                         'orderLinkId': params['orderLinkId']}}
+
+    def cancel_order(self, **params):
+        self.cancelled.append(params['orderId'])
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {}}
+
+
+class AsyncBatchClient(BatchClient):
+    """Тот же клиент с интерфейсом AsyncHTTP"""
+
+    async def place_batch_order(self, **params):
+        return BatchClient.place_batch_order(self, **params)
+
+    async def place_order(self, **params):
+        return BatchClient.place_order(self, **params)
+
+    async def cancel_order(self, **params):
+        return BatchClient.cancel_order(self, **params)
+
+
+def test_leg_mapping():
+    """Ответ пакета раскладывается по именам ног; большой пакет делится на порции"""
+    bundle = OrderBundle("BTCUSDT")
+    bundle.add("entry", side="Sell", orderType="Market", qty=0.01)
+    bundle.add("take_profit", side="Buy", orderType="Limit", qty=0.01, price=95.5, reduceOnly=True)
+    assert bundle.legs["entry"]['qty'] == "0.01" and bundle.legs["take_profit"]['price'] == "95.5"
+    assert bundle.legs["entry"]['symbol'] == "BTCUSDT" and bundle.legs["entry"]['orderLinkId']
+
+    client = BatchClient(reject_reduce_only=True)
+    legs = place_bundle(client, bundle)
+    assert len(client.batches) == 1 and [leg['side'] for leg in client.batches[0]] == ["Sell", "Buy"]
+    assert legs["entry"]['retCode'] == 0 and legs["entry"]['result']['orderId'] == "b1-0"
+    assert legs["take_profit"]['retCode'] == REDUCE_ONLY_REJECTED and legs["take_profit"]['result'] == {}
+    assert OrderBundle.failed(legs) == ["take_profit"] and OrderBundle.placed(legs) == ["entry"]
+
+    # Отказ всего запроса - отказ каждой ноги
+    failed = bundle.split(bundle.names(), {'retCode': 10004, 'retMsg': 'error sign!'})
+    assert all(leg['retCode'] == 10004 and leg['retMsg'] == 'error sign!' for leg in failed.values())
+
+    big = OrderBundle("BTCUSDT")
+    for i in range(MAX_BATCH_SIZE + 3):
+        big.add(f"grid-{i}", side="Sell", orderType="Limit", qty=1, price=100 + i)
+    client = BatchClient()
+    legs = place_bundle(client, big)
+    assert [len(batch) for batch in client.batches] == [MAX_BATCH_SIZE, 3]
+    assert legs[f"grid-{MAX_BATCH_SIZE}"]['result']['orderId'] == "b2-0"
+
+    # Шлюз без WebSocket Trade: пакет через REST, у каждой ноги orderLinkId
+    rest = BatchClient()
+    gateway = OrderGateway(rest, "key", "secret", url=None)
+    response = gateway.place_batch_order(category="linear", request=[{'symbol': "BTCUSDT", 'side': "Sell",
+                                                                     'orderType': "Market", 'qty': 1}])
+    assert response['via'] == "rest" and rest.batches[0][0]['orderLinkId'] and rest.batches[0][0]['qty'] == "1"
+
+
+def test_retry_and_cancel_async():
+    """Отклоненная защита повторяется отдельно; при отказе входа выставленная защита отменяется"""
+    async def scenario():
+        bundle = OrderBundle("BTCUSDT")
+        bundle.add("entry", side="Sell", orderType="Market", qty="1", reduceOnly=False)
+        bundle.add("stop_loss", side="Buy", orderType="Stop", qty="1", triggerPrice="115", reduceOnly=True)
+        client = AsyncBatchClient(reject_reduce_only=True)
+        legs = await place_bundle_async(client, bundle)
+        link_id = bundle.legs["stop_loss"]['orderLinkId']
+        legs = await retry_legs_async(client, bundle, legs)
+        assert legs["stop_loss"]['retCode'] == 0 and len(client.orders) == 1
+        assert client.orders[0]['triggerPrice'] == "115" and client.orders[0]['orderLinkId'] != link_id
+
+        client = AsyncBatchClient(fail_entry=True)
+        legs = await place_bundle_async(client, bundle)
+        assert legs["entry"]['retCode'] != 0 and legs["stop_loss"]['retCode'] == 0
+        await cancel_legs_async(client, bundle, legs, ["stop_loss", "take_profit"])
+        assert client.cancelled == [legs["stop_loss"]['result']['orderId']]
+
+    asyncio.run(scenario())
+
+
+class CountingSession(SimulatedSession):
+    """Симулятор, считающий запросы на выставление ордеров"""
+
+    def __init__(self):
+        super().__init__(fee_rate=0.0)
+        self.batch_calls = 0
+        self.order_calls = 0
+
+    def place_batch_order(self, **kwargs):
+        self.batch_calls += 1
+        return super().place_batch_order(**kwargs)
+
+    def place_order(self, **kwargs):
+        self.order_calls += 1
+        return super().place_order(**kwargs)
+
+
+def test_strategy_entry_bundle():
+    """Вход стратегии усреднения и лимитка усреднения - один пакетный запрос"""
+    async def scenario():
+        from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+        session = CountingSession()
+        clock = ReplayClock()
+        strategy = ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=clock, notifications=False)
+        replay = TickReplay(strategy, session, clock)
+        await replay.run([Ticker("BTCUSDT", i * 1000, p, p, p, p, 0.0) for i, p in enumerate([100.0, 101.0])])
+
+        assert strategy.position_opened and strategy.averaging_order_id is not None
+        assert session.batch_calls == 1
+        order = session.orders[strategy.averaging_order_id]
+        assert order['orderType'] == "Limit" and float(order['price']) == strategy.entry_price * 1.1
+        assert order['orderLinkId']
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_leg_mapping()
+    test_retry_and_cancel_async()
+    test_strategy_entry_bundle()
+    print("✅ Все тесты пакета ордеров пройдены")
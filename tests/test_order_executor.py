@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки исполнителя торговых запросов стратегии
+"""
+
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.order_executor import OrderExecutor
+from bybit.tick_replay import ReplayClock, SimulatedSession
+from bybit.ws_decoder import Ticker
+
+
+def test_order_preserved_and_superseded_collapsed():
+    """Запросы уходят по порядку; неотправленный перенос безубытка заменяется новым уровнем"""
+    async def scenario():
+        executor = OrderExecutor("BTCUSDT")
+        sent, done = [], []
+
+        def call(name):
+            sent.append(name)
+            return name
+
+        executor.submit('stop_loss', lambda: call('sl'), done.append)
+        for level in (5, 7, 9):
+            executor.submit('breakeven', lambda level=level: call(f'be{level}'), done.append)
+        assert executor.pending() == 2
+        position = await executor.run(lambda: call('position'))
+
+        assert sent == ['sl', 'be9', 'position'] and position == 'position'
+        assert done == ['sl', 'be9']
+        assert executor.stats()['collapsed'] == 2
+
+        # Запрос в полете не схлопывается: новый уровень уйдет следом
+        executor.submit('breakeven', lambda: call('be11'))
+        await asyncio.sleep(0)
+        executor.submit('breakeven', lambda: call('be13'))
+        await executor.join()
+        assert sent[-2:] == ['be11', 'be13']
+        await executor.close()
+
+        # Симулятор биржи: при пустой очереди запрос выполняется сразу, без задачи исполнителя
+        inline = OrderExecutor("BTCUSDT", threaded=False)
+        inline.submit('breakeven', lambda: call('be15'), done.append)
+        assert sent[-1] == 'be15' and done[-1] == 'be15' and inline.pending() == 0
+
+    asyncio.run(scenario())
+
+
+def test_discard_and_errors():
+    """discard снимает неотправленные намерения, ошибка запроса не останавливает очередь"""
+    async def scenario():
+        executor = OrderExecutor("BTCUSDT")
+        sent = []
+
+        def fail():
+            raise RuntimeError("timeout")
+
+        executor.submit('breakeven', lambda: sent.append('be'))
+        executor.submit('averaging_check', lambda: sent.append('check'))
+        executor.submit('stop_loss', fail)
+        assert executor.discard('breakeven', 'averaging_check') == 2
+        assert await executor.run(lambda: 'closed') == 'closed'
+        try:
+            await executor.run(fail)
+            assert False, "ошибка запроса должна дойти до вызывающего"
+        except RuntimeError:
+            pass
+        assert sent == [] and executor.stats()['failed'] == 2
+        await executor.close()
+
+    asyncio.run(scenario())
+
+
+def test_http_call_does_not_block_loop():
+    """HTTP-вызов выполняется в потоке: event loop продолжает обрабатывать тики"""
+    async def scenario():
+        executor = OrderExecutor("BTCUSDT")
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        executor.submit('breakeven', lambda: time.sleep(0.2))
+        await executor.join()
+        task.cancel()
+        assert time.perf_counter() - started >= 0.2
+        assert ticks >= 20
+        await executor.close()
+
+    asyncio.run(scenario())
+
+
+def test_breakeven_moved_by_amend():
+    """Перенос безубытка изменяет существующий стоп-ордер; при отказе биржи - отмена и новый ордер"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+
+    async def scenario():
+        session = SimulatedSession()
+        session.on_price("BTCUSDT", 100.0)
+        strategy = ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=ReplayClock(1.0),
+                                                notifications=False, state_store=None)
+        await strategy.process_message(Ticker("BTCUSDT", 0, 100.0, 100.0, 100.0, 100.0, 0.0))
+        session.on_price("BTCUSDT", 94.0)
+
+        strategy.place_breakeven_order(96.0, 4.0)
+        first = strategy.breakeven_order_id
+        strategy.place_breakeven_order(95.0, 5.0)
+        assert strategy.breakeven_order_id == first and strategy.breakeven_amends == 1
+        assert session.orders[first]['triggerPrice'] == '95.0'
+
+        session.amend_order = lambda **kwargs: {'retCode': 10001, 'retMsg': 'params error', 'result': {}}
+        strategy.place_breakeven_order(94.5, 5.5)
+        assert strategy.breakeven_replaces == 1 and strategy.breakeven_order_id != first
+        assert first not in session.orders
+        assert session.orders[strategy.breakeven_order_id]['triggerPrice'] == '94.5'
+        await strategy.orders.close()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_order_preserved_and_superseded_collapsed()
+    test_discard_and_errors()
+    test_http_call_does_not_block_loop()
+    test_breakeven_moved_by_amend()
+    print("✅ Все тесты исполнителя запросов пройдены")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки шлюза ордеров (локальный сервер WebSocket Trade на aiohttp)
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from pybit.exceptions import FailedRequestError, InvalidRequestError
+
+from bybit.order_gateway import DUPLICATE_ORDER_LINK_ID, OrderGateway
+from bybit.stop_all_orders import close_position_by_symbol
+
+
+class FakeTradeServer:
+    """Локальный /v5/trade: отвечает на order.* в случайном порядке, SLOWUSDT - без ответа"""
+
+    def __init__(self):
+        self.requests = []
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+        started = threading.Event()
+        threading.Thread(target=self._run, args=(started,), daemon=True).start()
+        started.wait(5)
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_get('/v5/trade', self.handle)
+        runner = web.AppRunner(app)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        started.set()
+        self.loop.run_forever()
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            message = json.loads(msg.data)
+            if message.get('op') == 'auth':
+                await ws.send_json({'op': 'auth', 'retCode': 0, 'retMsg': 'OK', 'connId': 'test'})
+                continue
+            self.requests.append(message)
+            args = message['args'][0]
+            if args.get('symbol') == 'SLOWUSDT':
+                continue
+            asyncio.ensure_future(self._reply(ws, message, args))
+        return ws
+
+    async def _reply(self, ws, message, args):
+        await asyncio.sleep(random.uniform(0, 0.05))
+        await ws.send_json({
+            'reqId': message['reqId'], 'retCode': 0, 'retMsg': 'OK', 'op': message['op'],
+            'data': {'orderId': f"ws-{args.get('orderLinkId') or args.get('orderId')}",
+                     'orderLinkId': args.get('orderLinkId', '')},
+            'header': {'Timenow': str(int(time.time() * 1000))},
+        })
+
+
+class FakeRest:
+    """Запасной путь: созданные по WebSocket orderLinkId биржа не примет повторно"""
+
+    def __init__(self, server=None):
+        self.server = server
+        self.calls = []
+        self.open_orders_down = False
+
+    def _ws_link_ids(self):
+        return {m['args'][0].get('orderLinkId') for m in self.server.requests} if self.server else set()
+
+    def place_order(self, **params):
+        self.calls.append(('place_order', params))
+        if params.get('orderLinkId') in self._ws_link_ids():
+            # Как pybit.HTTP: retCode != 0 - исключение, а не ответ
+            raise InvalidRequestError(request="/v5/order/create", message="OrderLinkedID is duplicate",
+                                      status_code=DUPLICATE_ORDER_LINK_ID, time="0", resp_headers={})
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {'orderId': 'rest-1', 'orderLinkId': params['orderLinkId']}}
+
+    def cancel_order(self, **params):
+        self.calls.append(('cancel_order', params))
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {}}
+
+    def amend_order(self, **params):
+        self.calls.append(('amend_order', params))
+        return {'retCode': 0, 'retMsg': 'OK', 'result': {}}
+
+    def get_open_orders(self, **params):
+        self.calls.append(('get_open_orders', params))
+        if self.open_orders_down:
+            raise FailedRequestError(request="/v5/order/realtime", message="Bad Gateway", status_code=502,
+                                     time="0", resp_headers={})
+        return {'retCode': 0, 'result': {'list': [{'orderId': 'ws-created', 'orderLinkId': params['orderLinkId']}]}}
+
+    def get_order_history(self, **params):
+        self.calls.append(('get_order_history', params))
+        if self.open_orders_down:
+            return {'retCode': 0, 'result': {'list': [{'orderId': 'ws-filled', 'orderLinkId': params['orderLinkId']}]}}
+        return {'retCode': 0, 'result': {'list': []}}
+
+    def get_positions(self, **params):
+        return {'retCode': 0, 'result': {'list': [{'symbol': params['symbol'], 'side': 'Sell', 'size': '3'}]}}
+
+
+def wait_connected(gateway, timeout=5.0):
+    deadline = time.time() + timeout
+    while not gateway.is_connected() and time.time() < deadline:
+        time.sleep(0.01)
+    assert gateway.is_connected()
+
+
+def test_orders_over_websocket():
+    """Ответы по reqId при параллельных запросах, amend/cancel и reduce-only закрытие - по WebSocket"""
+    server = FakeTradeServer()
+    rest = FakeRest(server)
+    gateway = OrderGateway(rest, "key", "secret", url=f"ws://127.0.0.1:{server.port}/v5/trade")
+    gateway.connect()
+    wait_connected(gateway)
+
+    def place(i):
+        return gateway.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market",
+                                   qty=0.001 * (i + 1), orderLinkId=f"link-{i}")
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        responses = list(pool.map(place, range(20)))
+    for i, response in enumerate(responses):
+        assert response['retCode'] == 0 and response['via'] == "ws"
+        assert response['result']['orderId'] == f"ws-link-{i}"
+    assert server.requests[0]['args'][0]['qty'] in {str(0.001 * (i + 1)) for i in range(20)}
+
+    assert gateway.amend_order(category="linear", symbol="BTCUSDT", orderId="7", triggerPrice=101.5)['via'] == "ws"
+    assert gateway.cancel_order(category="linear", symbol="BTCUSDT", orderId="7")['via'] == "ws"
+    assert server.requests[-2]['op'] == "order.amend" and server.requests[-2]['args'][0]['triggerPrice'] == "101.5"
+
+    close_position_by_symbol("ETHUSDT", rest, gateway)
+    close = server.requests[-1]['args'][0]
+    assert close['side'] == "Buy" and close['qty'] == "3" and close['reduceOnly'] is True
+    assert close['orderLinkId']   # Шлюз сам присваивает orderLinkId
+
+    stats = gateway.stats()
+    assert stats['ws']['sent'] == 23 and stats['rest']['sent'] == 0 and stats['ws']['p99_ms'] > 0
+    assert [name for name, _ in rest.calls] == []
+    gateway.close()
+
+
+def test_rest_fallback():
+    """Без ответа по WebSocket - повтор через REST с тем же orderLinkId; без соединения - сразу REST"""
+    server = FakeTradeServer()
+    rest = FakeRest(server)
+    gateway = OrderGateway(rest, "key", "secret", url=f"ws://127.0.0.1:{server.port}/v5/trade", timeout=0.2)
+    gateway.connect()
+    wait_connected(gateway)
+
+    # Ордер создан по WebSocket, но ответ не пришел: REST получает дубль и возвращает созданный ордер
+    response = gateway.place_order(category="linear", symbol="SLOWUSDT", side="Sell", orderType="Market", qty="1")
+    assert response['retCode'] == 0 and response['via'] == "rest"
+    assert response['result']['orderId'] == "ws-created"
+    assert rest.calls[0][1]['orderLinkId'] == server.requests[-1]['args'][0]['orderLinkId']
+    assert gateway.timeouts == 1 and gateway.fallbacks == 1 and gateway.duplicates == 1
+
+    # Ошибка при поиске среди открытых ордеров - ищем в истории
+    rest.open_orders_down = True
+    response = gateway.place_order(category="linear", symbol="SLOWUSDT", side="Sell", orderType="Market", qty="1")
+    assert response['retCode'] == 0 and response['result']['orderId'] == "ws-filled"
+    assert gateway.duplicates == 2
+    rest.open_orders_down = False
+
+    # Отмена без ответа повторяется через REST как есть
+    assert gateway.cancel_order(category="linear", symbol="SLOWUSDT", orderId="9")['via'] == "rest"
+    assert rest.calls[-1] == ('cancel_order', {'category': "linear", 'symbol': "SLOWUSDT", 'orderId': "9"})
+    gateway.close()
+
+    # Только REST (аккаунт без WebSocket Trade)
+    rest_only = OrderGateway(FakeRest(), "key", "secret", url=None)
+    rest_only.connect()
+    response = rest_only.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market", qty=1)
+    assert response['result']['orderId'] == "rest-1" and response['via'] == "rest"
+    assert rest_only.stats()['rest']['sent'] == 1
+
+
+if __name__ == "__main__":
+    test_orders_over_websocket()
+    test_rest_fallback()
+    print("✅ Все тесты шлюза ордеров пройдены")
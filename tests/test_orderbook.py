@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки локального стакана (snapshot + delta)
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.orderbook import OrderBook, SIDE_BUY, SIDE_SELL
+
+
+def make_book():
+    book = OrderBook("BTCUSDT", depth=5)
+    book.apply_message({
+        'topic': 'orderbook.5.BTCUSDT', 'type': 'snapshot', 'ts': 1,
+        'data': {
+            's': 'BTCUSDT', 'u': 10,
+            'b': [['99', '1'], ['100', '2'], ['98', '3']],
+            'a': [['101', '1'], ['103', '3'], ['102', '2']],
+        },
+    })
+    return book
+
+
+def test_snapshot_sorted():
+    """Snapshot сортируется: лучший bid - максимальный, лучший ask - минимальный"""
+    book = make_book()
+    assert book.best_bid() == (100.0, 2.0)
+    assert book.best_ask() == (101.0, 1.0)
+    assert book.mid_price() == 100.5
+
+
+def test_delta_insert_update_delete():
+    """Delta вставляет, обновляет и удаляет уровни"""
+    book = make_book()
+    book.apply_message({
+        'type': 'delta', 'ts': 2,
+        'data': {'u': 11, 'b': [['100', '0'], ['99.5', '4']], 'a': [['101', '5'], ['100.5', '1']]},
+    })
+    assert book.best_bid() == (99.5, 4.0)
+    assert book.best_ask() == (100.5, 1.0)
+    assert list(book.asks.prices()) == [100.5, 101.0, 102.0, 103.0]
+    assert list(book.bids.prices()) == [99.5, 99.0, 98.0]
+
+    # Удаление несуществующего уровня ничего не ломает
+    book.apply_message({'type': 'delta', 'data': {'u': 12, 'b': [['50', '0']], 'a': []}})
+    assert book.bids.count == 3
+
+
+def test_capacity_evicts_deepest_level():
+    """При заполнении глубины вытесняется самый дальний уровень"""
+    book = make_book()
+    book.apply_message({'type': 'delta', 'data': {'u': 11, 'a': [['104', '1'], ['105', '1']], 'b': []}})
+    assert book.asks.count == 5
+    book.apply_message({'type': 'delta', 'data': {'u': 12, 'a': [['100.8', '1'], ['106', '1']], 'b': []}})
+    assert list(book.asks.prices()) == [100.8, 101.0, 102.0, 103.0, 104.0]
+
+
+def test_fill_estimates():
+    """Средняя цена исполнения и глубина до суммы в USDT"""
+    book = make_book()
+    # Покупка 2 единиц: 1 по 101 и 1 по 102
+    assert book.estimate_fill_price(SIDE_BUY, 2) == 101.5
+    # Продажа 3 единиц: 2 по 100 и 1 по 99
+    assert abs(book.estimate_fill_price(SIDE_SELL, 3) - 299 / 3) < 1e-9
+    # Глубины не хватает
+    assert book.estimate_fill_price(SIDE_BUY, 100) is None
+
+    qty, worst = book.depth_to_notional(SIDE_BUY, 101 + 102)
+    assert abs(qty - 2.0) < 1e-9 and worst == 102.0
+    assert abs(book.estimate_slippage_percent(SIDE_BUY, 2) - 0.5 / 101 * 100) < 1e-9
+
+
+if __name__ == "__main__":
+    test_snapshot_sorted()
+    test_delta_insert_update_delete()
+    test_capacity_evicts_deepest_level()
+    test_fill_estimates()
+    print("✅ Все тесты стакана пройдены")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки книги позиций (пакетной проверки порогов)
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from bybit.position_book import PositionBook
+from bybit.tick_replay import ReplayClock, SimulatedSession
+from bybit.ws_decoder import Ticker
+
+
+class FakeFeed:
+    def __init__(self):
+        self.callbacks = {}
+
+    def subscribe(self, symbol, callback):
+        self.callbacks.setdefault(symbol, []).append(callback)
+
+    def unsubscribe(self, symbol, callback):
+        self.callbacks[symbol].remove(callback)
+
+    def send(self, symbol, price, ask=0.0):
+        ticker = Ticker(symbol, 0, price, price, ask, price, 0.0)
+        for callback in list(self.callbacks.get(symbol, ())):
+            callback(ticker)
+
+
+def test_only_crossed_slots_fire():
+    """Новый слот срабатывает на любом тике; после публикации порогов - только при пересечении"""
+    clock = ReplayClock(1000.0)
+    book = PositionBook(clock=clock)
+    feed = FakeFeed()
+    delivered = []
+    for symbol in ("AUSDT", "BUSDT", "CUSDT"):
+        book.add(feed, symbol, delivered.append)
+
+    feed.send("AUSDT", 100.0)
+    assert book.flush() == 1 and delivered[-1].symbol == "AUSDT"
+
+    for slot in range(3):
+        book.sync(slot, upper_last=110.0, upper_close=105.0, lower=97.0, due_at=1005.0)
+    delivered.clear()
+    feed.send("AUSDT", 101.0)
+    feed.send("AUSDT", 104.0)                 # В пачке остается последний тик символа
+    feed.send("BUSDT", 99.0, ask=105.5)       # Цена закрытия шорта - по ask
+    feed.send("CUSDT", 98.0)
+    assert book.flush() == 1
+    assert [t.symbol for t in delivered] == ["BUSDT"]
+    assert book.last_price[0] == 104.0
+
+    # Плановая проверка позиции по времени
+    clock.set_ms(1_006_000)
+    delivered.clear()
+    feed.send("CUSDT", 98.0)
+    assert book.flush() == 1 and delivered[0].symbol == "CUSDT"
+    assert book.stats()['ticks'] == 5 and book.stats()['fired'] == 3
+
+
+def test_slots_grow_and_reuse():
+    """Массивы удваиваются при нехватке слотов, освобожденный слот переиспользуется без старых порогов"""
+    book = PositionBook(capacity=2)
+    feed = FakeFeed()
+    slots = [book.add(feed, f"S{i}USDT", lambda t: None) for i in range(5)]
+    assert sorted(slots) == [0, 1, 2, 3, 4] and len(book.upper_last) >= 5
+    book.sync(slots[3], 1.0, 1.0, 0.5, 0.0)
+
+    book.remove("S3USDT")
+    assert feed.callbacks["S3USDT"] == []
+    slot = book.add(feed, "NEWUSDT", lambda t: None)
+    assert slot == slots[3] and book.lower[slot] == float('inf')
+
+    fired = book.evaluate(np.array(slots[:3]), np.full(3, 10.0), np.full(3, 10.0), 0.0)
+    assert fired.tolist() == slots[:3]
+
+
+def test_strategy_receives_only_crossing_ticks():
+    """Стратегия хоста получает тики только при пересечении порогов и закрывается по безубытку"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+
+    async def scenario():
+        clock = ReplayClock(1.0)
+        session = SimulatedSession()
+        session.on_price("BTCUSDT", 100.0)
+        feed = FakeFeed()
+        book = PositionBook(clock=clock)
+        strategy = ShortAveragingStrategyCelery(
+            "BTCUSDT", session=session, clock=clock, notifications=False,
+            ticker_feed=feed, position_book=book
+        )
+        task = asyncio.create_task(strategy.run())
+
+        async def tick(price):
+            session.on_price("BTCUSDT", price)
+            feed.send("BTCUSDT", price)
+            book.flush()
+            await asyncio.sleep(0.01)
+            await strategy.orders.join()
+
+        await asyncio.sleep(0.01)
+        await tick(100.0)
+        assert strategy.position_opened and strategy.ticks_processed == 1
+
+        await tick(99.5)                           # Новый пик прибыли
+        assert strategy.ticks_processed == 2
+        for price in (101.0, 102.0, 99.8):         # Между пиком (99.5) и усреднением (110)
+            await tick(price)
+        assert strategy.ticks_processed == 2
+
+        await tick(96.5)                           # TP: безубыток по текущей цене
+        assert strategy.ticks_processed == 3 and strategy.breakeven_price
+        await tick(98.0)                           # Цена вернулась к безубытку - закрытие
+        await asyncio.wait_for(task, timeout=5)
+        assert session.summary()['positions'] == {}
+        assert len(book) == 0
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_only_crossed_slots_fire()
+    test_slots_grow_and_reuse()
+    test_strategy_receives_only_crossing_ticks()
+    print("✅ Все тесты книги позиций пройдены")
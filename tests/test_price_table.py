@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки таблицы цен в разделяемой памяти
+"""
+
+import os
+import sys
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.price_table import PriceTable, PriceTableWriter
+from bybit.ws_decoder import Ticker
+
+
+def test_write_and_read():
+    """Писатель и читатель видят одни и те же цены через файл"""
+    path = os.path.join(tempfile.mkdtemp(), "prices")
+    writer = PriceTableWriter(path, capacity=8)
+    reader = PriceTable(path)
+
+    assert reader.get("BTCUSDT") is None
+
+    now_ms = int(time.time() * 1000)
+    writer.update_from_ticker(Ticker("BTCUSDT", now_ms, 65000.5, 65000.0, 65001.0, 64999.9, 0.0))
+    writer.update("ETHUSDT", 3000.0, ts=now_ms)
+
+    row = reader.get("btcusdt")
+    assert row.last == 65000.5
+    assert row.bid == 65000.0 and row.ask == 65001.0 and row.mark == 64999.9
+    assert row.ts == now_ms
+    assert reader.get_last_price("ETHUSDT") == 3000.0
+
+    writer.update("ETHUSDT", 3001.0, ts=now_ms)
+    assert reader.get_last_price("ETHUSDT") == 3001.0
+    writer.close()
+
+
+def test_stale_price_is_ignored():
+    """Устаревшая цена не возвращается из get_last_price"""
+    path = os.path.join(tempfile.mkdtemp(), "prices")
+    writer = PriceTableWriter(path, capacity=8)
+    reader = PriceTable(path)
+
+    old_ms = int((time.time() - 60) * 1000)
+    writer.update("SOLUSDT", 150.0, ts=old_ms)
+    assert reader.get("SOLUSDT").last == 150.0
+    assert reader.get_last_price("SOLUSDT", max_age=5) is None
+    writer.close()
+
+
+def test_writer_restart_resets_index():
+    """После перезапуска писателя читатель заново находит индексы символов"""
+    path = os.path.join(tempfile.mkdtemp(), "prices")
+    writer = PriceTableWriter(path, capacity=8)
+    reader = PriceTable(path)
+    writer.update("AAAUSDT", 1.0)
+    writer.update("BBBUSDT", 2.0)
+    assert reader.get_last_price("BBBUSDT") == 2.0
+    writer.close()
+
+    writer = PriceTableWriter(path, capacity=8)
+    writer.update("BBBUSDT", 3.0)
+    assert reader.get("AAAUSDT") is None
+    assert reader.get_last_price("BBBUSDT") == 3.0
+    writer.close()
+
+
+def test_writer_restart_with_other_capacity():
+    """Писатель с меньшей емкостью не укорачивает файл; читатель переоткрывает разметку"""
+    path = os.path.join(tempfile.mkdtemp(), "prices")
+    writer = PriceTableWriter(path, capacity=64)
+    reader = PriceTable(path)
+    for i in range(40):
+        writer.update(f"S{i}USDT", float(i + 1))
+    assert reader.get_last_price("S39USDT") == 40.0
+    size = os.path.getsize(path)
+    writer.close()
+
+    writer = PriceTableWriter(path, capacity=8)
+    assert os.path.getsize(path) == size
+    writer.update("S1USDT", 5.0)
+    assert reader.get("S39USDT") is None and reader.capacity == 8
+    assert reader.get_last_price("S1USDT") == 5.0
+    writer.close()
+
+
+class LocalFeed:
+    """Хаб процесса: последние тикеры по символам"""
+
+    def __init__(self, tickers):
+        self.tickers = tickers
+
+    def get_last_ticker(self, symbol):
+        return self.tickers.get(symbol)
+
+
+def test_local_feed_without_publisher():
+    """Без публикатора (файла нет) цены подписанных символов берутся из хаба процесса"""
+    path = os.path.join(tempfile.mkdtemp(), "prices")
+    now = int(time.time() * 1000)
+    reader = PriceTable(path)
+    assert reader.get_last_price("BTCUSDT") is None
+    reader.attach_local_feed(LocalFeed({'BTCUSDT': Ticker("BTCUSDT", now, 100.0, 99.9, 100.1, 100.0, 1.0)}))
+    assert reader.get_last_price("btcusdt") == 100.0 and reader.get("BTCUSDT").ask == 100.1
+    assert reader.get_last_price("ETHUSDT") is None
+
+    # Строка публикатора свежее тикера хаба - берется она
+    writer = PriceTableWriter(path, capacity=8)
+    writer.update("BTCUSDT", 101.0, ts=now + 1000)
+    assert reader.get_last_price("BTCUSDT") == 101.0
+    writer.close()
+
+
+if __name__ == "__main__":
+    test_write_and_read()
+    test_stale_price_is_ignored()
+    test_writer_restart_resets_index()
+    test_writer_restart_with_other_capacity()
+    test_local_feed_without_publisher()
+    print("✅ Все тесты таблицы цен пройдены")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки приватного потока ордеров, исполнений и позиции
+"""
+
+import asyncio
+import collections
+import hashlib
+import hmac
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.private_stream import PRIVATE_TOPICS, PrivateStream, auth_args
+from bybit.tick_replay import ReplayClock, SimulatedPrivateStream, SimulatedSession, TickReplay
+from bybit.ws_decoder import Ticker
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, raw):
+        self.sent.append(json.loads(raw))
+
+
+def connect(stream):
+    """Соединение без сети: поток считается запущенным, кадры отправляются в FakeWebSocket"""
+    stream._running = True
+    stream._ws = FakeWebSocket()
+    stream._on_open(stream._ws)
+    stream._on_message(stream._ws, json.dumps({"op": "auth", "success": True, "ret_msg": ""}))
+    stream._on_message(stream._ws, json.dumps({"op": "subscribe", "success": True, "ret_msg": ""}))
+    return stream._ws
+
+
+def test_auth_subscribe_and_dispatch():
+    """Подпись авторизации, подписка на топики после auth, раздача событий по символу, resync после обрыва"""
+    key, expires, signature = auth_args("key", "secret", expires=1700000000000)
+    assert signature == hmac.new(b"secret", b"GET/realtime1700000000000", hashlib.sha256).hexdigest()
+
+    stream = PrivateStream("key", "secret")
+    stream._running = True     # Без потока соединения: кадры подаются вручную
+    events = []
+    stream.subscribe("btcusdt", lambda kind, item: events.append((kind, item)))
+    ws = connect(stream)
+    assert ws.sent[0]['op'] == "auth" and ws.sent[0]['args'][0] == "key"
+    assert ws.sent[1] == {"op": "subscribe", "args": list(PRIVATE_TOPICS)}
+    assert stream.is_connected()
+
+    stream._on_message(ws, json.dumps({"topic": "order.linear", "data": [
+        {"symbol": "BTCUSDT", "orderId": "1", "orderStatus": "Filled"},
+        {"symbol": "ETHUSDT", "orderId": "2", "orderStatus": "New"},   # Чужой символ - без подписчиков
+    ]}))
+    stream._on_message(ws, json.dumps({"topic": "position.linear", "data": [
+        {"symbol": "BTCUSDT", "size": "2", "avgPrice": "105"},
+    ]}))
+    assert [(kind, item.get('orderId') or item['size']) for kind, item in events] == [('order', "1"), ('position', "2")]
+    assert stream.get_position("BTCUSDT")['avgPrice'] == "105"
+
+    # Обрыв и повторная авторизация: подписчик получает resync
+    stream._on_close(ws, 1006, "")
+    assert not stream.is_connected()
+    connect(stream)
+    assert events[-1] == ('resync', {'symbol': "BTCUSDT"}) and len(events) == 3
+
+
+class CountingSession(SimulatedSession):
+    """Симулятор, считающий REST-запросы чтения"""
+
+    def __init__(self):
+        super().__init__(fee_rate=0.0)
+        self.reads = collections.Counter()
+
+    def get_positions(self, **kwargs):
+        self.reads['get_positions'] += 1
+        return super().get_positions(**kwargs)
+
+    def get_open_orders(self, **kwargs):
+        self.reads['get_open_orders'] += 1
+        return super().get_open_orders(**kwargs)
+
+    def get_order_history(self, **kwargs):
+        self.reads['get_order_history'] += 1
+        return super().get_order_history(**kwargs)
+
+
+def ticks(prices, start_ms=0, step_ms=1000):
+    return [Ticker("BTCUSDT", start_ms + i * step_ms, p, p, p, p, 0.0) for i, p in enumerate(prices)]
+
+
+def make_strategy(session, stream, clock):
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+    return ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=clock, notifications=False,
+                                        private_stream=stream)
+
+
+def test_strategy_driven_by_events():
+    """Исполнение усреднения и avgPrice - событиями, закрытие позиции вручную - без опроса REST"""
+    async def scenario():
+        session = CountingSession()
+        stream = SimulatedPrivateStream(session)
+        clock = ReplayClock()
+        strategy = make_strategy(session, stream, clock)
+        replay = TickReplay(strategy, session, clock)
+
+        # Вход, рост до лимитки усреднения, 30 секунд в коридоре
+        await replay.run(ticks([100.0, 105.0, 111.0] + [108.0] * 30))
+        position = session.positions["BTCUSDT"]
+        assert strategy.is_averaged and strategy.averaged_price == position['avg']
+        assert strategy.position_qty == -position['qty'] and strategy.stop_loss_order_id is not None
+        assert sum(session.reads.values()) == 0
+
+        # Позицию закрыли вручную на бирже - событие позиции останавливает стратегию
+        session.place_order(category="linear", symbol="BTCUSDT", side="Buy", orderType="Market",
+                            qty=str(strategy.position_qty), reduceOnly=True)
+        await replay.run(ticks([108.0], start_ms=40_000))
+        assert strategy.should_stop and not strategy.private_subscribed
+        assert session.get_open_orders(category="linear", symbol="BTCUSDT")['result']['list'] == []
+        # REST - только разовая очистка ордеров символа при остановке
+        assert session.reads['get_positions'] <= 1 and session.reads['get_order_history'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_resync_after_lost_events():
+    """События за время обрыва потеряны: после переподключения одна сверка через REST подтверждает усреднение"""
+    async def scenario():
+        session = CountingSession()
+        stream = SimulatedPrivateStream(session)
+        clock = ReplayClock()
+        strategy = make_strategy(session, stream, clock)
+        replay = TickReplay(strategy, session, clock)
+
+        await replay.run(ticks([100.0, 105.0]))
+        stream.connected = False                    # Исполнение лимитки уйдет в пустоту
+        session.on_price("BTCUSDT", 111.0)
+        stream.connected = True
+        assert not strategy.is_averaged
+
+        stream.reconnect()
+        await replay.run(ticks([108.0, 108.0], start_ms=10_000))
+        assert strategy.is_averaged and strategy.averaged_price == session.positions["BTCUSDT"]['avg']
+        assert not strategy.stream_resync and strategy.stream_live()
+        reads = sum(session.reads.values())
+
+        await replay.run(ticks([108.0] * 20, start_ms=20_000))
+        assert sum(session.reads.values()) == reads   # Дальше снова без опроса
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_auth_subscribe_and_dispatch()
+    test_strategy_driven_by_events()
+    test_resync_after_lost_events()
+    print("✅ Все тесты приватного потока пройдены")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки лимитера запросов к бирже (корзины в памяти процесса и обертка сессии)
+"""
+
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from bybit.async_http import AsyncHTTP
+from bybit.rate_limiter import (
+    PRIORITY_ORDER, PRIORITY_READ, RateLimitedSession, RateLimiter, bucket_key,
+)
+
+
+def test_orders_have_priority_over_polling():
+    """Опрос оставляет резерв корзины: когда чтение уже ждет, ордер проходит сразу"""
+    limiter = RateLimiter("test", read_reserve=0.2, limits={'order_create': (10, 10), 'ip': (10, 10)})
+
+    reads = 0
+    while limiter.try_acquire('order_read', priority=PRIORITY_READ) == 0:
+        reads += 1
+    assert reads == 8                     # 20% емкости общей корзины IP осталось ордерам
+    assert limiter.try_acquire('order_create', priority=PRIORITY_ORDER) == 0
+    assert limiter.try_acquire('order_create', priority=PRIORITY_ORDER) == 0
+    wait = limiter.try_acquire('order_create', priority=PRIORITY_ORDER)
+    assert 0 < wait <= 100                # Корзина пуста, токен вернется через ~1/10 сек
+
+    started = time.monotonic()
+    waited = limiter.acquire('order_create', priority=PRIORITY_ORDER)
+    assert waited > 0 and time.monotonic() - started < 0.5
+    assert limiter.stats()['orders'] == 1 and limiter.stats()['order_wait_sec'] > 0
+
+
+def test_calibration_from_headers():
+    """X-Bapi-Limit задает лимит группы, нулевой остаток закрывает корзину до сброса"""
+    limiter = RateLimiter("test")
+    reset = int(time.time() * 1000) + 300
+    assert limiter.calibrate('position_read', {
+        'x-bapi-limit': "20", 'x-bapi-limit-status': "0", 'x-bapi-limit-reset-timestamp': str(reset),
+    })
+    assert limiter.try_acquire('position_read') > 0
+    bucket = limiter._local._buckets[bucket_key("test", 'position_read')]
+    assert bucket['cap'] == 20 and bucket['rate'] == 20
+
+    # Без заголовков лимита (публичный эндпоинт) - ничего не меняется
+    assert not limiter.calibrate('market', {'Content-Type': "application/json"})
+    assert not limiter.calibrate('ip', {'X-Bapi-Limit': "5", 'X-Bapi-Limit-Status': "0"})
+
+    time.sleep(0.4)
+    assert limiter.try_acquire('position_read', priority=PRIORITY_ORDER) == 0
+
+
+class BrokenRedis:
+    """Redis, который отвечает ошибкой на скрипты"""
+
+    def register_script(self, script):
+        def call(keys=None, args=None):
+            raise ConnectionError("Connection refused")
+        return call
+
+
+def test_redis_failure_falls_back_to_memory():
+    """Ошибка Redis не останавливает запросы: корзины считаются в памяти процесса"""
+    limiter = RateLimiter("test", redis=BrokenRedis())
+    assert limiter.try_acquire('order_create', priority=PRIORITY_ORDER) == 0
+    assert limiter.calibrate('order_create', {'X-Bapi-Limit': "10", 'X-Bapi-Limit-Status': "9"})
+    assert limiter.redis_errors == 2 and limiter.stats()['shared']
+
+
+class HeaderSession:
+    """Сессия с return_response_headers, как pybit.HTTP"""
+
+    def __init__(self):
+        self.return_response_headers = False
+        self.calls = []
+
+    def get_positions(self, **params):
+        self.calls.append(params)
+        response = {'retCode': 0, 'result': {'list': []}}
+        if self.return_response_headers:
+            return response, 0.01, {'X-Bapi-Limit': "30", 'X-Bapi-Limit-Status': "29"}
+        return response
+
+
+def test_session_wrapper_and_async_client():
+    """Обертка pybit-сессии снимает заголовки с ответа; AsyncHTTP калибруется по заголовкам ответа"""
+    limiter = RateLimiter("test")
+    session = RateLimitedSession(HeaderSession(), limiter)
+    assert session.get_positions(category="linear", symbol="BTCUSDT") == {'retCode': 0, 'result': {'list': []}}
+    assert session.return_response_headers is True
+    assert limiter.calibrations == 1 and limiter.stats()['reads'] == 1
+
+    async def handle(request):
+        return web.json_response({'retCode': 0, 'retMsg': 'OK', 'result': {}},
+                                 headers={'X-Bapi-Limit': "15", 'X-Bapi-Limit-Status': "14"})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        http = AsyncHTTP(api_key="key", api_secret="secret", endpoint=f"http://127.0.0.1:{port}", limiter=limiter)
+        await http.place_batch_order(category="linear", request=[{'symbol': "BTCUSDT"}, {'symbol': "BTCUSDT"}])
+        bucket = limiter._local._buckets[bucket_key("test", 'order_create')]
+        assert bucket['cap'] == 15 and 8 <= bucket['tokens'] < 9    # Пакет из двух ордеров - два токена
+        assert limiter.stats()['orders'] == 1
+        await http.close()
+        await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_signature_taken_after_token_wait():
+    """Запрос подписывается после ожидания токена: метка времени не устаревает в очереди лимитера"""
+    limiter = RateLimiter("test", limits={'order_create': (2, 1), 'ip': (100, 100)})
+    assert limiter.try_acquire('order_create', priority=PRIORITY_ORDER) == 0    # Корзина пуста
+    stamps = []
+
+    async def handle(request):
+        stamps.append(int(request.headers['X-BAPI-TIMESTAMP']))
+        return web.json_response({'retCode': 0, 'retMsg': 'OK', 'result': {}})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        http = AsyncHTTP(api_key="key", api_secret="secret", endpoint=f"http://127.0.0.1:{port}", limiter=limiter)
+        started = int(time.time() * 1000)
+        await http.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market", qty=1)
+        assert limiter.stats()['order_wait_sec'] >= 0.3
+        assert stamps[0] - started >= 300     # Подпись сделана после ~0.5 сек ожидания токена
+        await http.close()
+        await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_orders_have_priority_over_polling()
+    test_calibration_from_headers()
+    test_redis_failure_falls_back_to_memory()
+    test_session_wrapper_and_async_client()
+    test_signature_taken_after_token_wait()
+    print("✅ Все тесты лимитера запросов пройдены")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки объединения одинаковых запросов чтения (singleflight и кэш ответов)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+
+from bybit.async_http import AsyncHTTP
+from bybit.request_coalescer import CoalescedSession, RequestCoalescer
+
+
+class SlowSession:
+    """pybit-подобная сессия: каждый запрос идет заметное время, вызовы считаются"""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _call(self, name, params, response=None):
+        with self._lock:
+            self.calls.append((name, params))
+            number = len(self.calls)
+        time.sleep(self.delay)
+        return response or {'retCode': 0, 'retMsg': 'OK', 'result': {'list': [{'call': number}]}}
+
+    def get_instruments_info(self, **params):
+        return self._call('get_instruments_info', params)
+
+    def get_positions(self, **params):
+        return self._call('get_positions', params)
+
+    def get_tickers(self, **params):
+        return self._call('get_tickers', params, {'retCode': 10006, 'retMsg': 'Too many visits!'})
+
+    def place_order(self, **params):
+        return self._call('place_order', params)
+
+
+def _parallel(count, call):
+    results = [None] * count
+
+    def run(i):
+        results[i] = call()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_reads_share_one_request():
+    """Одинаковые одновременные чтения - один запрос; ответ instruments-info живет в кэше"""
+    session = SlowSession()
+    coalescer = RequestCoalescer()
+    client = CoalescedSession(session, coalescer)
+
+    results = _parallel(5, lambda: client.get_instruments_info(category="linear"))
+    assert len(session.calls) == 1 and all(result is results[0] for result in results)
+    assert client.get_instruments_info(category="linear") is results[0]
+    assert len(session.calls) == 1
+
+    # Другие параметры - другой запрос; ошибка API не кэшируется
+    client.get_instruments_info(category="linear", symbol="BTCUSDT")
+    client.get_tickers(category="linear", symbol="BTCUSDT")
+    client.get_tickers(category="linear", symbol="BTCUSDT")
+    assert len(session.calls) == 4
+
+    stats = coalescer.stats()
+    assert stats['hits'] == 1 and stats['dedup'] == 4 and stats['misses'] == 4
+    assert stats['paths']["/v5/market/instruments-info"] == {'hits': 1, 'dedup': 4, 'misses': 2}
+
+
+def test_state_reads_after_write_are_not_shared():
+    """Чтение позиции, начатое до ордера по символу, не отдается тем, кто спрашивает после ордера"""
+    session = SlowSession(delay=0.2)
+    coalescer = RequestCoalescer()
+    client = CoalescedSession(session, coalescer)
+    results = {}
+
+    reader = threading.Thread(target=lambda: results.setdefault('before', client.get_positions(
+        category="linear", symbol="BTCUSDT")))
+    reader.start()
+    time.sleep(0.05)
+    session.delay = 0.0
+    client.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market", qty="1")
+    results['after'] = client.get_positions(category="linear", symbol="BTCUSDT")
+    reader.join()
+
+    assert [name for name, _ in session.calls] == ['get_positions', 'place_order', 'get_positions']
+    assert results['before'] is not results['after']
+
+    # Позиции не кэшируются: следующий запрос снова идет на биржу
+    client.get_positions(category="linear", symbol="BTCUSDT")
+    assert len(session.calls) == 4 and coalescer.stats()['dedup'] == 0
+
+
+def test_async_client_coalesces_and_survives_cancel():
+    """AsyncHTTP: одновременные get_tickers - один HTTP-запрос; отмена первого не ломает остальных"""
+    hits = []
+
+    async def handle(request):
+        hits.append(request.path)
+        await asyncio.sleep(0.1)
+        return web.json_response({'retCode': 0, 'retMsg': 'OK', 'result': {'list': [{'lastPrice': "100"}]}})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        coalescer = RequestCoalescer(ttls={"/v5/market/tickers": 0.0, "/v5/position/list": 0.0})
+        http = AsyncHTTP(api_key="key", api_secret="secret", endpoint=f"http://127.0.0.1:{port}",
+                         coalescer=coalescer)
+        responses = await asyncio.gather(*[http.get_tickers(category="linear", symbol="BTCUSDT")
+                                           for _ in range(5)])
+        assert hits == ["/v5/market/tickers"] and all(r['retCode'] == 0 for r in responses)
+
+        # Первый запрос отменен - ожидающий отправляет свой
+        leader = asyncio.create_task(http.get_positions(category="linear", symbol="BTCUSDT"))
+        await asyncio.sleep(0.02)
+        follower = asyncio.create_task(http.get_positions(category="linear", symbol="BTCUSDT"))
+        await asyncio.sleep(0.02)
+        leader.cancel()
+        response = await follower
+        assert response['retCode'] == 0 and hits.count("/v5/position/list") == 2
+
+        # Запись через клиент отмечает символ
+        await http.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market", qty=1)
+        assert coalescer._writes["BTCUSDT"] > 0
+        assert coalescer.stats()['dedup'] == 5
+
+        await http.close()
+        await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_concurrent_reads_share_one_request()
+    test_state_reads_after_write_are_not_shared()
+    test_async_client_coalesces_and_survives_cancel()
+    print("✅ Все тесты объединения запросов пройдены")
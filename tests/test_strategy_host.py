@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки хоста стратегий
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.strategy_host import StrategyHost, commands_key, shard_for_symbol, submit_command
+
+
+class FakeMailbox:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStrategy:
+    def __init__(self, symbol, **params):
+        self.symbol = symbol
+        self.params = params
+        self.should_stop = False
+        self.mailbox = FakeMailbox()
+        self.trading_stopped = False
+
+    async def run(self):
+        while not self.should_stop:
+            await asyncio.sleep(0.001)
+
+    async def stop_trading_for_symbol(self):
+        self.trading_stopped = True
+        return True
+
+
+class SlowFactory:
+    """Создание стратегии идет заметное время (REST-запрос в конструкторе)"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.created = []
+
+    def __call__(self, symbol, **params):
+        time.sleep(self.delay)
+        strategy = FakeStrategy(symbol, **params)
+        self.created.append(strategy)
+        return strategy
+
+
+class SlowCloseStrategy(FakeStrategy):
+    async def stop_trading_for_symbol(self):
+        await asyncio.sleep(0.3)
+        return await super().stop_trading_for_symbol()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.lists = {}
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+
+def test_shard_is_stable_and_spread():
+    """Шард символа не зависит от процесса и регистра, символы распределяются по всем шардам"""
+    assert shard_for_symbol("BTCUSDT", 4) == shard_for_symbol("btcusdt", 4)
+    shards = {shard_for_symbol(f"SYM{i}USDT", 4) for i in range(100)}
+    assert shards == {0, 1, 2, 3}
+
+    redis = FakeRedis()
+    shard = submit_command('start', "ethusdt", {'usdt_amount': 50}, shards=4, redis=redis)
+    command = json.loads(redis.lists[commands_key(shard)][0])
+    assert command['symbol'] == "ETHUSDT" and command['params'] == {'usdt_amount': 50}
+
+
+def test_start_duplicate_and_stop():
+    """Повторный старт символа игнорируется, stop с close закрывает торговлю и завершает задачу"""
+    async def scenario():
+        host = StrategyHost(shard=0, shards=1, redis=FakeRedis(), strategy_factory=FakeStrategy)
+        await host.handle_command({'action': 'start', 'symbol': 'btcusdt', 'params': {'usdt_amount': 10}})
+        await host.handle_command({'action': 'start', 'symbol': 'BTCUSDT'})
+        await host.handle_command({'action': 'start', 'symbol': 'ETHUSDT'})
+        await host.join_commands()
+        assert sorted(host.strategies) == ['BTCUSDT', 'ETHUSDT']
+        assert host.rejected == 1
+        strategy = host.strategies['BTCUSDT']
+        assert strategy.params == {'usdt_amount': 10}
+
+        await host.handle_command({'action': 'stop', 'symbol': 'BTCUSDT', 'close': True})
+        await host.join_commands()
+        assert strategy.trading_stopped and strategy.mailbox.closed
+        assert list(host.strategies) == ['ETHUSDT']
+
+        await host.shutdown()
+        assert host.strategies == {} and host.completed == 2
+
+    asyncio.run(scenario())
+
+
+def test_stop_while_starting_and_slow_close():
+    """Stop во время создания стратегии не теряется; закрытие позиции не задерживает другие команды"""
+    async def scenario():
+        factory = SlowFactory()
+        host = StrategyHost(shard=0, shards=1, redis=FakeRedis(), strategy_factory=factory)
+        await host.handle_command({'action': 'start', 'symbol': 'BTCUSDT'})
+        await asyncio.sleep(0.05)
+        assert host.strategies == {'BTCUSDT': None}
+        await host.handle_command({'action': 'stop', 'symbol': 'BTCUSDT', 'close': True})
+        await host.join_commands()
+        assert host.strategies == {} and host.tasks == {} and host.started == 0
+        assert factory.created[0].trading_stopped
+
+        host.strategy_factory = SlowCloseStrategy
+        await host.start_strategy('ETHUSDT', {})
+        started = time.perf_counter()
+        await host.handle_command({'action': 'stop', 'symbol': 'ETHUSDT', 'close': True})
+        host.strategy_factory = FakeStrategy
+        await host.handle_command({'action': 'start', 'symbol': 'XRPUSDT'})
+        assert time.perf_counter() - started < 0.1
+        await host.join_commands()
+        assert sorted(host.strategies) == ['XRPUSDT']
+
+        await host.shutdown()
+        assert host.strategies == {}
+
+    asyncio.run(scenario())
+
+
+def test_foreign_shard_rejected():
+    """Символ чужого шарда не запускается"""
+    async def scenario():
+        host = StrategyHost(shard=0, shards=2, redis=FakeRedis(), strategy_factory=FakeStrategy)
+        symbol = next(f"SYM{i}USDT" for i in range(100) if shard_for_symbol(f"SYM{i}USDT", 2) == 1)
+        assert not await host.start_strategy(symbol, {})
+        assert host.strategies == {}
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_shard_is_stable_and_spread()
+    test_start_duplicate_and_stop()
+    test_stop_while_starting_and_slow_close()
+    test_foreign_shard_rejected()
+    print("✅ Все тесты хоста стратегий пройдены")
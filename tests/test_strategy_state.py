@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки снимков состояния стратегии и продолжения после перезапуска
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.strategy_state import StrategyStateStore, state_key
+from bybit.tick_replay import ReplayClock, SimulatedSession
+from bybit.ws_decoder import Ticker
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.ttl = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        pass
+
+    def watch(self, key):
+        pass
+
+    def multi(self):
+        pass
+
+    def reset(self):
+        pass
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    def expire(self, key, seconds):
+        self.ttl[key] = seconds
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+
+def test_snapshot_roundtrip():
+    """Снимок хранит типы полей, пустые значения и heartbeat; release делает снимок свободным"""
+    redis = FakeRedis()
+    store = StrategyStateStore(redis=redis)
+    store.save("btcusdt", {'position_opened': True, 'entry_price': 100.5, 'position_qty': 0.25,
+                           'is_averaged': False, 'breakeven_order_id': 'be-1', 'best_profit_percent': 5.0})
+    assert redis.ttl[state_key("BTCUSDT")] == store.ttl
+
+    state = store.load("BTCUSDT")
+    assert state['position_opened'] is True and state['is_averaged'] is False
+    assert state['entry_price'] == 100.5 and state['position_qty'] == 0.25
+    assert state['breakeven_order_id'] == 'be-1' and state['averaging_order_id'] is None
+    assert state['averaged_price'] is None and state['best_profit_percent'] == 5.0
+    assert not store.is_stale(state) and state['owner'] == store.owner
+
+    store.release("BTCUSDT")
+    assert store.is_stale(store.load("BTCUSDT"))
+    store.delete("BTCUSDT")
+    assert store.load("BTCUSDT") is None
+    assert StrategyStateStore(redis=None).load("BTCUSDT") is None
+
+
+def make_strategy(session, store, clock):
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+    return ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=clock, notifications=False,
+                                        state_store=store)
+
+
+def test_resume_after_worker_crash():
+    """Повторно доставленная задача продолжает позицию по снимку вместо отказа"""
+    async def scenario():
+        clock = ReplayClock(1.0)
+        session = SimulatedSession()
+        store = StrategyStateStore(redis=FakeRedis(), stale_after=0.05)
+
+        first = make_strategy(session, store, clock)
+        for price in (100.0, 111.0):   # Вход и исполнение лимитки усреднения
+            session.on_price("BTCUSDT", price)
+            await first.process_message(Ticker("BTCUSDT", 0, price, price, price, price, 0.0))
+            await first.orders.join()
+        assert first.is_averaged and first.stop_loss_order_id
+        assert store.load("BTCUSDT")['stop_loss_price'] == first.stop_loss_price
+        # Воркер упал: finally не выполнился, heartbeat остался свежим
+
+        second = make_strategy(session, store, clock)
+        assert await second.resume_state()
+        for name in ('entry_price', 'averaged_price', 'position_qty', 'is_averaged', 'averaging_order_id',
+                     'stop_loss_order_id', 'stop_loss_price', 'fake_tp_price', 'best_profit_percent'):
+            assert getattr(second, name) == getattr(first, name), name
+        assert second.position_opened and second.triggers.upper_close < second.stop_loss_price
+
+        # Стоп-лосс закрывает позицию, снимок удаляется
+        price = second.stop_loss_price + 1
+        session.on_price("BTCUSDT", price)
+        await second.process_message(Ticker("BTCUSDT", 0, price, price, price, price, 0.0))
+        await second.orders.join()
+        assert session.summary()['positions'] == {}
+        assert store.load("BTCUSDT") is None
+
+    asyncio.run(scenario())
+
+
+def test_no_save_without_state_change():
+    """Порог, срабатывающий на каждом тике без перехода, не пишет снимок в Redis"""
+    async def scenario():
+        clock = ReplayClock(1.0)
+        session = SimulatedSession()
+        store = StrategyStateStore(redis=FakeRedis())
+        saves = []
+        save = store.save
+        store.save = lambda *args: saves.append(args[0]) or save(*args)
+        strategy = make_strategy(session, store, clock)
+
+        session.on_price("BTCUSDT", 100.0)
+        await strategy.process_message(Ticker("BTCUSDT", 0, 100.0, 100.0, 100.0, 100.0, 0.0))
+        await strategy.orders.join()
+        saved = len(saves)
+        assert saved and strategy.averaging_order_id
+
+        # Цена выше уровня усреднения, лимитка не исполнена: порог срабатывает на каждом тике
+        for ts in range(1, 51):
+            await strategy.process_message(Ticker("BTCUSDT", ts, 111.0, 111.0, 111.0, 111.0, 0.0))
+        await strategy.orders.join()
+        assert not strategy.is_averaged and len(saves) == saved
+
+    asyncio.run(scenario())
+
+
+def test_no_resume_when_position_gone_or_owner_alive():
+    """Снимок без позиции на бирже удаляется; снимок живой стратегии не подхватывается"""
+    async def scenario():
+        clock = ReplayClock(1.0)
+        session = SimulatedSession()
+        session.on_price("BTCUSDT", 100.0)
+        store = StrategyStateStore(redis=FakeRedis(), stale_after=0.05)
+        store.save("BTCUSDT", {'position_opened': True, 'entry_price': 100.0, 'position_qty': 1.0})
+        store.release("BTCUSDT")
+        assert not await make_strategy(session, store, clock).resume_state()
+        assert store.load("BTCUSDT") is None
+
+        store.save("BTCUSDT", {'position_opened': True, 'entry_price': 100.0, 'position_qty': 1.0})
+        store.stale_after = 0.3
+
+        async def heartbeat():
+            for _ in range(10):
+                store.touch("BTCUSDT")
+                await asyncio.sleep(0.05)
+
+        task = asyncio.create_task(heartbeat())
+        assert not await make_strategy(session, store, clock).resume_state()
+        await task
+
+    asyncio.run(scenario())
+
+
+def test_claim_compares_owner():
+    """Устаревший снимок подхватывает одна задача; прежний владелец узнает о перехвате по heartbeat"""
+    store = StrategyStateStore(redis=FakeRedis(), stale_after=0.05)
+    old, first, second = store.new_owner(), store.new_owner(), store.new_owner()
+    store.save("BTCUSDT", {'position_opened': True, 'entry_price': 100.0}, old)
+    state = store.load("BTCUSDT")
+    assert state['owner'] == old and old != first
+
+    assert store.claim("BTCUSDT", state, first)
+    assert not store.claim("BTCUSDT", state, second)      # Снимок уже взят по тому же чтению
+    assert store.load("BTCUSDT")['owner'] == first
+    assert store.touch("BTCUSDT", first) and not store.touch("BTCUSDT", old)
+    store.release("BTCUSDT", old)                          # Чужой снимок не освобождается
+    assert not store.is_stale(store.load("BTCUSDT"))
+    store.delete("BTCUSDT")
+    assert store.touch("BTCUSDT", first) and store.load("BTCUSDT") is None
+
+
+def test_heartbeat_timer_without_ticks():
+    """Heartbeat идет по таймеру без тиков; перехваченная стратегия останавливается"""
+    async def scenario():
+        clock = ReplayClock(1.0)
+        session = SimulatedSession()
+        store = StrategyStateStore(redis=FakeRedis(), stale_after=0.3)
+        strategy = make_strategy(session, store, clock)
+        strategy.position_opened = True
+        strategy.entry_price = 100.0
+        strategy._save_state()
+
+        task = asyncio.create_task(strategy._heartbeat())
+        await asyncio.sleep(0.5)
+        assert not store.is_stale(store.load("BTCUSDT")) and not strategy.should_stop
+
+        store.save("BTCUSDT", {'position_opened': True, 'entry_price': 100.0}, store.new_owner())
+        await asyncio.sleep(0.15)
+        assert strategy.should_stop and strategy.state_cleared
+        await task
+        assert store.load("BTCUSDT")['owner'] != strategy.state_owner
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_snapshot_roundtrip()
+    test_resume_after_worker_crash()
+    test_no_save_without_state_change()
+    test_no_resume_when_position_gone_or_owner_alive()
+    test_claim_compares_owner()
+    test_heartbeat_timer_without_ticks()
+    print("✅ Все тесты снимков состояния пройдены")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки ящика тиков с вытеснением
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.tick_mailbox import AsyncTickMailbox
+
+
+def test_async_mailbox_wakes_loop_from_feed_thread():
+    """Поток источника будит задачу в event loop, промежуточные тики вытесняются"""
+    async def scenario():
+        mailbox = AsyncTickMailbox()
+        mailbox.bind(asyncio.get_running_loop())
+        assert await mailbox.get(timeout=0.01) is None
+
+        def feed():
+            for price in (100.0, 101.0, 102.0):
+                mailbox.put(price)
+
+        thread = threading.Thread(target=feed)
+        thread.start()
+        thread.join()
+        assert await mailbox.get(timeout=1) == 102.0
+        assert mailbox.dropped == 2
+
+        threading.Timer(0.05, mailbox.put, args=(103.0,)).start()
+        assert await mailbox.get(timeout=1) == 103.0
+
+        mailbox.close()
+        mailbox.put(104.0)
+        assert await mailbox.get(timeout=1) is None
+        return mailbox.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['received'] == 4
+    assert stats['delivered'] == 2
+
+
+def test_slow_consumer_does_not_block_producer():
+    """Медленная задача-потребитель не задерживает поток, который кладет тики"""
+    async def scenario():
+        mailbox = AsyncTickMailbox()
+        mailbox.bind(asyncio.get_running_loop())
+        seen = []
+        elapsed = []
+
+        def feed():
+            start = time.monotonic()
+            for i in range(1000):
+                mailbox.put(i)
+            elapsed.append(time.monotonic() - start)
+
+        thread = threading.Thread(target=feed)
+        thread.start()
+        while True:
+            tick = await mailbox.get(timeout=0.2)
+            if tick is None:
+                break
+            seen.append(tick)
+            await asyncio.sleep(0.01)  # Имитация REST-запроса внутри стратегии
+        thread.join()
+        return mailbox, seen, elapsed[0]
+
+    mailbox, seen, elapsed = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert seen[-1] == 999
+    assert mailbox.dropped > 0
+    assert mailbox.received == mailbox.delivered + mailbox.dropped
+
+
+def test_close_wakes_reader():
+    """close() из другого потока будит ожидающую задачу"""
+    async def scenario():
+        mailbox = AsyncTickMailbox()
+        mailbox.bind(asyncio.get_running_loop())
+        threading.Timer(0.05, mailbox.close).start()
+        start = time.monotonic()
+        assert await mailbox.get(timeout=5) is None
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 1
+
+
+if __name__ == "__main__":
+    test_async_mailbox_wakes_loop_from_feed_thread()
+    test_slow_consumer_does_not_block_producer()
+    test_close_wakes_reader()
+    print("✅ Все тесты ящика тиков пройдены")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки записи тиков в сжатые файлы
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.tick_recorder import TickFileReader, TickFileWriter, TickRecorder, tick_file_path
+from bybit.ws_decoder import Ticker
+
+DAY_MS = 86_400_000
+START_MS = 1_700_000_000_000 - 1_700_000_000_000 % DAY_MS   # Полночь UTC
+
+
+def make_rows(n, start=START_MS):
+    return [(start + i * 100, 100.0 + i, 99.5 + i, 100.5 + i, 1000.0 + i) for i in range(n)]
+
+
+def test_roundtrip_with_index():
+    """Блоки читаются обратно через индекс, фильтр по времени не распаковывает лишние блоки"""
+    path = os.path.join(tempfile.mkdtemp(), "BTCUSDT", "day.ticks")
+    rows = make_rows(250)
+    writer = TickFileWriter(path, "BTCUSDT")
+    for i in range(0, 250, 100):
+        writer.write_block(rows[i:i + 100])
+    writer.close()
+
+    reader = TickFileReader(path)
+    assert reader.symbol == "BTCUSDT"
+    assert [b.rows for b in reader.blocks()] == [100, 100, 50]
+    data = reader.read()
+    assert data['ts'].tolist() == [r[0] for r in rows]
+    assert data['last'].tolist() == [r[1] for r in rows]
+    assert data['volume'][-1] == rows[-1][4]
+
+    window = reader.read(START_MS + 150 * 100, START_MS + 160 * 100)
+    assert data['ts'][150:161].tolist() == window['ts'].tolist()
+    assert len(list(reader.iter_blocks(START_MS + 150 * 100, START_MS + 160 * 100))) == 1
+    reader.close()
+
+
+def test_reopen_appends_and_recovers_from_torn_index():
+    """Повторное открытие дописывает файл; без индекса блоки находятся проходом по файлу"""
+    path = os.path.join(tempfile.mkdtemp(), "ETHUSDT", "day.ticks")
+    writer = TickFileWriter(path, "ETHUSDT")
+    writer.write_block(make_rows(10))
+    writer.close()
+
+    # Имитация падения: индекс обрезан
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 7)
+    assert len(TickFileReader(path).blocks()) == 1
+
+    writer = TickFileWriter(path, "ETHUSDT")
+    writer.write_block(make_rows(5, start=START_MS + 10_000))
+    writer.close()
+    reader = TickFileReader(path)
+    assert [b.rows for b in reader.blocks()] == [10, 5]
+    assert len(reader.read()['ts']) == 15
+
+
+def test_recorder_splits_by_symbol_and_day():
+    """Фоновый писатель раскладывает тики по символам и дням"""
+    root = tempfile.mkdtemp()
+    recorder = TickRecorder(root, block_rows=3, flush_interval=60)
+    for i in range(5):
+        recorder.record(Ticker("BTCUSDT", START_MS + i, 1.0 + i, 0.9, 1.1, 0.0, 10.0))
+    recorder.record(Ticker("BTCUSDT", START_MS + DAY_MS, 9.0, 8.9, 9.1, 0.0, 11.0))
+    recorder.record(Ticker("SOLUSDT", START_MS, 150.0, 149.9, 150.1, 0.0, 5.0))
+    recorder.close()
+
+    assert recorder.stats()['recorded'] == 7 and recorder.dropped == 0
+    day1 = TickFileReader(tick_file_path(root, "BTCUSDT", START_MS)).read()
+    assert day1['last'].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    day2 = TickFileReader(tick_file_path(root, "BTCUSDT", START_MS + DAY_MS)).read()
+    assert day2['last'].tolist() == [9.0]
+    assert TickFileReader(tick_file_path(root, "SOLUSDT", START_MS)).read()['bid'].tolist() == [149.9]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    """При переполнении очереди тик отбрасывается, а не блокирует вызывающий поток"""
+    recorder = TickRecorder(tempfile.mkdtemp(), queue_size=1)
+    recorder._running = False
+    recorder._thread.join()
+    recorder.record(Ticker("BTCUSDT", START_MS, 1.0, 1.0, 1.0, 0.0, 0.0))
+    recorder.record(Ticker("BTCUSDT", START_MS + 1, 1.0, 1.0, 1.0, 0.0, 0.0))
+    assert recorder.dropped == 1
+
+
+if __name__ == "__main__":
+    test_roundtrip_with_index()
+    test_reopen_appends_and_recovers_from_torn_index()
+    test_recorder_splits_by_symbol_and_day()
+    test_full_queue_drops_instead_of_blocking()
+    print("✅ Все тесты записи тиков пройдены")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки симулятора биржи и воспроизведения тиков
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.tick_recorder import TickFileWriter, tick_file_path
+from bybit.tick_replay import ReplayClock, SimulatedSession, TickReplay, load_ticks
+from bybit.ws_decoder import Ticker
+
+START_MS = 1_700_000_000_000 - 1_700_000_000_000 % 86_400_000
+
+
+def position(session, symbol="BTCUSDT"):
+    return session.get_positions(category="linear", symbol=symbol)['result']['list'][0]
+
+
+def test_short_with_averaging_and_stop():
+    """Шорт по рынку, усреднение лимиткой, стоп на покупку по росту цены"""
+    session = SimulatedSession(fee_rate=0.0)
+    session.on_price("BTCUSDT", 100.0)
+    session.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market", qty="1")
+    avg_id = session.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Limit",
+                                 qty="1", price="110")['result']['orderId']
+    assert position(session)['side'] == 'Sell'
+
+    session.on_price("BTCUSDT", 111.0)
+    history = session.get_order_history(category="linear", symbol="BTCUSDT", orderId=avg_id)['result']['list']
+    assert history[0]['orderStatus'] == 'Filled'
+    assert float(position(session)['size']) == 2
+    assert float(position(session)['avgPrice']) == 105.0   # Лимитка исполнена по своей цене
+
+    session.place_order(category="linear", symbol="BTCUSDT", side="Buy", orderType="Stop", qty="2",
+                        stopPrice="115", reduceOnly=True)
+    session.on_price("BTCUSDT", 114.0)
+    assert len(session.orders) == 1
+    session.on_price("BTCUSDT", 116.0)
+    assert float(position(session)['size']) == 0
+    assert session.realized_pnl == (105.0 - 116.0) * 2
+
+
+def test_reduce_only_orders_removed_after_close():
+    """После закрытия позиции reduce-only ордера снимаются, отмена несуществующего - код 110001"""
+    session = SimulatedSession()
+    session.on_price("ETHUSDT", 10.0)
+    session.place_order(category="linear", symbol="ETHUSDT", side="Sell", orderType="Market", qty="3")
+    stop_id = session.place_order(category="linear", symbol="ETHUSDT", side="Buy", orderType="Stop", qty="3",
+                                  stopPrice="12", reduceOnly=True)['result']['orderId']
+    # Закрываем рынком больше, чем позиция: reduce-only урезается до размера позиции
+    session.place_order(category="linear", symbol="ETHUSDT", side="Buy", orderType="Market", qty="5", reduceOnly=True)
+    assert session.summary()['positions'] == {}
+    assert session.get_open_orders(category="linear", symbol="ETHUSDT")['result']['list'] == []
+
+    response = session.cancel_order(category="linear", symbol="ETHUSDT", orderId=stop_id)
+    assert response['retCode'] == 110001
+    assert 'not exists' in response['retMsg']
+
+
+def test_position_trading_stop():
+    """Стоп-лосс позиции: уровень по другую сторону цены отклоняется, срабатывание закрывает всю позицию"""
+    session = SimulatedSession(fee_rate=0.0)
+    session.on_price("BTCUSDT", 100.0)
+    assert session.set_trading_stop(category="linear", symbol="BTCUSDT", stopLoss="105")['retCode'] == 10001
+    session.place_order(category="linear", symbol="BTCUSDT", side="Sell", orderType="Market", qty="2")
+    assert session.set_trading_stop(category="linear", symbol="BTCUSDT", stopLoss="99")['retCode'] == 10001
+    assert session.set_trading_stop(category="linear", symbol="BTCUSDT", stopLoss="105")['retCode'] == 0
+    assert position(session)['stopLoss'] == '105.0'
+
+    session.on_price("BTCUSDT", 104.0)
+    assert float(position(session)['size']) == 2
+    session.on_price("BTCUSDT", 106.0)
+    assert session.summary()['positions'] == {} and session.trading_stops == {}
+    assert session.fills[-1]['side'] == 'Buy' and session.realized_pnl == (100.0 - 106.0) * 2
+
+
+def test_strategy_trading_stop_mode():
+    """Режим trading_stop: безубыток и стоп-лосс - уровень позиции без Stop-ордеров, закрывает биржа"""
+    from bybit.averaging_strategy_celery import ShortAveragingStrategyCelery
+
+    async def scenario():
+        session = SimulatedSession()
+        strategy = ShortAveragingStrategyCelery("BTCUSDT", session=session, clock=ReplayClock(1.0),
+                                                notifications=False, protection_mode="trading_stop")
+        for price in (100.0, 111.0, 112.0):   # Вход, исполнение лимитки усреднения
+            session.on_price("BTCUSDT", price)
+            await strategy.process_message(Ticker("BTCUSDT", 0, price, price, price, price, 0.0))
+        assert strategy.is_averaged and strategy.stop_loss_order_id is None
+        assert strategy.trading_stop_price == strategy.stop_loss_price
+        assert position(session)['stopLoss'] == str(strategy.stop_loss_price)
+        assert not [o for o in session.orders.values() if o['orderType'] == 'Stop']
+
+        price = strategy.stop_loss_price + 0.5
+        session.on_price("BTCUSDT", price)          # Биржа закрывает позицию стоп-лоссом позиции
+        await strategy.process_message(Ticker("BTCUSDT", 0, price, price, price, price, 0.0))
+        assert strategy.should_stop and session.summary()['positions'] == {}
+        assert session.fills[-1]['orderType'] == 'Market' and session.fills[-1]['side'] == 'Buy'
+        assert len(session.fills) == 3   # Вход, усреднение, стоп-лосс позиции - без встречных закрытий
+
+    asyncio.run(scenario())
+
+
+class FakeStrategy:
+    def __init__(self, clock, stop_at):
+        self.clock = clock
+        self.stop_at = stop_at
+        self.seen = []
+        self.should_stop = False
+
+    async def process_message(self, ticker):
+        self.seen.append((self.clock(), ticker.last_price))
+        if ticker.last_price >= self.stop_at:
+            self.should_stop = True
+
+
+def test_replay_from_recorded_file():
+    """Тики читаются из файла записи, часы стратегии идут по времени биржи, остановка прерывает прогон"""
+    root = tempfile.mkdtemp()
+    writer = TickFileWriter(tick_file_path(root, "BTCUSDT", START_MS), "BTCUSDT")
+    writer.write_block([(START_MS + i * 1000, 100.0 + i, 99.0 + i, 101.0 + i, 5.0) for i in range(10)])
+    writer.close()
+
+    day = tick_file_path(root, "BTCUSDT", START_MS).rsplit(os.sep, 1)[1][:10]
+    ticks = list(load_ticks(root, "BTCUSDT", [day]))
+    assert len(ticks) == 10 and ticks[3] == Ticker("BTCUSDT", START_MS + 3000, 103.0, 102.0, 104.0, 0.0, 5.0)
+
+    clock = ReplayClock()
+    session = SimulatedSession()
+    strategy = FakeStrategy(clock, stop_at=105.0)
+    result = asyncio.run(TickReplay(strategy, session, clock).run(ticks))
+
+    assert result['ticks'] == 6 and result['stopped']
+    assert strategy.seen[0] == (START_MS / 1000, 100.0)
+    assert strategy.seen[-1] == (START_MS / 1000 + 5, 105.0)
+    assert session.prices["BTCUSDT"] == 105.0
+
+
+if __name__ == "__main__":
+    test_short_with_averaging_and_stop()
+    test_reduce_only_orders_removed_after_close()
+    test_position_trading_stop()
+    test_strategy_trading_stop_mode()
+    test_replay_from_recorded_file()
+    print("✅ Все тесты воспроизведения тиков пройдены")
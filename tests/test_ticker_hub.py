@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки общего хаба тикеров (подсчет подписок, раздача, склейка, переподключение)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.ticker_hub import TickerHub
+from bybit.ws_decoder import Ticker
+
+
+class FakeWebSocket:
+    """WebSocket без сети: запоминает отправленные сообщения"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def send(self, raw):
+        self.sent.append(json.loads(raw))
+
+    def close(self):
+        self.closed = True
+
+    def ops(self):
+        return [(message['op'], message.get('args')) for message in self.sent]
+
+
+class SlowUnsubscribeWebSocket(FakeWebSocket):
+    """unsubscribe уходит в сеть заметное время"""
+
+    def __init__(self):
+        super().__init__()
+        self.unsubscribing = threading.Event()
+
+    def send(self, raw):
+        if json.loads(raw)['op'] == "unsubscribe":
+            self.unsubscribing.set()
+            time.sleep(0.1)
+        super().send(raw)
+
+
+class FakeWatchdog:
+    def __init__(self):
+        self.backfills = []
+
+    def request_backfill(self, symbols):
+        self.backfills.append(sorted(symbols))
+
+    def stop(self):
+        pass
+
+
+def make_hub():
+    """Хаб с подставленным соединением: потоки соединения и сторожа не запускаются"""
+    hub = TickerHub(url="ws://test")
+    hub._running = True
+    hub.watchdog = FakeWatchdog()
+    ws = FakeWebSocket()
+    hub._ws = ws
+    hub._on_open(ws)
+    return hub, ws
+
+
+def frame(symbol, kind, ts, **data):
+    return json.dumps({'topic': f"tickers.{symbol}", 'type': kind, 'ts': ts, 'data': dict(symbol=symbol, **data)},
+                      separators=(',', ':'))
+
+
+def test_refcount_subscriptions():
+    """Второй подписчик не шлет subscribe; unsubscribe уходит только после последнего"""
+    hub, ws = make_hub()
+    first, second = [], []
+    hub.subscribe("btcusdt", first.append)
+    hub.subscribe("BTCUSDT", second.append)
+    assert ws.ops() == [('subscribe', ["tickers.BTCUSDT"])]
+    assert hub.subscriber_count("BTCUSDT") == 2 and hub.get_symbols() == ["BTCUSDT"]
+
+    hub.unsubscribe("BTCUSDT", first.append)
+    hub.unsubscribe("BTCUSDT", first.append)     # Повторная отписка ничего не делает
+    assert len(ws.sent) == 1
+    hub.unsubscribe("BTCUSDT", second.append)
+    assert ws.ops()[-1] == ('unsubscribe', ["tickers.BTCUSDT"])
+    assert hub.subscriber_count("BTCUSDT") == 0 and hub.get_last_ticker("BTCUSDT") is None
+
+    # Стакан считается отдельным топиком
+    books = []
+    hub.subscribe_orderbook("BTCUSDT", books.append, depth=50)
+    hub.subscribe_orderbook("BTCUSDT", books.append, depth=50)
+    assert ws.ops()[-1] == ('subscribe', ["orderbook.50.BTCUSDT"]) and len(ws.sent) == 3
+
+
+def test_unsubscribe_does_not_override_new_subscribe():
+    """Подписка во время отправки unsubscribe уходит после него - последний кадр топика subscribe"""
+    hub = TickerHub(url="ws://test")
+    hub._running = True
+    hub.watchdog = FakeWatchdog()
+    ws = SlowUnsubscribeWebSocket()
+    hub._ws = ws
+    hub._on_open(ws)
+    old, new = [], []
+    hub.subscribe("BTCUSDT", old.append)
+
+    remover = threading.Thread(target=hub.unsubscribe, args=("BTCUSDT", old.append))
+    remover.start()
+    ws.unsubscribing.wait(1)
+    hub.subscribe("BTCUSDT", new.append)
+    remover.join()
+    assert ws.ops()[-2:] == [('unsubscribe', ["tickers.BTCUSDT"]), ('subscribe', ["tickers.BTCUSDT"])]
+    assert hub.subscriber_count("BTCUSDT") == 1 and "BTCUSDT" in hub.tick_ages()
+
+
+def test_fanout_and_delta_merge():
+    """Тикер раздается всем callback'ам символа; delta склеивается со snapshot"""
+    hub, ws = make_hub()
+    first, second, other = [], [], []
+    hub.subscribe("BTCUSDT", first.append)
+    hub.subscribe("BTCUSDT", second.append)
+    hub.subscribe("ETHUSDT", other.append)
+
+    hub._on_message(ws, frame("BTCUSDT", "snapshot", 1000, lastPrice="65000.5", bid1Price="65000",
+                              ask1Price="65001", markPrice="64999.9", volume24h="10"))
+    hub._on_message(ws, frame("BTCUSDT", "delta", 1100, bid1Price="65002", ask1Price="65003"))
+    expected = [Ticker("BTCUSDT", 1000, 65000.5, 65000.0, 65001.0, 64999.9, 10.0),
+                Ticker("BTCUSDT", 1100, 65000.5, 65002.0, 65003.0, 64999.9, 10.0)]
+    assert first == expected and second == expected and other == []
+    assert hub.get_last_ticker("BTCUSDT") == expected[-1] and hub.messages_received == 2
+
+    # Ошибка в одном callback не мешает остальным
+    def broken(ticker):
+        raise RuntimeError("boom")
+    hub.subscribe("ETHUSDT", broken)
+    hub._on_message(ws, frame("ETHUSDT", "snapshot", 5, lastPrice="3000"))
+    assert other[-1].last_price == 3000.0
+
+
+def test_resubscribe_after_reconnect():
+    """После переподключения все топики подписываются заново, цены подтягиваются через REST"""
+    hub, ws = make_hub()
+    callback = [].append
+    for symbol in ("BTCUSDT", "ETHUSDT"):
+        hub.subscribe(symbol, callback)
+    hub.subscribe_orderbook("BTCUSDT", callback, depth=50)
+    assert hub.watchdog.backfills == []     # Первое подключение - без догрузки
+
+    hub.reconnect()
+    assert ws.closed
+    hub._on_close(ws, 1006, "lost")
+    assert not hub.is_connected() and not hub._send({'op': "ping"})
+
+    new_ws = FakeWebSocket()
+    hub._ws = new_ws
+    hub._on_open(new_ws)
+    assert new_ws.ops() == [('subscribe', ["tickers.BTCUSDT", "tickers.ETHUSDT", "orderbook.50.BTCUSDT"])]
+    assert hub.watchdog.backfills == [["BTCUSDT", "ETHUSDT"]]
+
+
+if __name__ == "__main__":
+    test_refcount_subscriptions()
+    test_unsubscribe_does_not_override_new_subscribe()
+    test_fanout_and_delta_merge()
+    test_resubscribe_after_reconnect()
+    print("✅ Все тесты хаба тикеров пройдены")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки таблицы ценовых порогов стратегии
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.trigger_table import TriggerTable
+
+
+def make_table():
+    table = TriggerTable()
+    table.build(
+        above_last=[(110.0, 'averaging')],
+        above_close=[(115.0, 'stop_loss'), (101.0, 'breakeven')],
+        below=[(97.0, 'take_profit'), (98.0, 'fake_tp')],
+    )
+    return table
+
+
+def test_price_between_thresholds_fires_nothing():
+    """Цена между ближайшими порогами - пустой результат"""
+    table = make_table()
+    assert table.upper_last == 110.0 * (1 - 1e-9)
+    assert table.upper_close == 101.0 * (1 - 1e-9)
+    for price in (98.01, 99.0, 100.99):
+        assert table.check(price, price) == frozenset()
+
+
+def test_crossed_thresholds_found_by_bisect():
+    """Пересечение находит все пороги в нужную сторону, пороги срабатывают включительно"""
+    table = make_table()
+    assert table.check(98.0, 98.0) == {'fake_tp'}
+    assert table.check(96.0, 96.0) == {'fake_tp', 'take_profit'}
+    assert table.check(101.0, 101.0) == {'breakeven'}
+    assert table.check(112.0, 112.0) == {'averaging', 'breakeven'}
+    assert table.check(116.0, 116.0) == {'averaging', 'breakeven', 'stop_loss'}
+    # Стоп-лосс и безубыток сравниваются с ценой закрытия (лучший ask), а не с last
+    assert table.check(100.5, 101.5) == {'breakeven'}
+
+
+def test_rebuild_and_clear():
+    """Перестроение заменяет пороги целиком, пустая таблица не срабатывает никогда"""
+    table = make_table()
+    table.build(below=[(95.0, 'breakeven_step')])
+    assert table.check(120.0, 120.0) == frozenset()
+    assert table.check(95.0, 95.0) == {'breakeven_step'}
+    assert table.builds == 2
+    table.clear()
+    assert table.check(0.0, 1e9) == frozenset()
+
+
+if __name__ == "__main__":
+    test_price_between_thresholds_fires_nothing()
+    test_crossed_thresholds_found_by_bisect()
+    test_rebuild_and_clear()
+    print("✅ Все тесты таблицы порогов пройдены")
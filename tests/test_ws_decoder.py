@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Тестовый скрипт для проверки декодирования кадров тикеров
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bybit.ws_decoder import Ticker, decode_ticker, is_ticker_frame, merge_ticker
+
+SNAPSHOT = json.dumps({
+    "topic": "tickers.BTCUSDT", "type": "snapshot", "cs": 1, "ts": 1000,
+    "data": {
+        "symbol": "BTCUSDT", "tickDirection": "PlusTick", "price24hPcnt": "0.01",
+        "lastPrice": "65000.5", "bid1Price": "65000", "bid1Size": "1.2",
+        "ask1Price": "65001", "ask1Size": "0.5", "markPrice": "64999.9",
+        "volume24h": "12345.6", "fundingRate": "0.0001", "nextFundingTime": "1700000000000",
+    },
+}, separators=(',', ':'))
+DELTA = json.dumps({
+    "topic": "tickers.BTCUSDT", "type": "delta", "cs": 2, "ts": 1100,
+    "data": {"symbol": "BTCUSDT", "bid1Price": "65002", "ask1Price": "65003"},
+}, separators=(',', ':'))
+
+
+def test_snapshot_and_delta_merge():
+    """Delta обновляет только пришедшие поля, остальные берутся из snapshot"""
+    ticker = merge_ticker(None, decode_ticker(SNAPSHOT))
+    assert ticker == Ticker("BTCUSDT", 1000, 65000.5, 65000.0, 65001.0, 64999.9, 12345.6)
+
+    update = decode_ticker(DELTA)
+    assert update.last_price is None and not update.is_snapshot
+    ticker = merge_ticker(ticker, update)
+    assert ticker == Ticker("BTCUSDT", 1100, 65000.5, 65002.0, 65003.0, 64999.9, 12345.6)
+
+
+def test_frame_detection():
+    """Тикеры распознаются без разбора JSON, остальные кадры - нет"""
+    assert is_ticker_frame(SNAPSHOT)
+    assert is_ticker_frame(DELTA.encode())
+    assert not is_ticker_frame('{"success":true,"ret_msg":"pong","op":"ping"}')
+    assert not is_ticker_frame('{"topic":"orderbook.50.BTCUSDT","type":"delta","data":{}}')
+
+
+def test_empty_field_is_ignored():
+    """Пустая строка в поле не ломает декодирование"""
+    update = decode_ticker('{"topic":"tickers.XUSDT","type":"delta","ts":5,"data":{"markPrice":"","lastPrice":"1.5"}}')
+    assert update.mark_price is None
+    assert update.last_price == 1.5
+
+
+if __name__ == "__main__":
+    test_snapshot_and_delta_merge()
+    test_frame_detection()
+    test_empty_field_is_ignored()
+    print("✅ Все тесты декодирования тикеров пройдены")